@@ -0,0 +1,229 @@
+#!/usr/bin/env python3
+"""
+RetroPhone Audio-Arbitrierung
+-----------------------------
+Zwei Prozesse wollen das Audio-Geraet: aplay (Waehlton) vom Daemon und
+baresip (Gespraech). Der Installer legt dafuer in /etc/asound.conf ein
+gemeinsames PCM "retrophone" an (dmix fuer die Wiedergabe, dsnoop fuer
+die Aufnahme); darueber koennen beide gleichzeitig offen sein.
+
+Zusaetzlich vergibt AudioLease das Geraet im Daemon nach Vorrang:
+
+  call   baresip spielt das Gespraech (hoechster Vorrang)
+  warm   Stille waehrend es klingelt, haelt Geraet und dmix offen
+  play   Nachrichten abhoeren (Decoder -> aplay, gestreamt)
+  tone   Waehlton
+
+Ein hoeherer Besitzer verdraengt einen niedrigeren: aplay bekommt
+sofort SIGTERM, geerntet wird es erst in einem spaeteren Durchlauf der
+Hauptschleife (reap(), nach STOP_WAIT_SEC per SIGKILL). Die
+Hauptschleife blockiert dabei nie; aplay schliesst das Geraet nach
+SIGTERM in wenigen ms, baresip oeffnet es erst nach dem SIP-Handshake
+(bei einem exklusiven Geraet wie plughw:0,0 sonst "device busy"). Die Stille bleibt bis zum ersten
+Audio-Paket des Gespraechs stehen, damit baresip auf ein laufendes
+Geraet trifft; bei einem exklusiven Geraet gibt es keine Stille.
+Ein niedrigerer Besitzer bekommt das Geraet nicht, solange ein
+hoeherer es haelt (kein Waehlton in ein Gespraech hinein).
+"""
+
+import os
+import time
+import logging
+
+logger = logging.getLogger("retrophone")
+
+TONE = "tone"
+PLAY = "play"
+WARM = "warm"
+CALL = "call"
+PRIORITY = {TONE: 1, PLAY: 2, WARM: 3, CALL: 4}
+
+STOP_WAIT_SEC = 0.3     # so lange auf das Ende von aplay warten, dann kill
+REAP_TICK_SEC = 0.02    # Abstand der Pruefungen, solange ein Prozess endet
+WARM_MAX_SEC  = 120.0   # Stille spaetestens dann beenden
+WARM_RATE     = 8000
+
+# Geraete, die nur ein Prozess gleichzeitig oeffnen kann
+EXCLUSIVE_PREFIXES = ("hw:", "plughw:")
+
+
+def is_shared(device: str) -> bool:
+    return not device.startswith(EXCLUSIVE_PREFIXES)
+
+
+class AudioLease:
+    def __init__(self, device="retrophone", warmup=True):
+        self.device = device
+        self.warmup = warmup
+        self.owners = set()        # aktive Besitzer (call, warm, tone)
+        self.procs = {}            # besitzer -> aplay Popen
+        self.sources = {}          # besitzer -> Decoder, der in aplay schreibt
+        self.dying = []            # [proc, t_term, besitzer|None, gekillt] bis reap()
+        self.t_warm = 0.0
+        self.preempts = 0
+        self.preempt_ms_max = 0.0
+
+    def configure(self, device, warmup):
+        """Neue Einstellungen (Reload); laufende Wiedergaben bleiben."""
+        self.device, self.warmup = device, warmup
+
+    def holder(self):
+        return max(self.owners, key=PRIORITY.get) if self.owners else None
+
+    def acquire(self, owner) -> bool:
+        """Geraet fuer owner. False, wenn ein hoeherer Besitzer es haelt."""
+        top = self.holder()
+        if top and PRIORITY[top] > PRIORITY[owner]:
+            return False
+        for other in [o for o in self.owners if PRIORITY[o] < PRIORITY[owner]]:
+            # Stille darf neben baresip weiterlaufen, sofern das Geraet geteilt ist
+            if other == WARM and is_shared(self.device):
+                continue
+            self._stop(other, preempt=True)
+        self.owners.add(owner)
+        return True
+
+    def release(self, owner):
+        self._stop(owner)
+
+    # ---------- aplay ----------
+    def _play(self, owner, args) -> bool:
+        if not self.acquire(owner):
+            return False
+        proc = self.procs.get(owner)
+        if proc is not None and proc.poll() is None:
+            return True
+        import subprocess     # erst bei Bedarf, nicht beim Daemon-Start
+        try:
+            self.procs[owner] = subprocess.Popen(
+                ["aplay", "-q", "-D", self.device] + args,
+                stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        except OSError as e:
+            logger.error("aplay (%s) fehlgeschlagen: %s", owner, e)
+            self.owners.discard(owner)
+            return False
+        return True
+
+    def stream(self, owner, source_cmd) -> bool:
+        """
+        Spielt die Ausgabe von source_cmd (WAV auf stdout) ab. Decoder und
+        aplay sind per Pipe verbunden; die Datei wird nie ganz geladen.
+        """
+        self._stop(owner)
+        if not self.acquire(owner):
+            return False
+        import subprocess
+        try:
+            src = subprocess.Popen(source_cmd, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+        except OSError as e:
+            logger.error("Decoder (%s) fehlgeschlagen: %s", owner, e)
+            self.owners.discard(owner)
+            return False
+        try:
+            self.procs[owner] = subprocess.Popen(
+                ["aplay", "-q", "-D", self.device], stdin=src.stdout,
+                stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        except OSError as e:
+            logger.error("aplay (%s) fehlgeschlagen: %s", owner, e)
+            self._end(src, None)
+            self.owners.discard(owner)
+            return False
+        src.stdout.close()     # nur noch aplay liest die Pipe
+        self.sources[owner] = src
+        return True
+
+    def _end(self, proc, preempted):
+        """SIGTERM schicken, nicht warten; reap() erntet den Prozess."""
+        try:
+            proc.terminate()
+        except OSError:
+            pass
+        self.dying.append([proc, time.monotonic(), preempted, False])
+
+    def _stop(self, owner, preempt=False):
+        self.owners.discard(owner)
+        src = self.sources.pop(owner, None)
+        if src is not None:
+            self._end(src, None)
+        proc = self.procs.pop(owner, None)
+        if proc is None:
+            return
+        self._end(proc, owner if preempt else None)
+
+    def reap(self, now=None):
+        """
+        Beendete Prozesse ernten (Hauptschleife, jeder Durchlauf), wer
+        nach STOP_WAIT_SEC noch laeuft, bekommt SIGKILL.
+        """
+        if not self.dying:
+            return
+        now = now if now is not None else time.monotonic()
+        alive = []
+        for entry in self.dying:
+            proc, t_term, preempted, killed = entry
+            if proc.poll() is not None:
+                if preempted:
+                    ms = (now - t_term) * 1000.0
+                    self.preempts += 1
+                    self.preempt_ms_max = max(self.preempt_ms_max, ms)
+                    logger.info("Audio: %s verdraengt, Geraet nach %.0f ms frei", preempted, ms)
+                continue
+            if not killed and now - t_term >= STOP_WAIT_SEC:
+                logger.warning("Audio: Prozess %d reagiert nicht auf SIGTERM, kill", proc.pid)
+                try:
+                    proc.kill()
+                except OSError:
+                    pass
+                entry[3] = True
+            alive.append(entry)
+        self.dying = alive
+
+    def next_deadline(self):
+        """Monotone Zeit fuer den naechsten reap(), None ohne endende Prozesse."""
+        return time.monotonic() + REAP_TICK_SEC if self.dying else None
+
+    def playing(self, owner) -> bool:
+        proc = self.procs.get(owner)
+        return proc is not None and proc.poll() is None
+
+    # ---------- Waehlton ----------
+    def tone_start(self, wav) -> bool:
+        if not os.path.exists(wav) or self.playing(TONE):
+            return self.playing(TONE)
+        if self._play(TONE, [wav]):
+            logger.info("Dialtone gestartet")
+            return True
+        return False
+
+    def tone_stop(self):
+        self.release(TONE)
+
+    # ---------- Stille waehrend es klingelt ----------
+    def warm_start(self):
+        if not self.warmup or not is_shared(self.device) or self.playing(WARM):
+            return
+        if self._play(WARM, ["-t", "raw", "-f", "S16_LE", "-c", "1",
+                             "-r", str(WARM_RATE), "/dev/zero"]):
+            self.t_warm = time.monotonic()
+            logger.info("Audio: Geraet vorgewaermt (%s)", self.device)
+
+    def warm_stop(self):
+        if WARM in self.owners or WARM in self.procs:
+            self.release(WARM)
+
+    def warm_expired(self) -> bool:
+        return WARM in self.procs and time.monotonic() - self.t_warm > WARM_MAX_SEC
+
+    def close(self):
+        """Beim Beenden des Daemons: hier darf gewartet werden."""
+        for owner in list(self.procs):
+            self._stop(owner)
+        self.owners.clear()
+        deadline = time.monotonic() + 2 * STOP_WAIT_SEC
+        while self.dying and time.monotonic() < deadline:
+            self.reap()
+            time.sleep(REAP_TICK_SEC)
+
+    def metrics(self):
+        return {"device": self.device, "holder": self.holder(), "preempts": self.preempts,
+                "preempt_ms_max": round(self.preempt_ms_max, 1)}
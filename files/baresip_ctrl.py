@@ -0,0 +1,437 @@
+#!/usr/bin/env python3
+"""
+RetroPhone baresip ctrl_tcp Client
+----------------------------------
+JSON + Netstring ueber TCP, mit eigenem Supervisor-Thread:
+
+- Verbindungsaufbau mit exponentiellem Backoff und Jitter; die
+  Hauptschleife blockiert nie auf connect/recv.
+- Circuit-Breaker-Zustand (state), den die Hauptschleife ohne Locking
+  abfragen kann:
+    down       keine Verbindung, Kommandos werden gepuffert
+    connecting TCP-Verbindungsaufbau laeuft
+    probing    verbunden, Readiness-Probe noch ohne Antwort
+    ready      baresip antwortet, Kommandos gehen direkt raus
+- Kommandos, die ohne Verbindung abgesetzt werden, landen in einer
+  begrenzten Queue und werden nach dem Reconnect in Reihenfolge
+  nachgeschickt, sofern sie nicht zu alt sind (REPLAY_TTL).
+- Events von baresip landen in einer Queue, die poll_events() leert.
+  Nach jedem Reconnect kommt ein synthetisches Event CTRL_CONNECTED,
+  nach einem Abbruch CTRL_DISCONNECTED.
+"""
+
+import os
+import time
+import random
+import select
+import socket
+import logging
+import threading
+from collections import deque
+
+logger = logging.getLogger("retrophone")
+
+BS_HOST            = "127.0.0.1"
+BS_PORT            = 4444
+BS_READ_TIMEOUT    = 0.8     # Standard-Wartezeit von request()
+BS_CONNECT_TIMEOUT = 1.0
+BS_PROBE_TIMEOUT   = 2.0
+BS_PROBE_COMMAND   = "reginfo"
+# Laengster Schlaf des Supervisor-Threads ohne Daten; bestimmt, wie oft
+# sich der Thread im Leerlauf beim Watchdog meldet (LIVE_BARESIP_SEC)
+BS_IDLE_TICK       = 2.0
+
+# Backoff: base * 2^(fehlversuche-1), gedeckelt, davon 50..100 % (Jitter)
+BS_BACKOFF_BASE    = 0.5
+BS_BACKOFF_MAX     = 30.0
+
+BS_QUEUE_MAX       = 64
+# Wie alt ein gepuffertes Kommando beim Nachschicken sein darf (Sekunden).
+# Auflegen ist immer richtig, eine Annahme nach 10 s nicht mehr.
+REPLAY_TTL_DEFAULT = 3.0
+REPLAY_TTL = {
+    "hangup":    60.0,
+    "hangupall": 60.0,
+    "sndcode":   10.0,
+}
+# Bei voller Queue abgelehnt wird das neue Kommando, nie ein gepuffertes.
+# Auflegen kommt trotzdem immer rein und verdraengt dafuer das aelteste
+# andere Kommando.
+BS_NEVER_DROP = ("hangup", "hangupall")
+
+# Zustaende
+DOWN       = "down"
+CONNECTING = "connecting"
+PROBING    = "probing"
+READY      = "ready"
+
+
+class BaresipCtrl:
+    def __init__(self, host=BS_HOST, port=BS_PORT, read_timeout=BS_READ_TIMEOUT):
+        self.host = host
+        self.port = port
+        self.read_timeout = read_timeout
+        self.state = DOWN
+        self.sock = None
+        self.rxbuf = bytearray()
+        self._held_events = []
+
+        self.lock = threading.Lock()
+        self.outq = deque()      # (zeit, command, params, token)
+        self.events = deque()    # von baresip, fuer poll_events()
+        self.pending = {}        # token -> [command, threading.Event | None, antwort]
+        self._seq = 0
+
+        self._stop = threading.Event()
+        self._wake_r, self._wake_w = os.pipe()
+        os.set_blocking(self._wake_r, False)
+        os.set_blocking(self._wake_w, False)
+        # optional: wird bei jedem neuen Event aufgerufen (aus dem Supervisor-Thread)
+        self.on_event = None
+        # optional: Lebenszeichen des Supervisor-Threads (mind. alle BS_IDLE_TICK)
+        self.heartbeat = None
+        self.thread = None
+
+        self.failures = 0
+        self.stats = {
+            "connects": 0,
+            "connect_failures": 0,
+            "disconnects": 0,
+            "probe_failures": 0,
+            "replayed": 0,
+            "dropped": 0,
+            "backoff": 0.0,
+            "last_ready": 0.0,
+            "last_down": 0.0,
+            "last_error": "",
+        }
+
+    # ---------- API fuer die Hauptschleife (blockiert nie) ----------
+    def start(self):
+        if self.thread and self.thread.is_alive():
+            return
+        self._stop.clear()
+        self.thread = threading.Thread(target=self._run, name="baresip-ctrl", daemon=True)
+        self.thread.start()
+
+    @property
+    def ready(self) -> bool:
+        return self.state == READY
+
+    def send(self, command: str, params: str = "") -> bool:
+        """
+        Reiht ein Kommando ein. Liefert False, wenn die Queue voll war und
+        das Kommando abgelehnt wurde. Auflegen verdraengt stattdessen ein
+        anderes Kommando und scheitert nur an einer Queue voller Auflegen.
+        """
+        return self._enqueue(command, params, None) is not None
+
+    def poll_events(self):
+        """Alle seit dem letzten Aufruf eingetroffenen Events (nicht blockierend)."""
+        out = []
+        while self.events:
+            out.append(self.events.popleft())
+        return out
+
+    def metrics(self) -> dict:
+        with self.lock:
+            m = dict(self.stats)
+            m["queued"] = len(self.outq)
+        m["state"] = self.state
+        m["failures"] = self.failures
+        return m
+
+    # ---------- API fuer andere Threads ----------
+    def request(self, command: str, params: str = "", timeout=None):
+        """
+        Schickt ein Kommando und wartet auf die Antwort. Liefert
+        (ok, data) oder (False, "") bei Timeout und voller Queue. Nicht
+        aus der Hauptschleife aufrufen.
+        """
+        waiter = threading.Event()
+        token = self._enqueue(command, params, waiter)
+        if token is None:
+            return False, ""
+        if not waiter.wait(timeout if timeout is not None else self.read_timeout):
+            with self.lock:
+                self.pending.pop(token, None)
+            return False, ""
+        with self.lock:
+            entry = self.pending.pop(token, None)
+        if not entry:
+            return False, ""
+        ok, data = entry[2]
+        return ok, data
+
+    def close(self):
+        self._stop.set()
+        self._wake()
+        if self.thread:
+            self.thread.join(2.0)
+        self._close_sock()
+
+    # ---------- intern ----------
+    def _enqueue(self, command, params, waiter):
+        """Token des eingereihten Kommandos, None wenn die Queue voll war."""
+        with self.lock:
+            if len(self.outq) >= BS_QUEUE_MAX and not self._make_room(command):
+                self.stats["dropped"] += 1
+                logger.warning("baresip Queue voll, Kommando abgelehnt: %s %s", command, params)
+                return None
+            self._seq += 1
+            token = f"rp{self._seq}"
+            self.outq.append((time.time(), command, params, token))
+            self.pending[token] = [command, waiter, (False, "")]
+            if self.state != READY:
+                logger.info("baresip nicht bereit (%s), Kommando gepuffert: %s %s",
+                            self.state, command, params)
+        self._wake()
+        return token
+
+    def _make_room(self, command):
+        """Platz fuer Auflegen: aeltestes anderes Kommando raus (unter self.lock)."""
+        if command not in BS_NEVER_DROP:
+            return False
+        for i, old in enumerate(self.outq):
+            if old[1] not in BS_NEVER_DROP:
+                del self.outq[i]
+                self.pending.pop(old[3], None)
+                self.stats["dropped"] += 1
+                logger.warning("baresip Queue voll, verwerfe fuer %s: %s %s",
+                               command, old[1], old[2])
+                return True
+        return False
+
+    def _wake(self):
+        try:
+            os.write(self._wake_w, b"x")
+        except (BlockingIOError, OSError):
+            pass
+
+    def _drain_wake(self):
+        try:
+            while os.read(self._wake_r, 512):
+                pass
+        except (BlockingIOError, OSError):
+            pass
+
+    def _push_event(self, ev):
+        self.events.append(ev)
+        if self.on_event:
+            self.on_event()
+
+    def _beat(self):
+        if self.heartbeat:
+            self.heartbeat()
+
+    def _sleep(self, delay):
+        """Backoff-Pause in Schritten, damit das Lebenszeichen weiterlaeuft."""
+        end = time.monotonic() + delay
+        while True:
+            self._beat()
+            left = end - time.monotonic()
+            if left <= 0:
+                return False
+            if self._stop.wait(min(BS_IDLE_TICK, left)):
+                return True
+
+    def _backoff_delay(self):
+        d = min(BS_BACKOFF_MAX, BS_BACKOFF_BASE * (2 ** min(16, max(0, self.failures - 1))))
+        return d / 2 + random.uniform(0, d / 2)
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._beat()
+            if self.failures:
+                delay = self._backoff_delay()
+                self.stats["backoff"] = delay
+                self.state = DOWN
+                if self._sleep(delay):
+                    break
+            self.state = CONNECTING
+            try:
+                s = socket.create_connection((self.host, self.port), timeout=BS_CONNECT_TIMEOUT)
+            except Exception as e:
+                self.failures += 1
+                self.stats["connect_failures"] += 1
+                self.stats["last_error"] = str(e)
+                # nur den ersten Fehler einer Serie laut loggen
+                log = logger.error if self.failures == 1 else logger.debug
+                log("baresip connect fehlgeschlagen (%d. Versuch): %s", self.failures, e)
+                continue
+            self.sock = s
+            self.rxbuf.clear()
+            try:
+                self._session()
+            except Exception as e:
+                self.stats["last_error"] = str(e)
+                logger.error("baresip ctrl_tcp Verbindung verloren: %s", e)
+            was_ready = self.state == READY
+            self._close_sock()
+            self.state = DOWN
+            self.failures = max(1, self.failures)
+            if was_ready:
+                self.stats["disconnects"] += 1
+                self.stats["last_down"] = time.time()
+                self._push_event({"event": True, "class": "retrophone",
+                                  "type": "CTRL_DISCONNECTED"})
+        self.state = DOWN
+
+    def _session(self):
+        self.state = PROBING
+        self._held_events = []
+        probe = f"probe{self.stats['connects'] + self.stats['probe_failures']}"
+        self._send_obj({"command": BS_PROBE_COMMAND, "token": probe})
+        deadline = time.time() + BS_PROBE_TIMEOUT
+        while True:
+            left = deadline - time.time()
+            if left <= 0:
+                self.stats["probe_failures"] += 1
+                self.failures += 1
+                raise RuntimeError("Readiness-Probe ohne Antwort")
+            if self._pump(left, probe_token=probe):
+                break
+
+        self.state = READY
+        self.failures = 0
+        self.stats["connects"] += 1
+        self.stats["last_ready"] = time.time()
+        logger.info("Mit baresip ctrl_tcp (JSON+Netstring) verbunden (%s:%d), bereit",
+                    self.host, self.port)
+        # CTRL_CONNECTED vor den Events, die schon waehrend der Probe kamen
+        self._push_event({"event": True, "class": "retrophone", "type": "CTRL_CONNECTED"})
+        for ev in self._held_events:
+            self._push_event(ev)
+        self._held_events = []
+        self._flush_outq(replay=True)
+
+        while not self._stop.is_set():
+            self._pump(BS_IDLE_TICK)
+            self._flush_outq(replay=False)
+
+    def _pump(self, timeout, probe_token=None):
+        """Wartet auf Daten oder Weckruf. True, wenn die Probe beantwortet wurde."""
+        self._beat()
+        r, _, _ = select.select([self.sock, self._wake_r], [], [], timeout)
+        if self._wake_r in r:
+            self._drain_wake()
+        if self.sock not in r:
+            return False
+        data = self.sock.recv(4096)
+        if not data:
+            raise ConnectionError("baresip hat die ctrl_tcp Verbindung geschlossen")
+        self.rxbuf += data
+        probed = False
+        for msg in self._parse_netstrings():
+            if msg.get("event"):
+                if probe_token:
+                    self._held_events.append(msg)
+                else:
+                    self._push_event(msg)
+            elif msg.get("response"):
+                if probe_token and msg.get("token") == probe_token:
+                    probed = True
+                else:
+                    self._dispatch_response(msg)
+        return probed
+
+    def _dispatch_response(self, msg):
+        token = msg.get("token") or ""
+        data = msg.get("data") or ""
+        with self.lock:
+            entry = self.pending.get(token)
+            if entry:
+                entry[2] = (bool(msg.get("ok")), data)
+                if entry[1] is None:
+                    del self.pending[token]
+        command = entry[0] if entry else "?"
+        logger.info("baresip resp (%s, ok=%s): %s", command, msg.get("ok"),
+                    data.strip().replace("\n", " | "))
+        if entry and entry[1] is not None:
+            entry[1].set()
+
+    def _flush_outq(self, replay):
+        now = time.time()
+        while True:
+            with self.lock:
+                if not self.outq:
+                    return
+                ts, command, params, token = self.outq[0]
+                ttl = REPLAY_TTL.get(command, REPLAY_TTL_DEFAULT)
+                if replay and now - ts > ttl:
+                    self.outq.popleft()
+                    self.pending.pop(token, None)
+                    self.stats["dropped"] += 1
+                    logger.warning("Gepuffertes Kommando zu alt (%.1fs), verworfen: %s %s",
+                                   now - ts, command, params)
+                    continue
+            obj = {"command": command, "token": token}
+            if params:
+                obj["params"] = params
+            # Fehler hier beendet die Session; das Kommando bleibt vorne in der Queue
+            self._send_obj(obj)
+            with self.lock:
+                if self.outq and self.outq[0][3] == token:
+                    self.outq.popleft()
+                if replay:
+                    self.stats["replayed"] += 1
+            if replay:
+                logger.info("Gepuffertes Kommando nachgeschickt: %s %s", command, params)
+
+    def _send_obj(self, obj):
+        """
+        Sende einen Netstring:
+          <len>:<payload>,
+        wobei payload ein JSON-String ist.
+        """
+        import json
+        data = json.dumps(obj, separators=(",", ":")).encode("utf-8")
+        self.sock.sendall(f"{len(data)}:".encode("ascii") + data + b",")
+
+    def _parse_netstrings(self):
+        """Zerlegt den Empfangspuffer in fertige JSON-Objekte."""
+        out = []
+        buf = self.rxbuf
+        while True:
+            colon = buf.find(b":")
+            if colon < 0:
+                if len(buf) > 10:
+                    # kein gueltiger Laengen-Header -> Puffer verwerfen
+                    buf.clear()
+                break
+            head = bytes(buf[:colon])
+            if not head.isdigit():
+                logger.warning("baresip: ungueltiger Netstring-Header, Puffer verworfen")
+                buf.clear()
+                break
+            n = int(head)
+            if len(buf) < colon + 1 + n + 1:
+                break
+            payload = bytes(buf[colon + 1:colon + 1 + n])
+            del buf[:colon + 1 + n + 1]
+            try:
+                import json
+                out.append(json.loads(payload.decode("utf-8", "ignore")))
+            except ValueError:
+                logger.warning("baresip: kein JSON: %r", payload[:200])
+        return out
+
+    def _close_sock(self):
+        try:
+            if self.sock:
+                self.sock.close()
+        except Exception:
+            pass
+        self.sock = None
+        self.rxbuf.clear()
+        # Antworten auf bereits gesendete Kommandos kommen nicht mehr;
+        # wartende request()-Aufrufer nicht haengen lassen
+        with self.lock:
+            queued = {q[3] for q in self.outq}
+            for token, entry in list(self.pending.items()):
+                if token in queued:
+                    continue
+                if entry[1] is not None:
+                    entry[1].set()
+                else:
+                    del self.pending[token]
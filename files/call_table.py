@@ -0,0 +1,196 @@
+#!/usr/bin/env python3
+"""
+RetroPhone Call-Tabelle
+-----------------------
+Fuehrt pro baresip-Call (Schluessel = baresip Call-ID) einen Eintrag mit
+Zustand, Richtung, Gegenstelle und Zeitstempeln. Die Tabelle wird
+inkrementell aus den ctrl_tcp Events ("class":"call") aktualisiert.
+Nur nach einem Reconnect, wenn Events aus der Luecke fehlen koennen,
+gleicht reconcile() sie mit dem Text von listcalls ab.
+"""
+
+import re
+import time
+import logging
+
+logger = logging.getLogger("retrophone")
+
+# --- Call-Zustaende ---
+ST_INCOMING    = "incoming"     # klingelt bei uns, noch nicht angenommen
+ST_OUTGOING    = "outgoing"     # wir waehlen, Gegenstelle noch nicht erreicht
+ST_RINGING     = "ringing"      # Gegenstelle klingelt (ausgehend)
+ST_ESTABLISHED = "established"  # Gespraech steht
+ST_HELD        = "held"         # gehalten (Makeln / Anklopfen)
+ST_CLOSED      = "closed"
+
+# baresip Event-Typ -> neuer Zustand
+EVENT_STATES = {
+    "CALL_INCOMING":    ST_INCOMING,
+    "CALL_OUTGOING":    ST_OUTGOING,
+    "CALL_RINGING":     ST_RINGING,
+    "CALL_PROGRESS":    ST_RINGING,
+    "CALL_ANSWERED":    ST_ESTABLISHED,
+    "CALL_ESTABLISHED": ST_ESTABLISHED,
+    "CALL_HOLD":        ST_HELD,
+    "CALL_RESUME":      ST_ESTABLISHED,
+    "CALL_CLOSED":      ST_CLOSED,
+}
+
+# listcalls (baresip call_info): "[line 1, id 3f2a...]  0:01:23  ESTABLISHED  (on hold)  sip:..."
+LISTCALLS_RE = re.compile(r"\[line \d+, id ([^\]\s]+)\]\s+\S+\s+([A-Z]+)\s+(\(on hold\))?\s*(\S*)")
+# baresip Zustand -> Event, mit dem die Tabelle nachgezogen wird
+LISTCALLS_EVENTS = {
+    "INCOMING":    "CALL_INCOMING",
+    "OUTGOING":    "CALL_OUTGOING",
+    "RINGING":     "CALL_RINGING",
+    "EARLY":       "CALL_PROGRESS",
+    "ESTABLISHED": "CALL_ESTABLISHED",
+}
+
+
+class Call:
+    __slots__ = ("id", "state", "direction", "peer_uri", "peer_name",
+                 "t_created", "t_accept", "t_answered", "t_audio", "t_closed", "reason",
+                 "screen", "media", "voicemail", "recorder")
+
+    def __init__(self, call_id, direction, peer_uri="", peer_name="", now=None):
+        self.id         = call_id
+        self.state      = ST_INCOMING if direction == "incoming" else ST_OUTGOING
+        self.direction  = direction
+        self.peer_uri   = peer_uri
+        self.peer_name  = peer_name
+        self.t_created  = now if now is not None else time.time()
+        self.t_accept   = 0.0     # wir haben "accept" geschickt (Hoerer abgehoben)
+        self.t_answered = 0.0
+        self.t_audio    = 0.0     # erstes Audio-Paket (CALL_RTPESTAB)
+        self.t_closed   = 0.0
+        self.reason     = ""
+        self.screen     = ""      # Ergebnis des Anruffilters (caller_filter.py)
+        self.media      = None    # MediaStats aus CALL_RTCP (media_stats.py)
+        self.voicemail  = ""      # Anrufbeantworter: answering / recording / ending / taken
+        self.recorder   = None    # voicemail.Recorder, solange aufgenommen wird
+
+    def duration(self, now=None):
+        if not self.t_answered:
+            return 0.0
+        end = self.t_closed or (now if now is not None else time.time())
+        return max(0.0, end - self.t_answered)
+
+    def __repr__(self):
+        return f"<Call {self.id} {self.direction} {self.state} {self.peer_uri}>"
+
+
+class CallTable:
+    def __init__(self):
+        self.calls = {}
+        self.current_id = ""
+
+    def reset(self):
+        if self.calls:
+            logger.warning("Call-Tabelle verworfen (%d Calls)", len(self.calls))
+        self.calls.clear()
+        self.current_id = ""
+
+    def apply(self, ev: dict, now=None):
+        """
+        Wendet ein baresip Event an. Liefert (call, alter_zustand) oder
+        (None, None), wenn das Event keinen Call betrifft.
+        Geschlossene Calls werden aus der Tabelle entfernt und ein letztes
+        Mal zurueckgegeben.
+        """
+        if ev.get("class") != "call":
+            return None, None
+        new_state = EVENT_STATES.get(ev.get("type", ""))
+        call_id = ev.get("id") or ""
+        if not new_state or not call_id:
+            return None, None
+        if now is None:
+            now = time.time()
+
+        call = self.calls.get(call_id)
+        old_state = call.state if call else None
+        if call is None:
+            if new_state == ST_CLOSED:
+                return None, None
+            direction = ev.get("direction") or (
+                "incoming" if new_state == ST_INCOMING else "outgoing"
+            )
+            call = Call(call_id, direction, ev.get("peeruri") or "",
+                        ev.get("peerdisplayname") or "", now)
+            self.calls[call_id] = call
+        elif ev.get("peeruri") and not call.peer_uri:
+            call.peer_uri = ev["peeruri"]
+
+        call.state = new_state
+        if new_state == ST_ESTABLISHED and not call.t_answered:
+            call.t_answered = now
+        if new_state in (ST_ESTABLISHED, ST_OUTGOING, ST_RINGING):
+            self.current_id = call_id
+        if new_state == ST_CLOSED:
+            call.t_closed = now
+            call.reason = ev.get("param") or ""
+            del self.calls[call_id]
+            if self.current_id == call_id:
+                self.current_id = ""
+
+        logger.info("Call %s: %s -> %s (%s %s)", call_id, old_state, new_state,
+                    call.direction, call.peer_uri)
+        return call, old_state
+
+    def reconcile(self, listing: str, known, closed):
+        """
+        Synthetische Events, die die Tabelle an listcalls angleichen.
+        known: Call-IDs beim Reconnect (nur die koennen veraltet sein),
+        closed: seitdem per Event geschlossene IDs (nicht wiederbeleben).
+        Calls, die seit dem Reconnect per Event kamen, bleiben unberuehrt.
+        """
+        live = {}
+        for m in LISTCALLS_RE.finditer(listing or ""):
+            call_id, state, hold, peer = m.groups()
+            ev_type = LISTCALLS_EVENTS.get(state)
+            if ev_type == "CALL_ESTABLISHED" and hold:
+                ev_type = "CALL_HOLD"
+            if ev_type:
+                live[call_id] = (ev_type, peer)
+        events = []
+        for call_id in known:
+            call = self.calls.get(call_id)
+            if call is None:
+                continue
+            if call_id not in live:
+                events.append({"class": "call", "type": "CALL_CLOSED", "id": call_id,
+                               "param": "nach Reconnect nicht mehr in baresip"})
+            elif EVENT_STATES[live[call_id][0]] != call.state:
+                events.append({"class": "call", "type": live[call_id][0], "id": call_id})
+        for call_id, (ev_type, peer) in live.items():
+            if call_id in self.calls or call_id in closed:
+                continue
+            events.append({"class": "call", "type": ev_type, "id": call_id, "peeruri": peer,
+                           "direction": "incoming" if ev_type == "CALL_INCOMING" else "outgoing"})
+        return events
+
+    # --- Abfragen ---
+    def in_state(self, *states):
+        return [c for c in self.calls.values() if c.state in states]
+
+    def incoming(self):
+        """Eingehende Calls, die noch nicht angenommen sind (aelteste zuerst)."""
+        return sorted(self.in_state(ST_INCOMING), key=lambda c: c.t_created)
+
+    def established(self):
+        return self.in_state(ST_ESTABLISHED)
+
+    def held(self):
+        return self.in_state(ST_HELD)
+
+    def current(self):
+        return self.calls.get(self.current_id)
+
+    def waiting(self):
+        """Anklopfende Calls: eingehend, waehrend bereits ein Gespraech steht."""
+        if not self.in_state(ST_ESTABLISHED, ST_HELD):
+            return []
+        return self.incoming()
+
+    def __len__(self):
+        return len(self.calls)
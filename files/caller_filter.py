@@ -0,0 +1,261 @@
+#!/usr/bin/env python3
+"""
+RetroPhone Anruffilter
+----------------------
+Entscheidet anhand der Nummer des Anrufers, ob die Glocke laeuten darf.
+Die Listen stehen in einer Textdatei (Bearbeitung ueber die Weboberflaeche):
+
+  [allow]            klingelt immer, auch bei "Nicht stoeren"
+  +41791234567
+  [block]            wird abgewiesen, bevor die Glocke anschlaegt
+  0900*              '*' am Ende = Praefix
+  anonymous          Anrufe ohne Nummer
+  [dnd]              "Nicht stoeren": Glocke bleibt still, Abheben geht
+  22:00-07:00
+  Sa,So 00:00-09:00
+  [settings]
+  country = 41       0791234567 und +41791234567 sind dieselbe Nummer
+
+Die Eintraege werden beim Laden in ein Dict (exakte Nummern) und einen
+Praefix-Trie uebersetzt; eine Pruefung kostet O(Laenge der Nummer).
+Bei Treffern in beiden Listen gewinnt der spezifischere Eintrag, bei
+Gleichstand allow. Der Daemon laedt die Datei neu, sobald sich ihre
+mtime aendert (geprueft bei jedem eingehenden Anruf).
+"""
+
+import os
+import re
+import time
+import logging
+
+from cdr_store import number_from_uri
+
+logger = logging.getLogger("retrophone")
+
+FILTER_PATH = "/etc/retrophone/caller_filter.conf"
+
+# Ergebnisse von check()
+RING  = ""        # normal klingeln
+BLOCK = "block"   # abweisen
+DND   = "dnd"     # nicht klingeln, aber annehmbar
+
+ANONYMOUS = "anonymous"
+ANONYMOUS_USERS = {"", "anonymous", "unknown", "restricted", "private"}
+
+WEEKDAYS = ("mo", "di", "mi", "do", "fr", "sa", "so")
+DND_RE = re.compile(
+    r'^(?:(?P<days>[a-z]{2}(?:\s*[-,]\s*[a-z]{2})*)\s+)?'
+    r'(?P<h1>\d{1,2}):(?P<m1>\d{2})\s*-\s*(?P<h2>\d{1,2}):(?P<m2>\d{2})$'
+)
+
+DEFAULT_TEXT = """# RetroPhone Anruffilter
+# Nummern exakt oder als Praefix mit '*', 'anonymous' = ohne Nummer
+[allow]
+
+[block]
+
+[dnd]
+# z. B. 22:00-07:00 oder Sa,So 00:00-09:00
+
+[settings]
+country = 41
+"""
+
+_TRIE_END = ""   # Schluessel fuer "hier endet ein Praefix" im Trie-Knoten
+
+
+def normalize(number: str, country: str = "") -> str:
+    """Nummer vergleichbar machen: Trennzeichen weg, 00 -> +, 0 -> +<country>."""
+    n = re.sub(r'[\s\-/().]', "", number or "")
+    if n.startswith("00"):
+        n = "+" + n[2:]
+    elif country and n.startswith("0"):
+        n = "+" + country + n[1:]
+    return n
+
+
+def _parse_days(spec: str):
+    days = set()
+    for part in re.split(r'\s*,\s*', spec):
+        if "-" in part:
+            a, b = [x.strip() for x in part.split("-", 1)]
+            i, j = WEEKDAYS.index(a), WEEKDAYS.index(b)
+            k = i
+            while True:
+                days.add(k)
+                if k == j:
+                    break
+                k = (k + 1) % 7
+        else:
+            days.add(WEEKDAYS.index(part))
+    return days
+
+
+class Rules:
+    """Uebersetzte Listen; parse() liefert (Rules, Fehlerliste)."""
+
+    def __init__(self):
+        self.country = ""
+        self.exact = {}          # nummer -> (art, eintrag)
+        self.trie = {}           # zeichen -> knoten, _TRIE_END -> (art, eintrag)
+        self.anonymous = None    # (art, eintrag) fuer Anrufe ohne Nummer
+        self.dnd = []            # [(tage | None, start_min, ende_min, text)]
+        self.counts = {"allow": 0, "block": 0, "dnd": 0}
+
+    @classmethod
+    def parse(cls, text: str):
+        r = cls()
+        errors = []
+        entries = []
+        section = None
+        for lineno, line in enumerate(text.splitlines(), 1):
+            line = line.split("#", 1)[0].strip()
+            if not line:
+                continue
+            if line.startswith("[") and line.endswith("]"):
+                section = line[1:-1].strip().lower()
+                if section not in ("allow", "block", "dnd", "settings"):
+                    errors.append(f"Zeile {lineno}: unbekannter Abschnitt [{section}]")
+                continue
+            if section == "settings":
+                key, _, val = line.partition("=")
+                if key.strip().lower() == "country" and val.strip().isdigit():
+                    r.country = val.strip()
+                else:
+                    errors.append(f"Zeile {lineno}: unbekannte Einstellung: {line}")
+            elif section == "dnd":
+                m = DND_RE.match(line.lower())
+                try:
+                    if not m:
+                        raise ValueError
+                    days = _parse_days(m["days"]) if m["days"] else None
+                    start = int(m["h1"]) * 60 + int(m["m1"])
+                    end = int(m["h2"]) * 60 + int(m["m2"])
+                    if start > 24 * 60 or end > 24 * 60:
+                        raise ValueError
+                except ValueError:
+                    errors.append(f"Zeile {lineno}: ungueltiges Zeitfenster: {line}")
+                    continue
+                r.dnd.append((days, start, end, line))
+                r.counts["dnd"] += 1
+            elif section in ("allow", "block"):
+                if not re.fullmatch(r'[+\d\s\-/().]+\*?|\*|' + ANONYMOUS, line, re.I):
+                    errors.append(f"Zeile {lineno}: ungueltige Nummer: {line}")
+                    continue
+                entries.append((section, line))
+                r.counts[section] += 1
+            else:
+                errors.append(f"Zeile {lineno}: Eintrag ausserhalb eines Abschnitts: {line}")
+
+        # erst nach [settings] uebersetzen, damit country fuer alle gilt
+        for kind, line in entries:
+            if line.lower() == ANONYMOUS:
+                r._put_anonymous(kind, line)
+            elif line.endswith("*"):
+                r._put_prefix(normalize(line[:-1], r.country), kind, line)
+            else:
+                r._put_exact(normalize(line, r.country), kind, line)
+        return r, errors
+
+    def _put_anonymous(self, kind, line):
+        if self.anonymous is None or kind == "allow":
+            self.anonymous = (kind, line)
+
+    def _put_exact(self, number, kind, line):
+        if number not in self.exact or kind == "allow":
+            self.exact[number] = (kind, line)
+
+    def _put_prefix(self, prefix, kind, line):
+        node = self.trie
+        for ch in prefix:
+            node = node.setdefault(ch, {})
+        if _TRIE_END not in node or kind == "allow":
+            node[_TRIE_END] = (kind, line)
+
+    def match(self, number: str):
+        """(art, eintrag) des spezifischsten Eintrags oder None."""
+        if number.lower() in ANONYMOUS_USERS:
+            return self.anonymous
+        n = normalize(number, self.country)
+        hit = self.exact.get(n)
+        if hit:
+            return hit
+        best = None
+        node = self.trie
+        if _TRIE_END in node:
+            best = node[_TRIE_END]
+        for ch in n:
+            node = node.get(ch)
+            if node is None:
+                break
+            if _TRIE_END in node:
+                best = node[_TRIE_END]
+        return best
+
+    def in_dnd(self, now: float):
+        """Text des aktiven DND-Fensters oder None (lokale Zeit)."""
+        if not self.dnd:
+            return None
+        lt = time.localtime(now)
+        day, minute = lt.tm_wday, lt.tm_hour * 60 + lt.tm_min
+        prev = (day - 1) % 7
+        for days, start, end, text in self.dnd:
+            if start <= end:
+                if (days is None or day in days) and start <= minute < end:
+                    return text
+            else:
+                # ueber Mitternacht: Tage beziehen sich auf den Beginn
+                if (days is None or day in days) and minute >= start:
+                    return text
+                if (days is None or prev in days) and minute < end:
+                    return text
+        return None
+
+
+class CallerFilter:
+    def __init__(self, path=FILTER_PATH):
+        self.path = path
+        self.rules = Rules()
+        self.mtime = None
+
+    def maybe_reload(self):
+        """Laedt die Datei neu, wenn sich die mtime geaendert hat (ein stat())."""
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+        except OSError:
+            mtime = 0
+        if mtime == self.mtime:
+            return
+        self.mtime = mtime
+        if not mtime:
+            self.rules = Rules()
+            return
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                rules, errors = Rules.parse(f.read())
+        except OSError as e:
+            logger.error("Anruffilter %s nicht lesbar: %s", self.path, e)
+            return
+        for err in errors:
+            logger.warning("Anruffilter: %s", err)
+        self.rules = rules
+        logger.info("Anruffilter geladen: %d allow, %d block, %d DND-Fenster",
+                    rules.counts["allow"], rules.counts["block"], rules.counts["dnd"])
+
+    def check(self, peer_uri: str, now=None):
+        """Liefert (RING|BLOCK|DND, grund) fuer einen eingehenden Anruf."""
+        self.maybe_reload()
+        return decide(self.rules, number_from_uri(peer_uri),
+                      now if now is not None else time.time())
+
+
+def decide(rules: Rules, number: str, now: float):
+    hit = rules.match(number)
+    if hit and hit[0] == "allow":
+        return RING, f"allow {hit[1]}"
+    if hit and hit[0] == "block":
+        return BLOCK, f"block {hit[1]}"
+    window = rules.in_dnd(now)
+    if window:
+        return DND, f"dnd {window}"
+    return RING, ""
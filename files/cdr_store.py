@@ -0,0 +1,224 @@
+#!/usr/bin/env python3
+"""
+RetroPhone Anrufliste (CDR)
+---------------------------
+Speichert pro Call einen Datensatz (Start, Annahme, Ende, Richtung,
+Nummer, Dauer, Grund, Audioqualitaet) in einer SQLite-Datenbank im
+WAL-Modus.
+
+- phone_daemon.py schreibt ueber CdrWriter: record() legt den Datensatz
+  nur in eine Queue, ein eigener Thread schreibt gesammelt in einer
+  Transaktion. Die Hauptschleife wartet nie auf die SD-Karte.
+- webapp.py liest ueber iter_calls() mit einem Cursor, Zeile fuer Zeile.
+
+In derselben Datenbank liegt die Tabelle voicemail (Nachrichten des
+Anrufbeantworters, siehe voicemail.py); der CdrWriter schreibt auch sie.
+"""
+
+import os
+import re
+import queue
+import logging
+import threading
+
+logger = logging.getLogger("retrophone")
+
+CDR_DB = "/var/lib/retrophone/calls.db"
+
+BATCH_MAX = 50      # Datensaetze pro Transaktion
+BATCH_WAIT = 2.0    # Sekunden, die der Writer auf weitere Datensaetze wartet
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS cdr (
+    id        INTEGER PRIMARY KEY,
+    call_id   TEXT NOT NULL,
+    direction TEXT NOT NULL,
+    number    TEXT NOT NULL DEFAULT '',
+    peer_uri  TEXT NOT NULL DEFAULT '',
+    peer_name TEXT NOT NULL DEFAULT '',
+    t_start   REAL NOT NULL,
+    t_answer  REAL NOT NULL DEFAULT 0,
+    t_end     REAL NOT NULL DEFAULT 0,
+    duration  REAL NOT NULL DEFAULT 0,
+    reason    TEXT NOT NULL DEFAULT '',
+    media     TEXT NOT NULL DEFAULT ''
+);
+CREATE INDEX IF NOT EXISTS cdr_t_start ON cdr (t_start, id);
+CREATE INDEX IF NOT EXISTS cdr_number  ON cdr (number, t_start);
+CREATE TABLE IF NOT EXISTS voicemail (
+    id        INTEGER PRIMARY KEY,
+    call_id   TEXT NOT NULL,
+    number    TEXT NOT NULL DEFAULT '',
+    peer_uri  TEXT NOT NULL DEFAULT '',
+    t_start   REAL NOT NULL,
+    duration  REAL NOT NULL DEFAULT 0,
+    path      TEXT NOT NULL,
+    format    TEXT NOT NULL,
+    size      INTEGER NOT NULL DEFAULT 0,
+    heard     INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS voicemail_t_start ON voicemail (t_start, id);
+"""
+
+INSERT_CDR = ("INSERT INTO cdr (call_id, direction, number, peer_uri, peer_name,"
+              " t_start, t_answer, t_end, duration, reason, media)"
+              " VALUES (?,?,?,?,?,?,?,?,?,?,?)")
+UPDATE_HEARD = "UPDATE voicemail SET heard = 1 WHERE id = ?"
+INSERT_VOICEMAIL = ("INSERT INTO voicemail (call_id, number, peer_uri, t_start, duration,"
+                    " path, format, size) VALUES (?,?,?,?,?,?,?,?)")
+
+COLUMNS = ("id", "call_id", "direction", "number", "peer_uri", "peer_name",
+           "t_start", "t_answer", "t_end", "duration", "reason", "media")
+
+# Spalten, die nach der ersten Version dazukamen: (name, Definition)
+MIGRATIONS = (
+    ("media", "TEXT NOT NULL DEFAULT ''"),    # Audioqualitaet, JSON aus media_stats.py
+)
+
+URI_USER_RE = re.compile(r'^(?:sips?:|tel:)?([^@;>]+)')
+
+
+def number_from_uri(uri: str) -> str:
+    """sip:0791234567@sip.provider.tld -> 0791234567"""
+    if not uri:
+        return ""
+    m = URI_USER_RE.match(uri.strip().lstrip("<"))
+    return m.group(1) if m else uri
+
+
+def connect(path=CDR_DB, readonly=False):
+    # sqlite3 erst hier laden: im Daemon liegt das hinter "Hook live"
+    import sqlite3
+    if readonly:
+        con = sqlite3.connect(f"file:{path}?mode=ro", uri=True, timeout=2.0)
+    else:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        con = sqlite3.connect(path, timeout=5.0)
+        con.execute("PRAGMA journal_mode=WAL")
+        con.execute("PRAGMA synchronous=NORMAL")
+        con.executescript(SCHEMA)
+        have = {row[1] for row in con.execute("PRAGMA table_info(cdr)")}
+        for name, decl in MIGRATIONS:
+            if name not in have:
+                con.execute(f"ALTER TABLE cdr ADD COLUMN {name} {decl}")
+                logger.info("CDR: Spalte %s ergaenzt", name)
+    return con
+
+
+# ---------- Schreiben (phone_daemon) ----------
+class CdrWriter:
+    def __init__(self, path=CDR_DB):
+        self.path = path
+        self.q = queue.Queue()
+        self.thread = threading.Thread(target=self._run, name="cdr-writer", daemon=True)
+        self.thread.start()
+
+    def record(self, call):
+        """Nimmt einen beendeten Call aus call_table entgegen (blockiert nicht)."""
+        self.q.put((INSERT_CDR, (
+            call.id, call.direction, number_from_uri(call.peer_uri), call.peer_uri,
+            call.peer_name, call.t_created, call.t_answered, call.t_closed,
+            call.duration(call.t_closed), call.reason,
+            call.media.encode() if call.media else "",
+        )))
+
+    def record_message(self, msg):
+        """Fertige Nachricht vom Anrufbeantworter (thread-sicher)."""
+        self.q.put((INSERT_VOICEMAIL, (
+            msg["call_id"], number_from_uri(msg["peer_uri"]), msg["peer_uri"],
+            msg["t_start"], msg["duration"], msg["path"], msg["format"], msg["size"],
+        )))
+
+    def mark_heard(self, msg_id):
+        """Nachricht wurde am Telefon abgehoert."""
+        self.q.put((UPDATE_HEARD, (int(msg_id),)))
+
+    def close(self, timeout=3.0):
+        self.q.put(None)
+        self.thread.join(timeout)
+
+    def _run(self):
+        try:
+            con = connect(self.path)
+        except Exception as e:
+            logger.error("CDR Datenbank nicht verfuegbar (%s): %s", self.path, e)
+            return
+        done = False
+        while not done:
+            item = self.q.get()
+            if item is None:
+                break
+            batch = [item]
+            # weitere Datensaetze einsammeln, ohne lange zu warten
+            while len(batch) < BATCH_MAX:
+                try:
+                    item = self.q.get(timeout=BATCH_WAIT)
+                except queue.Empty:
+                    break
+                if item is None:
+                    done = True
+                    break
+                batch.append(item)
+            try:
+                with con:
+                    for sql, row in batch:
+                        con.execute(sql, row)
+                logger.info("CDR: %d Datensaetze geschrieben", len(batch))
+            except Exception as e:
+                logger.error("CDR schreiben fehlgeschlagen (%d verloren): %s", len(batch), e)
+        con.close()
+
+
+# ---------- Lesen (webapp) ----------
+def _where(filters):
+    """
+    Baut WHERE-Klausel aus den Filtern der Weboberflaeche:
+      direction  'incoming' / 'outgoing'
+      missed     True -> nur nicht angenommene eingehende Calls
+      number     Praefix der Nummer (nutzt Index cdr_number)
+      since/until  Unix-Zeit (nutzt Index cdr_t_start)
+    """
+    sql, args = [], []
+    if filters.get("direction") in ("incoming", "outgoing"):
+        sql.append("direction = ?")
+        args.append(filters["direction"])
+    if filters.get("missed"):
+        sql.append("direction = 'incoming' AND t_answer = 0")
+    num = re.sub(r'[\*\?\[\]]', "", filters.get("number") or "")
+    if num:
+        sql.append("number GLOB ?")
+        args.append(num + "*")
+    if filters.get("since"):
+        sql.append("t_start >= ?")
+        args.append(float(filters["since"]))
+    if filters.get("until"):
+        sql.append("t_start < ?")
+        args.append(float(filters["until"]))
+    return sql, args
+
+
+def iter_calls(con, filters=None, limit=None, before=None):
+    """
+    Liefert Datensaetze (dict) neueste zuerst. Blaettern per Keyset:
+    before=(t_start, id) des letzten Eintrags der vorherigen Seite.
+    """
+    sql, args = _where(filters or {})
+    if before:
+        sql.append("(t_start < ? OR (t_start = ? AND id < ?))")
+        args += [before[0], before[0], before[1]]
+    q = "SELECT " + ",".join(COLUMNS) + " FROM cdr"
+    if sql:
+        q += " WHERE " + " AND ".join(sql)
+    q += " ORDER BY t_start DESC, id DESC"
+    if limit:
+        q += " LIMIT ?"
+        args.append(int(limit))
+    for row in con.execute(q, args):
+        yield dict(zip(COLUMNS, row))
+
+
+def iter_media(con, limit=200):
+    """Spalte media der letzten Calls mit Audio-Statistik, neueste zuerst."""
+    q = "SELECT media FROM cdr WHERE media != '' ORDER BY t_start DESC, id DESC LIMIT ?"
+    for (media,) in con.execute(q, (int(limit),)):
+        yield media
@@ -0,0 +1,332 @@
+#!/usr/bin/env python3
+"""
+RetroPhone Daemon-IPC
+---------------------
+baresip ctrl_tcp nimmt nur eine Verbindung an; die haelt der Daemon.
+Andere Prozesse (Weboberflaeche) reden darum ueber einen Unix-Socket
+mit dem Daemon. Jede Verbindung bekommt einen eigenen kurzlebigen
+Thread, damit eine lange Anfrage (Warten auf REGISTER) die schnellen
+Abfragen des Dashboards nicht aufhaelt:
+
+  /run/retrophone/daemon.sock   (nur fuer den RetroPhone-User, 0600)
+
+Protokoll: pro Verbindung eine Anfrage und eine Antwort, je ein
+JSON-Objekt in einer Zeile.
+
+  -> {"cmd": "baresip", "commands": [["uanew", "<sip:...>"], ...],
+      "await_register": ["sip:...", ...], "timeout": 8.0}
+  <- {"ok": true, "results": [{"command": "uanew", "ok": true, "data": "..."}, ...],
+      "registrations": {"sip:...": {"type": "REGISTER_OK", "param": "...", "time": t} | null}}
+
+Die Kommandos laufen der Reihe nach; beim ersten Fehler kommt
+{"ok": false, "error": "...", "results": [...bis dahin...]} zurueck.
+Mit await_register wartet der Daemon danach bis zu timeout Sekunden auf
+REGISTER_OK/FAIL dieser Accounts (registrations, null = kein Ergebnis).
+Welche Kommandos erlaubt sind, entscheidet der Handler im Daemon
+(phone_daemon.ipc_handler), ebenso die Abfragen "registrations",
+"network" und "messages".
+
+Ausnahme {"cmd": "watch"}: die Verbindung bleibt offen, der Daemon
+schickt sofort den aktuellen Zustand und danach bei jeder Aenderung eine
+weitere Zeile (publish). Die Weboberflaeche haelt genau ein solches Abo
+(StateFeed) und verteilt es an alle offenen Browser-Tabs.
+"""
+
+import os
+import json
+import time
+import socket
+import logging
+import threading
+
+logger = logging.getLogger("retrophone")
+
+SOCK_PATH       = "/run/retrophone/daemon.sock"
+REQUEST_MAX     = 64 * 1024    # Bytes pro Anfrage
+CLIENT_TIMEOUT  = 5.0
+ACCEPT_TICK     = 2.0          # Lebenszeichen des Threads auch ohne Anfragen
+WATCH_MAX       = 4            # gleichzeitige Abos (Weboberflaeche braucht eins)
+CONN_MAX        = 8            # gleichzeitig bearbeitete Anfragen (je ein Thread)
+FEED_IDLE_SEC   = 15.0         # StateFeed prueft so oft, ob noch jemand liest
+FEED_RETRY_MAX  = 10.0         # laengste Pause zwischen Verbindungsversuchen
+
+
+class IpcServer:
+    """
+    Beantwortet Anfragen mit handler(dict) -> dict, jede Verbindung in
+    einem eigenen Thread. handler muss darum thread-sicher sein.
+    """
+
+    def __init__(self, handler, path=SOCK_PATH):
+        self.handler = handler
+        self.path = path
+        self.sock = None
+        self.thread = None
+        self.heartbeat = None
+        self.requests = 0
+        self.errors = 0
+        self.lock = threading.Lock()
+        self.slots = threading.BoundedSemaphore(CONN_MAX)
+        self.busy = 0              # abgewiesen, weil CONN_MAX Anfragen liefen
+        self.watchers = []         # offene Abos (Sockets, nicht blockierend)
+        self.state = None          # zuletzt veroeffentlichter Zustand
+        self.dropped = 0
+
+    def start(self):
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            try:
+                os.unlink(self.path)
+            except FileNotFoundError:
+                pass
+            self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            old_umask = os.umask(0o177)
+            try:
+                self.sock.bind(self.path)
+            finally:
+                os.umask(old_umask)
+            self.sock.listen(4)
+            self.sock.settimeout(ACCEPT_TICK)
+        except OSError as e:
+            logger.error("IPC-Socket %s nicht verfuegbar: %s", self.path, e)
+            self.sock = None
+            return False
+        self.thread = threading.Thread(target=self._run, name="daemon-ipc", daemon=True)
+        self.thread.start()
+        logger.info("IPC-Socket bereit: %s", self.path)
+        return True
+
+    def close(self):
+        with self.lock:
+            for conn in self.watchers:
+                conn.close()
+            self.watchers = []
+        if self.sock:
+            try:
+                self.sock.close()
+            except OSError:
+                pass
+            self.sock = None
+        try:
+            os.unlink(self.path)
+        except OSError:
+            pass
+
+    def _run(self):
+        while self.sock:
+            if self.heartbeat:
+                self.heartbeat()
+            try:
+                conn, _ = self.sock.accept()
+            except socket.timeout:
+                continue
+            except OSError:
+                break
+            if not self.slots.acquire(blocking=False):
+                self.busy += 1
+                logger.warning("IPC: %d Anfragen offen, Verbindung abgewiesen", CONN_MAX)
+                self._reply(conn, {"ok": False, "error": "Daemon beschaeftigt"})
+                conn.close()
+                continue
+            threading.Thread(target=self._conn, args=(conn,), name="daemon-ipc-conn",
+                             daemon=True).start()
+
+    def _conn(self, conn):
+        try:
+            if not self._serve(conn):
+                conn.close()
+        finally:
+            self.slots.release()
+
+    def _reply(self, conn, resp):
+        try:
+            conn.settimeout(CLIENT_TIMEOUT)
+            conn.sendall(_line(resp))
+        except OSError:
+            pass
+
+    def _serve(self, conn):
+        """Eine Anfrage beantworten. True, wenn conn als Abo offen bleibt."""
+        conn.settimeout(CLIENT_TIMEOUT)
+        try:
+            buf = b""
+            while b"\n" not in buf and len(buf) < REQUEST_MAX:
+                chunk = conn.recv(4096)
+                if not chunk:
+                    break
+                buf += chunk
+            req = json.loads(buf.split(b"\n", 1)[0] or b"{}")
+            if not isinstance(req, dict):
+                raise ValueError("Anfrage ist kein Objekt")
+        except (OSError, ValueError) as e:
+            self.errors += 1
+            logger.warning("IPC: ungueltige Anfrage: %s", e)
+            return False
+        self.requests += 1
+        if req.get("cmd") == "watch":
+            return self._watch(conn)
+        try:
+            resp = self.handler(req)
+        except Exception as e:
+            self.errors += 1
+            logger.error("IPC: Fehler bei %s: %s", req.get("cmd"), e)
+            resp = {"ok": False, "error": str(e)}
+        self._reply(conn, resp)
+        return False
+
+    # ---------- Zustand-Abo ----------
+    def _watch(self, conn):
+        with self.lock:
+            if len(self.watchers) >= WATCH_MAX:
+                self.errors += 1
+                logger.warning("IPC: zu viele Abos (%d)", len(self.watchers))
+                return False
+            try:
+                if self.state is not None:
+                    conn.sendall(_line(self.state))
+            except OSError:
+                return False
+            conn.setblocking(False)
+            self.watchers.append(conn)
+        logger.info("IPC: Abo fuer den Live-Zustand (%d offen)", len(self.watchers))
+        return True
+
+    def publish(self, state: dict):
+        """
+        Neuen Zustand an alle Abos (aus der Hauptschleife). Unveraendert ->
+        nichts zu tun. Blockiert nie: ein Abo, das nicht mitliest, wird
+        geschlossen und verbindet sich selbst neu.
+        """
+        if state == self.state:
+            return
+        with self.lock:
+            self.state = state
+            if not self.watchers:
+                return
+            line = _line(state)
+            alive = []
+            for conn in self.watchers:
+                try:
+                    conn.sendall(line)
+                    alive.append(conn)
+                except OSError:     # auch BlockingIOError: Puffer voll
+                    self.dropped += 1
+                    conn.close()
+            self.watchers = alive
+
+
+def _line(obj) -> bytes:
+    return json.dumps(obj).encode("utf-8") + b"\n"
+
+
+def request(req: dict, timeout=CLIENT_TIMEOUT, path=SOCK_PATH) -> dict:
+    """Anfrage an den Daemon. OSError, wenn der Daemon nicht erreichbar ist."""
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as s:
+        s.settimeout(timeout)
+        s.connect(path)
+        s.sendall(json.dumps(req).encode("utf-8") + b"\n")
+        buf = b""
+        while b"\n" not in buf:
+            chunk = s.recv(4096)
+            if not chunk:
+                break
+            buf += chunk
+    try:
+        return json.loads(buf.split(b"\n", 1)[0])
+    except ValueError:
+        raise OSError("ungueltige Antwort vom Daemon")
+
+
+def watch(path=SOCK_PATH, timeout=FEED_IDLE_SEC):
+    """
+    Abo beim Daemon: liefert je Zustand ein dict (den ersten sofort) und
+    None, wenn timeout Sekunden lang nichts kam. OSError, wenn die
+    Verbindung nicht zustande kommt oder abreisst.
+    """
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as s:
+        s.settimeout(CLIENT_TIMEOUT)
+        s.connect(path)
+        s.sendall(_line({"cmd": "watch"}))
+        s.settimeout(timeout)
+        buf = b""
+        while True:
+            while b"\n" in buf:
+                line, buf = buf.split(b"\n", 1)
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    raise OSError("ungueltige Zeile vom Daemon")
+            try:
+                chunk = s.recv(4096)
+            except socket.timeout:
+                yield None
+                continue
+            if not chunk:
+                raise OSError("Daemon hat das Abo beendet")
+            buf += chunk
+
+
+class StateFeed:
+    """
+    Ein Abo beim Daemon fuer beliebig viele Leser (Browser-Tabs, je ein
+    Thread im Webserver). Der Feed-Thread laeuft nur, solange es Leser
+    gibt; jeder neue Zustand erhoeht version und weckt alle Leser.
+    state ist None, solange der Daemon nicht erreichbar ist.
+    """
+
+    def __init__(self, path=SOCK_PATH):
+        self.path = path
+        self.cond = threading.Condition()
+        self.state = None
+        self.version = 0
+        self.readers = 0
+        self.connects = 0
+        self.thread = None
+
+    def join(self):
+        with self.cond:
+            self.readers += 1
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._run, name="state-feed", daemon=True)
+                self.thread.start()
+
+    def leave(self):
+        with self.cond:
+            self.readers -= 1
+
+    def wait(self, version, timeout):
+        """Wartet auf einen Zustand nach version. Liefert (version, state)."""
+        with self.cond:
+            self.cond.wait_for(lambda: self.version != version, timeout)
+            return self.version, self.state
+
+    def _set(self, state):
+        with self.cond:
+            self.state = state
+            self.version += 1
+            self.cond.notify_all()
+
+    def _wanted(self):
+        with self.cond:
+            if self.readers <= 0:
+                self.thread = None
+                return False
+            return True
+
+    def _run(self):
+        retry = 1.0
+        while self._wanted():
+            try:
+                self.connects += 1
+                for state in watch(self.path):
+                    if state is not None:
+                        self._set(state)
+                        retry = 1.0
+                    if not self._wanted():
+                        return
+            except OSError as e:
+                logger.warning("Live-Zustand: Daemon nicht erreichbar: %s", e)
+            if self.state is not None:
+                self._set(None)
+            time.sleep(retry)
+            retry = min(retry * 2, FEED_RETRY_MAX)
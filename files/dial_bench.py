@@ -0,0 +1,755 @@
+#!/usr/bin/env python3
+"""
+RetroPhone Waehlscheiben-Benchmark
+----------------------------------
+Spielt aufgezeichnete Flanken-Traces (.rtr, siehe edge_trace.py) durch
+Eingangsfilter und Impuls-Decoder des Daemons (input_filter.py,
+dial_decoder.py) und misst:
+
+  digit_accuracy     1 - Editierdistanz / erwartete Ziffern
+  traces_exact       Anteil Traces mit exakt richtiger Nummer
+  false_pulse_rate   zu viel gezaehlte Impulse / echte Impulse
+  missed_pulse_rate  verlorene Impulse / echte Impulse
+  latency_ms         Ende der Ziffer -> Ziffer erkannt (p50/p95/max)
+  cpu_us_per_edge    CPU-Zeit des Decoders pro Flanke
+  cpu_rel            dieselbe Zeit in Einheiten einer Kalibrierschleife
+                     (calibrate()), damit Rechner vergleichbar werden
+
+Verwendung:
+  dial_bench.py gen <verzeichnis> [seed]
+        synthetischen Korpus erzeugen (verschiedene Scheiben, Tempi,
+        Prellen, Stoerimpulse)
+  dial_bench.py run <verzeichnis> [--json <report.json>] [--baseline <report.json>]
+        Korpus auswerten; mit --baseline Vergleich und Exit-Code 1 bei
+        einer Verschlechterung von Genauigkeit, Impulsraten oder Latenz
+        (CPU wird nur berichtet)
+  dial_bench.py hook-gen <verzeichnis> [seed]
+        synthetischen Korpus fuer den Gabelkontakt erzeugen (Prellen,
+        Flashes an den Fenstergrenzen, Mehrfach-Flashes, Auflegen)
+  dial_bench.py hook <verzeichnis>
+        Hook-Traces durch Eingangsfilter und Gesten-Erkennung
+        (hook_gesture.py) spielen; Exit-Code 1 bei falscher Geste oder
+        wenn Auflegen nicht innerhalb von flash_max, ein Flash nicht
+        innerhalb von flash_gap erkannt wird
+  dial_bench.py record <datei.rtr> <ziffern> [beschreibung]
+        Impulsleitung am Pi aufzeichnen, bis STRG+C (phone-daemon vorher
+        stoppen)
+  dial_bench.py hook-record <datei.rtr> <gesten> [beschreibung]
+        Gabelkontakt aufzeichnen, Gesten wie bei hook-gen, z. B. "o1h";
+        ohne ends, die Latenz wird dann nicht geprueft
+  dial_bench.py stress <verzeichnis> [--traces n] [--load n] [--rt prio] [--core n]
+        Traces in Echtzeit abspielen, waehrend Lastprozesse eine
+        beschaeftigte Weboberflaeche nachahmen; Zeitstempel = wann der
+        Thread wirklich dran war. Zwei Durchgaenge: ohne und mit dem
+        Ressourcen-Profil (rt_sched.py). Fuer SCHED_FIFO mit sudo starten.
+
+Traces im selben Verzeichnis werden nach dem Praefix des Dateinamens
+(bis zum ersten "-") zu Profilen zusammengefasst.
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import bisect
+import signal
+
+import edge_trace
+import hook_gesture
+from dial_decoder import replay, MIN_PULSE, MAX_PULSE, DIGIT_GAP
+from input_filter import PinFilter, PULSE_FILTER, HOOK_FILTER
+
+PIN_PULSE = 23          # Impulsleitung (1 = Impuls aktiv)
+PIN_HOOK  = 18          # Gabelkontakt (0 = abgehoben)
+
+CPU_REPEAT = 20         # Korpus so oft abspielen fuer die CPU-Messung
+
+# Regression, wenn schlechter als Baseline um mehr als:
+REG_ACCURACY  = 0.001   # absolut
+REG_PULSES    = 0.001   # absolut (false/missed pulse rate)
+REG_LATENCY   = 0.10    # relativ, p95
+REG_LATENCY_MIN_MS = 5.0
+REG_CPU       = 0.50    # relativ, cpu_rel; nur Hinweis, kein Exit-Code 1:
+                        # auch normiert schwankt CPU-Zeit zwischen Rechnern
+
+CALIB_ROUNDS  = 20000   # Runden der Kalibrierschleife
+CALIB_REPEAT  = 5       # bester von so vielen Laeufen
+
+# Spielraum fuer Rundung (Trace in us, Filter in ns) bei den Latenzgrenzen
+HOOK_SLACK    = 0.001
+
+STRESS_TRACES = 4       # Traces je Durchgang (Echtzeit, ~15 s je Trace)
+STRESS_LOAD   = 4       # Lastprozesse
+STRESS_RT     = 50      # SCHED_FIFO, wenn retrophone.conf keine rt_priority setzt
+
+
+# ---------- Decoder ----------
+def decode(levels, pulse_filter=PULSE_FILTER):
+    """Die Dekodier-Kette des Daemons fuer einen Trace; [(t, event, wert), ...]."""
+    t0, level0 = levels[0]
+    f = PinFilter(level0, int(t0 * 1e9), *pulse_filter)
+    clean = [(t0, level0)]
+    for t, level in levels[1:]:
+        clean += [(ns / 1e9, lv) for lv, ns in f.feed(level, int(round(t * 1e9)))]
+    dl = f.next_deadline()
+    if dl is not None:
+        clean += [(ns / 1e9, lv) for lv, ns in f.poll(dl)]
+    return replay(clean)
+
+def decoder_info():
+    return {"min_pulse": MIN_PULSE, "max_pulse": MAX_PULSE, "digit_gap": DIGIT_GAP,
+            "filter": PULSE_FILTER[0], "settle": PULSE_FILTER[1]}
+
+
+# ---------- Synthetischer Korpus ----------
+# pps: Impulse pro Sekunde, brk: Anteil "Impuls aktiv" an der Periode,
+# bounce: zusaetzliche Prell-Wechsel pro Flanke, spikes: Stoerimpulse pro Sekunde
+PROFILES = {
+    "clean":  dict(pps=(9.5, 10.5), brk=(0.60, 0.64), bounce=(0, 0), spikes=0.0),
+    "fast":   dict(pps=(11.0, 12.5), brk=(0.58, 0.64), bounce=(0, 0), spikes=0.0),
+    "slow":   dict(pps=(8.0, 9.0), brk=(0.60, 0.64), bounce=(0, 0), spikes=0.0),
+    "worn":   dict(pps=(7.0, 7.8), brk=(0.62, 0.68), bounce=(0, 1), spikes=0.0),
+    "bounce": dict(pps=(9.0, 11.0), brk=(0.58, 0.66), bounce=(1, 4), spikes=0.0),
+    "noise":  dict(pps=(9.0, 11.0), brk=(0.58, 0.66), bounce=(0, 1), spikes=1.5),
+}
+TRACES_PER_PROFILE = 4
+DIGITS_PER_TRACE   = 10
+
+def synth(rng, prof):
+    """Erzeugt einen Trace mit zufaelliger Nummer fuer ein Profil."""
+    digits = "".join(rng.choice("0123456789") for _ in range(DIGITS_PER_TRACE))
+    pps = rng.uniform(*prof["pps"])
+    brk = rng.uniform(*prof["brk"])
+    ideal = []
+    ends = []
+    t = rng.uniform(0.3, 0.8)
+    for d in digits:
+        for _ in range(int(d) or 10):
+            period = 1.0 / pps * rng.uniform(0.97, 1.03)
+            high = period * brk + rng.uniform(-0.002, 0.002)
+            ideal.append((t, 1))
+            ideal.append((t + high, 0))
+            t += period
+        ends.append(ideal[-1][0])
+        # Finger zur naechsten Ziffer
+        t += rng.uniform(0.35, 1.2)
+    t_end = t + 0.5
+
+    edges = list(ideal)
+    # Prellen: nach jeder echten Flanke kurze Wechsel, Endpegel bleibt
+    lo, hi = prof["bounce"]
+    if hi:
+        for et, level in ideal:
+            n = rng.randint(lo, hi)
+            bt = et
+            for _ in range(n):
+                bt += rng.uniform(0.0001, 0.0008)
+                edges.append((bt, 1 - level))
+                bt += rng.uniform(0.0001, 0.0008)
+                edges.append((bt, level))
+    # Stoerimpulse: kurzer Gegenpegel, sowohl in Ruhe als auch im Impuls
+    if prof["spikes"]:
+        times = [e[0] for e in ideal]
+        for _ in range(int(prof["spikes"] * t_end)):
+            st = rng.uniform(0.0, t_end)
+            w = rng.uniform(0.0003, 0.003)
+            i = bisect.bisect_right(times, st)
+            # nicht direkt an eine echte Flanke legen
+            if (i and st - times[i - 1] < 0.005) or (i < len(times) and times[i] - st < w + 0.005):
+                continue
+            level = ideal[i - 1][1] if i else 0
+            edges.append((st, 1 - level))
+            edges.append((st + w, level))
+    edges.sort()
+    # doppelte Pegel entfernen, wie sie ein Flanken-Callback nie meldet
+    clean, level = [], 0
+    for et, lv in edges:
+        if lv != level:
+            clean.append((round(et, 6), lv))
+            level = lv
+    return digits, f"pps={pps:.2f} brk={brk:.2f}", ends, clean
+
+def cmd_gen(directory, seed=1):
+    rng = random.Random(seed)
+    os.makedirs(directory, exist_ok=True)
+    total = 0
+    for name, prof in PROFILES.items():
+        for i in range(TRACES_PER_PROFILE):
+            digits, label, ends, edges = synth(rng, prof)
+            tr = edge_trace.Trace(PIN_PULSE, 0, 0.0, digits, f"{name} {label}", ends, edges)
+            path = os.path.join(directory, f"{name}-{i + 1:02d}{edge_trace.SUFFIX}")
+            edge_trace.save(path, tr)
+            total += os.path.getsize(path)
+    print(f"{len(PROFILES) * TRACES_PER_PROFILE} Traces in {directory} ({total} Bytes, seed={seed})")
+    return 0
+
+
+# ---------- Auswertung ----------
+def edit_distance(a: str, b: str) -> int:
+    prev = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        cur = [i]
+        for j, cb in enumerate(b, 1):
+            cur.append(min(prev[j] + 1, cur[j - 1] + 1, prev[j - 1] + (ca != cb)))
+        prev = cur
+    return prev[-1]
+
+def evaluate(tr, levels=None):
+    """levels: Zeitstempel, wie sie der Daemon sah (stress); sonst die des Traces."""
+    levels = levels or tr.levels()
+    events = decode(levels)
+    got = "".join(str(v) for _, ev, v in events if ev == "digit")
+    counted = sum(1 for _, ev, _ in events if ev == "pulse")
+    true_pulses = sum(int(d) or 10 for d in tr.expected)
+
+    # Ende der Ziffer: aus dem Trace, sonst letzte fallende Flanke davor
+    ends = tr.ends or [t for t, lv in tr.edges if lv == 0]
+    latencies = []
+    for td, ev, _ in events:
+        if ev != "digit":
+            continue
+        i = bisect.bisect_right(ends, td)
+        if i:
+            latencies.append(td - ends[i - 1])
+
+    t0 = time.process_time()
+    for _ in range(CPU_REPEAT):
+        decode(levels)
+    cpu = (time.process_time() - t0) / CPU_REPEAT
+
+    return {
+        "expected": tr.expected,
+        "got": got,
+        "errors": edit_distance(tr.expected, got),
+        "true_pulses": true_pulses,
+        "extra": max(0, counted - true_pulses),
+        "missed": max(0, true_pulses - counted),
+        "latencies": latencies,
+        "edges": len(tr.edges),
+        "cpu": cpu,
+    }
+
+def calibrate():
+    """
+    CPU-Zeit (us) einer festen Python-Schleife mit aehnlichen Operationen
+    wie der Decoder (Vergleiche, Gleitkomma, Listen, bisect). Bester von
+    CALIB_REPEAT Laeufen; haengt nur vom Rechner ab, nicht vom Decoder.
+    """
+    ts = [i * 0.0137 for i in range(64)]
+    best = None
+    for _ in range(CALIB_REPEAT):
+        t0 = time.process_time()
+        acc, last, out = 0.0, 0.0, []
+        for i in range(CALIB_ROUNDS):
+            t = ts[i & 63] + i
+            if t - last > 0.004:
+                acc += t - last
+                out.append(bisect.bisect_right(ts, acc % 0.8))
+            last = t
+        dt = time.process_time() - t0
+        best = dt if best is None else min(best, dt)
+    return round(best * 1e6, 1)
+
+def _pct(values, q):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+def summarize(results):
+    digits = sum(len(r["expected"]) for r in results)
+    pulses = sum(r["true_pulses"] for r in results)
+    lat = [x * 1000.0 for r in results for x in r["latencies"]]
+    edges = sum(r["edges"] for r in results)
+    return {
+        "traces": len(results),
+        "digits": digits,
+        "digit_accuracy": round(1.0 - sum(r["errors"] for r in results) / digits, 4) if digits else 0.0,
+        "traces_exact": round(sum(r["got"] == r["expected"] for r in results) / len(results), 4),
+        "false_pulse_rate": round(sum(r["extra"] for r in results) / pulses, 4) if pulses else 0.0,
+        "missed_pulse_rate": round(sum(r["missed"] for r in results) / pulses, 4) if pulses else 0.0,
+        "latency_ms": {
+            "p50": round(_pct(lat, 0.50), 1),
+            "p95": round(_pct(lat, 0.95), 1),
+            "max": round(max(lat), 1) if lat else 0.0,
+        },
+        "cpu_us_per_edge": round(sum(r["cpu"] for r in results) / edges * 1e6, 2) if edges else 0.0,
+    }
+
+def run_corpus(directory):
+    by_profile = {}
+    names = sorted(n for n in os.listdir(directory) if n.endswith(edge_trace.SUFFIX))
+    if not names:
+        raise FileNotFoundError(f"keine {edge_trace.SUFFIX}-Dateien in {directory}")
+    failures = []
+    for name in names:
+        tr = edge_trace.load(os.path.join(directory, name))
+        r = evaluate(tr)
+        by_profile.setdefault(name.split("-", 1)[0], []).append(r)
+        if r["got"] != r["expected"]:
+            failures.append((name, r["expected"], r["got"]))
+    report = {
+        "decoder": decoder_info(),
+        "calibration_us": calibrate(),
+        "profiles": {p: summarize(rs) for p, rs in sorted(by_profile.items())},
+        "total": summarize([r for rs in by_profile.values() for r in rs]),
+    }
+    report["total"]["cpu_rel"] = _cpu_rel(report)
+    return report, failures
+
+def _cpu_rel(report):
+    """CPU je Flanke pro 1000 us Kalibrierschleife; None bei alter Baseline."""
+    calib = report.get("calibration_us")
+    if not calib:
+        return None
+    return round(report["total"]["cpu_us_per_edge"] / calib * 1000.0, 3)
+
+def compare(report, base):
+    """
+    (Verschlechterungen, Hinweise) gegenueber einer Baseline. Nur die
+    Verschlechterungen zaehlen fuer den Exit-Code; CPU haengt vom Rechner
+    ab und ist deshalb nur ein Hinweis.
+    """
+    out, notes = [], []
+    rows = [("total", report["total"], base.get("total"))]
+    rows += [(p, s, base.get("profiles", {}).get(p)) for p, s in report["profiles"].items()]
+    for name, cur, old in rows:
+        if not old:
+            continue
+        if cur["digit_accuracy"] < old["digit_accuracy"] - REG_ACCURACY:
+            out.append(f"{name}: digit_accuracy {old['digit_accuracy']} -> {cur['digit_accuracy']}")
+        for key in ("false_pulse_rate", "missed_pulse_rate"):
+            if cur[key] > old[key] + REG_PULSES:
+                out.append(f"{name}: {key} {old[key]} -> {cur[key]}")
+        p95, old95 = cur["latency_ms"]["p95"], old["latency_ms"]["p95"]
+        if p95 > old95 * (1 + REG_LATENCY) and p95 - old95 > REG_LATENCY_MIN_MS:
+            out.append(f"{name}: latency p95 {old95} -> {p95} ms")
+    old_rel, cur_rel = _cpu_rel(base) if "total" in base else None, report["total"]["cpu_rel"]
+    if old_rel and cur_rel and cur_rel > old_rel * (1 + REG_CPU):
+        notes.append(f"total: cpu_rel {old_rel} -> {cur_rel} "
+                     f"(us/Flanke {base['total']['cpu_us_per_edge']} -> {report['total']['cpu_us_per_edge']})")
+    elif not old_rel:
+        notes.append("Baseline ohne calibration_us: CPU nicht vergleichbar, "
+                     "Baseline mit --json neu schreiben")
+    return out, notes
+
+def print_report(report, failures):
+    d = report["decoder"]
+    print(f"Decoder: min_pulse={d['min_pulse']}s max_pulse={d['max_pulse']}s digit_gap={d['digit_gap']}s "
+          f"Filter: {d.get('filter', '-')} {d.get('settle', 0) * 1000:.1f}ms")
+    print(f"{'Profil':8s} {'Traces':>6} {'Ziffern':>7} {'Genau':>7} {'Exakt':>6} "
+          f"{'False':>7} {'Missed':>7} {'p50ms':>6} {'p95ms':>6} {'maxms':>6} {'us/Fl':>6}")
+    rows = list(report["profiles"].items()) + [("TOTAL", report["total"])]
+    for name, s in rows:
+        lat = s["latency_ms"]
+        print(f"{name:8s} {s['traces']:6d} {s['digits']:7d} {s['digit_accuracy']:7.3f} "
+              f"{s['traces_exact']:6.2f} {s['false_pulse_rate']:7.3f} {s['missed_pulse_rate']:7.3f} "
+              f"{lat['p50']:6.0f} {lat['p95']:6.0f} {lat['max']:6.0f} {s['cpu_us_per_edge']:6.1f}")
+    if report["total"].get("cpu_rel") is not None:
+        print(f"CPU: {report['total']['cpu_us_per_edge']} us/Flanke, Kalibrierschleife "
+              f"{report['calibration_us']} us -> cpu_rel {report['total']['cpu_rel']}")
+    for name, exp, got in failures:
+        print(f"  falsch: {name}: erwartet {exp}, erkannt {got}")
+
+def cmd_run(args):
+    directory = args[0]
+    out_json = base_json = None
+    rest = args[1:]
+    while rest:
+        opt = rest.pop(0)
+        if opt == "--json" and rest:
+            out_json = rest.pop(0)
+        elif opt == "--baseline" and rest:
+            base_json = rest.pop(0)
+        else:
+            print(f"Unbekannte Option: {opt}", file=sys.stderr)
+            return 2
+    report, failures = run_corpus(directory)
+    print_report(report, failures)
+    if out_json:
+        with open(out_json, "w") as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+            f.write("\n")
+    if base_json:
+        with open(base_json) as f:
+            regressions, notes = compare(report, json.load(f))
+        for line in notes:
+            print("Hinweis: " + line)
+        if regressions:
+            print("REGRESSION gegenueber", base_json)
+            for line in regressions:
+                print("  " + line)
+            return 1
+        print("Keine Regression gegenueber", base_json)
+    return 0
+
+
+# ---------- Echtzeit unter Last ----------
+def load_worker(web_profile, core):
+    """Last wie eine beschaeftigte Weboberflaeche: Seiten bauen, Logs lesen, Prozesse starten."""
+    import subprocess
+    if web_profile:
+        # wie retrophone-web.service im Profil realtime (CPUQuota geht nur per systemd)
+        os.nice(10)
+        others = set(range(os.cpu_count() or 1)) - {core}
+        if core >= 0 and others:
+            os.sched_setaffinity(0, others)
+    page = {"calls": [{"id": i, "number": str(10 ** 9 + i)} for i in range(200)]}
+    while True:
+        for _ in range(50):
+            json.loads(json.dumps(page))
+        try:
+            subprocess.run(["tail", "-n", "200", "/var/log/syslog"],
+                           stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, timeout=5)
+        except (OSError, subprocess.SubprocessError):
+            pass
+
+def start_load(n, web_profile, core):
+    pids = []
+    for _ in range(n):
+        pid = os.fork()
+        if pid == 0:
+            try:
+                load_worker(web_profile, core)
+            finally:
+                os._exit(0)
+        pids.append(pid)
+    return pids
+
+def stop_load(pids):
+    for pid in pids:
+        try:
+            os.kill(pid, signal.SIGTERM)
+            os.waitpid(pid, 0)
+        except OSError:
+            pass
+
+def play_realtime(tr):
+    """Flanken zur Trace-Zeit abspielen; liefert (gesehene Pegel, Verspaetungen in s)."""
+    levels = tr.levels()
+    start = time.monotonic() + 0.05
+    seen, late = [], []
+    for t, level in levels:
+        target = start + t
+        while True:
+            wait = target - time.monotonic()
+            if wait <= 0:
+                break
+            time.sleep(wait)
+        now = time.monotonic()
+        seen.append((now - start, level))
+        late.append(now - target)
+    return seen, late
+
+def stress_pass(traces, n_load, rt_prio, core):
+    """Ein Durchgang; rt_prio/core None = ohne Profil."""
+    import rt_sched
+    profile = rt_prio is not None
+    if profile:
+        rt_sched.set_thread(0, "Abspieler", rt_prio, core)
+    else:
+        os.sched_setscheduler(0, os.SCHED_OTHER, os.sched_param(0))
+        os.sched_setaffinity(0, range(os.cpu_count() or 1))
+    pids = start_load(n_load, profile, core if core is not None else -1)
+    results, late = [], []
+    try:
+        for tr in traces:
+            seen, lt = play_realtime(tr)
+            results.append(evaluate(tr, seen))
+            late += lt
+    finally:
+        stop_load(pids)
+    s = summarize(results)
+    s["late_ms"] = {"p50": round(_pct(late, 0.50) * 1000, 2), "p99": round(_pct(late, 0.99) * 1000, 2),
+                    "max": round(max(late) * 1000, 2) if late else 0.0}
+    return s
+
+def cmd_stress(args):
+    directory = args[0]
+    opts = {"--traces": STRESS_TRACES, "--load": STRESS_LOAD, "--rt": None, "--core": None}
+    rest = args[1:]
+    while rest:
+        opt = rest.pop(0)
+        if opt not in opts or not rest:
+            print(f"Unbekannte Option: {opt}", file=sys.stderr)
+            return 2
+        opts[opt] = int(rest.pop(0))
+    if opts["--rt"] is None or opts["--core"] is None:
+        from retro_config import ConfigStore
+        cfg = ConfigStore().load()
+        if opts["--rt"] is None:
+            opts["--rt"] = cfg.rt_priority or STRESS_RT
+        if opts["--core"] is None:
+            opts["--core"] = cfg.cpu_core if cfg.cpu_core >= 0 else (os.cpu_count() or 1) - 1
+    names = sorted(n for n in os.listdir(directory) if n.endswith(edge_trace.SUFFIX))
+    if not names:
+        print(f"keine {edge_trace.SUFFIX}-Dateien in {directory}", file=sys.stderr)
+        return 2
+    # ueber die Profile verteilt auswaehlen
+    step = max(1, len(names) // opts["--traces"])
+    traces = [edge_trace.load(os.path.join(directory, n)) for n in names[::step][:opts["--traces"]]]
+    secs = sum(tr.duration for tr in traces)
+    print(f"{len(traces)} Traces ({secs:.0f} s je Durchgang), {opts['--load']} Lastprozesse, "
+          f"{os.cpu_count()} Kerne")
+    rows = [("ohne Profil", stress_pass(traces, opts["--load"], None, None)),
+            (f"FIFO {opts['--rt']} Kern {opts['--core']}",
+             stress_pass(traces, opts["--load"], opts["--rt"], opts["--core"]))]
+    print(f"{'Durchgang':22s} {'Genau':>7} {'Exakt':>6} {'False':>7} {'Missed':>7} "
+          f"{'spaet p50':>9} {'p99':>7} {'max ms':>7}")
+    for name, s in rows:
+        late = s["late_ms"]
+        print(f"{name:22s} {s['digit_accuracy']:7.3f} {s['traces_exact']:6.2f} "
+              f"{s['false_pulse_rate']:7.3f} {s['missed_pulse_rate']:7.3f} "
+              f"{late['p50']:9.2f} {late['p99']:7.2f} {late['max']:7.2f}")
+    return 0 if rows[-1][1]["digit_accuracy"] >= rows[0][1]["digit_accuracy"] else 1
+
+
+# ---------- Hook-Gesten ----------
+# Hook-Traces: expected ist die Folge der Gesten, wie sie gesture_string()
+# aus den Events macht: "o" Abheben, "h" Auflegen, Ziffer = Flash mit so
+# vielen Druecken. ends haelt je Geste den Bezugszeitpunkt fuer die
+# Latenz: Abheben bzw. Auflegen (erste Flanke) oder letztes Wieder-Abheben
+# eines Flashes.
+HOOK_PROFILES = ("bounce", "flash", "multi", "edge", "hangup")
+HOOK_TRACES_PER_PROFILE = 4
+
+def hook_decode(levels, hook_filter=HOOK_FILTER, **windows):
+    """
+    Wie die Hauptschleife des Daemons: Rohflanken durch den Filter, dann
+    HookGesture, Fristen bis zum Horizont des Filters. Liefert
+    [(t_erkannt, event, wert), ...] mit dem Zeitpunkt, zu dem der Daemon
+    das Event fruehestens sieht.
+    """
+    t0, level0 = levels[0]
+    f = PinFilter(level0, int(t0 * 1e9), *hook_filter)
+    g = hook_gesture.HookGesture(level0 == 0, t0, **windows)
+    raw = [(int(round(t * 1e9)), lv) for t, lv in levels[1:]]
+    out = []
+    i, now = 0, int(t0 * 1e9)       # Nanosekunden wie im Daemon
+    while True:
+        if i < len(raw) and raw[i][0] <= now:
+            changes = f.feed(raw[i][1], raw[i][0])
+            i += 1
+        else:
+            changes = f.poll(now)
+        for level, t_ns in changes:
+            out += [(now / 1e9, ev, val) for ev, val in g.feed(level == 0, t_ns / 1e9)]
+        out += [(now / 1e9, ev, val) for ev, val in g.poll(f.horizon(now) / 1e9)]
+        wake = [raw[i][0]] if i < len(raw) else []
+        if f.next_deadline() is not None:
+            # Filter noch offen: Gesten-Fristen warten auf seinen Horizont
+            wake.append(f.next_deadline())
+        elif g.next_deadline() is not None:
+            wake.append(int(g.next_deadline() * 1e9) + 1)
+        if not wake:
+            return out
+        now = max(now, min(wake))
+
+def gesture_string(events):
+    return "".join("o" if ev == "offhook" else "h" if ev == "hangup" else str(val)
+                   for _, ev, val in events)
+
+def hook_synth(rng, profile):
+    """Trace fuer ein Hook-Profil: (erwartet, beschreibung, ends, flanken)."""
+    bounce_max = hook_gesture.BOUNCE_MAX
+    flash_max, flash_gap = hook_gesture.FLASH_MAX, hook_gesture.FLASH_GAP
+    edges, ends, expected = [], [], ""
+    t = rng.uniform(0.3, 0.8)
+
+    def contact(level, rattle):
+        """Eine Flanke mit Kontaktrattern (kuerzer als der Filter)."""
+        nonlocal t
+        edges.append((t, level))
+        bt = t
+        for _ in range(rattle):
+            bt += rng.uniform(0.0002, 0.002)
+            edges.append((bt, 1 - level))
+            bt += rng.uniform(0.0002, 0.002)
+            edges.append((bt, level))
+
+    def lift():
+        nonlocal t, expected
+        contact(0, rng.randint(0, 3))
+        ends.append(t)
+        expected += "o"
+        t += rng.uniform(1.0, 3.0)
+
+    def press(down, rattle=True):
+        """Gabel fuer down Sekunden druecken, danach wieder abgehoben."""
+        nonlocal t
+        contact(1, rng.randint(1, 4) if rattle else 0)
+        t += down
+        contact(0, rng.randint(0, 3) if rattle else 0)
+
+    def flash(n, lo, hi):
+        nonlocal t, expected
+        for k in range(n):
+            press(rng.uniform(lo, hi))
+            if k < n - 1:
+                t += rng.uniform(0.1, flash_gap * 0.7)
+        ends.append(t)
+        expected += str(n)
+        t += flash_gap + rng.uniform(0.8, 2.0)
+
+    def hangup():
+        nonlocal t, expected
+        contact(1, rng.randint(2, 6))
+        ends.append(t)
+        expected += "h"
+        t += flash_max + rng.uniform(0.5, 2.0)
+
+    def spike():
+        """Kurz aufgelegt, aber kuerzer als bounce_max: keine Geste."""
+        nonlocal t
+        press(rng.uniform(0.015, bounce_max * 0.85), rattle=rng.random() < 0.5)
+        t += rng.uniform(0.5, 1.5)
+
+    lift()
+    if profile == "bounce":
+        for _ in range(rng.randint(4, 8)):
+            spike()
+    elif profile == "flash":
+        for _ in range(rng.randint(2, 4)):
+            flash(1, bounce_max + 0.02, flash_max - 0.05)
+            if rng.random() < 0.5:
+                spike()
+    elif profile == "multi":
+        for _ in range(rng.randint(2, 3)):
+            flash(rng.randint(2, 3), bounce_max + 0.02, 0.3)
+    elif profile == "edge":
+        # knapp an den Fenstergrenzen (80 / 600 ms)
+        flash(1, bounce_max + 0.005, bounce_max + 0.005)
+        press(bounce_max - 0.01)
+        t += rng.uniform(0.5, 1.0)
+        flash(1, flash_max - 0.01, flash_max - 0.01)
+        press(flash_max + 0.05)
+        ends.append(t - flash_max - 0.05)   # Auflegen, dann gleich wieder abgehoben
+        ends.append(t)
+        expected += "ho"
+        t += rng.uniform(1.0, 2.0)
+    elif profile == "hangup":
+        hangup()
+        lift()
+    hangup()
+    edges.sort()
+    clean, level = [], 1
+    for et, lv in edges:
+        if lv != level:
+            clean.append((round(et, 6), lv))
+            level = lv
+    return expected, f"flash_max={flash_max} flash_gap={flash_gap}", ends, clean
+
+def cmd_hook_gen(directory, seed=1):
+    rng = random.Random(seed)
+    os.makedirs(directory, exist_ok=True)
+    total = 0
+    for name in HOOK_PROFILES:
+        for i in range(HOOK_TRACES_PER_PROFILE):
+            expected, label, ends, edges = hook_synth(rng, name)
+            tr = edge_trace.Trace(PIN_HOOK, 1, 0.0, expected, f"{name} {label}", ends, edges)
+            edge_trace.save(os.path.join(directory, f"{name}-{i + 1:02d}{edge_trace.SUFFIX}"), tr)
+            total += 1
+    print(f"{total} Hook-Traces in {directory}")
+    return 0
+
+def hook_evaluate(tr):
+    """Gesten und Latenz je Art (Sekunden) fuer einen Hook-Trace."""
+    events = hook_decode(tr.levels())
+    got = gesture_string(events)
+    lat = {"o": [], "h": [], "f": []}
+    if got == tr.expected and len(tr.ends) == len(events):
+        for (td, ev, _), ref in zip(events, tr.ends):
+            lat["o" if ev == "offhook" else "h" if ev == "hangup" else "f"].append(td - ref)
+    return {"expected": tr.expected, "got": got, "lat": lat}
+
+def cmd_hook(directory):
+    names = sorted(n for n in os.listdir(directory) if n.endswith(edge_trace.SUFFIX))
+    if not names:
+        print(f"keine {edge_trace.SUFFIX}-Dateien in {directory}", file=sys.stderr)
+        return 2
+    # Abheben nur berichten: haengt am Rattern des Kontakts (Filter wartet settle ab der letzten Flanke)
+    limits = {"o": None, "h": hook_gesture.FLASH_MAX, "f": hook_gesture.FLASH_GAP}
+    print(f"Filter: {HOOK_FILTER[0]} {HOOK_FILTER[1] * 1000:.0f}ms  bounce_max={hook_gesture.BOUNCE_MAX}s "
+          f"flash_max={hook_gesture.FLASH_MAX}s flash_gap={hook_gesture.FLASH_GAP}s")
+    print(f"{'Profil':8s} {'Traces':>6} {'Gesten':>6} {'Exakt':>6} "
+          f"{'Abheb ms':>8} {'Aufleg ms':>9} {'Flash ms':>8}")
+    by_profile, problems = {}, []
+    for name in names:
+        r = hook_evaluate(edge_trace.load(os.path.join(directory, name)))
+        by_profile.setdefault(name.split("-", 1)[0], []).append(r)
+        if r["got"] != r["expected"]:
+            problems.append(f"{name}: erwartet {r['expected']!r}, erkannt {r['got']!r}")
+        for kind, values in r["lat"].items():
+            if values and limits[kind] is not None and max(values) > limits[kind] + HOOK_SLACK:
+                problems.append(f"{name}: Latenz {kind} {max(values) * 1000:.0f} ms "
+                                f"> {limits[kind] * 1000:.0f} ms")
+    rows = list(by_profile.items()) + [("TOTAL", [r for rs in by_profile.values() for r in rs])]
+    for name, rs in rows:
+        worst = {k: max((x for r in rs for x in r["lat"][k]), default=0.0) * 1000 for k in limits}
+        print(f"{name:8s} {len(rs):6d} {sum(len(r['expected']) for r in rs):6d} "
+              f"{sum(r['got'] == r['expected'] for r in rs) / len(rs):6.2f} "
+              f"{worst['o']:8.0f} {worst['h']:9.0f} {worst['f']:8.0f}")
+    for line in problems:
+        print("  FEHLER " + line)
+    return 1 if problems else 0
+
+
+# ---------- Aufnahme am Pi ----------
+def cmd_record(path, digits, label="", pin=PIN_PULSE):
+    import RPi.GPIO as GPIO
+    from collections import deque
+    GPIO.setmode(GPIO.BCM)
+    GPIO.setup(pin, GPIO.IN, pull_up_down=GPIO.PUD_UP)
+    level0 = GPIO.input(pin)
+    t0 = time.time()
+    raw = deque()
+    GPIO.add_event_detect(pin, GPIO.BOTH,
+                          callback=lambda p: raw.append((time.time() - t0, GPIO.input(p))))
+    print(f"Aufnahme laeuft (Pin {pin}), jetzt {digits} waehlen bzw. ausfuehren, Ende mit STRG+C")
+    try:
+        while True:
+            time.sleep(0.5)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        GPIO.cleanup()
+    edges, level = [], level0
+    for t, lv in raw:
+        if lv != level:
+            edges.append((t, lv))
+            level = lv
+    edge_trace.save(path, edge_trace.Trace(pin, level0, t0, digits, label, [], edges))
+    print(f"\n{len(edges)} Flanken gespeichert in {path}")
+    return 0
+
+
+def main():
+    usage = ("Usage: dial_bench.py {gen <dir> [seed] | run <dir> [--json f] [--baseline f] | "
+             "hook-gen <dir> [seed] | hook <dir> | record <datei> <ziffern> [beschreibung] | "
+             "hook-record <datei> <gesten> [beschreibung] | "
+             "stress <dir> [--traces n] [--load n] [--rt prio] [--core n]}")
+    if len(sys.argv) < 3:
+        print(usage, file=sys.stderr)
+        sys.exit(2)
+    cmd = sys.argv[1]
+    if cmd == "gen":
+        sys.exit(cmd_gen(sys.argv[2], int(sys.argv[3]) if len(sys.argv) > 3 else 1))
+    elif cmd == "run":
+        sys.exit(cmd_run(sys.argv[2:]))
+    elif cmd == "hook-gen":
+        sys.exit(cmd_hook_gen(sys.argv[2], int(sys.argv[3]) if len(sys.argv) > 3 else 1))
+    elif cmd == "hook":
+        sys.exit(cmd_hook(sys.argv[2]))
+    elif cmd == "stress":
+        sys.exit(cmd_stress(sys.argv[2:]))
+    elif cmd == "hook-record" and len(sys.argv) >= 4:
+        sys.exit(cmd_record(sys.argv[2], sys.argv[3], " ".join(sys.argv[4:]), PIN_HOOK))
+    elif cmd == "record" and len(sys.argv) >= 4:
+        sys.exit(cmd_record(sys.argv[2], sys.argv[3], " ".join(sys.argv[4:])))
+    else:
+        print(usage, file=sys.stderr)
+        sys.exit(2)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+RetroPhone Waehlscheiben-Decoder
+--------------------------------
+Zaehlt Waehlimpulse anhand der Flanken an der Impulsleitung
+(1 = Impuls aktiv, 0 = Ruhe) und meldet nach einer Pause die Ziffer:
+
+  Impuls gueltig:  min_pulse <= Dauer(1) <= max_pulse
+  Ziffer fertig:   nach dem letzten Impuls digit_gap lang Ruhe
+  Ziffer:          Anzahl Impulse % 10 (10 Impulse = 0)
+
+Der Decoder arbeitet nur mit Zeitstempeln der Flanken, nicht mit
+Abtastung. Damit kann die Hauptschleife zwischen zwei Flanken schlafen
+(next_deadline()), und aufgezeichnete Traces lassen sich 1:1 abspielen
+(siehe replay()).
+"""
+
+import sys
+
+# Standard-Zeitfenster (Sekunden)
+MIN_PULSE = 0.004
+MAX_PULSE = 0.12      # langsame, ausgeleierte Scheiben: bis ~7 pps bei 68 % Oeffnung (~97 ms)
+DIGIT_GAP = 0.25
+
+
+class PulseDecoder:
+    def __init__(self, level: int, now: float,
+                 min_pulse=MIN_PULSE, max_pulse=MAX_PULSE, digit_gap=DIGIT_GAP):
+        self.min_pulse = min_pulse
+        self.max_pulse = max_pulse
+        self.digit_gap = digit_gap
+        self.level     = level
+        self.t_edge    = now      # letzte Flanke
+        self.count     = 0        # Impulse der laufenden Ziffer
+        # Statistik
+        self.pulses    = 0
+        self.rejected  = 0        # zu kurz (Prellen) oder zu lang
+        self.digits    = 0
+
+    @property
+    def busy(self) -> bool:
+        """True, solange eine Ziffer angefangen, aber noch nicht gemeldet ist."""
+        return self.count > 0 or self.level == 1
+
+    def feed(self, level: int, t: float):
+        """Neuer Pegel der Impulsleitung. Liefert Liste von Events."""
+        events = self.poll(t)
+        if level == self.level:
+            return events
+        if level == 0:
+            dur = t - self.t_edge
+            if self.min_pulse <= dur <= self.max_pulse:
+                self.count += 1
+                self.pulses += 1
+                events.append(("pulse", dur))
+            else:
+                self.rejected += 1
+        self.level = level
+        self.t_edge = t
+        return events
+
+    def poll(self, t: float):
+        """Prueft, ob die Pause nach dem letzten Impuls abgelaufen ist."""
+        if self.count and self.level == 0 and t >= self.t_edge + self.digit_gap:
+            digit = self.count % 10
+            self.count = 0
+            self.digits += 1
+            return [("digit", digit)]
+        return []
+
+    def next_deadline(self):
+        """Zeitpunkt, zu dem poll() spaetestens wieder gerufen werden muss (oder None)."""
+        if self.count and self.level == 0:
+            return self.t_edge + self.digit_gap
+        return None
+
+    def reset(self):
+        """Angefangene Ziffer verwerfen (z. B. Hoerer aufgelegt)."""
+        self.count = 0
+
+
+def replay(trace, **windows):
+    """
+    Spielt einen aufgezeichneten Trace [(t, pegel), ...] ab und liefert
+    [(t_erkannt, event, wert), ...].
+    """
+    if not trace:
+        return []
+    t0, level0 = trace[0]
+    d = PulseDecoder(level0, t0, **windows)
+    out = []
+    for t, level in trace[1:]:
+        dl = d.next_deadline()
+        if dl is not None and dl <= t:
+            out += [(dl, ev, val) for ev, val in d.poll(dl)]
+        out += [(t, ev, val) for ev, val in d.feed(level, t)]
+    dl = d.next_deadline()
+    if dl is not None:
+        out += [(dl, ev, val) for ev, val in d.poll(dl)]
+    return out
+
+
+def main():
+    """Trace-Datei mit Zeilen '<sekunden> <pegel>' abspielen und Ziffern ausgeben."""
+    if len(sys.argv) != 2:
+        print("Usage: dial_decoder.py <trace.txt>", file=sys.stderr)
+        sys.exit(2)
+    trace = []
+    with open(sys.argv[1], "r") as f:
+        for line in f:
+            line = line.split("#", 1)[0].strip()
+            if line:
+                t, level = line.split()
+                trace.append((float(t), int(level)))
+    for t, ev, val in replay(trace):
+        if ev == "digit":
+            print(f"{t:10.3f}  digit    {val}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""
+RetroPhone Flanken-Traces (.rtr)
+--------------------------------
+Kompaktes Binaerformat fuer aufgezeichnete GPIO-Flanken, z. B. der
+Impulsleitung der Waehlscheibe. Wird von dial_bench.py gelesen und
+geschrieben.
+
+Aufbau (little endian):
+  magic      4 Bytes  b"RPTR"
+  version    1 Byte   (1)
+  level0     1 Byte   Pegel zu Beginn
+  pin        1 Byte   BCM-Pin der Aufnahme
+  t0         8 Bytes  double, Startzeit (Unix-Zeit, nur zur Info)
+  expected   varint Laenge + ASCII   tatsaechlich gewaehlte Ziffern
+  label      varint Laenge + UTF-8   Beschreibung (Scheibe, Tempo, ...)
+  ends       varint Anzahl + je varint delta_us
+             tatsaechliches Ende jeder Ziffer (letzter Impuls), fuer die
+             Latenzmessung; bei echten Aufnahmen meist leer
+  count      varint   Anzahl Flanken
+  flanken    je ein varint: (delta_us << 1) | pegel
+             delta_us = Abstand zur vorherigen Flanke in Mikrosekunden
+
+Eine Flanke mit 10..100 ms Abstand braucht so 3 Bytes; eine gewaehlte
+Ziffer im Schnitt etwa 30 Bytes.
+"""
+
+import struct
+
+MAGIC   = b"RPTR"
+VERSION = 1
+SUFFIX  = ".rtr"
+
+_HEAD = struct.Struct("<4sBBBd")
+
+
+class Trace:
+    __slots__ = ("pin", "level0", "t0", "expected", "label", "ends", "edges")
+
+    def __init__(self, pin=0, level0=0, t0=0.0, expected="", label="", ends=None, edges=None):
+        self.pin      = pin
+        self.level0   = level0
+        self.t0       = t0
+        self.expected = expected
+        self.label    = label
+        self.ends     = ends if ends is not None else []     # [t_rel_s, ...]
+        self.edges    = edges if edges is not None else []   # [(t_rel_s, pegel), ...]
+
+    def levels(self):
+        """Trace im Format von dial_decoder.replay(): [(t, pegel), ...] ab t=0."""
+        return [(0.0, self.level0)] + self.edges
+
+    @property
+    def duration(self) -> float:
+        return self.edges[-1][0] if self.edges else 0.0
+
+
+# ---------- varint (LEB128) ----------
+def _put_varint(out: bytearray, n: int):
+    while n >= 0x80:
+        out.append((n & 0x7F) | 0x80)
+        n >>= 7
+    out.append(n)
+
+def _get_varint(buf, pos):
+    n = shift = 0
+    while True:
+        b = buf[pos]
+        pos += 1
+        n |= (b & 0x7F) << shift
+        if b < 0x80:
+            return n, pos
+        shift += 7
+
+
+# ---------- Lesen / Schreiben ----------
+def dumps(tr: Trace) -> bytes:
+    out = bytearray(_HEAD.pack(MAGIC, VERSION, tr.level0, tr.pin, tr.t0))
+    for text in (tr.expected.encode("ascii"), tr.label.encode("utf-8")):
+        _put_varint(out, len(text))
+        out += text
+    _put_varint(out, len(tr.ends))
+    prev_us = 0
+    for t in tr.ends:
+        us = int(round(t * 1e6))
+        _put_varint(out, max(0, us - prev_us))
+        prev_us = max(prev_us, us)
+    _put_varint(out, len(tr.edges))
+    prev_us = 0
+    for t, level in tr.edges:
+        us = int(round(t * 1e6))
+        _put_varint(out, (max(0, us - prev_us) << 1) | (level & 1))
+        prev_us = max(prev_us, us)
+    return bytes(out)
+
+def loads(data: bytes) -> Trace:
+    magic, version, level0, pin, t0 = _HEAD.unpack_from(data, 0)
+    if magic != MAGIC:
+        raise ValueError("keine RetroPhone-Trace-Datei")
+    if version != VERSION:
+        raise ValueError(f"Trace-Version {version} nicht unterstuetzt")
+    pos = _HEAD.size
+    texts = []
+    for _ in range(2):
+        n, pos = _get_varint(data, pos)
+        texts.append(bytes(data[pos:pos + n]))
+        pos += n
+    count, pos = _get_varint(data, pos)
+    ends = []
+    us = 0
+    for _ in range(count):
+        v, pos = _get_varint(data, pos)
+        us += v
+        ends.append(us / 1e6)
+    count, pos = _get_varint(data, pos)
+    edges = []
+    us = 0
+    for _ in range(count):
+        v, pos = _get_varint(data, pos)
+        us += v >> 1
+        edges.append((us / 1e6, v & 1))
+    return Trace(pin, level0, t0, texts[0].decode("ascii"), texts[1].decode("utf-8"),
+                 ends, edges)
+
+def save(path: str, tr: Trace):
+    with open(path, "wb") as f:
+        f.write(dumps(tr))
+
+def load(path: str) -> Trace:
+    with open(path, "rb") as f:
+        return loads(f.read())
@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""
+RetroPhone Hook-Gesten
+----------------------
+Erkennt am Gabelkontakt neben Abheben und Auflegen auch kurze
+Hook-Flashes (Gabel kurz druecken) anhand von Zeitfenstern:
+
+  aufgelegt <  bounce_max          -> Prellen, ignoriert
+  aufgelegt <  flash_max           -> Flash
+  aufgelegt >= flash_max           -> Auflegen (erst dann ausgeloest)
+
+Mehrere Flashes kurz hintereinander (Abstand < flash_gap) werden zu
+einer Geste zusammengefasst ("flash", anzahl).
+
+Garantierte Erkennungszeiten:
+  Auflegen:  spaetestens flash_max nach dem Auflegen
+  Flash:     spaetestens flash_gap nach dem letzten Wieder-Abheben
+  Abheben:   sofort (wichtig fuer das Annehmen)
+
+Die Klasse kennt keine GPIO und keine Uhr: Zeiten kommen von aussen,
+damit sich aufgezeichnete Traces 1:1 abspielen lassen (siehe replay()).
+"""
+
+import sys
+
+# Zustaende
+ON      = "on"       # aufgelegt (bestaetigt)
+OFF     = "off"      # abgehoben
+PENDING = "pending"  # aufgelegt, aber noch innerhalb des Flash-Fensters
+
+# Standard-Zeitfenster (Sekunden)
+BOUNCE_MAX = 0.08
+FLASH_MAX  = 0.6
+FLASH_GAP  = 0.4
+
+
+class HookGesture:
+    def __init__(self, offhook: bool, now: float,
+                 bounce_max=BOUNCE_MAX, flash_max=FLASH_MAX, flash_gap=FLASH_GAP):
+        self.bounce_max = bounce_max
+        self.flash_max  = flash_max
+        self.flash_gap  = flash_gap
+        self.state      = OFF if offhook else ON
+        self.t_on       = 0.0     # Beginn der aktuellen Auflege-Phase
+        self.t_off      = now     # letztes Abheben
+        self.flashes    = 0       # gezaehlte, noch nicht gemeldete Flashes
+        self.bounces    = 0       # Statistik: ignorierte Prell-Impulse
+
+    @property
+    def offhook(self) -> bool:
+        """Logischer Hook-Zustand: waehrend des Flash-Fensters noch abgehoben."""
+        return self.state != ON
+
+    @property
+    def pending(self) -> bool:
+        return self.state == PENDING or self.flashes > 0
+
+    def feed(self, offhook: bool, t: float):
+        """Neuer Rohzustand des Gabelkontakts. Liefert Liste von Events."""
+        events = self.poll(t)
+        if offhook:
+            if self.state == ON:
+                self.state = OFF
+                self.t_off = t
+                events.append(("offhook", t))
+            elif self.state == PENDING:
+                dur = t - self.t_on
+                self.state = OFF
+                self.t_off = t
+                if dur < self.bounce_max:
+                    self.bounces += 1
+                else:
+                    self.flashes += 1
+        else:
+            if self.state == OFF:
+                self.state = PENDING
+                self.t_on = t
+        return events
+
+    def poll(self, t: float):
+        """Prueft abgelaufene Zeitfenster. Liefert Liste von Events."""
+        events = []
+        if self.state == PENDING and t >= self.t_on + self.flash_max:
+            # zu lange aufgelegt: angefangene Flash-Folge verfaellt
+            self.state = ON
+            self.flashes = 0
+            events.append(("hangup", self.t_on))
+        elif self.state == OFF and self.flashes and t >= self.t_off + self.flash_gap:
+            events.append(("flash", self.flashes))
+            self.flashes = 0
+        return events
+
+    def next_deadline(self):
+        """Zeitpunkt, zu dem poll() spaetestens wieder gerufen werden muss (oder None)."""
+        if self.state == PENDING:
+            return self.t_on + self.flash_max
+        if self.state == OFF and self.flashes:
+            return self.t_off + self.flash_gap
+        return None
+
+
+def replay(trace, offhook_level=0, **windows):
+    """
+    Spielt einen aufgezeichneten Trace [(t, pegel), ...] ab und liefert
+    [(t_erkannt, event, wert), ...]. Pegel wie am GPIO: 0 = abgehoben.
+    """
+    if not trace:
+        return []
+    t0, level0 = trace[0]
+    g = HookGesture(level0 == offhook_level, t0, **windows)
+    out = []
+    for t, level in trace[1:]:
+        # Deadlines zwischen zwei Flanken exakt zum Ablaufzeitpunkt auswerten
+        dl = g.next_deadline()
+        while dl is not None and dl <= t:
+            out += [(dl, ev, val) for ev, val in g.poll(dl)]
+            dl = g.next_deadline()
+        out += [(t, ev, val) for ev, val in g.feed(level == offhook_level, t)]
+    dl = g.next_deadline()
+    while dl is not None:
+        out += [(dl, ev, val) for ev, val in g.poll(dl)]
+        dl = g.next_deadline()
+    return out
+
+
+def main():
+    """Trace-Datei mit Zeilen '<sekunden> <pegel>' abspielen und Events ausgeben."""
+    if len(sys.argv) != 2:
+        print("Usage: hook_gesture.py <trace.txt>", file=sys.stderr)
+        sys.exit(2)
+    trace = []
+    with open(sys.argv[1], "r") as f:
+        for line in f:
+            line = line.split("#", 1)[0].strip()
+            if line:
+                t, level = line.split()
+                trace.append((float(t), int(level)))
+    for t, ev, val in replay(trace):
+        print(f"{t:10.3f}  {ev:8s} {val}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+"""
+RetroPhone Eingangsfilter
+-------------------------
+Gemeinsame Entprellung fuer HOOK, PULSE und POS1. Arbeitet auf
+Flanken-Events (O(1) pro Flanke), nicht auf Abtastung; Zeiten sind
+monotone Nanosekunden (time.monotonic_ns()).
+
+Zwei Verfahren pro Pin:
+
+  INTEGRATOR  Zeit-Integrator: zaehlt hoch, solange der Rohpegel 1 ist,
+              runter bei 0 (begrenzt auf 0..settle). Der Ausgang wechselt
+              erst an den Grenzen. Kurze Einbrueche mitten im Impuls
+              werden geschluckt, ohne die Messung neu zu starten.
+  STABLE      Zaehler: der neue Pegel muss settle lang ohne jede weitere
+              Flanke anliegen. Gut gegen Kontaktrattern (Gabel).
+
+Beide Verfahren verzoegern um settle. Die gemeldeten Zeitstempel sind
+darum korrigiert (Beginn der Flanke), Impulslaengen bleiben erhalten.
+Verworfene Ausreisser zaehlen als Glitch.
+"""
+
+# Verfahren
+INTEGRATOR = "integrator"
+STABLE     = "stable"
+
+# Standard je Eingang: (Verfahren, settle in Sekunden)
+HOOK_FILTER  = (STABLE, 0.010)
+PULSE_FILTER = (INTEGRATOR, 0.003)
+POS1_FILTER  = (STABLE, 0.010)
+
+
+class PinFilter:
+    def __init__(self, level: int, t_ns: int, mode=INTEGRATOR, settle=0.003):
+        if mode not in (INTEGRATOR, STABLE):
+            raise ValueError(f"unbekanntes Filterverfahren: {mode}")
+        self.mode    = mode
+        self.settle  = int(settle * 1e9)
+        self.out     = level      # entprellter Pegel
+        self.raw     = level      # letzter Rohpegel
+        self.t_last  = t_ns       # letzte Rohflanke bzw. letzte Fortschreibung
+        self.t_start = t_ns       # STABLE: erste Flanke des laufenden Ausreissers
+        self.t_back  = t_ns - self.settle   # letzte Rueckkehr auf den Ausgangspegel
+        self.t_out   = t_ns       # Zeitstempel des letzten Ausgangswechsels
+        self.integ   = self.settle if level else 0
+        # Statistik
+        self.edges       = 0
+        self.transitions = 0
+        self.glitches    = 0
+
+    @property
+    def pending(self) -> bool:
+        return self.raw != self.out
+
+    def tune(self, mode, settle: float):
+        """Verfahren und settle zur Laufzeit aendern (Konfigurations-Reload)."""
+        if mode not in (INTEGRATOR, STABLE):
+            raise ValueError(f"unbekanntes Filterverfahren: {mode}")
+        self.mode   = mode
+        self.settle = int(settle * 1e9)
+        if self.pending:
+            self.integ = min(self.integ, self.settle)
+        else:
+            self.integ = self.settle if self.out else 0
+
+    def feed(self, level: int, t_ns: int):
+        """Neuer Rohpegel. Liefert Liste [(pegel, t_ns), ...] der Ausgangswechsel."""
+        # verspaetet gemeldete Flanke (Callback nach dem Nachlesen): nicht zurueck in der Zeit
+        t_ns = max(t_ns, self.t_last)
+        out = self.poll(t_ns)
+        if level == self.raw:
+            return out
+        self.edges += 1
+        if level == self.out:
+            # zurueck auf den alten Pegel, bevor der Wechsel bestaetigt war
+            self.glitches += 1
+            self.t_back = t_ns
+        elif t_ns - self.t_back >= self.settle:
+            # neuer Ausreisser; sonst gehoert die Flanke noch zum Prellen davor
+            self.t_start = t_ns
+        self.raw = level
+        self.t_last = t_ns
+        return out
+
+    def poll(self, t_ns: int):
+        """Schreibt den Filter bis t_ns fort; liefert bestaetigte Wechsel."""
+        if t_ns <= self.t_last:
+            return []
+        if self.mode == STABLE:
+            if self.pending and t_ns >= self.t_last + self.settle:
+                return self._switch(self.t_start)
+            return []
+        dt = t_ns - self.t_last
+        self.t_last = t_ns
+        if self.raw:
+            if self.integ + dt >= self.settle:
+                cross = t_ns - (self.integ + dt - self.settle)
+                self.integ = self.settle
+                if not self.out:
+                    return self._switch(cross - self.settle)
+            else:
+                self.integ += dt
+        else:
+            if self.integ - dt <= 0:
+                cross = t_ns - (dt - self.integ)
+                self.integ = 0
+                if self.out:
+                    return self._switch(cross - self.settle)
+            else:
+                self.integ -= dt
+        return []
+
+    def _switch(self, t_ns):
+        # Zeitstempel nie vor den vorherigen Wechsel legen
+        t_ns = max(t_ns, self.t_out)
+        self.out = self.raw
+        self.t_out = t_ns
+        self.transitions += 1
+        return [(self.out, t_ns)]
+
+    def next_deadline(self):
+        """Zeitpunkt (ns), zu dem ein Wechsel bestaetigt waere, oder None."""
+        if not self.pending:
+            return None
+        if self.mode == STABLE:
+            return self.t_last + self.settle
+        if self.raw:
+            return self.t_last + self.settle - self.integ
+        return self.t_last + self.integ
+
+    def horizon(self, t_ns: int) -> int:
+        """Bis hierhin ist der Ausgang endgueltig (kein spaeterer Wechsel davor)."""
+        if not self.pending:
+            return t_ns
+        if self.mode == STABLE:
+            return min(t_ns, self.t_start)
+        return min(t_ns, self.next_deadline() - self.settle)
+
+
+class InputFilter:
+    """Filter fuer mehrere Pins; Wechsel kommen als (pin, pegel, t_ns)."""
+
+    def __init__(self):
+        self.pins = {}
+
+    def add(self, pin, level: int, t_ns: int, mode=INTEGRATOR, settle=0.003):
+        self.pins[pin] = PinFilter(level, t_ns, mode, settle)
+
+    def tune(self, pin, mode, settle: float):
+        self.pins[pin].tune(mode, settle)
+
+    def level(self, pin) -> int:
+        return self.pins[pin].out
+
+    def feed(self, pin, level: int, t_ns: int):
+        # andere Pins zuerst bis zu diesem Zeitpunkt fortschreiben: Reihenfolge bleibt
+        out = self.poll(t_ns)
+        out += [(pin, lv, t) for lv, t in self.pins[pin].feed(level, t_ns)]
+        return out
+
+    def poll(self, t_ns: int):
+        out = []
+        for pin, f in self.pins.items():
+            out += [(pin, lv, t) for lv, t in f.poll(t_ns)]
+        if len(out) > 1:
+            out.sort(key=lambda x: x[2])
+        return out
+
+    def next_deadline(self):
+        dls = [d for d in (f.next_deadline() for f in self.pins.values()) if d is not None]
+        return min(dls) if dls else None
+
+    def horizon(self, t_ns: int) -> int:
+        return min([f.horizon(t_ns) for f in self.pins.values()] + [t_ns])
+
+    def metrics(self) -> dict:
+        return {pin: {"edges": f.edges, "transitions": f.transitions, "glitches": f.glitches}
+                for pin, f in self.pins.items()}
@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""
+RetroPhone Liveness / systemd Watchdog
+--------------------------------------
+Jeder Worker (GPIO-Hauptschleife, baresip Client, Klingel-Engine) meldet
+sich regelmaessig mit checkin(name). Ein eigener Thread schickt
+WATCHDOG=1 an systemd nur, solange sich alle Worker innerhalb ihrer
+Frist gemeldet haben. Haengt ein Worker laenger als stall_dump, landen
+die Stacks aller Threads im Log, bevor systemd den Dienst neu startet.
+
+Zusaetzlich fuehrt loop_time() ein Histogramm der Iterationszeiten der
+Hauptschleife (feste Bucket-Grenzen, O(1) pro Aufruf).
+"""
+
+import sys
+import time
+import logging
+import threading
+
+import sd_notify
+
+logger = logging.getLogger("retrophone")
+
+# Bucket-Obergrenzen in Millisekunden; letzter Bucket = alles darueber
+LOOP_BUCKETS_MS = (1, 2, 5, 10, 20, 50, 100, 250, 500, 1000, 2000)
+
+CHECK_INTERVAL = 2.0    # so oft prueft der Watchdog-Thread (Wakeups im Leerlauf!)
+STALL_DUMP_SEC = 5.0    # Worker so lange still -> Stack-Dump aller Threads
+
+
+class Liveness:
+    def __init__(self, stall_dump=STALL_DUMP_SEC):
+        self.stall_dump = stall_dump
+        self.workers = {}       # name -> [frist_s, letzter_checkin]
+        self.hist = [0] * (len(LOOP_BUCKETS_MS) + 1)
+        self.loop_count = 0
+        self.loop_max = 0.0
+        self.loop_sum = 0.0
+        self.pings = 0
+        self.withheld = 0
+        self.dumps = 0
+        self._dumped = set()    # Worker, fuer die im aktuellen Stall schon gedumpt wurde
+        self._stop = threading.Event()
+        self.thread = None
+
+    # ---------- Worker-Seite ----------
+    def register(self, name: str, deadline: float):
+        self.workers[name] = [deadline, time.monotonic()]
+
+    def checkin(self, name: str):
+        w = self.workers.get(name)
+        if w:
+            w[1] = time.monotonic()
+
+    def loop_time(self, dt: float):
+        ms = dt * 1000.0
+        i = 0
+        for limit in LOOP_BUCKETS_MS:
+            if ms <= limit:
+                break
+            i += 1
+        self.hist[i] += 1
+        self.loop_count += 1
+        self.loop_sum += dt
+        if dt > self.loop_max:
+            self.loop_max = dt
+
+    # ---------- Auswertung ----------
+    def stale(self, now=None):
+        """Liste (name, sekunden_still) aller Worker ueber ihrer Frist."""
+        if now is None:
+            now = time.monotonic()
+        return [(name, now - last) for name, (deadline, last) in self.workers.items()
+                if now - last > deadline]
+
+    def metrics(self) -> dict:
+        labels = [f"<={b}ms" for b in LOOP_BUCKETS_MS] + [f">{LOOP_BUCKETS_MS[-1]}ms"]
+        now = time.monotonic()
+        return {
+            "loop_hist": dict(zip(labels, self.hist)),
+            "loop_count": self.loop_count,
+            "loop_avg_ms": (self.loop_sum / self.loop_count * 1000.0) if self.loop_count else 0.0,
+            "loop_max_ms": self.loop_max * 1000.0,
+            "workers": {name: round(now - last, 3) for name, (_, last) in self.workers.items()},
+            "watchdog_pings": self.pings,
+            "watchdog_withheld": self.withheld,
+            "stack_dumps": self.dumps,
+        }
+
+    # ---------- Watchdog-Thread ----------
+    def start(self):
+        self.thread = threading.Thread(target=self._run, name="liveness", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        interval = sd_notify.watchdog_interval()
+        if interval:
+            logger.info("systemd Watchdog aktiv, Ping alle %.1fs", interval)
+        last_ping = 0.0
+        while not self._stop.wait(CHECK_INTERVAL):
+            now = time.monotonic()
+            stale = self.stale(now)
+            for name, quiet in stale:
+                if quiet > self.stall_dump and name not in self._dumped:
+                    self._dumped.add(name)
+                    self.dump_stacks(f"Worker '{name}' seit {quiet:.1f}s ohne Lebenszeichen")
+            if not stale:
+                self._dumped.clear()
+            if interval and now - last_ping >= interval:
+                if stale:
+                    # kein Ping -> systemd startet nach WatchdogSec neu
+                    self.withheld += 1
+                    logger.warning("Watchdog-Ping zurueckgehalten: %s",
+                                   ", ".join(f"{n}={q:.1f}s" for n, q in stale))
+                else:
+                    sd_notify.notify("WATCHDOG=1")
+                    self.pings += 1
+                last_ping = now
+
+    def dump_stacks(self, reason: str):
+        import traceback
+        self.dumps += 1
+        names = {t.ident: t.name for t in threading.enumerate()}
+        logger.error("STALL: %s - Stack-Dump aller Threads:", reason)
+        for tid, frame in sys._current_frames().items():
+            stack = "".join(traceback.format_stack(frame))
+            logger.error("Thread %s (%s):\n%s", names.get(tid, "?"), tid, stack)
@@ -0,0 +1,486 @@
+#!/usr/bin/env python3
+"""
+RetroPhone Log-Archiv
+---------------------
+phone.log und ring.log rotieren um Mitternacht (TimedRotatingFileHandler,
+phone.log.2026-10-18). `log_archive.py compact` (Timer retrophone-logs)
+packt rotierte Dateien nach ARCHIVE_DIR und raeumt nach [logs] auf:
+
+  archive/phone-2026-10-18.log.zst   Archiv (zstd oder gzip)
+  archive/phone-2026-10-18.log.idx   Zeit-Index dazu
+
+Das Archiv besteht aus unabhaengig komprimierten Bloecken von etwa
+BLOCK_BYTES Text (je ein zstd-Frame bzw. gzip-Member). Aneinandergehaengt
+ist das eine gueltige Datei; zcat / zstdcat lesen sie wie gewohnt. Der
+Index haelt je Block erste und letzte Zeitmarke, Offset und Laenge. Wer
+eine Uhrzeit sucht (Log-Ansicht der Weboberflaeche), findet den Block
+per Bisektion und entpackt nur ihn und die folgenden, nie das ganze Archiv.
+
+Auch Reste des frueheren logrotate (phone.log.1, phone.log.2.gz) werden
+uebernommen. zstd braucht das Modul zstandard (python3-zstandard), ohne
+es wird gzip geschrieben; gelesen wird, was da ist, soweit moeglich.
+
+Als Skript:
+  log_archive.py compact                     rotierte Logs packen, aufraeumen
+  log_archive.py list                        Archive mit Groesse und Faktor
+  log_archive.py show <phone|ring> <zeit> [n]  n Zeilen ab "2026-10-18 14:30"
+"""
+
+import os
+import re
+import sys
+import time
+import zlib
+import gzip
+import struct
+import bisect
+import logging
+from datetime import datetime
+
+logger = logging.getLogger("retrophone")
+
+LOG_DIR     = "/var/log/retrophone"
+ARCHIVE_DIR = os.path.join(LOG_DIR, "archive")
+LOGS        = ("phone", "ring")      # <name>.log in LOG_DIR
+
+BLOCK_BYTES = 64 * 1024   # Text je Block; Suche entpackt hoechstens so viel auf einmal
+PLAIN_SCAN  = 16 * 1024   # Bisektion in unkomprimierten Logs bis auf diese Spanne
+GZIP_LEVEL  = 6
+ZSTD_LEVEL  = 10
+
+INDEX_MAGIC = b"RPLIDX1\n"
+INDEX_REC   = struct.Struct("<ddQIII")   # t_erste, t_letzte, offset, laenge, text, zeilen
+
+EXTS = {"gz": "gzip", "zst": "zstd"}
+ARCHIVE_RE = re.compile(r"^(\w+)-(\d{4}-\d{2}-\d{2})(?:-(\d+))?\.log\.(gz|zst)$")
+ROTATED_RE = re.compile(r"^\.(\d{4}-\d{2}-\d{2}|\d+)(\.gz)?$")
+
+TS_LEN = 23                # "2026-10-18 14:30:05,123" (logging asctime)
+_hour_cache = {}
+
+
+# ---------- Zeitmarken ----------
+def parse_ts(line):
+    """Zeitmarke am Zeilenanfang (bytes oder str) -> Epoch, sonst None (z. B. Traceback)."""
+    head = line[:TS_LEN]
+    if isinstance(head, bytes):
+        head = head.decode("ascii", "replace")
+    if len(head) < 19 or head[4] != "-" or head[10] != " " or head[13] != ":":
+        return None
+    # mktime nur einmal je Stunde: pro Zeile waere das auf dem Pi Zero zu teuer
+    base = _hour_cache.get(head[:13])
+    try:
+        if base is None:
+            base = time.mktime((int(head[:4]), int(head[5:7]), int(head[8:10]),
+                                int(head[11:13]), 0, 0, 0, 0, -1))
+            if len(_hour_cache) > 4096:
+                _hour_cache.clear()
+            _hour_cache[head[:13]] = base
+        t = base + int(head[14:16]) * 60 + int(head[17:19])
+        if len(head) == TS_LEN and head[19] == ",":
+            t += int(head[20:23]) / 1000.0
+    except ValueError:
+        return None
+    return t
+
+def parse_when(text):
+    """'2026-10-18 14:30', '2026-10-18T14:30:05' oder Epoch -> Epoch. ValueError bei Unsinn."""
+    text = (text or "").strip()
+    try:
+        return float(text)
+    except ValueError:
+        return datetime.fromisoformat(text.replace(" ", "T")).timestamp()
+
+
+# ---------- Kompression ----------
+def _zstd():
+    try:
+        import zstandard
+    except ImportError:
+        return None
+    return zstandard
+
+def pick_ext(pref="auto"):
+    """Dateiendung fuer neue Archive nach log_compression."""
+    if pref in ("auto", "zstd"):
+        if _zstd() is not None:
+            return "zst"
+        if pref == "zstd":
+            logger.warning("Log-Archiv: zstandard fehlt (python3-zstandard), nehme gzip")
+    return "gz"
+
+def compress_block(ext, data):
+    if ext == "zst":
+        return _zstd().ZstdCompressor(level=ZSTD_LEVEL).compress(data)
+    return gzip.compress(data, compresslevel=GZIP_LEVEL, mtime=0)
+
+def decompress_block(ext, data):
+    if ext == "zst":
+        return _zstd().ZstdDecompressor().decompress(data)
+    return zlib.decompress(data, 31)
+
+
+# ---------- Archiv ----------
+class Archive:
+    """Ein gepacktes Log mit Index (Index fehlt -> Lesen am Stueck)."""
+
+    def __init__(self, path):
+        m = ARCHIVE_RE.match(os.path.basename(path))
+        if not m:
+            raise ValueError(f"kein Archiv: {path}")
+        self.path = path
+        self.name, self.day, self.ext = m.group(1), m.group(2), m.group(4)
+        self.seq = int(m.group(3) or 0)
+        self.idx_path = index_path(path)
+        self._blocks = None
+
+    @property
+    def size(self):
+        try:
+            return os.path.getsize(self.path)
+        except OSError:
+            return 0
+
+    def blocks(self):
+        """[(t_erste, t_letzte, offset, laenge, text, zeilen), ...] oder None ohne Index."""
+        if self._blocks is None:
+            self._blocks = read_index(self.idx_path)
+        return self._blocks
+
+    def span(self):
+        """(erste, letzte Zeitmarke) laut Index, sonst aus dem Tag im Namen."""
+        b = self.blocks()
+        if b:
+            return b[0][0], b[-1][1]
+        t0 = time.mktime(time.strptime(self.day, "%Y-%m-%d"))
+        return t0, t0 + 86400.0
+
+    def raw_size(self):
+        b = self.blocks()
+        return sum(r[4] for r in b) if b else 0
+
+    def block(self, f, i):
+        _, _, off, length, _, _ = self.blocks()[i]
+        f.seek(off)
+        return decompress_block(self.ext, f.read(length))
+
+    def find(self, t):
+        """Erster Block, der Zeilen ab t enthalten kann."""
+        return bisect.bisect_left([r[1] for r in self.blocks()], t)
+
+    def iter_lines(self, t=None):
+        """Zeilen (bytes) ab dem Block, der t enthaelt; ohne Index die ganze Datei."""
+        if not self.blocks():
+            yield from self._stream()
+            return
+        with open(self.path, "rb") as f:
+            for i in range(self.find(t) if t is not None else 0, len(self._blocks)):
+                yield from self.block(f, i).splitlines(keepends=True)
+
+    def _stream(self):
+        if self.ext == "gz":
+            with gzip.open(self.path, "rb") as f:
+                yield from f
+            return
+        zstd = _zstd()
+        if zstd is None:
+            raise OSError(f"{self.path}: zstandard fehlt")
+        import io
+        with open(self.path, "rb") as raw:
+            reader = zstd.ZstdDecompressor().stream_reader(raw, read_across_frames=True)
+            yield from io.BufferedReader(reader)
+
+
+def index_path(archive_path):
+    base = archive_path
+    for ext in EXTS:
+        if base.endswith("." + ext):
+            base = base[:-len(ext) - 1]
+    return base + ".idx"
+
+def read_index(path):
+    try:
+        with open(path, "rb") as f:
+            data = f.read()
+    except OSError:
+        return None
+    if not data.startswith(INDEX_MAGIC):
+        logger.warning("Log-Archiv: Index %s unbrauchbar", path)
+        return None
+    body = data[len(INDEX_MAGIC):]
+    n = len(body) // INDEX_REC.size
+    return [INDEX_REC.unpack_from(body, i * INDEX_REC.size) for i in range(n)]
+
+def archives(name=None, archive_dir=ARCHIVE_DIR):
+    """Archive aelteste zuerst (optional nur eines Logs)."""
+    out = []
+    try:
+        entries = os.listdir(archive_dir)
+    except OSError:
+        return out
+    for e in entries:
+        m = ARCHIVE_RE.match(e)
+        if m and (name is None or m.group(1) == name):
+            out.append(Archive(os.path.join(archive_dir, e)))
+    out.sort(key=lambda a: (a.day, a.seq, a.name))
+    return out
+
+
+# ---------- Packen ----------
+def rotated(name, log_dir=LOG_DIR):
+    """Rotierte, noch nicht gepackte Dateien von <name>.log, aelteste zuerst."""
+    base = name + ".log"
+    out = []
+    try:
+        entries = os.listdir(log_dir)
+    except OSError:
+        return out
+    for e in entries:
+        if e.startswith(base) and ROTATED_RE.match(e[len(base):]):
+            p = os.path.join(log_dir, e)
+            try:
+                out.append((os.path.getmtime(p), p))
+            except OSError:
+                pass
+    return [p for _, p in sorted(out)]
+
+def _open_source(path):
+    return gzip.open(path, "rb") if path.endswith(".gz") else open(path, "rb")
+
+def _write_index(path, recs):
+    tmp = path + ".part"
+    with open(tmp, "wb") as f:
+        f.write(INDEX_MAGIC)
+        for r in recs:
+            f.write(INDEX_REC.pack(*r))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+def _target(archive_dir, name, day, ext):
+    seq = 0
+    while True:
+        stem = f"{name}-{day}" + (f"-{seq}" if seq else "")
+        path = os.path.join(archive_dir, f"{stem}.log.{ext}")
+        if not any(os.path.exists(os.path.join(archive_dir, f"{stem}.log.{x}")) for x in EXTS):
+            return path
+        seq += 1
+
+def compact_file(src, name, ext, archive_dir=ARCHIVE_DIR):
+    """
+    Packt src blockweise nach archive_dir und loescht src. Liefert den
+    Pfad des Archivs (None bei leerer Datei). Im Speicher liegt nie mehr
+    als ein Block.
+    """
+    os.makedirs(archive_dir, exist_ok=True)
+    tmp = os.path.join(archive_dir, f".{name}-{os.getpid()}.part")
+    recs = []
+    t_prev = None
+    offset = 0
+    with _open_source(src) as inp, open(tmp, "wb") as out:
+        buf, n_lines, t_first, t_last = [], 0, None, None
+        size = 0
+
+        def flush():
+            nonlocal offset, buf, n_lines, t_first, t_last, size
+            data = b"".join(buf)
+            packed = compress_block(ext, data)
+            out.write(packed)
+            # Block ohne eigene Zeitmarke (nur Traceback) erbt die letzte
+            t0 = t_first if t_first is not None else (t_prev or 0.0)
+            recs.append((t0, t_last if t_last is not None else t0, offset,
+                         len(packed), len(data), n_lines))
+            offset += len(packed)
+            buf, n_lines, t_first, t_last, size = [], 0, None, None, 0
+
+        for line in inp:
+            t = parse_ts(line)
+            if t is not None:
+                if t_first is None:
+                    t_first = t
+                t_last = t_prev = t
+            elif not buf and t_prev is not None:
+                t_first = t_prev      # Block beginnt mitten im Traceback
+            buf.append(line)
+            n_lines += 1
+            size += len(line)
+            if size >= BLOCK_BYTES:
+                flush()
+        if buf:
+            flush()
+        out.flush()
+        os.fsync(out.fileno())
+    if not recs:
+        os.remove(tmp)
+        os.remove(src)
+        return None
+    first = next((r[0] for r in recs if r[0]), None) or os.path.getmtime(src)
+    path = _target(archive_dir, name, time.strftime("%Y-%m-%d", time.localtime(first)), ext)
+    # erst Index, dann Archiv, dann Quelle: ein Abbruch verliert nichts
+    _write_index(index_path(path), recs)
+    os.replace(tmp, path)
+    os.remove(src)
+    return path
+
+def prune(keep_days, max_mb, now=None, archive_dir=ARCHIVE_DIR):
+    """Archive aelter als keep_days loeschen, dann die aeltesten bis unter max_mb."""
+    now = now if now is not None else time.time()
+    cutoff = time.strftime("%Y-%m-%d", time.localtime(now - keep_days * 86400.0))
+    arcs = archives(archive_dir=archive_dir)
+    total = sum(a.size for a in arcs)
+    removed = []
+    for a in arcs:
+        if a.day >= cutoff and total <= max_mb * 1024 * 1024:
+            continue
+        total -= a.size
+        for p in (a.path, a.idx_path):
+            try:
+                os.remove(p)
+            except OSError:
+                pass
+        removed.append(a)
+    # Index ohne Archiv (Abbruch zwischen den beiden Umbenennungen)
+    live = {a.idx_path for a in archives(archive_dir=archive_dir)}
+    try:
+        for e in os.listdir(archive_dir):
+            p = os.path.join(archive_dir, e)
+            if (e.endswith(".idx") and p not in live) or e.endswith(".part"):
+                os.remove(p)
+    except OSError:
+        pass
+    return removed
+
+def compact(cfg, log_dir=LOG_DIR, archive_dir=ARCHIVE_DIR):
+    """Alle rotierten Logs packen und nach cfg aufraeumen."""
+    ext = pick_ext(cfg.log_compression)
+    for name in LOGS:
+        for src in rotated(name, log_dir):
+            t0 = time.monotonic()
+            raw = os.path.getsize(src)
+            try:
+                path = compact_file(src, name, ext, archive_dir)
+            except (OSError, EOFError, zlib.error) as e:
+                logger.error("Log-Archiv: %s nicht gepackt: %s", src, e)
+                continue
+            if path:
+                logger.info("Log-Archiv: %s -> %s (%d kB -> %d kB, %.1fs)",
+                            os.path.basename(src), os.path.basename(path), raw // 1024,
+                            os.path.getsize(path) // 1024, time.monotonic() - t0)
+    for a in prune(cfg.log_keep_days, cfg.log_max_mb, archive_dir=archive_dir):
+        logger.info("Log-Archiv: %s geloescht", os.path.basename(a.path))
+
+
+# ---------- Lesen ab Uhrzeit ----------
+def _plain_offset(f, t):
+    """Offset in einer unkomprimierten Logdatei, ab dem Zeilen >= t liegen koennen."""
+    lo, hi = 0, os.fstat(f.fileno()).st_size
+    while hi - lo > PLAIN_SCAN:
+        mid = (lo + hi) // 2
+        f.seek(mid)
+        f.readline()                  # angeschnittene Zeile
+        found = None
+        while found is None:
+            line = f.readline()
+            if not line:
+                break
+            found = parse_ts(line)
+        if found is None or found >= t:
+            hi = mid
+        else:
+            lo = mid
+    return lo
+
+def _plain_lines(path, t):
+    if path.endswith(".gz"):
+        with gzip.open(path, "rb") as f:
+            yield from f
+        return
+    with open(path, "rb") as f:
+        off = _plain_offset(f, t)
+        f.seek(off)
+        if off:
+            f.readline()
+        yield from f
+
+def sources(name, log_dir=LOG_DIR, archive_dir=ARCHIVE_DIR):
+    """(ende, lesefunktion(t)) aller Teile eines Logs, aelteste zuerst."""
+    out = []
+    for a in archives(name, archive_dir):
+        out.append((a.span()[1], a.iter_lines))
+    for p in rotated(name, log_dir):
+        out.append((os.path.getmtime(p), lambda t, p=p: _plain_lines(p, t)))
+    current = os.path.join(log_dir, name + ".log")
+    if os.path.exists(current):
+        out.append((float("inf"), lambda t: _plain_lines(current, t)))
+    return out
+
+def iter_from(name, t, **dirs):
+    """(zeitmarke, zeile) ab t ueber Archive, rotierte und aktuelle Datei."""
+    cur = None
+    for end, read in sources(name, **dirs):
+        if end < t:
+            continue
+        for line in read(t):
+            ts = parse_ts(line)
+            if ts is not None:
+                cur = ts
+            if cur is None or cur < t:
+                continue        # auch Fortsetzungszeilen vor t
+            yield cur, line.decode("utf-8", "replace")
+
+def read_page(name, t, skip=0, lines=200, **dirs):
+    """
+    Eine Seite ab t: (zeilen, weiter) mit weiter = (t, skip) fuer die
+    naechste Seite oder None am Ende. skip ueberspringt Zeilen mit genau
+    der Zeitmarke t (mehrere Zeilen in derselben Millisekunde).
+    """
+    out = []
+    last, same = t, skip
+    for ts, line in iter_from(name, t, **dirs):
+        if skip:
+            skip -= 1
+            continue
+        if len(out) >= lines:
+            return out, (last, same)
+        out.append(line)
+        if ts == last:
+            same += 1
+        else:
+            last, same = ts, 1
+    return out, None
+
+def summary(name, **dirs):
+    """Kennzahlen fuer die Weboberflaeche."""
+    arcs = archives(name, **dirs)
+    size = sum(a.size for a in arcs)
+    raw = sum(a.raw_size() for a in arcs)
+    return {"archives": len(arcs), "first": arcs[0].day if arcs else None,
+            "bytes": size, "ratio": raw / size if size and raw else None}
+
+
+# ---------- Skript ----------
+def main():
+    args = sys.argv[1:]
+    if not args or args[0] not in ("compact", "list", "show"):
+        print("Usage: log_archive.py compact | list | show <phone|ring> <zeit> [zeilen]",
+              file=sys.stderr)
+        sys.exit(2)
+    if args[0] == "compact":
+        from retro_config import ConfigStore
+        logging.basicConfig(level=logging.INFO, format="%(levelname)s %(message)s")
+        compact(ConfigStore().load())
+    elif args[0] == "list":
+        for a in archives():
+            raw = a.raw_size()
+            ratio = f"x{raw / a.size:.1f}" if raw and a.size else "ohne Index"
+            print(f"{a.name:<6} {a.day}  {EXTS[a.ext]:<5} {a.size // 1024:>7} kB  {ratio}")
+    else:
+        if len(args) < 3:
+            print("Usage: log_archive.py show <phone|ring> <zeit> [zeilen]", file=sys.stderr)
+            sys.exit(2)
+        page, _ = read_page(args[1], parse_when(args[2]),
+                            lines=int(args[3]) if len(args) > 3 else 50)
+        sys.stdout.write("".join(page))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,701 @@
+#!/usr/bin/env python3
+"""
+RetroPhone Log-Suche
+--------------------
+Volltext- und Zeitsuche ueber phone.log, ring.log, deren Archive
+(log_archive.py) und das Journal von baresip, ohne jedes Mal alles zu
+lesen.
+
+Index (SEARCH_DB, SQLite) auf Block-Ebene:
+
+  parts   ein Eintrag je Quelle: Archiv (archive:<datei>), unkomprimierte
+          Datei (plain:<dev>:<inode>, ueberlebt das Umbenennen bei der
+          Rotation) oder Journal (journal:baresip), mit Fortschritt
+  blocks  je Block Zeitspanne und Fundstelle: Archiv-Block (seq aus dem
+          .idx), Byte-Bereich einer Datei oder erster Journal-Cursor
+  terms   invertierter Index: Wort -> Block-IDs (array 'I' als BLOB)
+
+Woerter sind Folgen aus [a-z0-9_] ab zwei Zeichen, ohne die Zeitmarke
+am Zeilenanfang. Gesucht wird nach Wortanfaengen ("0301" findet
+"sip:030123@..."), alle Woerter muessen in derselben Zeile stehen. Der
+Index liefert die Bloecke, in denen alle Woerter vorkommen; nur die
+werden entpackt und Zeile fuer Zeile geprueft. Mit Regex gibt es keine
+Vorauswahl, nur die Zeitspanne grenzt ein. Eine Regex kann sich
+festrennen ("(a+)+$"), und das Budget wird nur zwischen Bloecken
+geprueft; die Weboberflaeche sucht mit Regex deshalb ueber
+search_isolated() in einem eigenen Prozess, der nach REGEX_KILL_SEC
+hart beendet wird.
+
+Der Index waechst inkrementell: update() liest nur neue volle Bloecke
+der laufenden Logs, neue Archive und neue Journal-Eintraege. Was noch
+nicht im Index ist (Rest unter einem Block, Journal seit dem letzten
+Block), liest die Suche direkt. Nachts laeuft update() nach dem Packen
+(retrophone-logs.service), die Weboberflaeche holt vor jeder Suche
+hoechstens UPDATE_BUDGET_SEC nach.
+
+Ergebnisse kommen seitenweise, nach Zeit gemischt ueber alle Quellen.
+Im Speicher liegt je Quelle ein Block; die Seite hat hoechstens
+PAGE_LINES Zeilen. Weiter geht es mit dem Cursor (zeit, skip) wie in
+der Log-Ansicht; auch eine nach SEARCH_BUDGET_SEC abgebrochene Suche
+liefert einen Cursor.
+
+Als Skript:
+  log_search.py update                      Index vollstaendig nachziehen
+  log_search.py search <woerter> [von] [bis]  Suche, z. B. "REGISTER_FAIL"
+  log_search.py stats                       Groesse des Index
+  log_search.py search-json                 Suche als JSON (stdin/stdout),
+                                            fuer search_isolated()
+"""
+
+import os
+import re
+import sys
+import json
+import time
+import heapq
+import sqlite3
+import logging
+from array import array
+
+import log_archive
+from log_archive import parse_ts
+
+logger = logging.getLogger("retrophone")
+
+SEARCH_DB = "/var/lib/retrophone/logsearch.db"
+SOURCES   = ("phone", "ring", "baresip")
+JOURNAL_UNIT = "baresip"
+
+BLOCK_BYTES   = log_archive.BLOCK_BYTES   # Bloecke unkomprimierter Dateien
+JOURNAL_BLOCK = 500       # Journal-Eintraege je Block
+BATCH_BLOCKS  = 16        # Bloecke je Transaktion beim Indizieren
+TERM_MAX      = 40        # laengere Woerter werden auf den Anfang gekuerzt
+JOURNAL_CHECK_SEC = 60.0  # journalctl fuer den Index hoechstens so oft starten
+
+PAGE_LINES        = 100
+LINE_MAX          = 400   # laengere Zeilen gekuerzt anzeigen
+REGEX_MAX         = 200
+SEARCH_BUDGET_SEC = 5.0
+REGEX_KILL_SEC    = SEARCH_BUDGET_SEC + 3.0   # inkl. Start von Python auf dem Pi Zero
+UPDATE_BUDGET_SEC = 1.0
+
+TOKEN_RE = re.compile(rb"[a-z0-9_]{2,}")
+TS_RE    = re.compile(rb"^\d{4}-\d\d-\d\d \d\d:\d\d:\d\d(?:,\d{3})? ", re.M)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS parts (
+    ident   TEXT PRIMARY KEY,
+    source  TEXT NOT NULL,
+    path    TEXT NOT NULL DEFAULT '',
+    done    INTEGER NOT NULL DEFAULT 0,   -- Archiv: Bloecke, Datei: Bytes
+    cursor  TEXT NOT NULL DEFAULT '',     -- Journal: letzter indizierter Eintrag
+    checked REAL NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS blocks (
+    id      INTEGER PRIMARY KEY AUTOINCREMENT,
+    ident   TEXT NOT NULL,
+    seq     INTEGER NOT NULL,
+    t_first REAL NOT NULL,
+    t_last  REAL NOT NULL,
+    offset  INTEGER NOT NULL DEFAULT 0,
+    length  INTEGER NOT NULL DEFAULT 0,
+    key     TEXT NOT NULL DEFAULT ''
+);
+CREATE INDEX IF NOT EXISTS blocks_ident ON blocks (ident, seq);
+CREATE TABLE IF NOT EXISTS terms (
+    term TEXT PRIMARY KEY,
+    ids  BLOB NOT NULL
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS meta (
+    key   TEXT PRIMARY KEY,
+    value REAL NOT NULL
+);
+"""
+
+
+def connect(path=SEARCH_DB):
+    con = sqlite3.connect(path, timeout=10.0)
+    con.execute("PRAGMA journal_mode=WAL")
+    con.execute("PRAGMA synchronous=NORMAL")
+    con.executescript(SCHEMA)
+    return con
+
+def terms_of(data: bytes):
+    """Woerter eines Blocks (ohne Zeitmarken), gekuerzt auf TERM_MAX."""
+    return {t[:TERM_MAX].decode("ascii") for t in TOKEN_RE.findall(TS_RE.sub(b"", data).lower())}
+
+
+# ---------- Teile ----------
+class Part:
+    """Ein Stueck einer Quelle: Archiv, Datei oder Journal."""
+
+    def __init__(self, ident, source, kind, path="", archive=None, final=True):
+        self.ident   = ident
+        self.source  = source
+        self.kind    = kind        # archive | plain | journal
+        self.path    = path
+        self.archive = archive
+        self.final   = final       # waechst nicht mehr (nicht die laufende Datei)
+
+def parts(log_dir=log_archive.LOG_DIR, archive_dir=log_archive.ARCHIVE_DIR, journal=True):
+    """Alle Teile je Quelle, aelteste zuerst."""
+    out = {}
+    for name in log_archive.LOGS:
+        lst = [Part("archive:" + os.path.basename(a.path), name, "archive", a.path, a)
+               for a in log_archive.archives(name, archive_dir)]
+        current = os.path.join(log_dir, name + ".log")
+        for p in log_archive.rotated(name, log_dir) + [current]:
+            if p.endswith(".gz"):
+                continue          # logrotate-Rest: wird beim naechsten Packen ein Archiv
+            try:
+                st = os.stat(p)
+            except OSError:
+                continue
+            lst.append(Part(f"plain:{st.st_dev}:{st.st_ino}", name, "plain", p,
+                            final=(p != current)))
+        out[name] = lst
+    if journal:
+        out[JOURNAL_UNIT] = [Part("journal:" + JOURNAL_UNIT, JOURNAL_UNIT, "journal")]
+    return out
+
+
+# ---------- Lesen ----------
+def _plain_chunks(path, start, final):
+    """
+    (offset, bytes) ab start in Bloecken von etwa BLOCK_BYTES bis zum
+    Zeilenende. Von der laufenden Datei (final=False) nur volle Bloecke.
+    """
+    with open(path, "rb") as f:
+        f.seek(start)
+        off = start
+        while True:
+            data = f.read(BLOCK_BYTES)
+            if not data:
+                return
+            if not data.endswith(b"\n"):
+                data += f.readline()
+            if not final and (len(data) < BLOCK_BYTES or not data.endswith(b"\n")):
+                return            # Rest liest die Suche direkt
+            yield off, data
+            off += len(data)
+
+def _plain_block(path, offset, length):
+    with open(path, "rb") as f:
+        f.seek(offset)
+        return f.read(length)
+
+def _span(data):
+    """(erste, letzte) Zeitmarke eines Blocks oder (None, None)."""
+    m = TS_RE.search(data)
+    if m is None:
+        return None, None
+    first = parse_ts(m.group(0))
+    # letzte Zeitmarke von hinten suchen statt alle Zeilen zu parsen
+    pos = len(data)
+    while pos > m.start():
+        pos = max(m.start(), pos - 4096)
+        last = None
+        for last in TS_RE.finditer(data, pos):
+            pass
+        if last is not None:
+            return first, parse_ts(last.group(0))
+    return first, first
+
+def _journal(args):
+    """Journal-Eintraege von baresip als (cursor, zeit, zeile als bytes)."""
+    import subprocess
+    cmd = ["journalctl", "-u", JOURNAL_UNIT, "-o", "json", "--no-pager"] + args
+    try:
+        proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+    except OSError:
+        return
+    try:
+        for raw in proc.stdout:
+            try:
+                e = json.loads(raw)
+                t = int(e["__REALTIME_TIMESTAMP"]) / 1e6
+            except (ValueError, KeyError, TypeError):
+                continue
+            msg = e.get("MESSAGE") or ""
+            if isinstance(msg, list):
+                msg = bytes(msg).decode("utf-8", "replace")
+            stamp = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(t))
+            line = f"{stamp},{int(t * 1000) % 1000:03d} {msg}\n".encode("utf-8", "replace")
+            yield e.get("__CURSOR", ""), t, line
+    finally:
+        proc.kill()
+        proc.wait()
+
+def _journal_block(key, count):
+    lines = []
+    for _, _, line in _journal(["--cursor", key]):
+        lines.append(line)
+        if len(lines) >= count:
+            break
+    return b"".join(lines)
+
+
+# ---------- Index ----------
+def _add_blocks(con, part, rows, done=None, cursor=None):
+    """Bloecke [(seq, t_first, t_last, offset, length, key, daten)] in einer Transaktion."""
+    postings = {}
+    with con:
+        for seq, t0, t1, offset, length, key, data in rows:
+            cur = con.execute("INSERT INTO blocks (ident, seq, t_first, t_last, offset, length, key) "
+                              "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                              (part.ident, seq, t0, t1, offset, length, key))
+            for term in terms_of(data):
+                postings.setdefault(term, array("I")).append(cur.lastrowid)
+        con.executemany("INSERT INTO terms (term, ids) VALUES (?, ?) "
+                        "ON CONFLICT(term) DO UPDATE SET ids = CAST(ids || excluded.ids AS BLOB)",
+                        ((t, ids.tobytes()) for t, ids in postings.items()))
+        if done is not None:
+            con.execute("UPDATE parts SET done = ?, path = ? WHERE ident = ?",
+                        (done, part.path, part.ident))
+        if cursor is not None:
+            con.execute("UPDATE parts SET cursor = ? WHERE ident = ?", (cursor, part.ident))
+
+def _drop(con, ident=None, before=None):
+    """Bloecke eines Teils (oder des Journals vor before) entfernen."""
+    with con:
+        if before is not None:
+            n = con.execute("DELETE FROM blocks WHERE ident = ? AND t_last < ?",
+                            (ident, before)).rowcount
+        else:
+            n = con.execute("DELETE FROM blocks WHERE ident = ?", (ident,)).rowcount
+            con.execute("DELETE FROM parts WHERE ident = ?", (ident,))
+        if n:
+            con.execute("INSERT INTO meta (key, value) VALUES ('dead', ?) "
+                        "ON CONFLICT(key) DO UPDATE SET value = value + excluded.value", (n,))
+
+def _vacuum_terms(con):
+    """Block-IDs geloeschter Bloecke aus den Listen werfen, wenn es sich lohnt."""
+    row = con.execute("SELECT value FROM meta WHERE key = 'dead'").fetchone()
+    dead = row[0] if row else 0
+    live = con.execute("SELECT COUNT(*) FROM blocks").fetchone()[0]
+    if dead < max(64, live // 2):
+        return
+    ids = {r[0] for r in con.execute("SELECT id FROM blocks")}
+    with con:
+        for term, blob in con.execute("SELECT term, ids FROM terms").fetchall():
+            kept = array("I", (i for i in _ids(blob) if i in ids))
+            if kept:
+                con.execute("UPDATE terms SET ids = ? WHERE term = ?", (kept.tobytes(), term))
+            else:
+                con.execute("DELETE FROM terms WHERE term = ?", (term,))
+        con.execute("DELETE FROM meta WHERE key = 'dead'")
+    logger.info("Log-Suche: Index bereinigt (%d Bloecke entfernt)", int(dead))
+
+_WORD = frozenset(b"abcdefghijklmnopqrstuvwxyz0123456789_")
+
+def _find_word(hay, tok, start=0, end=None):
+    """Erste Stelle, an der in hay[start:end] ein Wort mit tok beginnt, sonst -1."""
+    end = len(hay) if end is None else end
+    while True:
+        i = hay.find(tok, start, end)
+        if i <= 0 or hay[i - 1] not in _WORD:
+            return i
+        start = i + 1
+
+def _iter_word(hay, tok):
+    i = _find_word(hay, tok)
+    while i >= 0:
+        yield i
+        i = _find_word(hay, tok, i + 1)
+
+def _line_ts(data, start, t_begin):
+    """Zeitmarke der Zeile ab start oder der letzten Zeile davor, die eine hat."""
+    ts = parse_ts(data[start:start + log_archive.TS_LEN])
+    while ts is None and start > 0:
+        start = data.rfind(b"\n", 0, start - 1) + 1
+        ts = parse_ts(data[start:start + log_archive.TS_LEN])
+    return ts if ts is not None else t_begin
+
+def _ids(blob):
+    a = array("I")
+    a.frombytes(blob)
+    return a
+
+def _index_part(con, part, state, deadline, keep_sec):
+    """Neue Bloecke eines Teils indizieren. False, wenn die Zeit nicht gereicht hat."""
+    done, cursor, checked = state
+    batch = []
+
+    def flush(**progress):
+        _add_blocks(con, part, batch, **progress)
+        batch.clear()
+
+    if part.kind == "archive":
+        blocks = part.archive.blocks()
+        if not blocks:
+            return True
+        with open(part.path, "rb") as f:
+            for seq in range(done, len(blocks)):
+                t0, t1 = blocks[seq][0], blocks[seq][1]
+                batch.append((seq, t0, t1, 0, 0, "", part.archive.block(f, seq)))
+                if len(batch) >= BATCH_BLOCKS or seq == len(blocks) - 1:
+                    flush(done=seq + 1)
+                    if deadline and time.monotonic() > deadline:
+                        return seq + 1 == len(blocks)
+        return True
+
+    if part.kind == "plain":
+        seq = con.execute("SELECT COALESCE(MAX(seq) + 1, 0) FROM blocks WHERE ident = ?",
+                          (part.ident,)).fetchone()[0]
+        t_prev = con.execute("SELECT COALESCE(MAX(t_last), 0) FROM blocks WHERE ident = ?",
+                             (part.ident,)).fetchone()[0]
+        for off, data in _plain_chunks(part.path, done, part.final):
+            t0, t1 = _span(data)
+            if t0 is None or (t_prev and not TS_RE.match(data)):
+                t0 = t_prev           # Block beginnt mitten im Traceback
+            t1 = t1 if t1 is not None else t0
+            t_prev = t1
+            batch.append((seq, t0, t1, off, len(data), "", data))
+            seq += 1
+            if len(batch) >= BATCH_BLOCKS:
+                flush(done=off + len(data))
+                if deadline and time.monotonic() > deadline:
+                    return False
+        if batch:
+            flush(done=batch[-1][3] + batch[-1][4])
+        elif part.path:
+            con.execute("UPDATE parts SET path = ? WHERE ident = ?", (part.path, part.ident))
+            con.commit()
+        return True
+
+    # Journal: nur volle Bloecke; der Rest kommt bei der Suche direkt
+    now = time.time()
+    if now - checked < JOURNAL_CHECK_SEC:
+        return True
+    with con:
+        con.execute("UPDATE parts SET checked = ? WHERE ident = ?", (now, part.ident))
+    _drop(con, part.ident, before=now - keep_sec)
+    args = ["--after-cursor", cursor] if cursor else ["--since", f"@{int(now - keep_sec)}"]
+    seq = con.execute("SELECT COALESCE(MAX(seq) + 1, 0) FROM blocks WHERE ident = ?",
+                      (part.ident,)).fetchone()[0]
+    entries = []
+    for cur, t, line in _journal(args):
+        entries.append((cur, t, line))
+        if len(entries) < JOURNAL_BLOCK:
+            continue
+        batch.append((seq, entries[0][1], entries[-1][1], 0, len(entries), entries[0][0],
+                      b"".join(e[2] for e in entries)))
+        seq += 1
+        last = entries[-1][0]
+        entries = []
+        if len(batch) >= BATCH_BLOCKS:
+            flush(cursor=last)
+            if deadline and time.monotonic() > deadline:
+                return False
+    if batch:
+        flush(cursor=last)
+    return True
+
+def update(con, keep_days=90, budget=None, sources=SOURCES, **dirs):
+    """
+    Index nachziehen: verschwundene Teile entfernen, neue Bloecke
+    aufnehmen. Laufende Logs und neueste Archive zuerst. Liefert True,
+    wenn alles im Index ist.
+    """
+    deadline = time.monotonic() + budget if budget else None
+    found = parts(journal=JOURNAL_UNIT in sources, **dirs)
+    present = {p.ident for lst in found.values() for p in lst}
+    for (ident,) in con.execute("SELECT ident FROM parts").fetchall():
+        if ident not in present and not ident.startswith("journal:"):
+            _drop(con, ident)
+    state = {r[0]: r[1:] for r in con.execute("SELECT ident, done, cursor, checked FROM parts")}
+    complete = True
+    for name in sources:
+        for part in reversed(found.get(name, [])):
+            if part.kind == "plain" and part.ident in state and \
+                    os.path.getsize(part.path) < state[part.ident][0]:
+                _drop(con, part.ident)       # gekuerzt: neu indizieren
+                del state[part.ident]
+            if part.ident not in state:
+                with con:
+                    con.execute("INSERT INTO parts (ident, source, path) VALUES (?, ?, ?)",
+                                (part.ident, part.source, part.path))
+                state[part.ident] = (0, "", 0.0)
+            if deadline and time.monotonic() > deadline:
+                return False
+            try:
+                complete &= _index_part(con, part, state[part.ident], deadline, keep_days * 86400.0)
+            except (OSError, EOFError, ValueError) as e:
+                logger.warning("Log-Suche: %s nicht indiziert: %s", part.path or part.ident, e)
+    _vacuum_terms(con)
+    return complete
+
+
+# ---------- Suche ----------
+class Matcher:
+    """Woerter (Wortanfang, alle in einer Zeile, ohne Gross/Klein) oder Regex."""
+
+    def __init__(self, query, regex=False):
+        self.query = (query or "").strip()
+        self.regex = None
+        self.tokens = []
+        if regex:
+            if len(self.query) > REGEX_MAX:
+                raise ValueError(f"Regex laenger als {REGEX_MAX} Zeichen")
+            try:
+                self.regex = re.compile(self.query.encode("utf-8"), re.I | re.M)
+            except re.error as e:
+                raise ValueError(f"Regex: {e}")
+        else:
+            # laengstes Wort zuerst: meist das seltenste, danach wird im Block gesucht
+            self.tokens = sorted(TOKEN_RE.findall(self.query.encode("utf-8").lower()),
+                                 key=len, reverse=True)
+
+    def lines(self, data, t_begin):
+        """
+        Passende Zeilen eines Blocks als (zeit, zeile). Gesucht wird im
+        ganzen Block; Zeitmarken werden nur fuer Treffer gelesen, eine
+        Fortsetzungszeile bekommt die Zeit der Zeile davor.
+        """
+        if self.regex is None and not self.tokens:
+            cur = t_begin
+            for line in data.splitlines():
+                cur = parse_ts(line) or cur
+                yield cur, line
+            return
+        if self.regex is not None:
+            hits = (m.start() for m in self.regex.finditer(data))
+            hay = data
+        else:
+            # bytes.find statt Regex mit Lookbehind: ein Vielfaches schneller
+            hay = data.lower()
+            if any(_find_word(hay, t) < 0 for t in self.tokens[1:]):
+                return
+            hits = _iter_word(hay, self.tokens[0])
+        done = -1
+        for pos in hits:
+            start = hay.rfind(b"\n", 0, pos) + 1
+            if start <= done:
+                continue          # Zeile schon geprueft
+            end = hay.find(b"\n", pos)
+            end = len(hay) if end < 0 else end
+            done = end
+            if all(_find_word(hay, t, start, end) >= 0 for t in self.tokens[1:]):
+                yield _line_ts(data, start, t_begin), data[start:end]
+
+    def candidates(self, con):
+        """Block-IDs mit allen Woertern, None = keine Vorauswahl moeglich."""
+        if not self.tokens:
+            return None
+        result = None
+        for tok in self.tokens:
+            key = tok[:TERM_MAX].decode("ascii")
+            ids = set()
+            for (blob,) in con.execute("SELECT ids FROM terms WHERE term >= ? AND term < ?",
+                                       (key, key + "\uffff")):
+                ids.update(_ids(blob))
+            result = ids if result is None else result & ids
+            if not result:
+                break
+        return result
+
+
+def _block_rows(con, part, t0, t1):
+    return con.execute("SELECT id, seq, t_first, t_last, offset, length, key FROM blocks "
+                       "WHERE ident = ? AND t_last >= ? AND t_first <= ? ORDER BY seq",
+                       (part.ident, t0, t1)).fetchall()
+
+def _chunks(con, part, state, cands, t0, t1):
+    """(t_erste, t_letzte, daten) der Bloecke eines Teils, die Treffer enthalten koennen."""
+    done, cursor = state[0], state[1]
+    for bid, seq, bt0, bt1, offset, length, key in _block_rows(con, part, t0, t1):
+        if cands is not None and bid not in cands:
+            continue
+        if part.kind == "archive":
+            with open(part.path, "rb") as f:
+                yield bt0, bt1, part.archive.block(f, seq)
+        elif part.kind == "plain":
+            yield bt0, bt1, _plain_block(part.path, offset, length)
+        else:
+            yield bt0, bt1, _journal_block(key, length)
+    # noch nicht im Index: direkt lesen
+    if part.kind == "archive":
+        blocks = part.archive.blocks()
+        if not blocks:
+            yield from _grouped(part.archive.iter_lines())
+            return
+        with open(part.path, "rb") as f:
+            for seq in range(done, len(blocks)):
+                if blocks[seq][1] >= t0 and blocks[seq][0] <= t1:
+                    yield blocks[seq][0], blocks[seq][1], part.archive.block(f, seq)
+    elif part.kind == "plain":
+        start = done
+        if t0 > 0:
+            with open(part.path, "rb") as f:
+                start = max(done, log_archive._plain_offset(f, t0))
+                if start > done:
+                    f.seek(start)
+                    start += len(f.readline())
+        for _, data in _plain_chunks(part.path, start, True):
+            yield from _unindexed(data)
+    else:
+        args = ["--after-cursor", cursor] if cursor else []
+        if t0 > 0:
+            args += ["--since", f"@{int(t0)}"]
+        if t1 < float("inf"):
+            args += ["--until", f"@{int(t1) + 1}"]
+        yield from _grouped(line for _, _, line in _journal(args))
+
+def _unindexed(data):
+    t_first, t_last = _span(data)
+    if t_first is not None:
+        yield t_first, t_last, data
+
+def _grouped(lines):
+    """Zeilen ohne Index in Bloecken von etwa BLOCK_BYTES."""
+    buf, size = [], 0
+    for line in lines:
+        buf.append(line)
+        size += len(line)
+        if size >= BLOCK_BYTES:
+            yield from _unindexed(b"".join(buf))
+            buf, size = [], 0
+    if buf:
+        yield from _unindexed(b"".join(buf))
+
+def _source_hits(con, source, plist, state, matcher, cands, t0, t1, stats):
+    """
+    Treffer einer Quelle in Zeitfolge: (zeit, quelle, zeile). Nach jedem
+    Block ein Marker (zeit, quelle, None) fuer Budget und Cursor.
+    """
+    for part in plist:
+        st = state.get(part.ident, (0, "", 0.0))
+        for t_begin, t_end, data in _chunks(con, part, st, cands, t0, t1):
+            stats["blocks"] += 1
+            for cur, line in matcher.lines(data, t_begin):
+                if cur < t0:
+                    continue
+                if cur > t1:
+                    return
+                text = line.decode("utf-8", "replace")
+                if len(text) > LINE_MAX:
+                    text = text[:LINE_MAX] + " ..."
+                yield cur, source, text
+            if t_end > t1:
+                return
+            yield t_end, source, None
+
+def search(con, query="", sources=SOURCES, t0=None, t1=None, regex=False, cursor=None,
+           lines=PAGE_LINES, budget=SEARCH_BUDGET_SEC, **dirs):
+    """
+    Eine Seite Treffer. Liefert dict mit lines [(zeit, quelle, text)],
+    next (zeit, skip) oder None, blocks (gelesene Bloecke), elapsed und
+    partial (Budget erschoepft, next setzt fort). ValueError bei
+    ungueltiger Regex.
+    """
+    matcher = Matcher(query, regex)
+    t_start = time.monotonic()
+    t0 = t0 if t0 is not None else 0.0
+    t1 = t1 if t1 is not None else float("inf")
+    skip = 0
+    if cursor:
+        t0, skip = max(t0, cursor[0]), cursor[1]
+    cands = matcher.candidates(con)
+    state = {r[0]: r[1:] for r in con.execute("SELECT ident, done, cursor FROM parts")}
+    found = parts(journal=JOURNAL_UNIT in sources, **dirs)
+    stats = {"blocks": 0}
+    streams = [_source_hits(con, s, found.get(s, []), state, matcher, cands, t0, t1, stats)
+               for s in sources]
+    out, nxt, partial = [], None, False
+    last, same = t0, skip
+    for ts, source, text in heapq.merge(*streams, key=lambda r: r[0]):
+        if ts != last:
+            last, same = ts, 0
+        if text is None:
+            if time.monotonic() - t_start > budget:
+                nxt, partial = (last, same), True
+                break
+            continue
+        if skip and ts == t0:
+            skip -= 1
+            continue
+        if len(out) >= lines:
+            nxt = (last, same)
+            break
+        out.append((ts, source, text))
+        same += 1
+    for s in streams:
+        s.close()
+    return {"lines": out, "next": nxt, "blocks": stats["blocks"], "partial": partial,
+            "elapsed": time.monotonic() - t_start}
+
+def search_isolated(query="", sources=SOURCES, t0=None, t1=None, regex=True, cursor=None,
+                    timeout=REGEX_KILL_SEC):
+    """
+    search() in einem Kindprozess, der nach timeout Sekunden beendet
+    wird, ob die Regex im Block festhaengt oder nicht. Gleiches Ergebnis
+    wie search(); ValueError bei ungueltiger oder zu teurer Regex.
+    """
+    import subprocess
+    Matcher(query, regex)          # Syntaxfehler hier melden, ohne Prozess
+    req = {"query": query, "sources": list(sources), "t0": t0, "t1": t1,
+           "regex": regex, "cursor": cursor}
+    try:
+        proc = subprocess.run([sys.executable, os.path.abspath(__file__), "search-json"],
+                              input=json.dumps(req).encode("utf-8"),
+                              capture_output=True, timeout=timeout)
+    except subprocess.TimeoutExpired:
+        logger.warning("Log-Suche: Regex %r nach %.0fs abgebrochen", query, timeout)
+        raise ValueError(f"Regex zu aufwendig, nach {timeout:.0f} s abgebrochen")
+    if proc.returncode != 0:
+        err = proc.stderr.decode("utf-8", "replace").strip().splitlines()
+        raise OSError(err[-1] if err else f"log_search.py Exit {proc.returncode}")
+    res = json.loads(proc.stdout)
+    res["lines"] = [tuple(r) for r in res["lines"]]
+    res["next"] = tuple(res["next"]) if res["next"] else None
+    return res
+
+def stats(con, path=SEARCH_DB):
+    blocks = con.execute("SELECT COUNT(*) FROM blocks").fetchone()[0]
+    terms = con.execute("SELECT COUNT(*) FROM terms").fetchone()[0]
+    size = sum(os.path.getsize(p) for p in (path, path + "-wal") if os.path.exists(p))
+    return {"blocks": blocks, "terms": terms, "bytes": size}
+
+
+# ---------- Skript ----------
+def main():
+    args = sys.argv[1:]
+    if args[:1] == ["search-json"]:
+        req = json.load(sys.stdin)
+        con = connect()
+        try:
+            res = search(con, req["query"], req["sources"], req["t0"], req["t1"],
+                         req["regex"], req["cursor"])
+        finally:
+            con.close()
+        json.dump(res, sys.stdout)
+        return
+    if not args or args[0] not in ("update", "search", "stats"):
+        print("Usage: log_search.py update | search <woerter> [von] [bis] | stats", file=sys.stderr)
+        sys.exit(2)
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s %(message)s")
+    con = connect()
+    if args[0] == "update":
+        from retro_config import ConfigStore
+        t = time.monotonic()
+        update(con, keep_days=ConfigStore().load().log_keep_days)
+        s = stats(con)
+        print(f"Index: {s['blocks']} Bloecke, {s['terms']} Woerter, "
+              f"{s['bytes'] / 1048576:.1f} MB ({time.monotonic() - t:.1f}s)")
+    elif args[0] == "stats":
+        print(stats(con))
+    else:
+        if len(args) < 2:
+            print("Usage: log_search.py search <woerter> [von] [bis]", file=sys.stderr)
+            sys.exit(2)
+        t0 = log_archive.parse_when(args[2]) if len(args) > 2 else None
+        t1 = log_archive.parse_when(args[3]) if len(args) > 3 else None
+        res = search(con, args[1], t0=t0, t1=t1)
+        for _, source, text in res["lines"]:
+            print(f"{source:<8} {text}")
+        print(f"-- {len(res['lines'])} Treffer, {res['blocks']} Bloecke, "
+              f"{res['elapsed'] * 1000:.0f} ms{', weiter' if res['next'] else ''}",
+              file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
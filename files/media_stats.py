@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+"""
+RetroPhone Audioqualitaet je Call
+---------------------------------
+baresip schickt waehrend eines Gespraechs bei jedem RTCP-Report ein
+Event CALL_RTCP mit den Zaehlern des Audio-Streams:
+
+  "rtcp_stats": {"tx": {"sent", "lost", "jit"},    Sicht der Gegenstelle
+                 "rx": {"sent", "lost", "jit"},    was bei uns ankommt
+                 "rtt": ...}                       Jitter und RTT in us
+
+MediaStats verdichtet die Reports eines Calls zu festen Histogrammen
+(Jitter, Verlust je Intervall, RTT) und ein paar Summen: O(1) pro
+Report, ein paar hundert Bytes pro Call im CDR (Spalte media, JSON).
+Dazu kommt start_ms: Zeit von der Annahme bis zum ersten Audio-Paket
+(Event CALL_RTPESTAB).
+
+recommend() wertet die Histogramme vieler Calls aus und schlaegt
+jitter_buffer_type/-delay und opus_bitrate fuer die baresip config vor.
+"""
+
+import math
+
+# Bucket-Obergrenzen; letzter Bucket = alles darueber
+JITTER_BUCKETS_MS = (5, 10, 20, 30, 40, 60, 80, 120, 160, 240)
+LOSS_BUCKETS_PCT  = (0.5, 1, 2, 5, 10, 20)
+RTT_BUCKETS_MS    = (50, 100, 150, 200, 300, 500, 1000)
+START_BUCKETS_MS  = (50, 100, 200, 300, 500, 1000, 2000, 5000)
+
+PTIME_MS = 20      # Paketdauer (baresip ptime), Umrechnung Frames <-> ms
+
+
+def _bucket(edges, value):
+    for i, limit in enumerate(edges):
+        if value <= limit:
+            return i
+    return len(edges)
+
+
+class MediaStats:
+    __slots__ = ("reports", "jit", "loss", "rtt", "jit_max", "rtt_max",
+                 "rx", "rx_lost", "tx", "tx_lost", "start_ms", "_last_rx", "_last_lost")
+
+    def __init__(self):
+        self.reports   = 0
+        self.jit       = [0] * (len(JITTER_BUCKETS_MS) + 1)
+        self.loss      = [0] * (len(LOSS_BUCKETS_PCT) + 1)
+        self.rtt       = [0] * (len(RTT_BUCKETS_MS) + 1)
+        self.jit_max   = 0.0
+        self.rtt_max   = 0.0
+        self.rx        = 0       # empfangene Pakete (kumuliert, letzter Report)
+        self.rx_lost   = 0
+        self.tx        = 0
+        self.tx_lost   = 0       # laut Gegenstelle verloren
+        self.start_ms  = None    # Annahme -> erstes Audio-Paket
+        self._last_rx   = 0
+        self._last_lost = 0
+
+    def feed(self, st: dict):
+        """Einen rtcp_stats-Report aus dem CALL_RTCP Event einrechnen."""
+        if not st:
+            return
+        rx, tx = st.get("rx") or {}, st.get("tx") or {}
+        self.reports += 1
+        jit_ms = (rx.get("jit") or 0) / 1000.0
+        self.jit[_bucket(JITTER_BUCKETS_MS, jit_ms)] += 1
+        self.jit_max = max(self.jit_max, jit_ms)
+        rtt_ms = (st.get("rtt") or 0) / 1000.0
+        if rtt_ms > 0:
+            self.rtt[_bucket(RTT_BUCKETS_MS, rtt_ms)] += 1
+            self.rtt_max = max(self.rtt_max, rtt_ms)
+        # Zaehler sind kumuliert: Verlust dieses Intervalls aus den Differenzen
+        got = max(0, int(rx.get("sent") or 0) - self._last_rx)
+        lost = max(0, int(rx.get("lost") or 0) - self._last_lost)
+        if got + lost:
+            self.loss[_bucket(LOSS_BUCKETS_PCT, 100.0 * lost / (got + lost))] += 1
+        self._last_rx, self._last_lost = int(rx.get("sent") or 0), int(rx.get("lost") or 0)
+        self.rx, self.rx_lost = self._last_rx, max(0, self._last_lost)
+        self.tx, self.tx_lost = int(tx.get("sent") or 0), max(0, int(tx.get("lost") or 0))
+
+    @property
+    def loss_pct(self) -> float:
+        total = self.rx + self.rx_lost
+        return 100.0 * self.rx_lost / total if total else 0.0
+
+    def encode(self) -> str:
+        """Kompaktes JSON fuer die CDR-Spalte media ('' ohne Reports und Startzeit)."""
+        if not self.reports and self.start_ms is None:
+            return ""
+        d = {
+            "n": self.reports, "jit": self.jit, "loss": self.loss, "rtt": self.rtt,
+            "jit_max": round(self.jit_max, 1), "rtt_max": round(self.rtt_max, 1),
+            "rx": self.rx, "rx_lost": self.rx_lost, "tx": self.tx, "tx_lost": self.tx_lost,
+        }
+        if self.start_ms is not None:
+            d["start_ms"] = round(self.start_ms)
+        # json erst hier: media_stats wird vor "Hook live" geladen
+        import json
+        return json.dumps(d, separators=(",", ":"))
+
+
+def decode(text: str):
+    """CDR-Spalte media -> dict oder None."""
+    if not text:
+        return None
+    import json
+    try:
+        d = json.loads(text)
+    except ValueError:
+        return None
+    if not isinstance(d, dict) or not (d.get("n") or d.get("start_ms") is not None):
+        return None
+    return d
+
+
+def summary(d) -> str:
+    """Kurzform fuer die Anrufliste."""
+    if not d:
+        return ""
+    parts = []
+    if d.get("start_ms") is not None:
+        parts.append(f"Start {d['start_ms']} ms")
+    if d["n"]:
+        total = d["rx"] + d["rx_lost"]
+        loss = 100.0 * d["rx_lost"] / total if total else 0.0
+        # Bucket-Obergrenze kann ueber dem gemessenen Maximum liegen
+        j95 = min(percentile(d["jit"], JITTER_BUCKETS_MS, 95), d["jit_max"])
+        parts.append(f"Verlust {loss:.1f}%, Jitter p95 {j95:.0f} ms, max {d['jit_max']:.0f} ms")
+    return ", ".join(parts)
+
+
+# ---------- Auswertung ueber viele Calls ----------
+def merge(dists):
+    """Histogramme mehrerer Calls addieren."""
+    out = {"n": 0, "calls": 0, "jit": [0] * (len(JITTER_BUCKETS_MS) + 1),
+           "loss": [0] * (len(LOSS_BUCKETS_PCT) + 1), "rtt": [0] * (len(RTT_BUCKETS_MS) + 1),
+           "start": [0] * (len(START_BUCKETS_MS) + 1)}
+    for d in dists:
+        if not d:
+            continue
+        out["calls"] += 1
+        out["n"] += d["n"]
+        for key in ("jit", "loss", "rtt"):
+            out[key] = [a + b for a, b in zip(out[key], d.get(key) or [])]
+        if d.get("start_ms") is not None:
+            out["start"][_bucket(START_BUCKETS_MS, d["start_ms"])] += 1
+    return out
+
+def percentile(hist, edges, p):
+    """Obergrenze des Buckets, in dem das p-Perzentil liegt (letzter = 2 x letzte Grenze)."""
+    total = sum(hist)
+    if not total:
+        return 0
+    need = total * p / 100.0
+    acc = 0
+    for i, n in enumerate(hist):
+        acc += n
+        if acc >= need:
+            return edges[i] if i < len(edges) else edges[-1] * 2
+    return edges[-1] * 2
+
+def recommend(merged, ptime=PTIME_MS):
+    """
+    Vorschlaege fuer die baresip config aus der Verteilung. Liefert Liste
+    (schluessel, wert, begruendung). Faustregeln:
+    - RFC 3550 Jitter ist eine mittlere Abweichung; Spitzen liegen bei
+      etwa 3-4 x. Der Puffer soll das p95 davon abdecken.
+    - stark streuender Jitter (p95 > 3 x p50): adaptiver Puffer.
+    - Verlust p95 ueber 2 %: kleinere Opus-Bitrate plus Inband-FEC.
+    """
+    if merged["n"] < 10:
+        return []
+    j50 = percentile(merged["jit"], JITTER_BUCKETS_MS, 50)
+    j95 = percentile(merged["jit"], JITTER_BUCKETS_MS, 95)
+    l95 = percentile(merged["loss"], LOSS_BUCKETS_PCT, 95)
+    lo = max(2, math.ceil(2 * j50 / ptime))
+    hi = max(lo + 2, math.ceil(4 * j95 / ptime))
+    out = []
+    if j95 > 3 * max(j50, 5):
+        out.append(("jitter_buffer_type", "adaptive",
+                    f"Jitter streut stark (p50 {j50} ms, p95 {j95} ms)"))
+    else:
+        out.append(("jitter_buffer_type", "fixed", f"Jitter gleichmaessig (p50 {j50} ms, p95 {j95} ms)"))
+    out.append(("jitter_buffer_delay", f"{lo}-{hi}",
+                f"deckt ~4 x Jitter p95 = {4 * j95} ms bei ptime {ptime} ms"))
+    if l95 > 5:
+        out.append(("opus_bitrate", "16000", f"Verlust p95 {l95}%: wenig Bitrate, mehr Redundanz"))
+        out.append(("opus_inbandfec", "yes", "Verluste per FEC ueberbruecken"))
+        out.append(("opus_packetloss", str(min(int(l95), 20)), "erwarteter Verlust fuer den Encoder"))
+    elif l95 > 2:
+        out.append(("opus_bitrate", "20000", f"Verlust p95 {l95}%: etwas Bitrate fuer FEC freimachen"))
+        out.append(("opus_inbandfec", "yes", "Verluste per FEC ueberbruecken"))
+    else:
+        out.append(("opus_bitrate", "28000", f"Verlust p95 {l95}%: Standard-Bitrate passt"))
+    return out
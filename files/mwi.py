@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+RetroPhone Nachrichtenanzeige (MWI)
+-----------------------------------
+Ein Waehlscheibentelefon hat kein Display. Neue Nachrichten zeigt der
+Daemon darum mit einem kurzen, eigenen Glockenzeichen an, solange der
+Hoerer aufliegt und kein Call laeuft, hoechstens alle mwi_repeat_sec.
+
+Neue Nachrichten sind:
+
+- Voicemail beim Provider: baresip (Modul mwi) abonniert message-summary
+  (RFC 3842) und meldet jedes NOTIFY als ctrl_tcp Event MWI_NOTIFY,
+  param = Body, z. B. "Messages-Waiting: yes\\r\\nVoice-Message: 2/5"
+- ungehoerte Nachrichten des eigenen Anrufbeantworters (voicemail.py)
+- verpasste Anrufe seit dem letzten Abheben (mwi_missed)
+
+Abhoeren: die Nummer playback_code waehlen (siehe phone_daemon.py).
+"""
+
+import re
+import time
+import logging
+
+logger = logging.getLogger("retrophone")
+
+VOICE_RE   = re.compile(r"^\s*Voice-Message\s*:\s*(\d+)\s*/\s*(\d+)", re.I | re.M)
+WAITING_RE = re.compile(r"^\s*Messages-Waiting\s*:\s*(yes|no)", re.I | re.M)
+
+MIN_GAP_SEC     = 60.0     # neue Nachricht: Zeichen frueher, aber nicht oefter als das
+DEFAULT_PATTERN = (80, 200, 80, 200, 80)
+PATTERN_MAX_MS  = 3000     # laenger ist kein "kurzes" Zeichen mehr
+
+
+def parse_summary(body: str):
+    """message-summary Body -> (wartend, neu, alt)."""
+    body = body or ""
+    m = VOICE_RE.search(body)
+    new, old = (int(m.group(1)), int(m.group(2))) if m else (0, 0)
+    w = WAITING_RE.search(body)
+    waiting = w.group(1).lower() == "yes" if w else new > 0
+    return waiting, new, old
+
+def parse_pattern(text: str):
+    """'80,200,80' -> (80, 200, 80): abwechselnd Glocke an / aus in ms."""
+    try:
+        pattern = tuple(int(x) for x in text.replace(" ", "").split(",") if x)
+    except ValueError:
+        return DEFAULT_PATTERN
+    if (not pattern or len(pattern) % 2 == 0 or any(ms < 10 for ms in pattern)
+            or sum(pattern) > PATTERN_MAX_MS):
+        return DEFAULT_PATTERN
+    return pattern
+
+
+class MessageWaiting:
+    def __init__(self):
+        self.remote = {}        # aor -> (wartend, neu, alt)
+        self.local_new = 0      # ungehoerte Nachrichten des Anrufbeantworters
+        self.missed = 0         # verpasste Anrufe seit dem letzten Abheben
+        self.last_signal = 0.0
+        self.check_at = None    # naechste Pruefung (Wanduhr); None = nichts zu tun
+        self.signals = 0
+
+    def update_remote(self, ev) -> bool:
+        """MWI_NOTIFY eintragen; True bei Aenderung."""
+        aor = ev.get("accountaor") or ""
+        state = parse_summary(ev.get("param") or "")
+        if self.remote.get(aor) == state:
+            return False
+        self.remote[aor] = state
+        return True
+
+    def remote_new(self):
+        return sum(new or int(waiting) for waiting, new, _ in self.remote.values())
+
+    def pending(self, with_missed=True):
+        """Anzahl neuer Nachrichten (Provider + lokal [+ verpasst])."""
+        return self.remote_new() + self.local_new + (self.missed if with_missed else 0)
+
+    def poke(self, now=None):
+        """Etwas Neues ist da: bald pruefen, aber nicht schneller als MIN_GAP_SEC."""
+        now = now if now is not None else time.time()
+        at = max(now, self.last_signal + MIN_GAP_SEC)
+        self.check_at = at if self.check_at is None else min(self.check_at, at)
+
+    def due(self, now):
+        return self.check_at is not None and now >= self.check_at
+
+    def checked(self, now, pending, signalled, repeat_sec):
+        """Nach der Pruefung: wiederholen, solange etwas ansteht."""
+        if signalled:
+            self.last_signal = now
+            self.signals += 1
+        self.check_at = now + repeat_sec if pending else None
+
+    def seen(self):
+        """Hoerer abgehoben: verpasste Anrufe gelten als gesehen."""
+        self.missed = 0
+
+    def snapshot(self):
+        return {"remote": {aor: {"waiting": w, "new": n, "old": o}
+                           for aor, (w, n, o) in self.remote.items()},
+                "local_new": self.local_new, "missed": self.missed,
+                "last_signal": self.last_signal, "signals": self.signals}
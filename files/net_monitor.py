@@ -0,0 +1,467 @@
+#!/usr/bin/env python3
+"""
+RetroPhone Netzwerk-Monitor
+---------------------------
+Eigener Thread im Daemon, zwei Aufgaben:
+
+1. Qualitaet der Strecke zum Registrar messen. Alle net_probe_sec
+   Sekunden gehen net_probe_count SIP OPTIONS an denselben Server, den
+   baresip nimmt: den outbound-Proxy des Accounts, sonst die Domain.
+   Ziel ist eine SIP-URI; Port und transport daraus gelten, ohne Port
+   sucht der Monitor wie RFC 3263 per SRV (_sip._udp, _sip._tcp,
+   _sips._tcp) und faellt auf A + 5060/5061 zurueck. UDP von einem
+   eigenen Socket, TCP/TLS ueber eine Verbindung je Runde (Aufbau zaehlt
+   nicht mit). Jede Antwort zaehlt (auch 401/404/405); ICMP braeuchte
+   Root-Rechte. Ergebnis je Runde: RTT min/median/max, Jitter (mittlere
+   Differenz aufeinanderfolgender RTTs, wie RFC 3550) und Verlust in
+   Prozent.
+2. WLAN-Stromsparmodus. brcmfmac schaltet power_save nach jedem
+   Reconnect wieder ein (einseitiges Audio, verpasste INVITEs). Der
+   Monitor prueft ihn mit `iw` und schaltet ihn per sudo wieder aus.
+
+Die Runden landen in einem Ringpuffer (deque mit maxlen); snapshot()
+liefert sie der Weboberflaeche ueber den Daemon-IPC.
+
+Als Skript:  net_monitor.py <host|sip-uri> [anzahl]   eine Messrunde ausgeben
+"""
+
+import os
+import sys
+import time
+import ssl
+import uuid
+import random
+import select
+import socket
+import struct
+import ipaddress
+import logging
+import threading
+import subprocess
+from collections import deque
+
+logger = logging.getLogger("retrophone")
+
+SIP_PORT        = 5060
+SIPS_PORT       = 5061
+SRV_PREFIX      = {"udp": "_sip._udp", "tcp": "_sip._tcp", "tls": "_sips._tcp"}
+RESOLV_CONF     = "/etc/resolv.conf"
+DNS_TIMEOUT     = 2.0
+PROBE_GAP       = 0.2      # Abstand der OPTIONS innerhalb einer Runde (s)
+PROBE_TIMEOUT   = 1.0      # Antwortfrist je OPTIONS (s)
+RESOLVE_TTL     = 600.0    # DNS-Ergebnis so lange wiederverwenden
+HISTORY         = 120      # Runden im Ringpuffer (2 h bei 60 s)
+PS_CHECK_SEC    = 300.0    # so oft power_save pruefen
+IW              = "/usr/sbin/iw"
+SUDO            = "/usr/bin/sudo"
+
+
+# ---------- Ziel (SIP-URI) ----------
+def parse_target(uri: str):
+    """
+    "sip:proxy.example.ch:5080;transport=tcp" -> (host, port|None, transport).
+    Ohne Schema gilt die Angabe als Host, sips: bedeutet TLS.
+    """
+    uri = uri.strip().strip("<>")
+    scheme, sep, rest = uri.partition(":")
+    if not sep or scheme.lower() not in ("sip", "sips"):
+        scheme, rest = "sip", uri
+    hostport, *params = rest.split(";")
+    hostport = hostport.rsplit("@", 1)[-1]
+    transport = "tls" if scheme.lower() == "sips" else "udp"
+    for p in params:
+        k, _, v = p.partition("=")
+        if k.strip().lower() == "transport" and v.strip().lower() in SRV_PREFIX:
+            transport = v.strip().lower()
+    port = None
+    if hostport.startswith("["):                  # [IPv6]:port
+        host, _, tail = hostport[1:].partition("]")
+        if tail.startswith(":") and tail[1:].isdigit():
+            port = int(tail[1:])
+    elif hostport.count(":") == 1:
+        host, _, p = hostport.partition(":")
+        port = int(p) if p.isdigit() else None
+    else:
+        host = hostport
+    return host, port, transport
+
+
+def _is_ip(host: str) -> bool:
+    try:
+        ipaddress.ip_address(host)
+        return True
+    except ValueError:
+        return False
+
+
+def _nameservers():
+    out = []
+    try:
+        with open(RESOLV_CONF, "r", encoding="utf-8") as f:
+            for line in f:
+                parts = line.split("#", 1)[0].split()
+                if len(parts) >= 2 and parts[0] == "nameserver":
+                    out.append(parts[1])
+    except OSError:
+        pass
+    return out or ["127.0.0.1"]
+
+
+def _dns_name(msg: bytes, off: int):
+    """Name ab off (mit Kompression). Liefert (name, offset danach)."""
+    labels = []
+    end = None
+    for _ in range(64):                            # gegen Zeiger-Schleifen
+        n = msg[off]
+        if n & 0xC0 == 0xC0:
+            if end is None:
+                end = off + 2
+            off = ((n & 0x3F) << 8) | msg[off + 1]
+            continue
+        off += 1
+        if n == 0:
+            break
+        labels.append(msg[off:off + n].decode("ascii", "replace"))
+        off += n
+    return ".".join(labels), (end if end is not None else off)
+
+
+def srv_lookup(name: str, timeout=DNS_TIMEOUT):
+    """
+    SRV-Eintraege fuer name, sortiert nach Prioritaet und Gewicht:
+    [(prio, gewicht, port, ziel), ...]. Leer, wenn es keine gibt.
+    Nur die Standardbibliothek: eine UDP-Anfrage an die Nameserver aus
+    /etc/resolv.conf.
+    """
+    qid = random.getrandbits(16)
+    query = struct.pack("!HHHHHH", qid, 0x0100, 1, 0, 0, 0)
+    for label in name.rstrip(".").split("."):
+        query += bytes([len(label)]) + label.encode("ascii")
+    query += b"\0" + struct.pack("!HH", 33, 1)
+    for ns in _nameservers():
+        try:
+            with socket.socket(socket.AF_INET6 if ":" in ns else socket.AF_INET,
+                               socket.SOCK_DGRAM) as s:
+                s.settimeout(timeout)
+                s.sendto(query, (ns, 53))
+                msg = s.recv(4096)
+        except OSError as e:
+            logger.debug("SRV %s ueber %s: %s", name, ns, e)
+            continue
+        try:
+            rid, flags, qd, an = struct.unpack("!HHHH", msg[:8])
+            if rid != qid or flags & 0x000F not in (0, 3):   # NOERROR / NXDOMAIN
+                continue
+            off = 12
+            for _ in range(qd):
+                off = _dns_name(msg, off)[1] + 4
+            out = []
+            for _ in range(an):
+                off = _dns_name(msg, off)[1]
+                rtype, _, _, rdlen = struct.unpack("!HHIH", msg[off:off + 10])
+                off += 10
+                if rtype == 33:
+                    prio, weight, port = struct.unpack("!HHH", msg[off:off + 6])
+                    target = _dns_name(msg, off + 6)[0]
+                    if target:                     # "." = Dienst gibt es nicht
+                        out.append((prio, -weight, port, target))
+                off += rdlen
+        except (struct.error, IndexError) as e:
+            logger.debug("SRV %s: kaputte Antwort von %s: %s", name, ns, e)
+            continue
+        return [(p, -w, port, t) for p, w, port, t in sorted(out)]
+    return []
+
+
+def resolve_target(uri: str):
+    """
+    SIP-URI -> (ip, port, transport, servername) wie RFC 3263 ohne NAPTR:
+    Port in der URI oder IP-Adresse -> direkt, sonst SRV, sonst A-Record
+    mit Standard-Port. OSError, wenn nichts aufloesbar ist.
+    """
+    host, port, transport = parse_target(uri)
+    default = SIPS_PORT if transport == "tls" else SIP_PORT
+    candidates = []
+    if port is None and not _is_ip(host):
+        candidates = [(t, p) for _, _, p, t in srv_lookup(f"{SRV_PREFIX[transport]}.{host}")]
+    candidates = candidates or [(host, port or default)]
+    err = None
+    stype = socket.SOCK_DGRAM if transport == "udp" else socket.SOCK_STREAM
+    for name, p in candidates:
+        try:
+            ip = socket.getaddrinfo(name, p, socket.AF_INET, stype)[0][4][0]
+            return ip, p, transport, name
+        except (OSError, IndexError) as e:
+            err = e
+    raise OSError(f"{host}: {err}")
+
+
+# ---------- OPTIONS ----------
+def options_request(host: str, branch: str, call_id: str, cseq: int,
+                    transport="udp") -> bytes:
+    tag = uuid.uuid4().hex[:8]
+    return (
+        f"OPTIONS sip:{host} SIP/2.0\r\n"
+        f"Via: SIP/2.0/{transport.upper()} 0.0.0.0;branch=z9hG4bK{branch};rport\r\n"
+        f"Max-Forwards: 70\r\n"
+        f"From: <sip:probe@retrophone.invalid>;tag={tag}\r\n"
+        f"To: <sip:{host}>\r\n"
+        f"Call-ID: {call_id}\r\n"
+        f"CSeq: {cseq} OPTIONS\r\n"
+        f"User-Agent: RetroPhone probe\r\n"
+        f"Content-Length: 0\r\n\r\n"
+    ).encode("ascii")
+
+
+def _branch(data: bytes):
+    """branch aus der obersten Via-Zeile einer Antwort (oder None)."""
+    for line in data.split(b"\r\n"):
+        if line.lower().startswith(b"via:") and b"branch=z9hG4bK" in line:
+            return line.split(b"branch=z9hG4bK", 1)[1].split(b";", 1)[0].decode("ascii", "replace")
+    return None
+
+
+def probe(addr, host: str, count: int, gap=PROBE_GAP, timeout=PROBE_TIMEOUT,
+          transport="udp", servername=None):
+    """
+    count OPTIONS an addr=(ip, port) ueber transport (udp/tcp/tls).
+    Liefert Dict mit rtt-Liste (ms, None = keine Antwort), Jitter und
+    Verlust.
+    """
+    if transport != "udp":
+        return probe_stream(addr, host, count, gap, timeout, transport, servername)
+    call_id = uuid.uuid4().hex
+    rtts = [None] * count
+    sent = {}        # branch -> (index, t_send)
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as s:
+        s.setblocking(False)
+        next_send = time.monotonic()
+        i = 0
+        deadline = None
+        while True:
+            now = time.monotonic()
+            if i < count and now >= next_send:
+                branch = uuid.uuid4().hex[:16]
+                try:
+                    s.sendto(options_request(host, branch, call_id, i + 1), addr)
+                    sent[branch] = (i, now)
+                except OSError as e:
+                    logger.debug("Probe an %s: %s", addr, e)
+                i += 1
+                next_send = now + gap
+                if i == count:
+                    deadline = now + timeout
+            if deadline is not None and (now >= deadline or len(sent) == 0):
+                break
+            wait = (next_send if i < count else deadline) - now
+            r, _, _ = select.select([s], [], [], max(0.0, wait))
+            if not r:
+                continue
+            try:
+                data = s.recv(4096)
+            except OSError:
+                continue
+            t_recv = time.monotonic()
+            hit = sent.pop(_branch(data), None)
+            if hit:
+                rtts[hit[0]] = round((t_recv - hit[1]) * 1000.0, 1)
+    return summarize(rtts)
+
+
+def probe_stream(addr, host: str, count: int, gap=PROBE_GAP, timeout=PROBE_TIMEOUT,
+                 transport="tcp", servername=None):
+    """
+    Wie probe(), aber ueber eine TCP- bzw. TLS-Verbindung: die OPTIONS
+    gehen nacheinander, jede wartet auf ihre Antwort. Kommt die
+    Verbindung nicht zustande, zaehlt die ganze Runde als Verlust.
+    """
+    call_id = uuid.uuid4().hex
+    rtts = [None] * count
+    try:
+        s = socket.create_connection(addr, timeout=timeout)
+    except OSError as e:
+        logger.debug("Probe an %s (%s): %s", addr, transport, e)
+        return summarize(rtts)
+    try:
+        if transport == "tls":
+            s = ssl.create_default_context().wrap_socket(s, server_hostname=servername or host)
+        buf = b""
+        for i in range(count):
+            if i:
+                time.sleep(gap)
+            branch = uuid.uuid4().hex[:16]
+            t_send = time.monotonic()
+            s.sendall(options_request(host, branch, call_id, i + 1, transport))
+            deadline = t_send + timeout
+            while True:
+                # Antworten einzeln zerlegen ist unnoetig: der eigene branch genuegt
+                done = b"branch=z9hG4bK" + branch.encode("ascii") in buf
+                left = deadline - time.monotonic()
+                if done or left <= 0:
+                    break
+                s.settimeout(left)
+                try:
+                    chunk = s.recv(4096)
+                except socket.timeout:
+                    break
+                if not chunk:
+                    raise OSError("Verbindung geschlossen")
+                buf = buf[-256:] + chunk
+            if done:
+                rtts[i] = round((time.monotonic() - t_send) * 1000.0, 1)
+                buf = b""
+    except OSError as e:                  # auch ssl.SSLError
+        logger.debug("Probe an %s (%s): %s", addr, transport, e)
+    finally:
+        s.close()
+    return summarize(rtts)
+
+
+def summarize(rtts):
+    got = [r for r in rtts if r is not None]
+    diffs = [abs(b - a) for a, b in zip(got, got[1:])]
+    srt = sorted(got)
+    return {
+        "rtts":     rtts,
+        "rtt_min":  srt[0] if srt else None,
+        "rtt_med":  srt[len(srt) // 2] if srt else None,
+        "rtt_max":  srt[-1] if srt else None,
+        "jitter":   round(sum(diffs) / len(diffs), 1) if diffs else (0.0 if got else None),
+        "loss":     round(100.0 * (len(rtts) - len(got)) / len(rtts), 1) if rtts else 0.0,
+    }
+
+
+def wlan_power_save(iface: str):
+    """True/False fuer on/off, None wenn unbekannt (kein WLAN, kein iw)."""
+    if not os.path.isdir(f"/sys/class/net/{iface}/wireless"):
+        return None
+    try:
+        out = subprocess.run([IW, "dev", iface, "get", "power_save"],
+                             capture_output=True, text=True, timeout=3).stdout
+    except (OSError, subprocess.SubprocessError):
+        return None
+    if "Power save: on" in out:
+        return True
+    if "Power save: off" in out:
+        return False
+    return None
+
+
+def wlan_power_save_off(iface: str) -> bool:
+    try:
+        proc = subprocess.run([SUDO, "-n", IW, "dev", iface, "set", "power_save", "off"],
+                              capture_output=True, text=True, timeout=5)
+    except (OSError, subprocess.SubprocessError) as e:
+        logger.warning("power_save off auf %s fehlgeschlagen: %s", iface, e)
+        return False
+    if proc.returncode != 0:
+        logger.warning("power_save off auf %s fehlgeschlagen: %s", iface, proc.stderr.strip())
+        return False
+    return True
+
+
+class NetMonitor:
+    """
+    get_cfg liefert den aktuellen Config-Snapshot (retro_config),
+    get_targets die SIP-URIs, an die baresip die REGISTER schickt
+    (outbound-Proxy oder Domain der registrierten Accounts).
+    """
+
+    def __init__(self, get_cfg, get_targets):
+        self.get_cfg = get_cfg
+        self.get_targets = get_targets
+        self.history = deque(maxlen=HISTORY)
+        self.lock = threading.Lock()
+        self.power_save = None        # zuletzt gesehener Zustand
+        self.ps_fixes = 0
+        self.last_ps_check = -PS_CHECK_SEC    # erste Pruefung sofort
+        self._resolved = {}           # uri -> ((ip, port, transport, servername), zeit)
+        self._stop = threading.Event()
+        self.thread = None
+
+    def start(self):
+        self.thread = threading.Thread(target=self._run, name="net-monitor", daemon=True)
+        self.thread.start()
+
+    def close(self):
+        self._stop.set()
+
+    def _resolve(self, uri):
+        dest, t = self._resolved.get(uri, (None, 0.0))
+        if dest and time.monotonic() - t < RESOLVE_TTL:
+            return dest
+        try:
+            dest = resolve_target(uri)
+        except OSError as e:
+            logger.warning("Registrar %s nicht aufloesbar: %s", uri, e)
+            return None
+        self._resolved[uri] = (dest, time.monotonic())
+        return dest
+
+    def _run(self):
+        # erste Runde leicht verzoegert, damit baresip zuerst registriert
+        next_probe = time.monotonic() + 10.0 + random.uniform(0, 5)
+        while not self._stop.is_set():
+            cfg = self.get_cfg()
+            now = time.monotonic()
+            if cfg.wlan_power_save_off and now - self.last_ps_check >= PS_CHECK_SEC:
+                self.last_ps_check = now
+                self.check_power_save(cfg.wlan_iface)
+            if now >= next_probe:
+                next_probe = now + cfg.net_probe_sec
+                for uri in self.get_targets():
+                    self.run_probe(uri, cfg.net_probe_count)
+            # bis zur naechsten Aufgabe schlafen, keine Leerlauf-Wakeups
+            wait = next_probe - time.monotonic()
+            if cfg.wlan_power_save_off:
+                wait = min(wait, self.last_ps_check + PS_CHECK_SEC - time.monotonic())
+            self._stop.wait(max(wait, 0.1))
+
+    def check_power_save(self, iface):
+        ps = wlan_power_save(iface)
+        if ps and wlan_power_save_off(iface):
+            self.ps_fixes += 1
+            logger.warning("WLAN %s: power_save war an, wieder ausgeschaltet", iface)
+            ps = wlan_power_save(iface)
+        self.power_save = ps
+
+    def run_probe(self, uri, count):
+        host = parse_target(uri)[0]
+        dest = self._resolve(uri)
+        if dest is None:
+            res = summarize([None] * count)
+            res["target"] = ""
+        else:
+            ip, port, transport, servername = dest
+            res = probe((ip, port), host, count, transport=transport, servername=servername)
+            res["target"] = f"{ip}:{port}/{transport}"
+        res["host"] = host
+        res["time"] = time.time()
+        with self.lock:
+            self.history.append(res)
+        if res["loss"] >= 50.0:
+            logger.warning("Registrar %s: %.0f%% Verlust", host, res["loss"])
+        return res
+
+    def snapshot(self):
+        with self.lock:
+            rounds = [{k: r[k] for k in ("host", "target", "time", "rtt_min", "rtt_med", "rtt_max",
+                                         "jitter", "loss")} for r in self.history]
+        return {"rounds": rounds, "power_save": self.power_save, "ps_fixes": self.ps_fixes}
+
+
+def main():
+    if len(sys.argv) < 2:
+        print("Usage: net_monitor.py <host|sip-uri> [anzahl]", file=sys.stderr)
+        sys.exit(2)
+    uri = sys.argv[1]
+    count = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+    host = parse_target(uri)[0]
+    ip, port, transport, servername = resolve_target(uri)
+    res = probe((ip, port), host, count, transport=transport, servername=servername)
+    print(f"{host} ({ip}:{port}/{transport}): RTT {res['rtt_min']}/{res['rtt_med']}/{res['rtt_max']} ms, "
+          f"Jitter {res['jitter']} ms, Verlust {res['loss']}%")
+    print("einzeln:", res["rtts"])
+
+if __name__ == "__main__":
+    main()
@@ -1,27 +1,74 @@
 #!/usr/bin/env python3
-import time, os, socket, json, logging, logging.handlers, subprocess
+import time
+# Startzeitpunkt fuer die Startup-Aufschluesselung (erste Python-Zeile)
+STARTUP_T0 = time.monotonic()
+
+# Nur was bis "Hook live" gebraucht wird, wird hier importiert.
+# subprocess, json und sqlite3 laden die Funktionen/Threads bei Bedarf.
+import os, sys, queue, select, signal, threading, logging, logging.handlers
+from collections import deque
 import RPi.GPIO as GPIO
 
-# --- GPIO Definitionen ---
-PIN_PULSE = 23        # Waehlimpulse (1 = Impuls aktiv, 0 = Ruhe)
-PIN_HOOK  = 18        # Hoerer Schalter (0 = abgehoben, 1 = aufgelegt)
-PIN_POS1  = 24        # Ruecklaufkontakt (0 = Scheibe dreht, 1 = ruht)
+import sd_notify
+from audio_lease import AudioLease, CALL, PLAY
+from baresip_ctrl import BaresipCtrl
+from call_table import CallTable, ST_INCOMING, ST_ESTABLISHED, ST_HELD, ST_CLOSED
+from caller_filter import CallerFilter, BLOCK, DND
+from cdr_store import CdrWriter, number_from_uri
+from dial_decoder import PulseDecoder
+from hook_gesture import HookGesture
+from media_stats import MediaStats
+from mwi import MessageWaiting, parse_pattern
+from input_filter import InputFilter, HOOK_FILTER, POS1_FILTER
+from liveness import Liveness
+from registrations import Registrations
+from retro_config import ConfigStore
+from sip_accounts import AccountStore, account_aor, default_path, registrar_uri
+from voicemail import Recorder, GREETING, SPOOL_DIR, decoder_cmd
+
+startup_marks = [("imports", time.monotonic())]
+
+# Pins, Zeiten und Filter stehen in /etc/retrophone/retrophone.conf
+# (siehe retro_config.py); hier nur, was nicht konfigurierbar ist.
 
-# --- Zeiten und Parameter ---
-DIAL_TIMEOUT      = 4.0
-DEBOUNCE          = 0.006
-MIN_PULSE_LOW     = 0.004
-MAX_PULSE_LOW     = 0.08
+# --- Idle-Modus: Hauptschleife schlaeft bis zur naechsten Flanke / Frist ---
+IDLE_TICK_SEC     = 2.0    # laengster Schlaf ohne Ereignis (muss < LIVE_GPIO_SEC sein)
+POLL_IDLE_SEC     = 0.03   # nur ohne Flankenerkennung: Abtastung bei aufgelegtem Hoerer
+POLL_DIAL_SEC     = 0.004  # nur ohne Flankenerkennung: Abtastung beim Waehlen
+DIALTONE_POLL_SEC = 0.05   # aplay beendet -> Waehlton neu starten
 
-CALLS_POLL_SEC    = 0.6
-RING_WATCHDOG_SEC = 2.0
+CONFIG_CHECK_SEC  = 2.0    # so oft wird die mtime der Konfiguration geprueft
 
-# --- baresip Steuerung (ctrl_tcp, JSON + Netstring) ---
-BS_HOST            = "127.0.0.1"
-BS_PORT            = 4444
+# --- Hook-Flash: (Kontext, Anzahl Flashes) -> Aktion
+FLASH_ACTIONS = {
+    ("call", 1): "switch",     # anklopfenden Call annehmen / makeln
+    ("call", 2): "transfer",   # naechste gewaehlte Nummer = Ziel der Weitervermittlung
+    ("idle", 1): "redial",     # Wahlwiederholung
+}
+
+# --- baresip Steuerung (ctrl_tcp, JSON + Netstring, siehe baresip_ctrl.py) ---
 BS_READ_TIMEOUT    = 0.8
-BS_CONNECT_TIMEOUT = 1.0
-BS_RECONNECT_PAUSE = 0.8
+BS_METRICS_LOG_SEC = 300.0   # Reconnect-Metriken periodisch ins Log, solange nicht bereit
+BS_RESYNC_TIMEOUT  = 3.0     # Wartezeit auf listcalls nach einem Reconnect
+
+# --- IPC fuer die Weboberflaeche (siehe daemon_ipc.py) ---
+IPC_BS_TIMEOUT     = 3.0     # Wartezeit auf baresip je weitergereichtem Kommando
+IPC_REG_WAIT_MAX   = 20.0    # laengste Wartezeit auf REGISTER_OK/FAIL pro Anfrage
+# nur Account-Verwaltung, keine Call-Steuerung von aussen
+IPC_BARESIP_COMMANDS = ("uanew", "uadel", "uafind", "uareg", "reginfo")
+
+# --- Liveness / systemd Watchdog (siehe liveness.py) ---
+LIVE_GPIO_SEC      = 5.0     # Hauptschleife (GPIO-Intake) muss sich so oft melden
+LIVE_BARESIP_SEC   = 5.0     # baresip Supervisor-Thread
+LIVE_RING_SEC      = 5.0     # Klingel-Engine
+RING_IDLE_TICK     = 2.0     # Klingel-Engine meldet sich im Leerlauf so oft
+LIVE_METRICS_LOG_SEC = 3600.0
+
+# --- Startup ---
+STARTUP_BUDGET_SEC = 2.0   # exec -> Hook live; darueber Warnung im Log
+
+# --- Echtzeit (rt_priority > 0, siehe rt_sched.py) ---
+RT_SWITCH_INTERVAL = 0.001   # GIL-Wechsel: Flanken-Callback wartet hoechstens so lange
 
 # --- Dialtone Datei ---
 DIALTONE_WAV = "/usr/local/retrophone/dialtone.wav"
@@ -39,10 +86,75 @@ handler = logging.handlers.TimedRotatingFileHandler(
 handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(message)s"))
 logger.addHandler(handler)
 logger.propagate = False
+startup_marks.append(("logging", time.monotonic()))
+
+# --- Konfiguration: unveraenderlicher Snapshot, Reload tauscht conf.current ---
+conf = ConfigStore()
+cfg0 = conf.load()
+PIN_PULSE = cfg0.pin_pulse    # Waehlimpulse (1 = Impuls aktiv, 0 = Ruhe)
+PIN_HOOK  = cfg0.pin_hook     # Hoerer Schalter (0 = abgehoben, 1 = aufgelegt)
+PIN_POS1  = cfg0.pin_pos1     # Ruecklaufkontakt (0 = Scheibe dreht, 1 = ruht)
+startup_marks.append(("config", time.monotonic()))
+
+# SIGHUP (systemctl reload) -> Reload in der Hauptschleife
+reload_requested = False
 
-# globaler Status fuer Dialtone und Call
-dialtone_proc = None
+# Audio-Geraet: Waehlton, Vorwaermen und Gespraech (siehe audio_lease.py)
+audio = AudioLease(cfg0.audio_device, cfg0.audio_warmup)
+
+# globaler Status fuer den Call
 call_in_progress = False
+last_dialed = ""
+transfer_pending = False
+
+# Ziffern, die waehrend eines Calls gewaehlt wurden und als DTMF rausgehen
+dtmf_queue = deque()
+
+# alle Calls, die baresip gerade kennt (aus ctrl_tcp Events)
+calls = CallTable()
+# Abgleich nach Reconnect: Antwort von listcalls aus dem Hilfsthread,
+# dazu die seitdem per Event geschlossenen Call-IDs
+resync_results = deque()
+resync_closed = set()
+resync_pending = False
+
+# Anrufliste (SQLite, eigener Writer-Thread), wird in main() angelegt
+cdr = None
+
+# allow/block-Listen und "Nicht stoeren" (laedt bei Aenderung selbst neu)
+callers = CallerFilter()
+
+# Registrierungsstatus je Account (REGISTER_OK/FAIL), auch fuer die IPC
+registrations = Registrations()
+
+# neue Nachrichten (Provider-MWI, Anrufbeantworter, verpasste Anrufe)
+mwi_state = MessageWaiting()
+
+# Nachrichten, die nach Waehlen von playback_code noch abgespielt werden
+playlist = deque()
+
+# Netzwerk-Monitor (eigener Thread), wird in main() angelegt
+net = None
+
+# IPC-Verbindungen laufen parallel; ihre baresip-Kommandofolgen nicht
+ipc_bs_lock = threading.Lock()
+
+# accounts-Datei von baresip (outbound-Proxy und transport fuer net_monitor)
+accounts = AccountStore(default_path)
+
+def registrar_targets():
+    """
+    SIP-URIs, an die baresip fuer die registrierten Accounts REGISTER
+    schickt. Steht ein Account nicht (mehr) in der Datei, bleibt die
+    Domain aus der AOR.
+    """
+    by_aor = {account_aor(a): a for a in accounts.accounts()}
+    targets = set()
+    for aor in list(registrations.state):
+        acc = by_aor.get(aor.split(";", 1)[0])
+        targets.add(registrar_uri(acc) if acc else
+                    "sip:" + aor.split("@", 1)[-1].split(";", 1)[0])
+    return sorted(targets)
 
 
 # ---------- GPIO ----------
@@ -55,199 +167,735 @@ def gpio_setup():
         PIN_HOOK, PIN_PULSE, PIN_POS1
     )
 
+# ---------- GPIO Flanken (Idle-Modus) ----------
+# RPi.GPIO meldet Flanken aus einem eigenen Thread (epoll auf den
+# sysfs/gpiochip-Deskriptoren). Der Callback legt (pin, pegel, t_ns) mit
+# monotoner Zeit in eine Queue und weckt die Hauptschleife ueber eine
+# Self-Pipe. Ueber dieselbe Pipe weckt auch der baresip-Thread bei
+# neuen Events. Entprellt wird erst in der Hauptschleife (InputFilter).
+edges = deque()
+wake_r, wake_w = os.pipe()
+os.set_blocking(wake_r, False)
+os.set_blocking(wake_w, False)
+
+def wake():
+    try:
+        os.write(wake_w, b"x")
+    except (BlockingIOError, OSError):
+        pass
+
+def on_edge(pin):
+    edges.append((pin, GPIO.input(pin), time.monotonic_ns()))
+    wake()
+
+def edge_setup() -> bool:
+    """Flankenerkennung einschalten. False -> Hauptschleife pollt wie frueher."""
+    try:
+        for p in (PIN_PULSE, PIN_HOOK, PIN_POS1):
+            GPIO.add_event_detect(p, GPIO.BOTH, callback=on_edge)
+    except Exception as e:
+        logger.warning("GPIO Flankenerkennung nicht verfuegbar (%s), Polling-Modus", e)
+        return False
+    logger.info("GPIO Flankenerkennung aktiv, Idle-Modus")
+    return True
+
+def on_sighup(signum, frame):
+    global reload_requested
+    reload_requested = True
+    wake()
+
+def wait_wake(timeout: float):
+    """Schlaeft bis Flanke, baresip-Event oder Timeout."""
+    if timeout > 0:
+        select.select([wake_r], [], [], timeout)
+    try:
+        while os.read(wake_r, 512):
+            pass
+    except (BlockingIOError, OSError):
+        pass
+
+def process_age() -> float:
+    """Sekunden seit exec() dieses Prozesses (aus /proc/self/stat), -1 wenn unbekannt."""
+    try:
+        with open("/proc/self/stat", "r") as f:
+            fields = f.read().rsplit(")", 1)[1].split()
+        start_ticks = int(fields[19])
+        return time.clock_gettime(time.CLOCK_BOOTTIME) - start_ticks / os.sysconf("SC_CLK_TCK")
+    except Exception:
+        return -1.0
+
+def log_startup(age: float):
+    parts = []
+    prev = STARTUP_T0
+    for name, t in startup_marks:
+        parts.append(f"{name}={(t - prev) * 1000:.0f}ms")
+        prev = t
+    pre_python = age - (prev - STARTUP_T0) if age >= 0 else -1.0
+    logger.info("Startup: interpreter=%.0fms %s -> Hook live %.3fs nach exec",
+                pre_python * 1000, " ".join(parts), age)
+    if age > STARTUP_BUDGET_SEC:
+        logger.warning("Startup ueber Budget (%.3fs > %.1fs)", age, STARTUP_BUDGET_SEC)
+
 def offhook_from_raw(hook_raw: int) -> bool:
     # 0 = abgehoben, 1 = aufgelegt
     return hook_raw == 0
 
 
 # ---------- baresip ctrl_tcp (JSON + Netstring) ----------
-class BaresipCtrl:
-    def __init__(self, host, port, read_timeout):
-        self.host = host
-        self.port = port
-        self.read_timeout = read_timeout
-        self.sock = None
-        self.last_connect_fail = 0.0
-
-    def _connect(self):
-        now = time.time()
-        if self.sock:
-            return True
-        if now - self.last_connect_fail < BS_RECONNECT_PAUSE:
-            return False
-        try:
-            s = socket.create_connection(
-                (self.host, self.port),
-                timeout=BS_CONNECT_TIMEOUT
-            )
-            s.settimeout(self.read_timeout)
-            self.sock = s
-            logger.info("Mit baresip ctrl_tcp (JSON+Netstring) verbunden (%s:%d)", self.host, self.port)
-            return True
-        except Exception as e:
-            self.last_connect_fail = now
-            logger.error("baresip connect fehlgeschlagen: %s", e)
-            self.sock = None
-            return False
-
-    def _send_netstring(self, payload: str):
-        """
-        Sende einen Netstring:
-          <len>:<payload>,
-        wobei payload ein JSON-String ist.
-        """
-        if not self.sock:
-            return
-        data = payload.encode("utf-8")
-        header = f"{len(data)}:".encode("ascii")
-        packet = header + data + b","
-        self.sock.sendall(packet)
-
-    def cmd(self, command: str, params: str = "", token: str = "retrophone") -> str:
-        """
-        Schickt ein JSON-Kommando wie:
-          {"command":"dial","params":"078...","token":"retrophone"}
-        verpackt als Netstring. Liefert die Rohantwort als String.
-        """
-        if not self._connect():
-            return ""
-        obj = {"command": command}
-        if params:
-            obj["params"] = params
-        if token:
-            obj["token"] = token
-        try:
-            payload = json.dumps(obj, separators=(",", ":"))
-            self._send_netstring(payload)
-            try:
-                data = self.sock.recv(4096)
-            except Exception:
-                return ""
-            resp = data.decode("utf-8", "ignore")
-            logger.info("baresip resp (%s): %s", command, resp.strip().replace("\n", " | "))
-            return resp
-        except Exception as e:
-            logger.error("baresip cmd fehlgeschlagen (%s): %s", command, e)
-            self.close()
-            return ""
-
-    def close(self):
-        try:
-            if self.sock:
-                self.sock.close()
-        except:
-            pass
-        self.sock = None
-
-bs = BaresipCtrl(BS_HOST, BS_PORT, BS_READ_TIMEOUT)
+bs = BaresipCtrl(cfg0.bs_host, cfg0.bs_port, BS_READ_TIMEOUT)
 
 
 # ---------- Telefonsteuerung ----------
 def dial_number(num: str):
-    global call_in_progress
+    global call_in_progress, last_dialed
     call_in_progress = True
-    dialtone_stop()
+    last_dialed = num
+    audio.acquire(CALL)
     logger.info("Waehle via baresip (JSON): %s", num)
-    bs.cmd("dial", num)
+    bs.send("dial", num)
 
 def hangup_all():
-    global call_in_progress
-    logger.info("Haenge auf (baresip JSON)")
-    bs.cmd("hangup")
+    """
+    Legt alle Gespraeche auf. Ein anklopfender, noch nicht angenommener
+    Call bleibt stehen und klingelt danach normal weiter.
+    """
+    global call_in_progress, transfer_pending
+    transfer_pending = False
+    ours = [c for c in calls.calls.values() if c.state != ST_INCOMING]
+    if ours:
+        for c in ours:
+            logger.info("Haenge auf (baresip JSON): %s", c.id)
+            bs.send("hangup", c.id)
+    elif call_in_progress:
+        logger.info("Haenge auf (baresip JSON)")
+        bs.send("hangup")
     call_in_progress = False
+    dtmf_clear()
     dialtone_stop()
+    playback_stop()
+    # auch wenn baresip nie einen Call angelegt hat: Geraet wieder frei
+    audio.release(CALL)
 
-def answer_call():
+def answer_call(call=None):
     global call_in_progress
+    # Waehlton bekommt SIGTERM, bevor baresip das Geraet oeffnet (nach dem accept)
+    audio.acquire(CALL)
     logger.info("Nehme an (baresip JSON)")
-    bs.cmd("accept")
+    if call:
+        # bei mehreren eingehenden Calls genau diesen annehmen
+        bs.send("callfind", call.id)
+        call.t_accept = time.time()
+    bs.send("accept")
     call_in_progress = True
-    dialtone_stop()
+
+def switch_call():
+    """
+    Hook-Flash im Gespraech: anklopfenden Call annehmen oder zwischen
+    gehaltenem und aktivem Call makeln. Das Halten des anderen Calls
+    uebernimmt baresip (call_hold_other_calls yes).
+    """
+    waiting = [c for c in calls.waiting() if not c.screen]
+    if waiting:
+        logger.info("Hook-Flash -> anklopfenden Call annehmen (%s)", waiting[0].peer_uri)
+        bs.send("callfind", waiting[0].id)
+        bs.send("accept")
+        return
+    held = sorted(calls.held(), key=lambda c: c.t_created)
+    if held:
+        logger.info("Hook-Flash -> makeln zu %s", held[0].peer_uri)
+        bs.send("callfind", held[0].id)
+        bs.send("resume")
+        return
+    logger.info("Hook-Flash ohne zweiten Call, ignoriert")
+
+def start_transfer():
+    global transfer_pending
+    if not calls.established():
+        logger.info("Weitervermitteln ohne aktiven Call, ignoriert")
+        return
+    logger.info("Weitervermitteln: naechste Nummer ist das Ziel")
+    transfer_pending = True
+    dtmf_clear()
+
+def transfer_call(num: str):
+    global transfer_pending
+    transfer_pending = False
+    logger.info("Vermittle aktuellen Call weiter an %s", num)
+    bs.send("transfer", num)
+
+def redial():
+    if not last_dialed:
+        logger.info("Wahlwiederholung: noch keine Nummer gewaehlt")
+        return
+    logger.info("Wahlwiederholung: %s", last_dialed)
+    dial_number(last_dialed)
+
+def hook_flash(count: int, talking: bool):
+    context = "call" if talking else "idle"
+    action = FLASH_ACTIONS.get((context, count))
+    logger.info("Hook-Flash x%d (%s) -> %s", count, context, action or "keine Aktion")
+    if action == "switch":
+        switch_call()
+    elif action == "transfer":
+        start_transfer()
+    elif action == "redial":
+        redial()
+
+
+# ---------- DTMF (Waehlscheibe im Gespraech) ----------
+def dtmf_enqueue(digit: str):
+    if len(dtmf_queue) >= conf.current.dtmf_queue_max:
+        # Lieber laut verwerfen als die Reihenfolge zu verlieren
+        logger.warning("DTMF-Puffer voll, Ziffer %s verworfen", digit)
+        return
+    dtmf_queue.append(digit)
+    logger.info("DTMF eingereiht: %s (wartend=%d)", digit, len(dtmf_queue))
+
+def dtmf_flush(call_active: bool):
+    """
+    Uebergibt gepufferte Ziffern der Reihe nach als sndcode an baresip,
+    aber nur bei bereiter Verbindung: solange baresip weg ist, bleiben
+    die Ziffern hier stehen statt in der Kommando-Queue von BaresipCtrl
+    nach REPLAY_TTL zu verfallen. Reisst die Verbindung zwischen Senden
+    und Ausfuehren ab, gilt dort REPLAY_TTL["sndcode"]; was verfaellt,
+    wird geloggt und in metrics()["dropped"] gezaehlt.
+    """
+    if not call_active or not bs.ready:
+        return
+    while dtmf_queue:
+        # Bei voller Queue bleibt die Ziffer vorne stehen: naechste Runde
+        if not bs.send("sndcode", dtmf_queue[0]):
+            return
+        logger.info("DTMF gesendet: %s", dtmf_queue.popleft())
+
+def dtmf_clear():
+    if dtmf_queue:
+        logger.info("DTMF-Puffer verworfen (%d Ziffern)", len(dtmf_queue))
+    dtmf_queue.clear()
 
 
 # ---------- Klingelsteuerung (ueber ring_control.py) ----------
+RING_CTL = "/usr/local/retrophone/ring_control.py"
+
+class RingEngine:
+    """
+    Fuehrt Klingel-Kommandos seriell in einem eigenen Thread aus.
+    "stop" wartet bis zu 1.5 s auf den Klingelprozess; das soll die
+    Hauptschleife nicht spueren. Die Reihenfolge bleibt erhalten.
+    """
+    def __init__(self):
+        self.q = queue.Queue()
+        self.thread = None
+        self.heartbeat = None
+
+    def start(self):
+        self.thread = threading.Thread(target=self._run, name="ring-engine", daemon=True)
+        self.thread.start()
+
+    def submit(self, *args):
+        self.q.put(args)
+
+    def run_now(self, *args):
+        """Synchron ausfuehren (Shutdown)."""
+        self._exec(args)
+
+    def _run(self):
+        while True:
+            if self.heartbeat:
+                self.heartbeat()
+            try:
+                args = self.q.get(timeout=RING_IDLE_TICK)
+            except queue.Empty:
+                continue
+            self._exec(args)
+
+    def _exec(self, args):
+        import subprocess
+        try:
+            if args[0] in ("stop", "pattern"):
+                # pattern ist kurz; synchron, damit ein folgendes "start" nicht dazwischenfunkt
+                subprocess.call([RING_CTL, *args], timeout=5)
+            else:
+                subprocess.Popen([RING_CTL, *args], close_fds=True)
+        except Exception as e:
+            logger.error("ring_control %s fehlgeschlagen: %s", " ".join(args), e)
+
+ring = RingEngine()
+
 def ring_start():
-    subprocess.Popen(
-        ["/usr/local/retrophone/ring_control.py", "start"],
-        close_fds=True
-    )
+    ring.submit("start")
 
 def ring_stop():
-    subprocess.call(
-        ["/usr/local/retrophone/ring_control.py", "stop"]
-    )
+    ring.submit("stop")
+
+def ring_tap(ms: int):
+    ring.submit("oneshot", str(ms))
 
 
 # ---------- Dialtone Steuerung ----------
 def dialtone_start():
-    global dialtone_proc
-    if not os.path.exists(DIALTONE_WAV):
-        return
-    if dialtone_proc is not None and dialtone_proc.poll() is None:
-        return
-    try:
-        dialtone_proc = subprocess.Popen(
-            ["aplay", "-q", DIALTONE_WAV],
-            stdout=subprocess.DEVNULL,
-            stderr=subprocess.DEVNULL
-        )
-        logger.info("Dialtone gestartet")
-    except Exception as e:
-        logger.error("Dialtone start fehlgeschlagen: %s", e)
-        dialtone_proc = None
+    audio.tone_start(DIALTONE_WAV)
 
 def dialtone_stop():
-    global dialtone_proc
-    if dialtone_proc is not None:
+    audio.tone_stop()
+
+# ---------- Anrufbeantworter (siehe voicemail.py) ----------
+def voicemail_due(call, cfg):
+    """Wanduhrzeit, zu der der Anrufbeantworter den Call annimmt."""
+    cycle = (cfg.cadence_on_ms + cfg.cadence_off_ms) / 1000.0
+    return call.t_created + cfg.voicemail_rings * cycle
+
+def voicemail_answer(call):
+    """Call als Anrufbeantworter annehmen; sndfile muss vor dem accept geladen sein."""
+    logger.info("Anrufbeantworter nimmt an: %s", call.peer_uri or call.id)
+    call.voicemail = "answering"
+    audio.acquire(CALL)
+    bs.send("module_load", "sndfile")
+    bs.send("callfind", call.id)
+    call.t_accept = time.time()
+    bs.send("accept")
+
+def voicemail_record(call, cfg):
+    """Call steht: Ansage als Audio-Quelle, Aufnahme starten."""
+    call.voicemail = "recording"
+    if os.path.exists(GREETING):
+        bs.send("callfind", call.id)
+        bs.send("ausrc", f"aufile,{GREETING}")
+    else:
+        logger.warning("Anrufbeantworter: keine Ansage (%s)", GREETING)
+    call.recorder = Recorder(call, cfg.voicemail_format, call.t_accept or call.t_answered,
+                             message_recorded)
+    call.recorder.start()
+
+def voicemail_takeover(call, cfg):
+    """Hoerer abgehoben waehrend der Aufnahme: Mikrofon statt Ansage, Aufnahme laeuft weiter."""
+    logger.info("Anrufbeantworter: Gespraech %s uebernommen", call.id)
+    call.voicemail = "taken"
+    bs.send("callfind", call.id)
+    bs.send("ausrc", f"alsa,{cfg.audio_device}")
+
+def message_recorded(msg):
+    """Laeuft im Recorder-Thread: Nachricht speichern, Anzeige anstossen."""
+    if cdr:
+        cdr.record_message(msg)
+    mwi_state.poke()
+    wake()
+
+def voicemail_closed(call):
+    if call.recorder:
+        call.recorder.finish()
+        call.recorder = None
+    call.reason = "voicemail" + (f" ({call.reason})" if call.reason else "")
+    if not any(c.voicemail for c in calls.calls.values()):
+        bs.send("module_unload", "sndfile")
+
+# ---------- Nachrichten: Anzeige und Abhoeren ----------
+def voicemail_query(fn, default):
+    """Kurze Abfrage der Tabelle voicemail; der Daemon liest sonst nie aus calls.db."""
+    import cdr_store
+    try:
+        con = cdr_store.connect(cdr_store.CDR_DB, readonly=True)
         try:
-            dialtone_proc.terminate()
-        except Exception:
-            pass
-        dialtone_proc = None
+            return fn(con)
+        finally:
+            con.close()
+    except Exception as e:
+        logger.warning("Nachrichten nicht lesbar: %s", e)
+        return default
+
+def mwi_check(cfg, now):
+    """Pruefung faellig: ungehoerte Nachrichten zaehlen, ggf. Glockenzeichen."""
+    import voicemail
+    mwi_state.local_new = voicemail_query(lambda con: voicemail.counts(con)[1],
+                                          mwi_state.local_new)
+    pending = mwi_state.pending(cfg.mwi_missed)
+    ring_it = bool(pending) and cfg.mwi_signal
+    if ring_it:
+        callers.maybe_reload()
+        dnd = callers.rules.in_dnd(now)
+        if dnd:
+            logger.info("Nachrichten-Zeichen unterdrueckt (Nicht stoeren %s)", dnd)
+            ring_it = False
+    if ring_it:
+        pattern = parse_pattern(cfg.mwi_pattern)
+        logger.info("Nachrichten-Zeichen: %d neu (Provider %d, Anrufbeantworter %d, verpasst %d)",
+                    pending, mwi_state.remote_new(), mwi_state.local_new, mwi_state.missed)
+        ring.submit("pattern", ",".join(str(ms) for ms in pattern))
+    mwi_state.checked(now, pending, ring_it, cfg.mwi_repeat_sec)
+
+def playback_start():
+    """Gewaehlter playback_code: Nachrichten des Anrufbeantworters abspielen."""
+    import voicemail
+    msgs = voicemail_query(voicemail.playback_list, [])
+    logger.info("Abhoeren: %d Nachrichten", len(msgs))
+    playlist.extend(msgs)
+
+def playback_next():
+    """Naechste Nachricht, sobald die vorige fertig ist. True, solange abgespielt wird."""
+    if audio.playing(PLAY):
+        return True
+    while playlist:
+        msg = playlist.popleft()
+        if audio.stream(PLAY, decoder_cmd(msg["format"], msg["path"])):
+            logger.info("Abhoeren: Nachricht %d von %s", msg["id"], msg["number"] or "unbekannt")
+            if not msg["heard"] and cdr:
+                cdr.mark_heard(msg["id"])
+                mwi_state.local_new = max(0, mwi_state.local_new - 1)
+            return True
+    if PLAY in audio.owners:
+        audio.release(PLAY)
+    return False
+
+def playback_stop():
+    if playlist or PLAY in audio.owners:
+        logger.info("Abhoeren beendet")
+    playlist.clear()
+    audio.release(PLAY)
+
+def audio_started(call):
+    """Erstes Audio-Paket eines Calls: Startzeit messen, Vorwaermen beenden."""
+    ref = call.t_accept or call.t_answered
+    if not ref or call.t_audio < ref:
+        return      # Early Media vor der Annahme: beim Annehmen laeuft Audio schon
+    if call.media is None:
+        call.media = MediaStats()
+    if call.media.start_ms is None:
+        call.media.start_ms = max(0.0, (call.t_audio - ref) * 1000.0)
+        logger.info("Audio %s: erstes Paket %.0f ms nach Annahme", call.id, call.media.start_ms)
+    audio.warm_stop()
+
+
+# ---------- baresip Events ----------
+def calls_resync(known):
+    """
+    Hilfsthread nach CTRL_CONNECTED: listcalls holen (request() blockiert,
+    darum nicht in der Hauptschleife). Abgeglichen wird in handle_events().
+    """
+    ok, data = bs.request("listcalls", timeout=BS_RESYNC_TIMEOUT)
+    resync_results.append((known, ok, data))
+    wake()
+
+def resync_events():
+    """Synthetische Call-Events aus einem fertigen listcalls-Abgleich."""
+    global resync_pending
+    out = []
+    while resync_results:
+        known, ok, data = resync_results.popleft()
+        resync_pending = False
+        if not ok:
+            # Call-Tabelle behalten; der naechste Reconnect versucht es wieder
+            logger.warning("listcalls nach Reconnect ohne Antwort, Call-Tabelle unveraendert")
+            continue
+        out += calls.reconcile(data, known, resync_closed)
+        resync_closed.clear()
+        if out:
+            logger.info("Call-Tabelle nach Reconnect abgeglichen: %s",
+                        ", ".join(f"{e['id']} {e['type']}" for e in out))
+    return out
+
+def handle_events(now):
+    """
+    Arbeitet alle neuen ctrl_tcp Events ab. Liefert True, wenn dabei ein
+    neuer Call eingetroffen ist, waehrend schon ein Gespraech steht.
+    """
+    global call_in_progress, resync_pending
+    new_waiting = False
+    for ev in resync_events() + bs.poll_events():
+        if ev.get("class") == "retrophone":
+            if ev.get("type") == "CTRL_CONNECTED":
+                # Events aus der Luecke koennen fehlen: Calls nicht verwerfen,
+                # sondern gegen listcalls abgleichen (laufendes Gespraech bleibt)
+                resync_pending = True
+                resync_closed.clear()
+                threading.Thread(target=calls_resync, args=(set(calls.calls),),
+                                 name="calls-resync", daemon=True).start()
+                if not len(calls):
+                    audio.warm_stop()
+                    audio.release(CALL)
+                logger.info("baresip Metriken: %s", bs.metrics())
+            continue
+        if ev.get("type") == "MWI_NOTIFY":
+            if mwi_state.update_remote(ev):
+                logger.info("MWI %s: %s", ev.get("accountaor"),
+                            " ".join((ev.get("param") or "").split()))
+                mwi_state.poke()
+            continue
+        if ev.get("class") == "register":
+            # Erneuerungen im Takt nicht loggen, nur Wechsel und Fehler
+            if registrations.update(ev):
+                logger.info("Registrierung %s: %s %s", ev.get("accountaor"),
+                            ev.get("type"), ev.get("param") or "")
+            continue
+        if ev.get("type") == "CALL_RTPESTAB":
+            call = calls.calls.get(ev.get("id") or "")
+            if call and ev.get("param", "audio") == "audio" and not call.t_audio:
+                call.t_audio = time.time()
+                audio_started(call)
+            continue
+        if ev.get("type") == "CALL_RTCP":
+            # Audio-Statistik des laufenden Calls, nur verdichten
+            call = calls.calls.get(ev.get("id") or "")
+            if call and ev.get("param", "audio") == "audio":
+                if call.media is None:
+                    call.media = MediaStats()
+                call.media.feed(ev.get("rtcp_stats"))
+            continue
+        call, old_state = calls.apply(ev, now)
+        if call is None:
+            continue
+        if call.state == ST_INCOMING and old_state is None:
+            # Anruffilter vor der ersten Glocke
+            verdict, why = callers.check(call.peer_uri, now)
+            if verdict == BLOCK:
+                call.screen = BLOCK
+                logger.info("Anruf von %s abgewiesen (%s)", call.peer_uri or "unbekannt", why)
+                bs.send("hangup", call.id)
+                continue
+            if verdict == DND:
+                call.screen = DND
+                logger.info("Nicht stoeren: %s klingelt nicht (%s)",
+                            call.peer_uri or "unbekannt", why)
+                continue
+            if why:
+                logger.info("Anruffilter: %s darf klingeln (%s)", call.peer_uri, why)
+        if call.state == ST_ESTABLISHED and call.voicemail == "answering":
+            voicemail_record(call, conf.current)
+        if call.state == ST_ESTABLISHED and old_state != ST_ESTABLISHED:
+            if call.t_audio:
+                call.t_audio = max(call.t_audio, call.t_answered)
+                audio_started(call)
+        if call.state == ST_INCOMING and old_state is None and calls.waiting():
+            logger.info("Anklopfen: %s", call.peer_uri or call.id)
+            new_waiting = True
+        if call.state == ST_CLOSED:
+            if resync_pending:
+                resync_closed.add(call.id)
+            if call.screen:
+                call.reason = call.screen + (f" ({call.reason})" if call.reason else "")
+            if call.voicemail:
+                voicemail_closed(call)
+            elif call.direction == "incoming" and not call.t_answered and call.screen != BLOCK:
+                mwi_state.missed += 1
+                mwi_state.poke()
+            logger.info("Call beendet: %s (%s, %.1fs)", call.id, call.reason or "-",
+                        call.duration(now))
+            if call.media and call.media.reports:
+                logger.info("Audio %s: %d RTCP-Reports, Verlust %.1f%%, Jitter max %.0f ms",
+                            call.id, call.media.reports, call.media.loss_pct, call.media.jit_max)
+            if cdr:
+                cdr.record(call)
+            if not calls.established() and not calls.held():
+                dtmf_clear()
+            if not len(calls):
+                call_in_progress = False
+                audio.warm_stop()
+                audio.release(CALL)
+    return new_waiting
+
+
+# ---------- IPC (Weboberflaeche) ----------
+def ipc_handler(req):
+    """
+    Laeuft im Thread der jeweiligen IPC-Verbindung, auch mehrfach
+    gleichzeitig. Kommandofolgen fuer baresip laufen nacheinander
+    (ipc_bs_lock), das Warten auf REGISTER nicht.
+
+    {"cmd": "baresip", "commands": [[kommando, params], ...],
+     "await_register": [aor, ...], "timeout": s}
+        schickt die Kommandos der Reihe nach ueber ctrl_tcp, bricht beim
+        ersten Fehler ab und wartet danach optional auf REGISTER_OK/FAIL
+        der genannten Accounts.
+    {"cmd": "registrations"}
+        letzter Registrierungsstatus aller Accounts.
+    {"cmd": "network"}
+        Messrunden zum Registrar und WLAN-Stromsparmodus.
+    {"cmd": "watch"}
+        Abo auf live_state(), beantwortet IpcServer selbst.
+    """
+    if req.get("cmd") == "registrations":
+        return {"ok": True, "registrations": registrations.snapshot()}
+    if req.get("cmd") == "network":
+        return {"ok": True, "network": net.snapshot() if net else None}
+    if req.get("cmd") == "messages":
+        return {"ok": True, "messages": mwi_state.snapshot()}
+    if req.get("cmd") != "baresip":
+        return {"ok": False, "error": f"unbekannte Anfrage: {req.get('cmd')}"}
+    t0 = time.time()
+    results = []
+    with ipc_bs_lock:
+        for command, params in req.get("commands") or []:
+            if command not in IPC_BARESIP_COMMANDS:
+                return {"ok": False, "error": f"Kommando nicht erlaubt: {command}", "results": results}
+            if not bs.ready:
+                return {"ok": False, "error": "baresip nicht verbunden", "results": results}
+            logger.info("IPC: %s %s", command, params.split(";", 1)[0])
+            ok, data = bs.request(command, str(params or ""), timeout=IPC_BS_TIMEOUT)
+            results.append({"command": command, "ok": ok, "data": data})
+            if not ok:
+                return {"ok": False, "error": f"{command} fehlgeschlagen", "results": results}
+            if command == "uadel":
+                registrations.forget(params)
+    resp = {"ok": True, "results": results}
+    aors = req.get("await_register") or []
+    if aors:
+        timeout = min(float(req.get("timeout") or IPC_BS_TIMEOUT), IPC_REG_WAIT_MAX)
+        resp["registrations"] = registrations.wait(aors, t0, timeout)
+    return resp
+
+
+def live_state(cur_hook, number, decoder, ringing_now, playing):
+    """
+    Zustand fuer das Dashboard (Abo "watch"). Nur was sich sichtbar
+    aendert: keine Zeitstempel ausser Beginn des Calls, sonst ginge bei
+    jedem Durchlauf der Hauptschleife eine neue Zeile raus.
+    """
+    call = calls.current()
+    if call is None or call.state == ST_CLOSED:
+        active = calls.established() + calls.held() + calls.incoming()
+        call = active[0] if active else None
+    if call is not None:
+        call_state = {
+            "number":    number_from_uri(call.peer_uri),
+            "name":      call.peer_name,
+            "direction": call.direction,
+            "state":     call.state,
+            "since":     call.t_answered or call.t_created,
+            "answered":  bool(call.t_answered),
+            "voicemail": call.voicemail,
+        }
+    else:
+        call_state = None
+    if call is not None and call.voicemail in ("answering", "recording", "ending"):
+        phase = "voicemail"
+    elif call is not None and call.t_answered:
+        phase = "call"
+    elif ringing_now or (call is not None and call.direction == "incoming" and not call.t_accept):
+        phase = "ringing"
+    elif call is not None:
+        phase = "calling"
+    elif playing:
+        phase = "playback"
+    elif number or decoder.busy:
+        phase = "dialing"
+    elif cur_hook:
+        phase = "offhook"
+    else:
+        phase = "idle"
+    return {
+        "phase":    phase,
+        "hook":     "off" if cur_hook else "on",
+        "digits":   number,
+        "pulses":   decoder.count,
+        "ringing":  ringing_now,
+        "call":     call_state,
+        "calls":    len(calls),
+        "baresip":  bs.ready,
+        "registrations": registrations.statuses(),
+        "messages": mwi_state.pending(),
+    }
 
 
-# ---------- Incoming-Call-Parsing ----------
-def parse_call_states(resp: str):
+def rt_setup(cfg):
     """
-    Sehr einfache Auswertung der baresip-Antwort (JSON-Events im Text).
-    Wir suchen nur nach Stichwoertern im Text.
+    Ressourcen-Profil: GPIO-Schleife (Hauptthread) und Flanken-Thread von
+    RPi.GPIO bekommen Echtzeit-Prioritaet und einen eigenen Kern. Erst nach
+    dem Start der uebrigen Threads, damit die normal weiterlaufen.
     """
-    if not resp:
-        return False, False, False
-    low = resp.lower()
-    incoming = ("call_incoming" in low) or (" incoming " in low)
-    active = ("call_established" in low or
-              "call_confirmed" in low or
-              "call_answered" in low or
-              " connected " in low)
-    ended  = ("call_closed" in low or
-              " terminated" in low or
-              " idle " in low)
-    return incoming, active, ended
+    if cfg.rt_priority <= 0 and cfg.cpu_core < 0:
+        return
+    import rt_sched
+    rt_sched.set_thread(0, "GPIO-Schleife", cfg.rt_priority, cfg.cpu_core)
+    for tid in rt_sched.foreign_threads():
+        rt_sched.set_thread(tid, f"Flanken-Thread {tid}", cfg.rt_priority, cfg.cpu_core)
+    if cfg.rt_priority > 0:
+        # Callback und Hauptschleife brauchen den GIL; Hilfs-Threads sollen ihn schnell abgeben
+        sys.setswitchinterval(RT_SWITCH_INTERVAL)
+
+
+# ---------- Konfiguration anwenden ----------
+def input_filters(cfg):
+    """Eingangsfilter je Pin: (Verfahren, settle in s), siehe input_filter.py."""
+    return {
+        PIN_HOOK:  (HOOK_FILTER[0], cfg.hook_settle),   # stabil: Gabel rattert beim Auflegen
+        PIN_PULSE: (cfg.pulse_filter, cfg.pulse_settle),  # Integrator schluckt Stoerimpulse
+        PIN_POS1:  (POS1_FILTER[0], cfg.pos1_settle),
+    }
+
+def apply_config(cfg, inputs, gesture, decoder):
+    """Neuen Snapshot in die laufenden Filter, Gesten und den Decoder uebernehmen."""
+    for pin, (mode, settle) in input_filters(cfg).items():
+        inputs.tune(pin, mode, settle)
+    gesture.bounce_max = cfg.hook_bounce_max
+    gesture.flash_max  = cfg.hook_flash_max
+    gesture.flash_gap  = cfg.hook_flash_gap
+    decoder.min_pulse  = cfg.min_pulse
+    decoder.max_pulse  = cfg.max_pulse
+    decoder.digit_gap  = cfg.digit_gap
+    audio.configure(cfg.audio_device, cfg.audio_warmup)
 
 
 # ---------- Hauptprogramm ----------
 def main():
-    global call_in_progress
+    global call_in_progress, cdr, reload_requested, net
     gpio_setup()
+    startup_marks.append(("gpio", time.monotonic()))
 
     number = ""
-    pulse_count = 0
     last_digit_time = 0.0
 
     # letzte Zustände fuer Aenderungs Logik
     last_hook_raw    = GPIO.input(PIN_HOOK)
     last_pulse_state = GPIO.input(PIN_PULSE)
     last_pos1_state  = GPIO.input(PIN_POS1)
-    last_hook        = offhook_from_raw(last_hook_raw)
+    # Gesten, Decoder und Filter rechnen mit monotoner Zeit
+    t_start_ns       = time.monotonic_ns()
+    inputs           = InputFilter()
+    filters          = input_filters(cfg0)
+    inputs.add(PIN_HOOK, last_hook_raw, t_start_ns, *filters[PIN_HOOK])
+    inputs.add(PIN_PULSE, last_pulse_state, t_start_ns, *filters[PIN_PULSE])
+    inputs.add(PIN_POS1, last_pos1_state, t_start_ns, *filters[PIN_POS1])
+    gesture          = HookGesture(offhook_from_raw(last_hook_raw), t_start_ns / 1e9,
+                                   cfg0.hook_bounce_max, cfg0.hook_flash_max, cfg0.hook_flash_gap)
+    decoder          = PulseDecoder(last_pulse_state, t_start_ns / 1e9,
+                                    cfg0.min_pulse, cfg0.max_pulse, cfg0.digit_gap)
+    startup_marks.append(("hook", time.monotonic()))
+    log_startup(process_age())
+    edge_mode = edge_setup()
+    signal.signal(signal.SIGHUP, on_sighup)
+    last_config_check = time.monotonic()
 
-    # Klingel- / Call-Status (persistente Flags)
+    # alles Weitere liegt hinter "Hook live": Threads starten, systemd melden
+    live = Liveness()
+    live.register("gpio", LIVE_GPIO_SEC)
+    live.register("baresip", LIVE_BARESIP_SEC)
+    live.register("ring", LIVE_RING_SEC)
+    bs.heartbeat = lambda: live.checkin("baresip")
+    bs.on_event = wake
+    ring.heartbeat = lambda: live.checkin("ring")
+    bs.start()
+    ring.start()
+    from daemon_ipc import IpcServer
+    ipc = IpcServer(ipc_handler)
+    ipc.start()
+    # nicht im Watchdog: ein haengender Probe soll das Telefon nicht neu starten
+    from net_monitor import NetMonitor
+    net = NetMonitor(lambda: conf.current, registrar_targets)
+    net.start()
+    # snd_path von baresip fuer den Anrufbeantworter (tmpfs)
+    os.makedirs(SPOOL_DIR, exist_ok=True)
+    cdr = CdrWriter()
+    # ungehoerte Nachrichten vom letzten Lauf anzeigen
+    mwi_state.poke()
+    live.start()
+    rt_setup(cfg0)
+    sd_notify.notify("READY=1", "STATUS=Hook live, verbinde baresip")
+    last_live_log = time.time()
+
+    # Klingel- / Call-Status
     ringing_now = False
-    last_calls_poll = 0.0
     last_incoming_seen = 0.0
-    incoming_flag = False
-    active_flag   = False
-    ended_flag    = False
+    last_cw_tap = 0.0
+    last_metrics_log = time.time()
 
     logger.info(
         "RetroPhone Daemon gestartet, Initial GPIO Status: HOOK=%d PULSE=%d POS1=%d",
@@ -257,50 +905,87 @@ def main():
     try:
         while True:
             now = time.time()
+            t_iter = time.monotonic()
+
+            # Konfiguration: SIGHUP sofort, sonst mtime alle paar Sekunden
+            if reload_requested or t_iter - last_config_check >= CONFIG_CHECK_SEC:
+                changed = conf.reload() if reload_requested else conf.maybe_reload()
+                reload_requested = False
+                last_config_check = t_iter
+                if changed:
+                    apply_config(conf.current, inputs, gesture, decoder)
+            cfg = conf.current
+
+            # Rohflanken durch den Eingangsfilter, in zeitlicher Reihenfolge
+            changes = []
+            while edges:
+                changes += inputs.feed(*edges.popleft())
 
-            # Rohwerte lesen
-            hook_raw    = GPIO.input(PIN_HOOK)
-            pulse_state = GPIO.input(PIN_PULSE)
-            pos1_state  = GPIO.input(PIN_POS1)
-            cur_hook    = offhook_from_raw(hook_raw)
+            # Rohwerte lesen (Polling-Modus bzw. verpasste Flanke nachziehen)
+            t_read = time.monotonic_ns()
+            for pin in (PIN_HOOK, PIN_PULSE, PIN_POS1):
+                changes += inputs.feed(pin, GPIO.input(pin), t_read)
+
+            # Nur entprellte Wechsel erreichen Gesten und Decoder
+            hook_events = []
+            pulse_events = []
+            for pin, level, t_ns in changes:
+                if pin == PIN_HOOK:
+                    hook_events += gesture.feed(offhook_from_raw(level), t_ns / 1e9)
+                elif pin == PIN_PULSE:
+                    pulse_events += decoder.feed(level, t_ns / 1e9)
+            # Fristen nur bis dahin auswerten, wo der Filter nichts mehr nachliefern kann
+            horizon = inputs.horizon(t_read) / 1e9
+            hook_events += gesture.poll(horizon)
+            pulse_events += decoder.poll(horizon)
+            # Gesten zuerst: cur_hook bleibt im Flash-Fenster "abgehoben"
+            cur_hook = gesture.offhook
 
             # GPIO Aenderungen loggen
-            if (hook_raw != last_hook_raw or
-                pulse_state != last_pulse_state or
-                pos1_state != last_pos1_state):
+            if changes:
                 logger.info(
                     "GPIO Status: HOOK=%d PULSE=%d POS1=%d",
-                    hook_raw, pulse_state, pos1_state
+                    inputs.level(PIN_HOOK), inputs.level(PIN_PULSE), inputs.level(PIN_POS1)
                 )
-                last_hook_raw    = hook_raw
-                last_pos1_state  = pos1_state
-
-            # --- baresip listcalls pollen fuer eingehende/aktive Calls ---
-            if now - last_calls_poll >= CALLS_POLL_SEC:
-                resp = bs.cmd("listcalls")
-                inc, act, end = parse_call_states(resp)
-                incoming_flag = inc
-                active_flag   = act
-                ended_flag    = end
-                last_calls_poll = now
-                if inc:
-                    last_incoming_seen = now
-                if end and not act:
-                    # Call wirklich beendet
-                    call_in_progress = False
+
+            # --- baresip Events in die Call-Tabelle uebernehmen ---
+            if handle_events(now):
+                last_cw_tap = 0.0
+
+            # abgewiesene Calls zaehlen nicht; DND-Calls klingeln nicht, sind aber annehmbar
+            # Calls beim Anrufbeantworter zaehlen nicht als Gespraech, bis jemand abhebt
+            incoming = [c for c in calls.incoming() if c.screen != BLOCK and not c.voicemail]
+            ringable = [c for c in incoming if not c.screen]
+            talking  = any(c.voicemail in ("", "taken")
+                           for c in calls.established() + calls.held())
+            if incoming and bs.ready:
+                last_incoming_seen = now
+
+            # Circuit-Breaker offen: gelegentlich Metriken ins Log
+            if not bs.ready and now - last_metrics_log >= BS_METRICS_LOG_SEC:
+                logger.warning("baresip nicht bereit: %s", bs.metrics())
+                last_metrics_log = now
+
+            # --- Anklopfen: kurzer Glockenschlag, solange der Call wartet ---
+            if ringable and talking and cur_hook and not gesture.pending:
+                if now - last_cw_tap >= cfg.cw_repeat_sec:
+                    logger.info("Anklopf-Signal (%d ms)", cfg.cw_tap_ms)
+                    ring_tap(cfg.cw_tap_ms)
+                    last_cw_tap = now
 
             # --- Klingellogik fuer eingehende Calls ---
-            need_ring = incoming_flag and not cur_hook  # nur klingeln, wenn Hoerer aufliegt
+            # nur klingeln, wenn Hoerer aufliegt und kein Gespraech gehalten wird
+            need_ring = bool(ringable) and not talking and not cur_hook
 
             if ringing_now:
                 must_stop = False
 
-                # Watchdog: laenger keine incoming Info -> stoppen
-                if (now - last_incoming_seen) > RING_WATCHDOG_SEC:
+                # Watchdog: zu lange keine Verbindung zu baresip -> stoppen
+                if (now - last_incoming_seen) > cfg.ring_watchdog_sec:
                     must_stop = True
 
                 # Call beendet oder bereits aktiv -> Klingel aus
-                if ended_flag or active_flag:
+                if not ringable or talking:
                     must_stop = True
 
                 if cur_hook:
@@ -308,84 +993,114 @@ def main():
                     must_stop = True
 
                 if must_stop:
-                    logger.info("Klingel AUS (incoming=%s active=%s ended=%s)",
-                                incoming_flag, active_flag, ended_flag)
+                    logger.info("Klingel AUS (incoming=%d talking=%s)",
+                                len(ringable), talking)
                     ring_stop()
                     ringing_now = False
 
             if not ringing_now and need_ring:
-                logger.info("Klingel AN (incoming call erkannt)")
+                logger.info("Klingel AN (incoming call erkannt: %s)",
+                            ringable[0].peer_uri or ringable[0].id)
                 ring_start()
                 ringing_now = True
+                # Geraet schon jetzt oeffnen, damit das Gespraech ohne Anlauf startet
+                audio.warm_start()
 
-            # --- Hook-Erkennung (Booleans) ---
-            if cur_hook != last_hook:
-                logger.info("Hook-Status: %s", "OFFHOOK" if cur_hook else "ONHOOK")
-                if not cur_hook:
-                    # Hoerer aufgelegt
-                    if number or pulse_count:
+            # --- Anrufbeantworter: nach voicemail_rings Klingelzyklen selbst annehmen ---
+            if cfg.voicemail and bs.ready and incoming and not talking and not cur_hook:
+                due = incoming[0]
+                if now >= voicemail_due(due, cfg):
+                    if ringing_now:
+                        ring_stop()
+                        ringing_now = False
+                    voicemail_answer(due)
+            for c in calls.established():
+                if c.voicemail == "recording" and now - c.t_answered >= cfg.voicemail_max_sec:
+                    logger.info("Anrufbeantworter: Nachricht %s nach %.0fs beendet",
+                                c.id, cfg.voicemail_max_sec)
+                    c.voicemail = "ending"
+                    bs.send("hangup", c.id)
+
+            # --- Nachrichten-Zeichen: nur in Ruhe (aufgelegt, kein Call, keine Klingel) ---
+            idle_phone = not cur_hook and not len(calls) and not ringing_now
+            if idle_phone and mwi_state.due(now):
+                mwi_check(cfg, now)
+
+            # beendete aplay/Decoder ernten (nie blockierend)
+            audio.reap()
+
+            # Vorwaermen ohne Gespraech (Anrufer hat aufgelegt) nicht ewig laufen lassen
+            if audio.warm_expired():
+                logger.warning("Audio: Vorwaermen nach Zeitlimit beendet")
+                audio.warm_stop()
+
+            # --- Hook-Gesten: Abheben, Auflegen (nach Gnadenfrist), Flash ---
+            for ev, val in hook_events:
+                if ev == "hangup":
+                    logger.info("Hook-Status: ONHOOK")
+                    if number or decoder.busy:
                         logger.info("Wahl abgebrochen (Onhook)")
                         number = ""
-                        pulse_count = 0
+                        decoder.reset()
                     hangup_all()
-                else:
-                    # Hoerer abgehoben
-                    if incoming_flag or active_flag:
+                elif ev == "flash":
+                    hook_flash(val, talking)
+                elif ev == "offhook":
+                    logger.info("Hook-Status: OFFHOOK")
+                    mwi_state.seen()
+                    recording = [c for c in calls.established() if c.voicemail == "recording"]
+                    if recording and not incoming:
+                        voicemail_takeover(recording[0], cfg)
+                    elif incoming:
                         # Egal ob Klingel noch aktiv ist oder nicht:
-                        logger.info("OFFHOOK bei Call (incoming=%s active=%s) -> annehmen",
-                                    incoming_flag, active_flag)
+                        logger.info("OFFHOOK bei Call (%s) -> annehmen",
+                                    incoming[0].peer_uri or incoming[0].id)
                         ring_stop()
                         ringing_now = False
-                        answer_call()
+                        answer_call(incoming[0])
                     elif not call_in_progress:
                         # kein Call -> Dialtone ueber Logik weiter unten
                         pass
-                last_hook = cur_hook
+
+            # Im Gespraech gehen Ziffern als DTMF raus statt in die Nummer
+            in_call = call_in_progress or talking
 
             # --- Waehl-Logik nur bei abgehobenem Hoerer ---
             if cur_hook:
-                # Impulsflanke erfassen (STEIGENDE Flanke: 0 -> 1, da 1 = Impuls aktiv)
-                if pulse_state == 1 and last_pulse_state == 0:
-                    t0 = time.time()
-                    while GPIO.input(PIN_PULSE) == 1:
-                        time.sleep(DEBOUNCE)
-                    high_dur = time.time() - t0
-                    if MIN_PULSE_LOW <= high_dur <= MAX_PULSE_LOW:
-                        pulse_count += 1
-                        logger.info(
-                            "Impuls erkannt, Pulse-Count=%d (high_dur=%.4f)",
-                            pulse_count, high_dur
-                        )
-
-                # Ende der Impulsreihe (Pause nach LOW, da Ruhe = 0)
-                if last_pulse_state == 1 and pulse_state == 0:
-                    pause_start = time.time()
-                    new_impulse = False
-                    while time.time() - pause_start < 0.25:
-                        if GPIO.input(PIN_PULSE) == 1:
-                            new_impulse = True
-                            break
-                        time.sleep(0.01)
-                    if not new_impulse and pulse_count > 0:
-                        digit = pulse_count % 10
-                        if digit == 0:
-                            digit = 0
-                        number += str(digit)
-                        last_digit_time = time.time()
-                        logger.info("Ziffer erkannt: %s  Nummer bisher: %s", digit, number)
-                        pulse_count = 0
+                for ev, val in pulse_events:
+                    if ev == "pulse":
+                        logger.info("Impuls erkannt, Pulse-Count=%d (high_dur=%.4f)",
+                                    decoder.count, val)
+                        continue
+                    if in_call and not transfer_pending:
+                        logger.info("Ziffer erkannt im Gespraech: %s -> DTMF", val)
+                        dtmf_enqueue(str(val))
+                    else:
+                        number += str(val)
+                        last_digit_time = time.monotonic()
+                        logger.info("Ziffer erkannt: %s  Nummer bisher: %s", val, number)
+
+                # Gepufferte DTMF-Ziffern sofort nach Ruecklauf senden
+                dtmf_flush(bool(calls.established()))
 
                 # Timeout: komplette Nummer waehlen
-                if number and (time.time() - last_digit_time) > DIAL_TIMEOUT:
-                    dial_number(number)
+                if (number and (not in_call or transfer_pending) and
+                        (time.monotonic() - last_digit_time) > cfg.dial_timeout):
+                    if transfer_pending:
+                        transfer_call(number)
+                    elif number == cfg.playback_code:
+                        dialtone_stop()
+                        playback_start()
+                    else:
+                        dial_number(number)
                     number = ""
-                    pulse_count = 0
+                    decoder.reset()
             else:
                 # Hoerer aufgelegt, sicherheitshalber alles resetten
-                if number or pulse_count:
+                if number or decoder.count:
                     logger.info("Wahl abgebrochen (Hoerer aufgelegt)")
                 number = ""
-                pulse_count = 0
+                decoder.reset()
 
             # Dialtone Status steuern
             # Nur wenn:
@@ -393,34 +1108,84 @@ def main():
             #  - keine Nummer in Eingabe
             #  - kein Call aktiv
             #  - kein eingehender Call
+            playing = cur_hook and not len(calls) and playback_next()
             want_dialtone = (cur_hook and
                              (not number) and
-                             pulse_count == 0 and
+                             not decoder.busy and
                              (not call_in_progress) and
-                             (not incoming_flag) and
-                             (not active_flag))
+                             (not len(calls)) and
+                             not playing)
 
             if want_dialtone:
                 dialtone_start()
             else:
                 dialtone_stop()
 
-            # letzten Puls Zustand aktualisieren
-            last_pulse_state = pulse_state
+            # Dashboard: nur Aenderungen gehen an die Abos
+            ipc.publish(live_state(cur_hook, number, decoder, ringing_now, playing))
+
+            # Lebenszeichen + Iterationszeit (ohne Schlafphase) fuer den Watchdog
+            live.loop_time(time.monotonic() - t_iter)
+            live.checkin("gpio")
+            if now - last_live_log >= LIVE_METRICS_LOG_SEC:
+                logger.info("Liveness Metriken: %s", live.metrics())
+                logger.info("Eingangsfilter: %s", inputs.metrics())
+                logger.info("Audio: %s", audio.metrics())
+                for aor, st in registrations.snapshot().items():
+                    logger.info("Registrierung %s: %s, RTT median %s ms, %d ok / %d fail",
+                                aor, st["status"], st["rtt_med"], st["oks"], st["fails"])
+                last_live_log = now
 
-            time.sleep(0.03)
+            # --- Schlafen bis zur naechsten Flanke, Event oder Frist ---
+            # Eingaenge rechnen monoton, Klingel/Anklopfen mit Wanduhr
+            filter_dl = inputs.next_deadline()
+            mono_deadlines = [gesture.next_deadline(), decoder.next_deadline(),
+                              filter_dl / 1e9 if filter_dl is not None else None,
+                              audio.next_deadline()]
+            if number and (not in_call or transfer_pending):
+                mono_deadlines.append(last_digit_time + cfg.dial_timeout)
+            wall_deadlines = []
+            if ringing_now:
+                wall_deadlines.append(last_incoming_seen + cfg.ring_watchdog_sec)
+            if ringable and talking and cur_hook and not gesture.pending:
+                wall_deadlines.append(last_cw_tap + cfg.cw_repeat_sec)
+            if cfg.voicemail and incoming and not talking and not cur_hook:
+                wall_deadlines.append(voicemail_due(incoming[0], cfg))
+            for c in calls.established():
+                if c.voicemail == "recording":
+                    wall_deadlines.append(c.t_answered + cfg.voicemail_max_sec)
+            if idle_phone and mwi_state.check_at is not None:
+                wall_deadlines.append(mwi_state.check_at)
+            if edge_mode:
+                timeout = IDLE_TICK_SEC
+            else:
+                timeout = POLL_DIAL_SEC if cur_hook else POLL_IDLE_SEC
+            if want_dialtone or playing:
+                timeout = min(timeout, DIALTONE_POLL_SEC)
+            for deadlines, t_now in ((mono_deadlines, time.monotonic()),
+                                     (wall_deadlines, time.time())):
+                for dl in deadlines:
+                    if dl is not None:
+                        # knapp nach der Frist aufwachen, die Vergleiche sind strikt
+                        timeout = min(timeout, dl - t_now + 0.002)
+            wait_wake(timeout)
 
     except KeyboardInterrupt:
         logger.info("Daemon beendet (KeyboardInterrupt)")
+        sd_notify.notify("STOPPING=1")
     except Exception as e:
         logger.exception("Fehler im Daemon: %s", e)
     finally:
         try:
-            ring_stop()
+            ring.run_now("stop")
         except Exception:
             pass
-        dialtone_stop()
+        audio.close()
+        ipc.close()
+        net.close()
         bs.close()
+        if cdr:
+            cdr.close()
         GPIO.cleanup()
         logger.info("GPIO cleanup abgeschlossen")
 
@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+"""
+RetroPhone SIP-Registrierungen
+------------------------------
+Registrierungsstatus je Account (AOR) aus den ctrl_tcp Events von
+baresip (Klasse "register"):
+
+  REGISTERING     REGISTER ist unterwegs (Start der RTT-Messung)
+  REGISTER_OK     Registrar hat bestaetigt
+  REGISTER_FAIL   Registrierung abgelehnt oder Timeout (param = Grund)
+
+Pro Account fuehrt Health einen Ringpuffer (deque mit maxlen) der
+letzten Ergebnisse mit Antwortzeit (REGISTERING -> OK/FAIL), die
+Abstaende der Erneuerungen und die Zeitpunkte der Wechsel OK <-> FAIL.
+Daraus ergibt sich der Zustand fuer die Weboberflaeche:
+
+  ok        zuletzt registriert, Erneuerung im ueblichen Takt
+  fail      letzte Registrierung fehlgeschlagen
+  flapping  mindestens FLAP_MIN_CHANGES Wechsel in FLAP_WINDOW_SEC
+  overdue   laenger als OVERDUE_FACTOR x ueblicher Abstand keine Erneuerung
+
+Die Hauptschleife des Daemons traegt die Events ein; andere Threads
+(IPC fuer die Weboberflaeche) lesen snapshot() oder warten mit wait()
+auf das naechste Ergebnis bestimmter Accounts.
+"""
+
+import time
+import logging
+import threading
+from collections import deque
+
+logger = logging.getLogger("retrophone")
+
+REGISTERING   = "REGISTERING"
+REGISTER_OK   = "REGISTER_OK"
+REGISTER_FAIL = "REGISTER_FAIL"
+FINAL_TYPES   = (REGISTER_OK, REGISTER_FAIL)
+
+HISTORY          = 60       # Ergebnisse je Account im Ringpuffer
+FLAP_WINDOW_SEC  = 900.0
+FLAP_MIN_CHANGES = 4        # Wechsel OK <-> FAIL im Fenster = Flattern
+OVERDUE_FACTOR   = 1.5      # Erneuerung so viel spaeter als ueblich = ueberfaellig
+RTT_MAX_SEC      = 60.0     # aeltere REGISTERING-Marken nicht als RTT werten
+
+ST_OK       = "ok"
+ST_FAIL     = "fail"
+ST_FLAPPING = "flapping"
+ST_OVERDUE  = "overdue"
+ST_UNKNOWN  = "unknown"
+
+
+class Health:
+    __slots__ = ("samples", "changes", "intervals", "t_sent", "last_type", "last_param",
+                 "last_time", "last_ok", "oks", "fails", "flapping")
+
+    def __init__(self):
+        self.samples    = deque(maxlen=HISTORY)   # (zeit, ok, rtt_ms | None)
+        self.changes    = deque(maxlen=64)        # Zeitpunkte der Wechsel OK <-> FAIL
+        self.intervals  = deque(maxlen=8)         # Abstaende zwischen REGISTER_OK (s)
+        self.t_sent     = None
+        self.last_type  = ""
+        self.last_param = ""
+        self.last_time  = 0.0
+        self.last_ok    = 0.0
+        self.oks        = 0
+        self.fails      = 0
+        self.flapping   = False
+
+    def refresh_sec(self):
+        """Ueblicher Abstand der Erneuerungen (Median), 0 wenn unbekannt."""
+        if not self.intervals:
+            return 0.0
+        iv = sorted(self.intervals)
+        return iv[len(iv) // 2]
+
+    def recent_changes(self, now):
+        return sum(1 for t in self.changes if now - t <= FLAP_WINDOW_SEC)
+
+    def status(self, now):
+        if not self.last_type:
+            return ST_UNKNOWN
+        if self.recent_changes(now) >= FLAP_MIN_CHANGES:
+            return ST_FLAPPING
+        if self.last_type == REGISTER_FAIL:
+            return ST_FAIL
+        refresh = self.refresh_sec()
+        if refresh and now - self.last_ok > refresh * OVERDUE_FACTOR:
+            return ST_OVERDUE
+        return ST_OK
+
+
+class Registrations:
+    def __init__(self):
+        self.cond = threading.Condition()
+        self.state = {}      # aor -> Health
+
+    def update(self, ev, now=None):
+        """Event von baresip eintragen; True, wenn sich das Ergebnis (OK/FAIL) geaendert hat."""
+        typ = ev.get("type") or ""
+        aor = ev.get("accountaor") or ""
+        if not aor or (typ != REGISTERING and typ not in FINAL_TYPES):
+            return False
+        now = now if now is not None else time.time()
+        with self.cond:
+            h = self.state.get(aor)
+            if h is None:
+                h = self.state[aor] = Health()
+            if typ == REGISTERING:
+                if h.t_sent is None:
+                    h.t_sent = now
+                return False
+            rtt = None
+            if h.t_sent is not None and now - h.t_sent <= RTT_MAX_SEC:
+                rtt = round((now - h.t_sent) * 1000.0, 1)
+            h.t_sent = None
+            ok = typ == REGISTER_OK
+            changed = h.last_type != typ
+            if h.last_type and changed:
+                h.changes.append(now)
+            if ok:
+                if h.last_ok:
+                    h.intervals.append(now - h.last_ok)
+                h.last_ok = now
+                h.oks += 1
+            else:
+                h.fails += 1
+            h.samples.append((now, ok, rtt))
+            h.last_type, h.last_param, h.last_time = typ, ev.get("param") or "", now
+            flapping = h.recent_changes(now) >= FLAP_MIN_CHANGES
+            if flapping != h.flapping:
+                h.flapping = flapping
+                if flapping:
+                    logger.warning("Registrierung %s flattert: %d Wechsel in %.0f min",
+                                   aor, h.recent_changes(now), FLAP_WINDOW_SEC / 60)
+                else:
+                    logger.info("Registrierung %s wieder stabil", aor)
+            self.cond.notify_all()
+        return changed or not ok
+
+    def forget(self, aor):
+        with self.cond:
+            self.state.pop(aor, None)
+
+    def snapshot(self, now=None):
+        """Zustand aller Accounts fuer die Weboberflaeche (JSON-tauglich)."""
+        now = now if now is not None else time.time()
+        out = {}
+        with self.cond:
+            for aor, h in self.state.items():
+                rtts = [s[2] for s in h.samples if s[2] is not None]
+                out[aor] = {
+                    "type":     h.last_type,
+                    "param":    h.last_param,
+                    "time":     h.last_time,
+                    "status":   h.status(now),
+                    "last_ok":  h.last_ok,
+                    "refresh":  round(h.refresh_sec(), 1),
+                    "oks":      h.oks,
+                    "fails":    h.fails,
+                    "changes":  h.recent_changes(now),
+                    "rtt_ms":   rtts[-1] if rtts else None,
+                    "rtt_med":  sorted(rtts)[len(rtts) // 2] if rtts else None,
+                    # Verlauf fuer die Sparkline: [ok, rtt_ms | None] je Ergebnis
+                    "history":  [[s[1], s[2]] for s in h.samples],
+                }
+        return out
+
+    def statuses(self, now=None):
+        """Nur der Status je Account (Live-Zustand fuer das Dashboard)."""
+        now = now if now is not None else time.time()
+        with self.cond:
+            return {aor: h.status(now) for aor, h in self.state.items()}
+
+    def wait(self, aors, since: float, timeout: float):
+        """
+        Wartet, bis fuer jeden AOR ein Ergebnis nach since vorliegt, hoechstens
+        timeout Sekunden. Liefert {aor: {"type", "param", "time"} | None}.
+        """
+        deadline = time.time() + timeout
+        with self.cond:
+            while True:
+                missing = [a for a in aors
+                           if a not in self.state or self.state[a].last_time < since]
+                left = deadline - time.time()
+                if not missing or left <= 0:
+                    break
+                self.cond.wait(left)
+            out = {}
+            for a in aors:
+                h = self.state.get(a)
+                out[a] = ({"type": h.last_type, "param": h.last_param, "time": h.last_time}
+                          if h and h.last_type and h.last_time >= since else None)
+            return out
@@ -0,0 +1,309 @@
+#!/usr/bin/env python3
+"""
+RetroPhone Konfiguration
+------------------------
+Eine Datei fuer Daemon und Klingeltreiber:
+
+  /etc/retrophone/retrophone.conf
+
+  [daemon]
+  dial_timeout = 4.0
+  [ring]
+  single_coil = no
+
+Jeder Schluessel steht mit Typ, Standardwert, erlaubtem Bereich und
+"live"-Flag in SCHEMA. Geladen wird in einen unveraenderlichen Snapshot
+(Config, mit __slots__); Konsumenten lesen immer store.current und
+bekommen so entweder die alte oder die neue Konfiguration, nie eine
+Mischung. Eine fehlerhafte Datei wird komplett verworfen, der alte
+Snapshot bleibt aktiv.
+
+Schluessel mit live=False (Pins, baresip-Adresse) wirken erst nach
+einem Neustart; beim Reload bleibt dafuer der alte Wert stehen.
+
+Als Skript:  retro_config.py [datei]     Datei pruefen und Werte zeigen
+             retro_config.py --defaults  Vorlage mit allen Standardwerten
+"""
+
+import os
+import sys
+import math
+import logging
+
+logger = logging.getLogger("retrophone")
+
+CONFIG_PATH = "/etc/retrophone/retrophone.conf"
+
+
+class Field:
+    __slots__ = ("section", "name", "type", "default", "lo", "hi", "live", "help")
+
+    def __init__(self, section, name, type_, default, lo=None, hi=None, live=True, help=""):
+        self.section = section
+        self.name    = name
+        self.type    = type_      # int, float, bool, str oder Tupel erlaubter Werte
+        self.default = default
+        self.lo      = lo
+        self.hi      = hi
+        self.live    = live
+        self.help    = help
+
+
+SCHEMA = (
+    # --- phone_daemon.py ---
+    Field("daemon", "pin_pulse", int, 23, 0, 27, False, "Waehlimpulse (BCM)"),
+    Field("daemon", "pin_hook", int, 18, 0, 27, False, "Hoerer-Schalter (BCM)"),
+    Field("daemon", "pin_pos1", int, 24, 0, 27, False, "Ruecklaufkontakt (BCM)"),
+    Field("daemon", "dial_timeout", float, 4.0, 1.0, 30.0, True, "Sekunden nach der letzten Ziffer bis zur Wahl"),
+    Field("daemon", "min_pulse", float, 0.004, 0.001, 0.05, True, "kuerzester gueltiger Impuls (s)"),
+    Field("daemon", "max_pulse", float, 0.12, 0.03, 0.2, True, "laengster gueltiger Impuls (s)"),
+    Field("daemon", "digit_gap", float, 0.25, 0.1, 1.0, True, "Ruhe nach dem letzten Impuls -> Ziffer fertig (s)"),
+    Field("daemon", "pulse_filter", ("integrator", "stable"), "integrator", None, None, True, "Entprellung Impulsleitung"),
+    Field("daemon", "pulse_settle", float, 0.003, 0.0, 0.02, True, "Entprellzeit Impulsleitung (s)"),
+    Field("daemon", "hook_settle", float, 0.010, 0.0, 0.1, True, "Entprellzeit Gabel (s)"),
+    Field("daemon", "pos1_settle", float, 0.010, 0.0, 0.1, True, "Entprellzeit Ruecklaufkontakt (s)"),
+    Field("daemon", "hook_bounce_max", float, 0.08, 0.0, 0.5, True, "kuerzer aufgelegt = Prellen (s)"),
+    Field("daemon", "hook_flash_max", float, 0.6, 0.1, 2.0, True, "laenger aufgelegt = Auflegen (s)"),
+    Field("daemon", "hook_flash_gap", float, 0.4, 0.1, 2.0, True, "Abstand, bis Flashes zusammenzaehlen (s)"),
+    Field("daemon", "ring_watchdog_sec", float, 2.0, 0.5, 30.0, True, "Klingel aus ohne Verbindung zu baresip (s)"),
+    Field("daemon", "cw_tap_ms", int, 120, 20, 1000, True, "Anklopf-Glockenschlag (ms)"),
+    Field("daemon", "cw_repeat_sec", float, 8.0, 1.0, 60.0, True, "Wiederholung Anklopf-Signal (s)"),
+    Field("daemon", "dtmf_queue_max", int, 32, 1, 256, True, "gepufferte DTMF-Ziffern"),
+    Field("daemon", "bs_host", str, "127.0.0.1", None, None, False, "baresip ctrl_tcp Host"),
+    Field("daemon", "bs_port", int, 4444, 1, 65535, False, "baresip ctrl_tcp Port"),
+    Field("daemon", "net_probe_sec", float, 60.0, 10.0, 3600.0, True, "Messrunde zum Registrar alle (s)"),
+    Field("daemon", "net_probe_count", int, 5, 1, 20, True, "SIP OPTIONS je Messrunde"),
+    Field("daemon", "wlan_iface", str, "wlan0", None, None, True, "WLAN-Interface"),
+    Field("daemon", "wlan_power_save_off", bool, True, None, None, True, "WLAN-Stromsparen ausschalten"),
+    Field("daemon", "audio_device", str, "retrophone", None, None, True, "ALSA-Geraet fuer den Waehlton (wie baresip)"),
+    Field("daemon", "audio_warmup", bool, True, None, None, True, "Geraet waehrend des Klingelns offen halten"),
+    Field("daemon", "voicemail", bool, False, None, None, True, "Anrufbeantworter"),
+    Field("daemon", "voicemail_rings", int, 5, 1, 30, True, "Klingelzyklen bis der Anrufbeantworter annimmt"),
+    Field("daemon", "voicemail_max_sec", float, 120.0, 10.0, 600.0, True, "laengste Nachricht (s)"),
+    Field("daemon", "voicemail_format", ("flac", "opus"), "flac", None, None, True, "Format der Nachrichten"),
+    Field("daemon", "mwi_signal", bool, True, None, None, True, "Glockenzeichen bei neuen Nachrichten"),
+    Field("daemon", "mwi_repeat_sec", float, 1800.0, 60.0, 86400.0, True, "Glockenzeichen hoechstens alle (s)"),
+    Field("daemon", "mwi_pattern", str, "80,200,80,200,80", None, None, True, "Glockenzeichen: an,aus,an,... (ms)"),
+    Field("daemon", "mwi_missed", bool, True, None, None, True, "verpasste Anrufe zaehlen als neue Nachricht"),
+    Field("daemon", "playback_code", str, "99", None, None, True, "Nummer zum Abhoeren der Nachrichten"),
+    Field("daemon", "rt_priority", int, 0, 0, 89, False, "SCHED_FIFO fuer GPIO-Schleife und Klingel (0 = aus)"),
+    Field("daemon", "cpu_core", int, -1, -1, 63, False, "Kern fuer GPIO-Schleife und Klingel (-1 = alle)"),
+    # --- ring_control.py ---
+    Field("ring", "ring_pin_a", int, 17, 0, 27, False, "Spule A (BCM)"),
+    Field("ring", "ring_pin_b", int, 27, 0, 27, False, "Spule B (BCM)"),
+    Field("ring", "single_coil", bool, False, None, None, True, "nur eine Spule"),
+    Field("ring", "toggle_interval", float, 0.02, 0.005, 0.1, True, "Umschaltintervall der Spulen (s)"),
+    Field("ring", "cadence_on_ms", int, 1000, 100, 10000, True, "Klingeln (ms)"),
+    Field("ring", "cadence_off_ms", int, 3000, 100, 10000, True, "Pause (ms)"),
+    # --- log_archive.py ---
+    Field("logs", "log_keep_days", int, 90, 1, 3650, True, "gepackte Logs so viele Tage behalten"),
+    Field("logs", "log_max_mb", int, 64, 1, 4096, True, "hoechstens so viel Platz fuer gepackte Logs (MB)"),
+    Field("logs", "log_compression", ("auto", "zstd", "gzip"), "auto", None, None, True, "auto = zstd, wenn installiert"),
+)
+
+FIELDS = {f.name: f for f in SCHEMA}
+SECTIONS = tuple(dict.fromkeys(f.section for f in SCHEMA))
+
+_TRUE  = ("1", "yes", "true", "on", "ja")
+_FALSE = ("0", "no", "false", "off", "nein")
+
+
+class Config:
+    """Unveraenderlicher Snapshot aller Einstellungen."""
+    __slots__ = tuple(FIELDS)
+
+    def __init__(self, values=None):
+        values = values or {}
+        for f in SCHEMA:
+            object.__setattr__(self, f.name, values.get(f.name, f.default))
+
+    def __setattr__(self, name, value):
+        raise AttributeError("Config ist unveraenderlich")
+
+    def as_dict(self):
+        return {name: getattr(self, name) for name in FIELDS}
+
+    def diff(self, other):
+        """Namen der Schluessel, die sich gegenueber other unterscheiden."""
+        return [n for n in FIELDS if getattr(self, n) != getattr(other, n)]
+
+
+def _convert(f: Field, raw: str):
+    if isinstance(f.type, tuple):
+        v = raw.lower()
+        if v not in f.type:
+            raise ValueError(f"erlaubt: {', '.join(f.type)}")
+        return v
+    if f.type is bool:
+        v = raw.lower()
+        if v in _TRUE:
+            return True
+        if v in _FALSE:
+            return False
+        raise ValueError("erwartet yes/no")
+    if f.type is str:
+        return raw
+    v = f.type(raw)
+    if f.type is float and not math.isfinite(v):
+        # nan besteht jeden Bereichsvergleich, inf braucht keine Grenze
+        raise ValueError("erwartet eine endliche Zahl")
+    if (f.lo is not None and v < f.lo) or (f.hi is not None and v > f.hi):
+        raise ValueError(f"erlaubt {f.lo} .. {f.hi}")
+    return v
+
+
+def parse(text: str):
+    """Liefert (Config, Fehlerliste). Bei Fehlern ist Config None."""
+    values = {}
+    errors = []
+    section = None
+    for lineno, line in enumerate(text.splitlines(), 1):
+        line = line.split("#", 1)[0].strip()
+        if not line:
+            continue
+        if line.startswith("[") and line.endswith("]"):
+            section = line[1:-1].strip().lower()
+            if section not in SECTIONS:
+                errors.append(f"Zeile {lineno}: unbekannter Abschnitt [{section}]")
+            continue
+        key, sep, raw = line.partition("=")
+        key, raw = key.strip().lower(), raw.strip()
+        f = FIELDS.get(key)
+        if not sep or f is None:
+            errors.append(f"Zeile {lineno}: unbekannter Schluessel: {key}")
+            continue
+        if f.section != section:
+            errors.append(f"Zeile {lineno}: {key} gehoert in [{f.section}]")
+            continue
+        if key in values:
+            errors.append(f"Zeile {lineno}: {key} doppelt")
+            continue
+        try:
+            values[key] = _convert(f, raw)
+        except ValueError as e:
+            errors.append(f"Zeile {lineno}: {key} = {raw}: {e or 'ungueltig'}")
+    if (values.get("min_pulse", FIELDS["min_pulse"].default) >=
+            values.get("max_pulse", FIELDS["max_pulse"].default)):
+        errors.append("min_pulse muss kleiner als max_pulse sein")
+    pins = [values.get(n, FIELDS[n].default)
+            for n in ("pin_pulse", "pin_hook", "pin_pos1", "ring_pin_a", "ring_pin_b")]
+    if len(set(pins)) != len(pins):
+        errors.append(f"GPIO-Pins doppelt belegt: {pins}")
+    if errors:
+        return None, errors
+    return Config(values), []
+
+
+def default_text():
+    """Vollstaendige Datei mit allen Standardwerten (Vorlage fuer die Weboberflaeche)."""
+    out = ["# RetroPhone Konfiguration", "# Aenderungen wirken ohne Neustart, ausser (Neustart)", ""]
+    for section in SECTIONS:
+        out.append(f"[{section}]")
+        for f in SCHEMA:
+            if f.section != section:
+                continue
+            if f.type is bool:
+                val = "yes" if f.default else "no"
+            else:
+                val = str(f.default)
+            note = f.help + ("" if f.live else " (Neustart)")
+            out.append(f"{f.name} = {val}    # {note}")
+        out.append("")
+    return "\n".join(out)
+
+
+class ConfigStore:
+    """Haelt den aktuellen Snapshot und tauscht ihn beim Reload als Ganzes."""
+
+    def __init__(self, path=CONFIG_PATH, log=None):
+        self.path = path
+        self.log = log or logger     # ring_control.py schreibt in sein eigenes Log
+        self.current = Config()
+        self.mtime = None
+        self.errors = []
+
+    def _read(self):
+        try:
+            st = os.stat(self.path)
+        except OSError:
+            return None, 0
+        with open(self.path, "r", encoding="utf-8") as f:
+            return f.read(), st.st_mtime_ns
+
+    def load(self):
+        """Erstes Laden beim Start; ohne Datei gelten die Standardwerte."""
+        try:
+            text, self.mtime = self._read()
+        except OSError as e:
+            self.log.error("Konfiguration %s nicht lesbar: %s", self.path, e)
+            return self.current
+        if text is None:
+            return self.current
+        cfg, self.errors = parse(text)
+        for err in self.errors:
+            self.log.error("Konfiguration: %s", err)
+        if cfg:
+            self.current = cfg
+        else:
+            self.log.error("Konfiguration %s verworfen, Standardwerte aktiv", self.path)
+        return self.current
+
+    def maybe_reload(self):
+        """Reload, wenn sich die mtime geaendert hat. Liefert geaenderte Schluessel."""
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+        except OSError:
+            mtime = 0
+        if mtime == self.mtime:
+            return []
+        return self.reload()
+
+    def reload(self):
+        """Datei neu lesen und Snapshot tauschen. Liefert geaenderte Schluessel."""
+        try:
+            text, self.mtime = self._read()
+        except OSError as e:
+            self.log.error("Konfiguration %s nicht lesbar: %s", self.path, e)
+            return []
+        cfg, self.errors = parse(text if text is not None else "")
+        if cfg is None:
+            for err in self.errors:
+                self.log.error("Konfiguration: %s", err)
+            self.log.error("Reload verworfen, bisherige Konfiguration bleibt aktiv")
+            return []
+        old = self.current
+        values = cfg.as_dict()
+        for name in cfg.diff(old):
+            if not FIELDS[name].live:
+                self.log.warning("Konfiguration: %s wirkt erst nach Neustart (%s -> %s)",
+                               name, getattr(old, name), values[name])
+                values[name] = getattr(old, name)
+        new = Config(values)
+        changed = new.diff(old)
+        self.current = new
+        if changed:
+            self.log.info("Konfiguration neu geladen: %s",
+                        ", ".join(f"{n}={getattr(new, n)}" for n in changed))
+        return changed
+
+
+def main():
+    path = sys.argv[1] if len(sys.argv) > 1 else CONFIG_PATH
+    if len(sys.argv) > 1 and sys.argv[1] == "--defaults":
+        print(default_text())
+        return
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            cfg, errors = parse(f.read())
+    except OSError as e:
+        print(f"{path}: {e}", file=sys.stderr)
+        sys.exit(1)
+    for err in errors:
+        print(f"{path}: {err}", file=sys.stderr)
+    if errors:
+        sys.exit(1)
+    for name, val in cfg.as_dict().items():
+        print(f"{name} = {val}")
+
+if __name__ == "__main__":
+    main()
@@ -3,15 +3,7 @@ import os, sys, time, signal, logging, logging.handlers
 
 import RPi.GPIO as GPIO
 
-# === Pins ===
-RING_A_PIN = 17    # Spule A
-RING_B_PIN = 27    # Spule B (bei SINGLE_COIL nicht genutzt)
-
-# Wenn du nur 1 Spule hast, auf True setzen
-SINGLE_COIL = False
-
-# Umschaltintervall der Spulen (Sekunden)
-TOGGLE_INTERVAL = 0.02  # ~25 Hz
+from retro_config import ConfigStore
 
 LOG_DIR = "/var/log/retrophone"
 PID_DIR = "/run/retrophone"
@@ -26,13 +18,32 @@ handler = logging.handlers.TimedRotatingFileHandler(LOG_PATH, when="midnight", b
 handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(message)s"))
 logger.addHandler(handler)
 
+# === Konfiguration ([ring] in /etc/retrophone/retrophone.conf) ===
+conf = ConfigStore(log=logger)
+cfg = conf.load()
+
+# === Pins ===
+RING_A_PIN = cfg.ring_pin_a    # Spule A
+RING_B_PIN = cfg.ring_pin_b    # Spule B (bei single_coil nicht genutzt)
+
 stop_flag = False
+reload_flag = False
 
 def sigterm_handler(signum, frame):
     global stop_flag
     stop_flag = True
     logger.info("Signal %s empfangen -> stop", signum)
 
+def sighup_handler(signum, frame):
+    global reload_flag
+    reload_flag = True
+
+def rt_setup():
+    """Spulen-Takt mit Echtzeit-Prioritaet (rt_priority / cpu_core, siehe rt_sched.py)."""
+    if cfg.rt_priority > 0 or cfg.cpu_core >= 0:
+        import rt_sched
+        rt_sched.set_thread(0, "Klingel", cfg.rt_priority, cfg.cpu_core, log=logger)
+
 def gpio_setup():
     GPIO.setmode(GPIO.BCM)
     GPIO.setup(RING_A_PIN, GPIO.OUT, initial=GPIO.LOW)
@@ -75,27 +86,32 @@ def remove_pid():
         pass
 
 def parse_cadence():
-    # Umgebungsvariable "RINGCADENCE" im Format "on_ms,off_ms"
-    cad = os.environ.get("RINGCADENCE", "1000,3000")
+    # Umgebungsvariable "RINGCADENCE" im Format "on_ms,off_ms" hat Vorrang vor der Konfiguration
+    default = (cfg.cadence_on_ms / 1000.0, cfg.cadence_off_ms / 1000.0)
+    cad = os.environ.get("RINGCADENCE")
+    if not cad:
+        return default
     try:
         on_ms, off_ms = [int(x.strip()) for x in cad.split(",")]
         on_ms = max(100, min(on_ms, 10000))
         off_ms = max(100, min(off_ms, 10000))
         return on_ms/1000.0, off_ms/1000.0
     except Exception:
-        logger.warning("Ungültige RINGCADENCE '%s' -> 1000,3000", cad)
-        return 1.0, 3.0
+        logger.warning("Ungültige RINGCADENCE '%s' -> %d,%d", cad,
+                       cfg.cadence_on_ms, cfg.cadence_off_ms)
+        return default
 
 def ring_burst(duration_s):
     """Lässt für duration_s Sekunden klingeln."""
     end_t = time.time() + duration_s
-    if SINGLE_COIL:
+    toggle = cfg.toggle_interval    # Umschaltintervall der Spulen, ~25 Hz
+    if cfg.single_coil:
         # Eine Spule rhythmisch pulsen
         while not stop_flag and time.time() < end_t:
             GPIO.output(RING_A_PIN, GPIO.HIGH)
-            time.sleep(TOGGLE_INTERVAL)
+            time.sleep(toggle)
             GPIO.output(RING_A_PIN, GPIO.LOW)
-            time.sleep(TOGGLE_INTERVAL)
+            time.sleep(toggle)
     else:
         # Zwei Spulen alternierend
         state = False
@@ -103,10 +119,11 @@ def ring_burst(duration_s):
             state = not state
             GPIO.output(RING_A_PIN, GPIO.HIGH if state else GPIO.LOW)
             GPIO.output(RING_B_PIN, GPIO.LOW  if state else GPIO.HIGH)
-            time.sleep(TOGGLE_INTERVAL)
+            time.sleep(toggle)
         gpio_all_low()
 
 def cmd_start():
+    global cfg, reload_flag
     # Bereits laufend?
     old = read_pid()
     if old:
@@ -123,17 +140,25 @@ def cmd_start():
     # Im Vordergrund laufen, PID direkt vom echten Prozess schreiben
     signal.signal(signal.SIGTERM, sigterm_handler)
     signal.signal(signal.SIGINT,  sigterm_handler)
+    signal.signal(signal.SIGHUP,  sighup_handler)
 
     write_own_pid()
 
+    rt_setup()
     gpio_setup()
     gpio_all_low()
 
     on_s, off_s = parse_cadence()
-    logger.info("Start ring loop (on=%.3fs off=%.3fs single=%s)", on_s, off_s, SINGLE_COIL)
+    logger.info("Start ring loop (on=%.3fs off=%.3fs single=%s)", on_s, off_s, cfg.single_coil)
 
     try:
         while not stop_flag:
+            # Aenderungen an der Konfiguration ab dem naechsten Klingelzyklus
+            changed = conf.reload() if reload_flag else conf.maybe_reload()
+            reload_flag = False
+            if changed:
+                cfg = conf.current
+                on_s, off_s = parse_cadence()
             ring_burst(on_s)
             if stop_flag:
                 break
@@ -199,6 +224,7 @@ def cmd_status():
     return 1
 
 def cmd_oneshot(ms):
+    rt_setup()
     gpio_setup()
     try:
         logger.info("Oneshot %d ms", ms)
@@ -208,9 +234,25 @@ def cmd_oneshot(ms):
         gpio_cleanup()
     return 0
 
+def cmd_pattern(pattern):
+    """Kurzes Zeichen: abwechselnd Glocke an / aus (ms), z. B. 80,200,80."""
+    rt_setup()
+    gpio_setup()
+    try:
+        logger.info("Pattern %s", ",".join(str(ms) for ms in pattern))
+        for i, ms in enumerate(pattern):
+            if i % 2 == 0:
+                ring_burst(ms/1000.0)
+                gpio_all_low()
+            else:
+                time.sleep(ms/1000.0)
+    finally:
+        gpio_cleanup()
+    return 0
+
 def main():
     if len(sys.argv) < 2:
-        print("Usage: ring_control.py {start|stop|status|oneshot <ms>}", file=sys.stderr)
+        print("Usage: ring_control.py {start|stop|status|oneshot <ms>|pattern <ms,ms,...>}", file=sys.stderr)
         sys.exit(2)
     cmd = sys.argv[1]
     if cmd == "start":
@@ -229,8 +271,15 @@ def main():
             print("Ungültige Zahl", file=sys.stderr)
             sys.exit(2)
         sys.exit(cmd_oneshot(ms))
+    elif cmd == "pattern":
+        try:
+            pattern = [int(x) for x in sys.argv[2].split(",")]
+        except (IndexError, ValueError):
+            print("Usage: ring_control.py pattern <ms,ms,...>", file=sys.stderr)
+            sys.exit(2)
+        sys.exit(cmd_pattern(pattern))
     else:
-        print("Usage: ring_control.py {start|stop|status|oneshot <ms>}", file=sys.stderr)
+        print("Usage: ring_control.py {start|stop|status|oneshot <ms>|pattern <ms,ms,...>}", file=sys.stderr)
         sys.exit(2)
 
 if __name__ == "__main__":
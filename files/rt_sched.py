@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+RetroPhone Echtzeit-Scheduling
+------------------------------
+Ressourcen-Profil "realtime" (Installer, RESOURCE_PROFILE):
+
+  phone-daemon   GPIO-Schleife und Flanken-Thread von RPi.GPIO mit
+                 SCHED_FIFO rt_priority auf Kern cpu_core
+  ring_control   Spulen-Takt ebenso (eigener Prozess je Klingeln)
+  baresip        Nice=-10, alle Kerne ausser cpu_core
+  webapp         Nice=10, CPUQuota, alle Kerne ausser cpu_core
+
+Linux setzt Prioritaet und Kern je Thread (tid); 0 = aufrufender
+Thread. Mit SCHED_RESET_ON_FORK laufen Threads und Prozesse, die ein
+Echtzeit-Thread startet (aplay, sox, Hilfs-Threads), wieder mit normaler
+Prioritaet. Den Kern erben sie; dort verdraengt die GPIO-Schleife sie.
+
+Ohne Root braucht SCHED_FIFO ein RLIMIT_RTPRIO (LimitRTPRIO= im
+Service); fehlt es, bleibt alles wie es ist, mit Warnung im Log.
+
+Als Skript:  rt_sched.py [pid]   Prioritaet und Kerne aller Threads zeigen
+"""
+
+import os
+import sys
+import logging
+import threading
+
+logger = logging.getLogger("retrophone")
+
+
+def set_thread(tid, name, priority, core, log=None):
+    """
+    Thread tid (0 = aufrufender) auf SCHED_FIFO priority (0 = unveraendert)
+    und Kern core (-1 = unveraendert). Liefert die Beschreibung dessen, was
+    gesetzt wurde ('' = nichts).
+    """
+    log = log or logger
+    done = []
+    if core >= 0:
+        try:
+            os.sched_setaffinity(tid, {core})
+            done.append(f"Kern {core}")
+        except (OSError, ValueError) as e:
+            log.warning("%s: Kern %d nicht moeglich: %s", name, core, e)
+    if priority > 0:
+        try:
+            os.sched_setscheduler(tid, os.SCHED_FIFO | os.SCHED_RESET_ON_FORK,
+                                  os.sched_param(priority))
+            done.append(f"SCHED_FIFO {priority}")
+        except (OSError, AttributeError) as e:
+            log.warning("%s: Echtzeit-Prioritaet %d nicht moeglich (LimitRTPRIO?): %s",
+                        name, priority, e)
+    if done:
+        log.info("%s: %s", name, ", ".join(done))
+    return ", ".join(done)
+
+
+def foreign_threads():
+    """tids dieses Prozesses, die Python nicht kennt (C-Threads, z. B. von RPi.GPIO)."""
+    known = {t.native_id for t in threading.enumerate()}
+    try:
+        tids = [int(t) for t in os.listdir("/proc/self/task")]
+    except OSError:
+        return []
+    return sorted(t for t in tids if t not in known)
+
+
+def describe(pid="self"):
+    """[(tid, name, Policy, Prioritaet, Kerne), ...] fuer alle Threads von pid."""
+    policies = {os.SCHED_OTHER: "OTHER", os.SCHED_FIFO: "FIFO", os.SCHED_RR: "RR",
+                getattr(os, "SCHED_BATCH", -1): "BATCH", getattr(os, "SCHED_IDLE", -2): "IDLE"}
+    out = []
+    for t in sorted(os.listdir(f"/proc/{pid}/task"), key=int):
+        tid = int(t)
+        try:
+            with open(f"/proc/{pid}/task/{t}/comm") as f:
+                name = f.read().strip()
+            policy = os.sched_getscheduler(tid) & ~getattr(os, "SCHED_RESET_ON_FORK", 0)
+            prio = os.sched_getparam(tid).sched_priority
+            cores = sorted(os.sched_getaffinity(tid))
+        except OSError:
+            continue
+        out.append((tid, name, policies.get(policy, str(policy)), prio, cores))
+    return out
+
+
+def main():
+    pid = sys.argv[1] if len(sys.argv) > 1 else "self"
+    for tid, name, policy, prio, cores in describe(pid):
+        print(f"{tid:>7} {name:<16} {policy:<6} {prio:>3}  Kerne {','.join(map(str, cores))}")
+
+if __name__ == "__main__":
+    main()
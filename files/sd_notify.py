@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+"""
+RetroPhone sd_notify
+--------------------
+Minimale Umsetzung des systemd Notify-Protokolls ohne Abhaengigkeiten:
+ein Datagramm an den Unix-Socket aus $NOTIFY_SOCKET.
+
+  notify("READY=1")        Dienst ist benutzbar (Type=notify)
+  notify("WATCHDOG=1")     Lebenszeichen fuer WatchdogSec=
+  notify("STATUS=...")     Text fuer systemctl status
+
+Ohne NOTIFY_SOCKET (z. B. manuell gestartet) sind alle Aufrufe No-Ops.
+"""
+
+import os
+import socket
+
+_sock = None
+_addr = None
+
+
+def _target():
+    addr = os.environ.get("NOTIFY_SOCKET", "")
+    if not addr:
+        return None
+    if addr[0] == "@":
+        # abstrakter Namespace
+        addr = "\0" + addr[1:]
+    return addr
+
+
+def notify(*lines) -> bool:
+    """Schickt eine oder mehrere Zeilen KEY=VALUE. True, wenn gesendet."""
+    global _sock, _addr
+    if _addr is None:
+        _addr = _target() or ""
+    if not _addr:
+        return False
+    try:
+        if _sock is None:
+            _sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM | socket.SOCK_CLOEXEC)
+        _sock.sendto("\n".join(lines).encode("utf-8"), _addr)
+        return True
+    except OSError:
+        return False
+
+
+def watchdog_interval():
+    """
+    Sekunden zwischen zwei WATCHDOG=1 (halbe WatchdogSec), oder None,
+    wenn systemd fuer diesen Prozess keinen Watchdog erwartet.
+    """
+    usec = os.environ.get("WATCHDOG_USEC", "")
+    pid = os.environ.get("WATCHDOG_PID", "")
+    if not usec.isdigit() or int(usec) == 0:
+        return None
+    if pid and pid.isdigit() and int(pid) != os.getpid():
+        return None
+    return int(usec) / 2e6
@@ -0,0 +1,349 @@
+#!/usr/bin/env python3
+"""
+RetroPhone SIP-Accounts
+-----------------------
+Lesen und Schreiben der baresip accounts-Datei (eine Zeile pro Account):
+
+  "Anna" <sip:anna@sip.example.ch>;auth_user=anna;auth_pass=geheim;regint=300
+
+AccountStore haelt die geparsten Accounts im Speicher und liest die
+Datei nur neu, wenn sich Inode, mtime oder Groesse aendern (ein stat()
+pro Zugriff). Kommentare und Leerzeilen bleiben beim Schreiben an ihrem
+Platz.
+
+Geschrieben wird atomar (tmp + fsync + rename + fsync des Verzeichnisses).
+Vorher kopiert der Prozess die alte Datei selbst nach accounts.bak.<zeit>,
+ebenfalls mit fsync; es bleiben die letzten BACKUP_KEEP Sicherungen.
+
+plan_live() vergleicht alte und neue Accounts feldweise und liefert die
+ctrl_tcp Kommandos, mit denen das laufende baresip nachgezogen wird.
+"""
+
+import os
+import re
+import stat
+import glob
+import time
+
+BACKUP_KEEP = 10
+DEFAULT_PATH  = "/home/pi/.baresip/accounts"
+FALLBACK_PATH = "/etc/baresip/accounts"
+
+ACC_RE = re.compile(
+    r'^\s*(?:"(?P<display>[^"]*)"\s*)?'
+    r'<sip:(?P<aor>[^>]+)>\s*(?P<params>.*)$'
+)
+
+
+# ---------- Zeile <-> Felder ----------
+def empty_account():
+    return {
+        "display":   "",
+        "user":      "",
+        "domain":    "",
+        "transport": "udp",
+        "auth_user": "",
+        "auth_pass": "",
+        "outbound":  "",
+        "regint":    "3600",
+    }
+
+def parse_account(line: str):
+    acc = empty_account()
+    if not line:
+        return acc
+
+    m = ACC_RE.match(line)
+    if not m:
+        return acc
+
+    g = m.groupdict()
+    acc["display"] = g.get("display") or ""
+    aor            = g.get("aor") or ""
+    params         = g.get("params") or ""
+
+    if "@" in aor:
+        userpart, dompart = aor.split("@", 1)
+        if ":" in userpart:
+            user, uri_pw = userpart.split(":", 1)
+            acc["user"] = user
+            if uri_pw:
+                acc["auth_pass"] = uri_pw
+        else:
+            acc["user"] = userpart
+        acc["domain"] = dompart
+    else:
+        acc["user"] = aor
+
+    m_au = re.search(r';\s*auth_user\s*=\s*([^\s;]+)', params)
+    if m_au:
+        acc["auth_user"] = m_au.group(1)
+
+    m_ap = re.search(r';\s*auth_pass\s*=\s*([^\s;]+)', params)
+    if m_ap:
+        acc["auth_pass"] = m_ap.group(1)
+
+    m_ri = re.search(r';\s*regint\s*=\s*(\d+)', params)
+    if m_ri:
+        acc["regint"] = m_ri.group(1)
+
+    m_ob = re.search(r';\s*outbound\s*=\s*"([^"]+)"', params)
+    if m_ob:
+        acc["outbound"] = m_ob.group(1)
+
+    m_tr_uri = re.search(r';\s*transport=([\w]+)', params)
+    if m_tr_uri:
+        acc["transport"] = m_tr_uri.group(1)
+    elif acc["outbound"]:
+        m_tr_out = re.search(r';\s*transport=([\w]+)', acc["outbound"])
+        if m_tr_out:
+            acc["transport"] = m_tr_out.group(1)
+
+    if not acc["auth_user"]:
+        acc["auth_user"] = acc["user"]
+    if not acc["regint"]:
+        acc["regint"] = "3600"
+    if not acc["transport"]:
+        acc["transport"] = "udp"
+
+    return acc
+
+def build_account_line(acc):
+    display   = acc.get("display", "").strip()
+    user      = acc.get("user", "").strip()
+    domain    = acc.get("domain", "").strip()
+    transport = acc.get("transport", "udp").strip() or "udp"
+    auth_user = acc.get("auth_user", "").strip() or user
+    auth_pass = acc.get("auth_pass", "").strip()
+    regint    = acc.get("regint", "").strip() or "300"
+    outbound  = acc.get("outbound", "").strip()
+
+    sip_uri = f"<sip:{user}@{domain}>"
+
+    params = []
+    if auth_user:
+        params.append(f"auth_user={auth_user}")
+    if auth_pass:
+        params.append(f"auth_pass={auth_pass}")
+
+    if outbound:
+        if "transport=" not in outbound and transport:
+            outbound = outbound + f";transport={transport}"
+        params.append(f'outbound="{outbound}"')
+    if regint:
+        params.append(f"regint={regint}")
+
+    disp_prefix = f"\"{display}\" " if display else ""
+    if params:
+        return f"{disp_prefix}{sip_uri};" + ";".join(params)
+    else:
+        return f"{disp_prefix}{sip_uri}"
+
+def default_path():
+    """accounts-Datei von baresip: im Home von pi, sonst systemweit."""
+    return DEFAULT_PATH if os.path.exists(DEFAULT_PATH) else FALLBACK_PATH
+
+def registrar_uri(acc) -> str:
+    """
+    Wohin baresip die REGISTER des Accounts schickt: outbound-Proxy, sonst
+    die Domain, jeweils mit transport (fuer net_monitor).
+    """
+    uri = acc.get("outbound", "").strip() or f"sip:{acc.get('domain', '')}"
+    if "transport=" not in uri and acc.get("transport", "udp") != "udp":
+        uri += f";transport={acc['transport']}"
+    return uri
+
+def account_aor(acc) -> str:
+    """Address of Record, wie baresip den Account kennt (sip:user@domain)."""
+    return f"sip:{acc.get('user', '')}@{acc.get('domain', '')}"
+
+# Felder, die sich ohne neuen User-Agent aendern lassen (uafind + uareg)
+REREGISTER_FIELDS = ("regint",)
+
+def plan_live(old, new):
+    """
+    Kommandos fuer das laufende baresip. Liefert (kommandos, aors), wobei
+    aors die Accounts sind, deren Registrierung danach neu laufen muss.
+
+    - entfernt:               uadel
+    - neu:                    uanew
+    - nur regint geaendert:   uafind + uareg (User-Agent und Calls bleiben)
+    - sonst geaendert:        uadel + uanew
+    """
+    old_by = {account_aor(a): a for a in old}
+    new_by = {account_aor(a): a for a in new}
+    commands = []
+    aors = []
+    for aor in old_by:
+        if aor not in new_by:
+            commands.append(["uadel", aor])
+    for aor, acc in new_by.items():
+        prev = old_by.get(aor)
+        line = acc.get("line") or build_account_line(acc)
+        changed = [k for k in empty_account() if prev is None or prev.get(k) != acc.get(k)]
+        if not changed:
+            continue
+        if prev is not None and all(k in REREGISTER_FIELDS for k in changed):
+            commands.append(["uafind", aor])
+            commands.append(["uareg", acc.get("regint") or "0"])
+        else:
+            if prev is not None:
+                commands.append(["uadel", aor])
+            commands.append(["uanew", line])
+        if (acc.get("regint") or "0") != "0":
+            aors.append(aor)
+    return commands, aors
+
+def is_account_line(line: str) -> bool:
+    s = line.strip()
+    return bool(s) and not s.startswith("#")
+
+
+# ---------- Datei mit Cache ----------
+def _fsync_dir(path):
+    try:
+        fd = os.open(os.path.dirname(path) or ".", os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+def _write_synced(path, data: bytes):
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, stat.S_IRUSR | stat.S_IWUSR)
+    try:
+        os.write(fd, data)
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+    os.chmod(path, stat.S_IRUSR | stat.S_IWUSR)
+
+
+class AccountStore:
+    """
+    Gecachte Sicht auf die accounts-Datei. path_fn liefert den aktuellen
+    Pfad (die Weboberflaeche kennt zwei moegliche Orte).
+    """
+
+    def __init__(self, path_fn, backup_keep=BACKUP_KEEP):
+        self.path_fn = path_fn
+        self.backup_keep = backup_keep
+        self._key = None
+        self._lines = []         # Rohzeilen der Datei ohne Zeilenende
+        self._accounts = []      # [(zeilenindex, account-dict)]
+        self.loads = 0           # Statistik: tatsaechliche Lesevorgaenge
+
+    @property
+    def path(self):
+        return self.path_fn()
+
+    def _stat_key(self, path):
+        try:
+            st = os.stat(path)
+        except OSError:
+            return (path, None)
+        return (path, st.st_dev, st.st_ino, st.st_mtime_ns, st.st_size)
+
+    def _refresh(self):
+        path = self.path
+        key = self._stat_key(path)
+        if key == self._key:
+            return
+        lines = []
+        if key[1] is not None:
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    lines = f.read().splitlines()
+            except OSError:
+                lines = []
+        self._set(key, lines)
+        self.loads += 1
+
+    def _set(self, key, lines):
+        self._key = key
+        self._lines = lines
+        self._accounts = []
+        for i, line in enumerate(lines):
+            if is_account_line(line):
+                acc = parse_account(line.strip())
+                acc["line"] = line.strip()
+                self._accounts.append((i, acc))
+
+    def accounts(self):
+        """Alle Accounts in Dateireihenfolge (Kopien, mit 'line')."""
+        self._refresh()
+        return [dict(acc) for _, acc in self._accounts]
+
+    def get(self, index: int):
+        accs = self.accounts()
+        if 0 <= index < len(accs):
+            return accs[index]
+        return None
+
+    def first(self):
+        """Erster Account oder ein leerer (Dashboard, Formular)."""
+        return self.get(0) or empty_account()
+
+    def save(self, accounts):
+        """
+        Schreibt die Accounts (Liste von Feld-Dicts) in Reihenfolge.
+        Liefert (pfad, alte Accounts, neue Accounts).
+        """
+        self._refresh()
+        path = self.path
+        old = [dict(acc) for _, acc in self._accounts]
+        new_lines = [build_account_line(acc) for acc in accounts]
+
+        # Kommentare bleiben stehen, Account-Zeilen werden der Reihe nach ersetzt
+        out = []
+        pending = list(new_lines)
+        for line in self._lines:
+            if is_account_line(line):
+                if pending:
+                    out.append(pending.pop(0))
+            else:
+                out.append(line)
+        out += pending
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        if self._key[1] is not None:
+            self.backup(path)
+        tmp = path + ".tmp"
+        _write_synced(tmp, ("\n".join(out).rstrip() + "\n").encode("utf-8"))
+        os.replace(tmp, path)
+        _fsync_dir(path)
+
+        self._set(self._stat_key(path), out)
+        new = [dict(acc) for _, acc in self._accounts]
+        return path, old, new
+
+    def backup(self, path):
+        """Sicherung im Prozess (kein cp), danach nur die neuesten behalten."""
+        ts = time.strftime("%Y%m%d-%H%M%S")
+        bak = f"{path}.bak.{ts}"
+        n = 1
+        while os.path.exists(bak):
+            bak = f"{path}.bak.{ts}-{n}"
+            n += 1
+        with open(path, "rb") as f:
+            data = f.read()
+        _write_synced(bak, data)
+        _fsync_dir(bak)
+        self.prune_backups(path)
+        return bak
+
+    def backups(self, path=None):
+        """Vorhandene Sicherungen, neueste zuerst."""
+        path = path or self.path
+        return sorted(glob.glob(glob.escape(path) + ".bak.*"),
+                      key=lambda p: (os.path.getmtime(p), p), reverse=True)
+
+    def prune_backups(self, path):
+        for old in self.backups(path)[self.backup_keep:]:
+            try:
+                os.remove(old)
+            except OSError:
+                pass
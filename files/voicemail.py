@@ -0,0 +1,270 @@
+#!/usr/bin/env python3
+"""
+RetroPhone Anrufbeantworter
+---------------------------
+Nimmt der Daemon einen Call als Anrufbeantworter an, laeuft das so:
+
+1. vor dem accept: baresip laedt das Modul sndfile (module_load). Es
+   schreibt die Audio-Streams des Calls als WAV nach snd_path, also
+   nach SPOOL_DIR (tmpfs unter /run, nicht auf die SD-Karte).
+2. nach CALL_ESTABLISHED: Audio-Quelle des Calls auf die Ansage
+   (ausrc aufile,<greeting.wav>), dazu startet ein Recorder.
+3. Recorder (eigener Thread) folgt der wachsenden *-dec.wav (was der
+   Anrufer sagt) und schiebt sie in festen Bloecken (CHUNK_BYTES) in
+   einen Encoder (sox -> FLAC oder opusenc -> Opus). Im Speicher liegt
+   nie mehr als ein Block; die Spool-Datei ist durch voicemail_max_sec
+   begrenzt und wird danach geloescht.
+4. nach CALL_CLOSED: Encoder fertig, Datei umbenennen, Eintrag in der
+   Tabelle voicemail (calls.db, geschrieben vom CdrWriter).
+
+Die Weboberflaeche liest die Tabelle ueber iter_messages() und liefert
+die Dateien direkt von der Platte aus.
+"""
+
+import os
+import glob
+import time
+import struct
+import logging
+import threading
+
+logger = logging.getLogger("retrophone")
+
+VM_DIR      = "/var/lib/retrophone/voicemail"
+SPOOL_DIR   = "/run/retrophone/vm-spool"     # snd_path in der baresip config
+GREETING    = os.path.join(VM_DIR, "greeting.wav")
+
+CHUNK_BYTES = 64 * 1024   # Block vom WAV in den Encoder
+FOLLOW_SEC  = 0.5         # so oft auf neue Daten in der WAV-Datei schauen
+FIND_SEC    = 5.0         # so lange auf die Spool-Datei von baresip warten
+ENCODE_WAIT = 30.0        # Encoder darf nach dem Ende so lange nacharbeiten
+
+FORMATS = ("flac", "opus")
+MIME = {"flac": "audio/flac", "opus": "audio/ogg"}
+
+
+# ---------- WAV / Encoder ----------
+def wav_header(f):
+    """
+    Liest den Kopf einer (evtl. noch wachsenden) WAV-Datei. Liefert
+    (rate, kanaele, bits, offset der Audiodaten). ValueError, wenn der
+    Kopf (noch) nicht vollstaendig ist.
+    """
+    f.seek(0)
+    riff = f.read(12)
+    if len(riff) < 12 or riff[:4] != b"RIFF" or riff[8:12] != b"WAVE":
+        raise ValueError("kein WAV")
+    rate = channels = bits = None
+    while True:
+        hdr = f.read(8)
+        if len(hdr) < 8:
+            raise ValueError("WAV-Kopf unvollstaendig")
+        cid, size = hdr[:4], struct.unpack("<I", hdr[4:])[0]
+        if cid == b"fmt ":
+            fmt = f.read(size)
+            if len(fmt) < 16:
+                raise ValueError("WAV-Kopf unvollstaendig")
+            _, channels, rate, _, _, bits = struct.unpack("<HHIIHH", fmt[:16])
+        elif cid == b"data":
+            if rate is None:
+                raise ValueError("data vor fmt")
+            return rate, channels, bits, f.tell()
+        else:
+            f.seek(size + (size & 1), os.SEEK_CUR)
+
+def encoder_cmd(fmt, rate, channels, out):
+    """Encoder, der 16 Bit PCM auf stdin erwartet."""
+    if fmt == "opus":
+        return ["opusenc", "--quiet", "--raw", "--raw-rate", str(rate),
+                "--raw-chan", str(channels), "--bitrate", "24", "-", out]
+    return ["sox", "-q", "-t", "raw", "-r", str(rate), "-e", "signed", "-b", "16",
+            "-c", str(channels), "-", "-t", "flac", out]
+
+def decoder_cmd(fmt, path):
+    """Decoder fuer das Abhoeren: schreibt WAV auf stdout (fuer aplay)."""
+    if fmt == "opus":
+        return ["opusdec", "--quiet", "--force-wav", path, "-"]
+    return ["sox", "-q", path, "-t", "wav", "-"]
+
+
+class Recorder:
+    """
+    Folgt der Spool-Datei eines Calls und kodiert sie. on_done(msg) wird
+    im Recorder-Thread mit dem fertigen Eintrag aufgerufen.
+    """
+
+    def __init__(self, call, fmt, since, on_done, spool_dir=SPOOL_DIR, out_dir=VM_DIR):
+        self.call_id  = call.id
+        self.peer_uri = call.peer_uri
+        self.fmt      = fmt if fmt in FORMATS else "flac"
+        self.since    = since
+        self.on_done  = on_done
+        self.spool_dir = spool_dir
+        self.out_dir  = out_dir
+        self.bytes    = 0
+        self._done    = threading.Event()
+        self.thread   = None
+
+    def start(self):
+        self.thread = threading.Thread(target=self._run, name="voicemail", daemon=True)
+        self.thread.start()
+
+    def finish(self):
+        """Call ist beendet: Rest lesen, Encoder schliessen."""
+        self._done.set()
+
+    def _find(self):
+        """Neueste *dec.wav in SPOOL_DIR, die nach since angelegt wurde."""
+        deadline = time.monotonic() + FIND_SEC
+        while True:
+            cands = [p for p in glob.glob(os.path.join(self.spool_dir, "*dec.wav"))
+                     if os.path.getmtime(p) >= self.since - 1.0]
+            if cands:
+                return max(cands, key=os.path.getmtime)
+            if time.monotonic() >= deadline:
+                return None
+            self._done.wait(FOLLOW_SEC)
+
+    def _run(self):
+        import subprocess
+        wav = self._find()
+        if wav is None:
+            logger.error("Anrufbeantworter %s: keine Aufnahme in %s (sndfile geladen?)",
+                         self.call_id, self.spool_dir)
+            return
+        try:
+            f = open(wav, "rb")
+        except OSError as e:
+            logger.error("Anrufbeantworter %s: %s", self.call_id, e)
+            return
+        with f:
+            rate = None
+            while rate is None:
+                try:
+                    rate, channels, bits, offset = wav_header(f)
+                except ValueError:
+                    if self._done.is_set():
+                        logger.error("Anrufbeantworter %s: leere Aufnahme", self.call_id)
+                        self._cleanup(wav)
+                        return
+                    self._done.wait(FOLLOW_SEC)
+            if bits != 16:
+                logger.error("Anrufbeantworter %s: %d Bit nicht unterstuetzt", self.call_id, bits)
+                self._cleanup(wav)
+                return
+            os.makedirs(self.out_dir, exist_ok=True)
+            t_start = time.time()
+            name = time.strftime("%Y%m%d-%H%M%S", time.localtime(t_start))
+            out = os.path.join(self.out_dir, f"{name}-{self.call_id[:8]}.{self.fmt}")
+            part = out + ".part"
+            try:
+                enc = subprocess.Popen(encoder_cmd(self.fmt, rate, channels, part),
+                                       stdin=subprocess.PIPE, stdout=subprocess.DEVNULL,
+                                       stderr=subprocess.DEVNULL)
+            except OSError as e:
+                logger.error("Anrufbeantworter: Encoder %s fehlt: %s", self.fmt, e)
+                self._cleanup(wav)
+                return
+            f.seek(offset)
+            try:
+                while True:
+                    chunk = f.read(CHUNK_BYTES)
+                    if chunk:
+                        enc.stdin.write(chunk)
+                        self.bytes += len(chunk)
+                        continue
+                    if self._done.is_set():
+                        # nach dem Ende noch einmal lesen: baresip schreibt den Rest beim Schliessen
+                        chunk = f.read()
+                        if chunk:
+                            enc.stdin.write(chunk)
+                            self.bytes += len(chunk)
+                        break
+                    self._done.wait(FOLLOW_SEC)
+                enc.stdin.close()
+                enc.wait(ENCODE_WAIT)
+            except (OSError, subprocess.TimeoutExpired) as e:
+                logger.error("Anrufbeantworter %s: Encoder abgebrochen: %s", self.call_id, e)
+                enc.kill()
+                self._cleanup(wav, part)
+                return
+        self._cleanup(wav)
+        if enc.returncode != 0 or not os.path.exists(part):
+            logger.error("Anrufbeantworter %s: Encoder Fehler %s", self.call_id, enc.returncode)
+            self._cleanup(part)
+            return
+        os.replace(part, out)
+        duration = self.bytes / float(rate * channels * 2)
+        logger.info("Anrufbeantworter: Nachricht %s (%.1fs, %d kB)", os.path.basename(out),
+                    duration, os.path.getsize(out) // 1024)
+        self.on_done({
+            "call_id":  self.call_id,
+            "peer_uri": self.peer_uri,
+            "t_start":  t_start,
+            "duration": duration,
+            "path":     out,
+            "format":   self.fmt,
+            "size":     os.path.getsize(out),
+        })
+
+    def _cleanup(self, *paths):
+        for p in paths:
+            if p and p.endswith("dec.wav"):
+                # auch die Gegenrichtung (Ansage) von sndfile wegwerfen
+                paths += (p[:-len("dec.wav")] + "enc.wav",)
+        for p in paths:
+            try:
+                os.remove(p)
+            except OSError:
+                pass
+
+
+# ---------- Tabelle voicemail (calls.db) ----------
+MSG_COLUMNS = ("id", "call_id", "number", "peer_uri", "t_start", "duration",
+               "path", "format", "size", "heard")
+
+def iter_messages(con, limit=200):
+    """Nachrichten neueste zuerst."""
+    q = ("SELECT " + ",".join(MSG_COLUMNS) +
+         " FROM voicemail ORDER BY t_start DESC, id DESC LIMIT ?")
+    for row in con.execute(q, (int(limit),)):
+        yield dict(zip(MSG_COLUMNS, row))
+
+def get_message(con, msg_id):
+    row = con.execute("SELECT " + ",".join(MSG_COLUMNS) + " FROM voicemail WHERE id = ?",
+                      (int(msg_id),)).fetchone()
+    return dict(zip(MSG_COLUMNS, row)) if row else None
+
+def counts(con):
+    """(alle, ungehoerte) Nachrichten."""
+    total, new = con.execute(
+        "SELECT COUNT(*), COALESCE(SUM(heard = 0), 0) FROM voicemail").fetchone()
+    return total, new
+
+def playback_list(con, last=3):
+    """Zum Abhoeren am Telefon: ungehoerte aelteste zuerst, sonst die letzten last."""
+    q = "SELECT " + ",".join(MSG_COLUMNS) + " FROM voicemail"
+    rows = [dict(zip(MSG_COLUMNS, r)) for r in
+            con.execute(q + " WHERE heard = 0 ORDER BY t_start, id")]
+    if not rows:
+        rows = [dict(zip(MSG_COLUMNS, r)) for r in
+                con.execute(q + " ORDER BY t_start DESC, id DESC LIMIT ?", (int(last),))]
+        rows.reverse()
+    return rows
+
+def mark_heard(con, msg_id, heard=True):
+    with con:
+        con.execute("UPDATE voicemail SET heard = ? WHERE id = ?", (int(heard), int(msg_id)))
+
+def delete_message(con, msg_id):
+    """Eintrag und Datei loeschen. Liefert den geloeschten Eintrag oder None."""
+    msg = get_message(con, msg_id)
+    if msg is None:
+        return None
+    with con:
+        con.execute("DELETE FROM voicemail WHERE id = ?", (int(msg_id),))
+    try:
+        os.remove(msg["path"])
+    except OSError:
+        pass
+    return msg
@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""
+RetroPhone Wakeup-Messung
+-------------------------
+Misst fuer einen laufenden Prozess (Standard: phone_daemon.py), wie oft
+seine Threads aufwachen und wie viel CPU-Zeit er verbraucht. Grundlage
+sind die Zaehler aus /proc:
+
+  /proc/<pid>/task/<tid>/status   voluntary_ctxt_switches
+                                  (= Schlafphasen, also Wakeups)
+  /proc/<pid>/task/<tid>/stat     utime + stime pro Thread
+
+Verwendung:
+  sudo python3 /usr/local/retrophone/wakeup_stats.py [sekunden] [pid]
+
+Ohne pid wird der Prozess mit "phone_daemon.py" in der Kommandozeile
+gesucht. Ausgabe: Wakeups/s je Thread und gesamt, CPU-Sekunden pro
+Stunde und CPU-Last in Prozent.
+"""
+
+import os
+import sys
+import time
+
+DEFAULT_SECONDS = 60
+DEFAULT_TARGET  = "phone_daemon.py"
+
+
+def find_pid(target=DEFAULT_TARGET):
+    me = os.getpid()
+    for name in os.listdir("/proc"):
+        if not name.isdigit() or int(name) == me:
+            continue
+        try:
+            with open(f"/proc/{name}/cmdline", "rb") as f:
+                args = f.read().split(b"\0")
+        except OSError:
+            continue
+        args = [a.decode("utf-8", "ignore") for a in args]
+        # nur den Python-Prozess selbst, nicht z. B. einen Wrapper
+        if os.path.basename(args[0]).startswith("python") and \
+                any(a.endswith(target) for a in args[1:]):
+            return int(name)
+    return None
+
+
+def read_task(pid, tid):
+    """(name, wakeups, nonvoluntary, cpu_ticks) eines Threads oder None."""
+    base = f"/proc/{pid}/task/{tid}"
+    try:
+        with open(base + "/comm") as f:
+            name = f.read().strip()
+        vol = nonvol = 0
+        with open(base + "/status") as f:
+            for line in f:
+                if line.startswith("voluntary_ctxt_switches:"):
+                    vol = int(line.split()[1])
+                elif line.startswith("nonvoluntary_ctxt_switches:"):
+                    nonvol = int(line.split()[1])
+        with open(base + "/stat") as f:
+            fields = f.read().rsplit(")", 1)[1].split()
+        # nach dem Namen: state=0 ... utime=11 stime=12
+        ticks = int(fields[11]) + int(fields[12])
+    except (OSError, ValueError, IndexError):
+        return None
+    return name, vol, nonvol, ticks
+
+
+def snapshot(pid):
+    out = {}
+    for tid in os.listdir(f"/proc/{pid}/task"):
+        t = read_task(pid, tid)
+        if t:
+            out[int(tid)] = t
+    return out
+
+
+def measure(pid, seconds):
+    hz = os.sysconf("SC_CLK_TCK")
+    a = snapshot(pid)
+    t0 = time.monotonic()
+    time.sleep(seconds)
+    b = snapshot(pid)
+    dt = time.monotonic() - t0
+
+    rows = []
+    for tid, (name, vol, nonvol, ticks) in sorted(b.items()):
+        # neu gestartete Threads ab 0 zaehlen
+        _, vol0, nonvol0, ticks0 = a.get(tid, (name, 0, 0, 0))
+        rows.append((tid, name, (vol - vol0) / dt, (nonvol - nonvol0) / dt,
+                     (ticks - ticks0) / hz))
+    return dt, rows
+
+
+def main():
+    seconds = DEFAULT_SECONDS
+    pid = None
+    try:
+        if len(sys.argv) > 1:
+            seconds = float(sys.argv[1])
+        if len(sys.argv) > 2:
+            pid = int(sys.argv[2])
+    except ValueError:
+        print("Usage: wakeup_stats.py [sekunden] [pid]", file=sys.stderr)
+        sys.exit(2)
+    if pid is None:
+        pid = find_pid()
+        if pid is None:
+            print(f"Kein laufender Prozess mit {DEFAULT_TARGET} gefunden", file=sys.stderr)
+            sys.exit(1)
+
+    print(f"Messe PID {pid} fuer {seconds:.0f}s ...")
+    try:
+        dt, rows = measure(pid, seconds)
+    except FileNotFoundError:
+        print(f"Prozess {pid} nicht mehr vorhanden", file=sys.stderr)
+        sys.exit(1)
+
+    print(f"{'TID':>7}  {'Thread':16s} {'Wakeups/s':>10} {'Preempt/s':>10} {'CPU s/h':>9}")
+    total_w = total_cpu = 0.0
+    for tid, name, wps, pps, cpu in rows:
+        total_w += wps
+        total_cpu += cpu
+        print(f"{tid:7d}  {name:16s} {wps:10.2f} {pps:10.2f} {cpu / dt * 3600:9.2f}")
+    print("-" * 58)
+    print(f"Gesamt: {total_w:.2f} Wakeups/s, {total_cpu / dt * 3600:.2f} CPU-s/h "
+          f"({total_cpu / dt * 100:.3f} % CPU) ueber {dt:.1f}s")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,304 @@
+#!/usr/bin/env python3
+"""
+RetroPhone Web-Login
+--------------------
+Login der Weboberflaeche, auch fuer den Fall, dass Port 8080 aus dem
+Internet erreichbar ist:
+
+- Passwort als scrypt-Hash in RETRO_WEB_PASS ("scrypt:14:8:1:<salt>:<hash>",
+  erzeugt mit `web_auth.py hash`). Ein Klartext-Passwort wird beim Start
+  einmal gehasht und funktioniert weiter (Warnung im Log).
+- Vergleich von Benutzer und Hash in konstanter Zeit (hmac.compare_digest);
+  jeder zugelassene Versuch kostet genau einen Hash, egal ob der
+  Benutzername stimmt.
+- Vor dem Hash: Token-Buckets je IP, je Benutzername und global, in einer
+  LRU-Tabelle mit fester Groesse. Abgewiesene Versuche kosten keinen Hash.
+  Jeder Versuch verbraucht ein Token der IP (ein erfolgreicher bekommt es
+  zurueck); Benutzer- und globaler Bucket zahlen nur fuer Fehlversuche,
+  und IPs bzw. Browser, die sich schon einmal angemeldet haben, prueft
+  nur ihr IP-Bucket. So sperrt ein Angreifer mit falschem "admin"-Login
+  den echten Admin nicht aus, und der globale Bucket begrenzt trotzdem
+  die Hash-Last einer Flut aus vielen Adressen, damit der Phone-Daemon
+  auf einem Pi Zero (ein Kern) nicht verhungert.
+- Secret fuer die Session-Cookies: RETRO_WEB_SECRET oder einmal erzeugt
+  und in SECRET_PATH abgelegt (0600), ueberlebt Neustarts.
+
+scrypt mit N=2^14, r=8 braucht 16 MiB je Hash und auf einem Pi Zero
+einige hundert Millisekunden; `web_auth.py bench` misst das auf dem
+Geraet und rechnet die CPU-Last einer Login-Flut durch den Limiter.
+
+Als Skript:
+  web_auth.py hash                  Passwort abfragen (ohne Terminal: von stdin),
+                                    Wert fuer RETRO_WEB_PASS ausgeben
+  web_auth.py bench [versuche/s]    Hash-Zeit messen, Flut simulieren
+"""
+
+import os
+import sys
+import hmac
+import time
+import base64
+import hashlib
+import logging
+import secrets
+import threading
+from collections import OrderedDict
+
+logger = logging.getLogger("retrophone")
+
+HASH_PREFIX  = "scrypt"
+SCRYPT_LOG_N = 14         # N = 16384
+SCRYPT_R     = 8          # Speicher 128 * r * N = 16 MiB
+SCRYPT_P     = 1
+SALT_BYTES   = 16
+HASH_BYTES   = 32
+
+SECRET_PATH        = "/var/lib/retrophone/web_secret"
+OLD_DEFAULT_SECRET = "retrophone-change-me"
+
+# Token-Buckets: (Kapazitaet, Sekunden je neuem Versuch)
+IP_BUCKET     = (5, 12.0)
+USER_BUCKET   = (10, 30.0)
+GLOBAL_BUCKET = (5, 4.0)     # hoechstens ein Hash alle 4 s im Dauerbetrieb
+LRU_MAX       = 512          # Buckets in der Tabelle; aelteste fliegen raus
+TRUSTED_MAX   = 64           # IPs mit erfolgreichem Login (LRU)
+
+# Ergebnis von Authenticator.login()
+OK      = "ok"
+FAIL    = "fail"
+LIMITED = "limited"
+BUSY    = "busy"
+
+
+# ---------- Hash ----------
+def _b64(raw: bytes) -> str:
+    return base64.b64encode(raw).decode("ascii").rstrip("=")
+
+def _unb64(text: str) -> bytes:
+    return base64.b64decode(text + "=" * (-len(text) % 4))
+
+def _scrypt(password: str, salt: bytes, log_n: int, r: int, p: int) -> bytes:
+    n = 1 << log_n
+    return hashlib.scrypt(password.encode("utf-8"), salt=salt, n=n, r=r, p=p,
+                          maxmem=256 * r * n, dklen=HASH_BYTES)
+
+def hash_password(password: str, log_n=SCRYPT_LOG_N, r=SCRYPT_R, p=SCRYPT_P) -> str:
+    salt = secrets.token_bytes(SALT_BYTES)
+    digest = _scrypt(password, salt, log_n, r, p)
+    return ":".join((HASH_PREFIX, str(log_n), str(r), str(p), _b64(salt), _b64(digest)))
+
+def is_hash(text: str) -> bool:
+    return (text or "").startswith(HASH_PREFIX + ":")
+
+def parse_hash(text: str):
+    """'scrypt:14:8:1:<salt>:<hash>' -> (log_n, r, p, salt, digest). ValueError bei Unsinn."""
+    parts = (text or "").split(":")
+    if len(parts) != 6 or parts[0] != HASH_PREFIX:
+        raise ValueError("kein scrypt-Hash")
+    log_n, r, p = int(parts[1]), int(parts[2]), int(parts[3])
+    if not (10 <= log_n <= 20 and 1 <= r <= 16 and 1 <= p <= 4):
+        raise ValueError("scrypt-Parameter ausserhalb des Bereichs")
+    return log_n, r, p, _unb64(parts[4]), _unb64(parts[5])
+
+def verify_password(password: str, stored: str) -> bool:
+    log_n, r, p, salt, digest = parse_hash(stored)
+    return hmac.compare_digest(_scrypt(password, salt, log_n, r, p), digest)
+
+
+# ---------- Rate-Limit ----------
+class RateLimiter:
+    """Token-Buckets je (Art, Schluessel) in einer LRU-Tabelle."""
+
+    def __init__(self, size=LRU_MAX):
+        self.size = size
+        self.buckets = OrderedDict()     # (art, schluessel) -> [tokens, zeit]
+        self.trusted = OrderedDict()     # ip -> None, schon einmal erfolgreich angemeldet
+        self.lock = threading.Lock()
+
+    def _bucket(self, key, cap, per, now):
+        b = self.buckets.get(key)
+        if b is None:
+            b = self.buckets[key] = [float(cap), now]
+            if len(self.buckets) > self.size:
+                self.buckets.popitem(last=False)
+        else:
+            self.buckets.move_to_end(key)
+            b[0] = min(float(cap), b[0] + (now - b[1]) / per)
+            b[1] = now
+        return b
+
+    def allow(self, ip: str, user: str, trusted=False, now=None):
+        """
+        Ein Versuch von ip fuer user. Liefert (erlaubt, wartezeit in s).
+        Verbraucht nur ein Token der IP; ein abgewiesener Versuch nichts.
+        trusted (oder eine bekannte IP): Benutzer- und globaler Bucket
+        zaehlen nicht, die kann ein Fremder leer laufen lassen.
+        """
+        now = now if now is not None else time.monotonic()
+        checks = [(("ip", ip), IP_BUCKET)]
+        with self.lock:
+            if not (trusted or ip in self.trusted):
+                checks += [(("user", user.lower()), USER_BUCKET), (("all", ""), GLOBAL_BUCKET)]
+            buckets = [(self._bucket(key, cap, per, now), per) for key, (cap, per) in checks]
+            wait = max((1.0 - b[0]) * per for b, per in buckets)
+            if wait > 0:
+                return False, wait
+            buckets[0][0][0] -= 1.0
+            return True, 0.0
+
+    def failed(self, ip: str, user: str, now=None):
+        """Fehlversuch nach dem Hash: kostet Benutzer- und globalen Bucket."""
+        now = now if now is not None else time.monotonic()
+        with self.lock:
+            for key, (cap, per) in ((("user", user.lower()), USER_BUCKET),
+                                    (("all", ""), GLOBAL_BUCKET)):
+                b = self._bucket(key, cap, per, now)
+                b[0] = max(0.0, b[0] - 1.0)
+
+    def succeeded(self, ip: str, now=None):
+        """Erfolgreicher Login: IP-Token zurueck, IP gilt kuenftig als bekannt."""
+        now = now if now is not None else time.monotonic()
+        with self.lock:
+            b = self._bucket(("ip", ip), *IP_BUCKET, now)
+            b[0] = min(float(IP_BUCKET[0]), b[0] + 1.0)
+            self.trusted[ip] = None
+            self.trusted.move_to_end(ip)
+            if len(self.trusted) > TRUSTED_MAX:
+                self.trusted.popitem(last=False)
+
+
+# ---------- Login ----------
+class Authenticator:
+    def __init__(self, user: str, password: str):
+        self.user = user or ""
+        if is_hash(password):
+            parse_hash(password)      # Fehler sofort beim Start, nicht beim ersten Login
+            self.stored = password
+            self.plaintext = False
+        else:
+            logger.warning("Web-Login: RETRO_WEB_PASS ist Klartext; Hash mit "
+                           "'python3 web_auth.py hash' erzeugen")
+            self.stored = hash_password(password or "")
+            self.plaintext = True
+        # Passwort geaendert -> alte Session-Cookies ungueltig
+        self.session_tag = hashlib.sha256(self.stored.encode("ascii")).hexdigest()[:16]
+        self.limiter = RateLimiter()
+        self._hashing = threading.Semaphore(1)
+        self.attempts = self.oks = self.fails = self.limited = 0
+        self.hash_ms_max = 0.0
+
+    def login(self, ip: str, user: str, password: str, now=None, trusted=False):
+        """
+        Liefert (OK | FAIL | LIMITED | BUSY, wartezeit in s). trusted: der
+        Browser hat sich schon einmal angemeldet (Session-Merker der Web-App).
+        """
+        self.attempts += 1
+        allowed, wait = self.limiter.allow(ip or "", user or "", trusted, now)
+        if not allowed:
+            self.limited += 1
+            return LIMITED, wait
+        # nie zwei Hashes gleichzeitig: der zweite wartet nicht, er wird abgewiesen
+        if not self._hashing.acquire(blocking=False):
+            self.limited += 1
+            return BUSY, 1.0
+        try:
+            t0 = time.monotonic()
+            pass_ok = verify_password(password or "", self.stored)
+            self.hash_ms_max = max(self.hash_ms_max, (time.monotonic() - t0) * 1000.0)
+        finally:
+            self._hashing.release()
+        user_ok = hmac.compare_digest(hashlib.sha256((user or "").encode("utf-8")).digest(),
+                                      hashlib.sha256(self.user.encode("utf-8")).digest())
+        if user_ok and pass_ok:
+            self.oks += 1
+            self.limiter.succeeded(ip or "", now)
+            return OK, 0.0
+        self.fails += 1
+        self.limiter.failed(ip or "", user or "", now)
+        logger.warning("Web-Login fehlgeschlagen von %s", ip)
+        return FAIL, 0.0
+
+    def metrics(self):
+        return {"attempts": self.attempts, "ok": self.oks, "fail": self.fails,
+                "limited": self.limited, "hash_ms_max": round(self.hash_ms_max, 1),
+                "buckets": len(self.limiter.buckets)}
+
+
+# ---------- Session-Secret ----------
+def load_secret(path=SECRET_PATH) -> str:
+    """RETRO_WEB_SECRET, sonst gespeichertes oder neu erzeugtes Secret."""
+    env = os.environ.get("RETRO_WEB_SECRET", "")
+    if env and env != OLD_DEFAULT_SECRET:
+        return env
+    try:
+        with open(path, encoding="ascii") as f:
+            secret = f.read().strip()
+        if len(secret) >= 32:
+            return secret
+    except OSError:
+        pass
+    secret = secrets.token_hex(32)
+    try:
+        fd = os.open(path + ".tmp", os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, "w", encoding="ascii") as f:
+            f.write(secret + "\n")
+        os.replace(path + ".tmp", path)
+        logger.info("Web-Login: neues Session-Secret in %s", path)
+    except OSError as e:
+        # laeuft trotzdem; Sessions gelten dann nur bis zum naechsten Neustart
+        logger.warning("Web-Login: Secret nicht speicherbar (%s): %s", path, e)
+    return secret
+
+
+# ---------- Skript ----------
+def bench(rate=200.0, seconds=600.0, ips=200):
+    """Hash-Zeit messen und eine simulierte Flut durch den Limiter schicken."""
+    stored = hash_password("bench")
+    runs = 5
+    t0, c0 = time.monotonic(), time.process_time()
+    for _ in range(runs):
+        verify_password("falsch", stored)
+    hash_sec = (time.monotonic() - t0) / runs
+    hash_cpu = (time.process_time() - c0) / runs
+    n = 1 << SCRYPT_LOG_N
+    print(f"scrypt N=2^{SCRYPT_LOG_N} r={SCRYPT_R} p={SCRYPT_P}: "
+          f"{hash_sec * 1000:.0f} ms je Hash ({hash_cpu * 1000:.0f} ms CPU), "
+          f"{128 * SCRYPT_R * n // (1 << 20)} MiB")
+    for label, user_of in (("ein Benutzer", lambda i: "admin"),
+                           ("wechselnde Benutzer", lambda i: f"user{i % 997}")):
+        lim = RateLimiter()
+        total = int(rate * seconds)
+        admitted = 0
+        t0 = time.monotonic()
+        for i in range(total):
+            ip = f"10.{i % ips // 256}.{i % 256}.1"
+            ok, _ = lim.allow(ip, user_of(i), now=i / rate)
+            if ok:
+                lim.failed(ip, user_of(i), now=i / rate)
+            admitted += ok
+        check_us = (time.monotonic() - t0) / total * 1e6
+        cpu = admitted * hash_cpu / seconds * 100.0
+        print(f"Flut {rate:.0f}/s aus {ips} IPs, {label}: {admitted} von {total} Versuchen "
+              f"gehasht ({admitted / seconds:.2f}/s), Hash-CPU {cpu:.1f}% eines Kerns, "
+              f"Limiter {check_us:.1f} us je Versuch")
+
+def main():
+    if len(sys.argv) < 2 or sys.argv[1] not in ("hash", "bench"):
+        print("Usage: web_auth.py hash | bench [versuche/s]", file=sys.stderr)
+        sys.exit(2)
+    if sys.argv[1] == "hash":
+        if not sys.stdin.isatty():
+            # Installer: printf '%s\n' "$PASS" | web_auth.py hash
+            print(hash_password(sys.stdin.readline().rstrip("\n")))
+            return
+        import getpass
+        pw = getpass.getpass("Passwort: ")
+        if pw != getpass.getpass("Wiederholen: "):
+            print("Passwoerter verschieden", file=sys.stderr)
+            sys.exit(1)
+        print(hash_password(pw))
+    else:
+        bench(float(sys.argv[2]) if len(sys.argv) > 2 else 200.0)
+
+if __name__ == "__main__":
+    main()
@@ -1,28 +1,45 @@
 #!/usr/bin/env python3
 import os
-import re
-import stat
+import csv
+import io
 import html
+import json
+import time
 import subprocess
-from datetime import datetime
+from datetime import datetime, timedelta
 from functools import wraps
 
-from flask import Flask, request, Response, url_for, redirect, session
+from flask import Flask, request, Response, url_for, redirect, session, send_file, stream_with_context
+
+import cdr_store
+import caller_filter
+import daemon_ipc
+import log_archive
+import log_search
+import media_stats
+import retro_config
+import sip_accounts
+import voicemail
+import web_auth
 
 app = Flask(__name__)
 
-# --- Secret fuer Session-Cookies ---
-app.secret_key = os.environ.get("RETRO_WEB_SECRET", "retrophone-change-me")
+# --- Secret fuer Session-Cookies (RETRO_WEB_SECRET oder gespeichert, siehe web_auth.py) ---
+app.secret_key = web_auth.load_secret()
+SESSION_HOURS = 12
+app.config.update(
+    SESSION_COOKIE_HTTPONLY=True,
+    SESSION_COOKIE_SAMESITE="Lax",
+    # nur hinter TLS (Reverse-Proxy) einschalten, sonst kein Login ueber http moeglich
+    SESSION_COOKIE_SECURE=os.environ.get("RETRO_WEB_SECURE_COOKIE") == "1",
+    PERMANENT_SESSION_LIFETIME=timedelta(hours=SESSION_HOURS),
+)
 
 # --- Pfade ---
 PHONE_LOG = "/var/log/retrophone/phone.log"
 RING_LOG  = "/var/log/retrophone/ring.log"
 
-DEFAULT_ACCOUNTS  = "/home/pi/.baresip/accounts"
-FALLBACK_ACCOUNTS = "/etc/baresip/accounts"
-
-def accounts_path():
-    return DEFAULT_ACCOUNTS if os.path.exists(DEFAULT_ACCOUNTS) else FALLBACK_ACCOUNTS
+accounts_path = sip_accounts.default_path
 
 # --- Services fuer Uebersicht ---
 SERVICES = {
@@ -34,9 +51,16 @@ SERVICES = {
 # --- Login-Konfig aus Environment (Service-File) ---
 WEB_USER = os.environ.get("RETRO_WEB_USER", "admin")
 WEB_PASS = os.environ.get("RETRO_WEB_PASS", "changeme")
+auth = web_auth.Authenticator(WEB_USER, WEB_PASS)
 
 def is_logged_in():
-    return session.get("logged_in") is True
+    return session.get("logged_in") is True and session.get("auth") == auth.session_tag
+
+def safe_next(url):
+    """Nur Pfade auf diesem Server als Ziel nach dem Login (kein offener Redirect)."""
+    if not url or not url.startswith("/") or url.startswith("//") or "\\" in url:
+        return "/"
+    return url
 
 def login_required(f):
     @wraps(f)
@@ -63,8 +87,9 @@ h1{font-size:1.4rem;margin:0 0 10px}
 h2{font-size:1.2rem;margin:0 0 10px}
 pre{background:#020617;color:#e5e7eb;padding:10px;border-radius:8px;overflow:auto;max-height:70vh;border:1px solid #1f2937;font-size:0.8rem}
 label{display:block;margin-top:10px;margin-bottom:2px;font-weight:600;font-size:0.9rem}
-input,select{padding:7px 9px;margin-bottom:4px;width:100%;border-radius:8px;border:1px solid #1f2937;background:#020617;color:#e5e7eb;font-size:0.9rem}
-input:focus,select:focus{outline:none;border-color:#3b82f6}
+input,select,textarea{padding:7px 9px;margin-bottom:4px;width:100%;border-radius:8px;border:1px solid #1f2937;background:#020617;color:#e5e7eb;font-size:0.9rem}
+input:focus,select:focus,textarea:focus{outline:none;border-color:#3b82f6}
+textarea{font-family:monospace}
 .btn-row{margin-top:14px;display:flex;flex-wrap:wrap;gap:8px}
 .btn{display:inline-flex;align-items:center;justify-content:center;padding:7px 11px;border-radius:999px;border:1px solid #374151;font-size:0.9rem;background:#111827;color:#e5e7eb;cursor:pointer}
 .btn.primary{background:#2563eb;border-color:#2563eb}
@@ -80,6 +105,7 @@ input:focus,select:focus{outline:none;border-color:#3b82f6}
 .badge.ok{border-color:#16a34a;color:#bbf7d0}
 .badge.warn{border-color:#f59e0b;color:#fef3c7}
 .badge.err{border-color:#b91c1c;color:#fecaca}
+.spark{vertical-align:middle}
 .table{width:100%;border-collapse:collapse;font-size:0.9rem;margin-top:6px}
 .table th,.table td{padding:6px 8px;border-bottom:1px solid #1f2937;text-align:left}
 .table th{font-weight:600;color:#9ca3af}
@@ -95,6 +121,10 @@ def render_page(title, active, body_html, auto_refresh=None, show_nav=True):
   <div class="nav">
     <a href="{url_for('index')}" class="{ 'active' if active=='home' else '' }">Dashboard</a>
     <a href="{url_for('account_form')}" class="{ 'active' if active=='account' else '' }">SIP Account</a>
+    <a href="{url_for('calls_history')}" class="{ 'active' if active=='calls' else '' }">Anrufe</a>
+    <a href="{url_for('voicemail_list')}" class="{ 'active' if active=='voicemail' else '' }">Anrufbeantworter</a>
+    <a href="{url_for('callers_form')}" class="{ 'active' if active=='callers' else '' }">Anruffilter</a>
+    <a href="{url_for('config_form')}" class="{ 'active' if active=='config' else '' }">Konfiguration</a>
     <a href="{url_for('logs_phone')}" class="{ 'active' if active=='logs' else '' }">Logs</a>
     <a href="{url_for('services_overview')}" class="{ 'active' if active=='services' else '' }">Services</a>
     <a href="{url_for('auth_info')}" class="{ 'active' if active=='auth' else '' }">Login-Info</a>
@@ -134,6 +164,56 @@ def tail_file(path, lines=200):
     except Exception as e:
         return f"tail failed: {e}"
 
+LOG_PAGE_LINES = 200
+
+def log_seek(name, endpoint):
+    """
+    Log ab Uhrzeit (?at=, ?skip=) aus Archiv, rotierter oder aktueller
+    Datei. Liefert (Text, Navigation als HTML) oder None ohne ?at=.
+    """
+    at = (request.args.get("at") or "").strip()
+    if not at:
+        return None
+    try:
+        t = log_archive.parse_when(at)
+        skip = max(0, int(request.args.get("skip", "0")))
+    except ValueError:
+        return f"Ungueltige Zeit: {at}", ""
+    t0 = time.monotonic()
+    try:
+        page, nxt = log_archive.read_page(name, t, skip, LOG_PAGE_LINES)
+    except (OSError, EOFError) as e:
+        return f"Fehler beim Lesen des Archivs: {e}", ""
+    ms = (time.monotonic() - t0) * 1000.0
+    nav = f'<span class="subtle">{len(page)} Zeilen ab {fmt_ts(t)} ({ms:.0f} ms)</span>'
+    if nxt:
+        nav += f' <a class="btn" href="{url_for(endpoint, at=repr(nxt[0]), skip=nxt[1])}">Weiter</a>'
+    return "".join(page) or "Keine Eintraege ab diesem Zeitpunkt.", nav
+
+def render_log_seek_form(name, endpoint):
+    s = log_archive.summary(name)
+    if s["archives"]:
+        ratio = f", Faktor {s['ratio']:.1f}" if s["ratio"] else ""
+        info = (f"Archiv: {s['archives']} Tage seit {s['first']}, "
+                f"{s['bytes'] / 1048576:.1f} MB{ratio}")
+    else:
+        info = "Noch kein Archiv."
+    at = request.args.get("at", "")
+    try:
+        value = datetime.fromtimestamp(log_archive.parse_when(at)).strftime("%Y-%m-%dT%H:%M:%S") if at else ""
+    except ValueError:
+        value = ""
+    return f"""
+  <form method="get" action="{url_for(endpoint)}">
+    <label>Ab Zeitpunkt (auch aus dem Archiv)</label>
+    <input type="datetime-local" step="1" name="at" value="{value}">
+    <div class="btn-row">
+      <button class="btn primary" type="submit">Anzeigen</button>
+      <a class="btn" href="{url_for(endpoint)}">Aktuell</a>
+      <span class="subtle">{html.escape(info)}</span>
+    </div>
+  </form>"""
+
 def tail_baresip(lines=200):
     try:
         out = subprocess.check_output(
@@ -188,142 +268,61 @@ def restart_service(unit):
     except Exception as e:
         return False, f"restart fehlgeschlagen: {e}"
 
-# --- baresip Account Parsing ---
-ACC_RE = re.compile(
-    r'^\s*(?:"(?P<display>[^"]*)"\s*)?'
-    r'<sip:(?P<aor>[^>]+)>\s*(?P<params>.*)$'
-)
+# --- baresip Accounts (gecacht, siehe sip_accounts.py) ---
+accounts = sip_accounts.AccountStore(accounts_path)
 
-def read_account_line():
-    p = accounts_path()
-    if not os.path.exists(p):
-        return ""
+def account_fields(acc):
+    """Nur die Formularfelder (ohne 'line')."""
+    return {k: acc.get(k, "") for k in sip_accounts.empty_account()}
+
+REG_WAIT_SEC = 8.0    # so lange auf REGISTER_OK/FAIL nach einer Aenderung warten
+
+def run_live(commands, aors):
+    """
+    Kommandos ueber den Daemon an baresip, danach auf die Registrierung der
+    aors warten. Liefert (ok, meldung, {aor: status|None}).
+    """
+    if not commands:
+        return True, "Keine Aenderung fuer baresip.", {}
     try:
-        with open(p, "r", encoding="utf-8") as f:
-            for line in f:
-                line = line.strip()
-                if not line or line.startswith("#"):
-                    continue
-                return line
-    except Exception:
-        pass
-    return ""
-
-def parse_account(line: str):
-    acc = {
-        "display":   "",
-        "user":      "",
-        "domain":    "",
-        "transport": "udp",
-        "auth_user": "",
-        "auth_pass": "",
-        "outbound":  "",
-        "regint":    "3600",
-    }
-    if not line:
-        return acc
-
-    m = ACC_RE.match(line)
-    if not m:
-        return acc
-
-    g = m.groupdict()
-    acc["display"] = g.get("display") or ""
-    aor            = g.get("aor") or ""
-    params         = g.get("params") or ""
-
-    if "@" in aor:
-        userpart, dompart = aor.split("@", 1)
-        if ":" in userpart:
-            user, uri_pw = userpart.split(":", 1)
-            acc["user"] = user
-            if uri_pw:
-                acc["auth_pass"] = uri_pw
-        else:
-            acc["user"] = userpart
-        acc["domain"] = dompart
-    else:
-        acc["user"] = aor
-
-    m_au = re.search(r';\s*auth_user\s*=\s*([^\s;]+)', params)
-    if m_au:
-        acc["auth_user"] = m_au.group(1)
-
-    m_ap = re.search(r';\s*auth_pass\s*=\s*([^\s;]+)', params)
-    if m_ap:
-        acc["auth_pass"] = m_ap.group(1)
-
-    m_ri = re.search(r';\s*regint\s*=\s*(\d+)', params)
-    if m_ri:
-        acc["regint"] = m_ri.group(1)
-
-    m_ob = re.search(r';\s*outbound\s*=\s*"([^"]+)"', params)
-    if m_ob:
-        acc["outbound"] = m_ob.group(1)
-
-    m_tr_uri = re.search(r';\s*transport=([\w]+)', params)
-    if m_tr_uri:
-        acc["transport"] = m_tr_uri.group(1)
-    elif acc["outbound"]:
-        m_tr_out = re.search(r';\s*transport=([\w]+)', acc["outbound"])
-        if m_tr_out:
-            acc["transport"] = m_tr_out.group(1)
-
-    if not acc["auth_user"]:
-        acc["auth_user"] = acc["user"]
-    if not acc["regint"]:
-        acc["regint"] = "3600"
-    if not acc["transport"]:
-        acc["transport"] = "udp"
-
-    return acc
-
-def build_account_line(acc):
-    display   = acc.get("display", "").strip()
-    user      = acc.get("user", "").strip()
-    domain    = acc.get("domain", "").strip()
-    transport = acc.get("transport", "udp").strip() or "udp"
-    auth_user = acc.get("auth_user", "").strip() or user
-    auth_pass = acc.get("auth_pass", "").strip()
-    regint    = acc.get("regint", "").strip() or "300"
-    outbound  = acc.get("outbound", "").strip()
-
-    sip_uri = f"<sip:{user}@{domain}>"
-
-    params = []
-    if auth_user:
-        params.append(f"auth_user={auth_user}")
-    if auth_pass:
-        params.append(f"auth_pass={auth_pass}")
-
-    if outbound:
-        if "transport=" not in outbound and transport:
-            if ";" in outbound:
-                outbound = outbound + f";transport={transport}"
-            else:
-                outbound = outbound + f";transport={transport}"
-        params.append(f'outbound="{outbound}"')
-    if regint:
-        params.append(f"regint={regint}")
-
-    disp_prefix = f"\"{display}\" " if display else ""
-    if params:
-        return f"{disp_prefix}{sip_uri};" + ";".join(params)
+        resp = daemon_ipc.request({"cmd": "baresip", "commands": commands,
+                                   "await_register": aors, "timeout": REG_WAIT_SEC},
+                                  timeout=REG_WAIT_SEC + 2 * len(commands) + 2)
+    except OSError as e:
+        return False, f"Daemon nicht erreichbar ({e})", {}
+    done = ", ".join(r["command"] for r in resp.get("results", []))
+    if not resp.get("ok"):
+        return False, f"{resp.get('error') or 'Fehler'} (ausgefuehrt: {done or '-'})", {}
+    return True, f"Live uebernommen: {done}", resp.get("registrations") or {}
+
+def apply_accounts(old, new, force_restart=False):
+    """
+    Account-Aenderung auf das laufende baresip anwenden: nur das Geaenderte
+    ueber ctrl_tcp, Neustart nur, wenn das nicht geht.
+    Liefert (ok, meldung, registrierungen, neu_gestartet).
+    """
+    if not force_restart:
+        commands, aors = sip_accounts.plan_live(old, new)
+        ok, msg, regs = run_live(commands, aors)
+        if ok:
+            return True, msg, regs, False
     else:
-        return f"{disp_prefix}{sip_uri}"
+        msg = "Neustart angefordert"
+    ok, out = restart_service(SERVICES["baresip"])
+    return ok, f"{msg}; baresip neu gestartet" if ok else f"{msg}; {out}", {}, True
 
-def write_accounts_file(line: str):
-    p = accounts_path()
-    os.makedirs(os.path.dirname(p), exist_ok=True)
-    if os.path.exists(p):
-        ts = datetime.now().strftime("%Y%m%d-%H%M%S")
-        subprocess.call(["cp", "-a", p, f"{p}.bak.{ts}"])
-    tmp = p + ".tmp"
-    with open(tmp, "w", encoding="utf-8") as f:
-        f.write(line.strip() + "\n")
-    os.chmod(tmp, stat.S_IRUSR | stat.S_IWUSR)
-    os.replace(tmp, p)
-    return p
+def render_registrations(regs):
+    rows = []
+    for aor, st in regs.items():
+        if st is None:
+            badge = '<span class="badge warn">keine Antwort</span>'
+        elif st["type"] == "REGISTER_OK":
+            badge = '<span class="badge ok">registriert</span>'
+        else:
+            badge = '<span class="badge err">fehlgeschlagen</span>'
+        detail = html.escape(st["param"]) if st else f"nach {REG_WAIT_SEC:.0f}s noch kein Ergebnis"
+        rows.append(f'<li><code>{html.escape(aor)}</code> {badge} <span class="subtle">{detail}</span></li>')
+    return f'<ul class="subtle">{"".join(rows)}</ul>' if rows else ""
 
 # --- Health ---
 @app.get("/health")
@@ -331,13 +330,8 @@ def health():
     return {"status": "ok"}
 
 # --- Login / Logout ---
-@app.get("/login")
-def login():
-    if is_logged_in():
-        return redirect(url_for("index"))
-    error = request.args.get("error", "")
+def render_login(error, next_url):
     err_html = f'<p class="errtext">{html.escape(error)}</p>' if error else ""
-    next_url = request.args.get("next", "/")
     body = f"""
 <div class="card" style="max-width:420px;margin:40px auto;">
   <h1>Login</h1>
@@ -353,38 +347,306 @@ def login():
       <button class="btn primary" type="submit">Anmelden</button>
     </div>
     <p class="subtle" style="margin-top:8px;">
-      Benutzername aktuell: <code>{html.escape(WEB_USER or '')}</code><br>
-      Passwort wird in <code>/etc/systemd/system/retrophone-web.service</code> via Environment gesetzt.
+      Zugangsdaten werden in <code>/etc/systemd/system/retrophone-web.service</code> via Environment gesetzt.
     </p>
   </form>
 </div>
 """
     return render_page("Login", "login", body, show_nav=False)
 
+@app.get("/login")
+def login():
+    if is_logged_in():
+        return redirect(url_for("index"))
+    return render_login(request.args.get("error", ""), safe_next(request.args.get("next", "/")))
+
 @app.post("/login")
 def login_post():
     username = (request.form.get("username") or "").strip()
     password = request.form.get("password") or ""
-    next_url = request.form.get("next") or "/"
-    if username == WEB_USER and password == WEB_PASS:
+    next_url = safe_next(request.form.get("next") or "/")
+    result, wait = auth.login(request.remote_addr, username, password,
+                              trusted=session.get("known") is True)
+    if result == web_auth.OK:
+        # neue Session statt der vom Login-Formular (Session Fixation)
+        session.clear()
+        session.permanent = True
         session["logged_in"] = True
+        session["auth"] = auth.session_tag
+        session["known"] = True
         return redirect(next_url)
-    else:
-        return redirect(url_for("login", error="Login fehlgeschlagen", next=next_url))
+    if result in (web_auth.LIMITED, web_auth.BUSY):
+        retry = max(1, int(wait + 0.999))
+        resp = Response(render_login(f"Zu viele Versuche, bitte in {retry}s erneut versuchen.",
+                                     next_url), status=429)
+        resp.headers["Retry-After"] = str(retry)
+        return resp
+    return redirect(url_for("login", error="Login fehlgeschlagen", next=next_url))
 
 @app.get("/logout")
 @login_required
 def logout():
     session.clear()
+    # Merker fuer den Limiter (web_auth.py): dieser Browser war schon angemeldet
+    session.permanent = True
+    session["known"] = True
     return redirect(url_for("login"))
 
+# --- Registrierung (live aus dem Daemon, siehe registrations.py) ---
+REG_BADGES = {
+    "ok":       ("ok",   "registriert"),
+    "fail":     ("err",  "fehlgeschlagen"),
+    "flapping": ("err",  "instabil"),
+    "overdue":  ("warn", "Erneuerung ueberfaellig"),
+    "unknown":  ("warn", "unbekannt"),
+}
+
+def daemon_registrations():
+    """Registrierungsstatus vom Daemon oder None, wenn er nicht antwortet."""
+    try:
+        resp = daemon_ipc.request({"cmd": "registrations"}, timeout=1.0)
+    except OSError:
+        return None
+    return resp.get("registrations") if resp.get("ok") else None
+
+def sparkline(history, width=180, height=32):
+    """SVG-Sparkline der Registrier-RTTs; Fehlschlaege als rote Striche."""
+    if not history:
+        return ""
+    rtts = [r for ok, r in history if ok and r is not None]
+    top = max(rtts) if rtts else 1.0
+    step = width / max(len(history) - 1, 1)
+    points, marks = [], []
+    for i, (ok, rtt) in enumerate(history):
+        x = round(i * step, 1)
+        if not ok:
+            marks.append(f'<line x1="{x}" y1="0" x2="{x}" y2="{height}" stroke="#ef4444" stroke-width="2"/>')
+        elif rtt is not None:
+            y = round(height - 2 - (height - 4) * rtt / top, 1)
+            points.append(f"{x},{y}")
+    line = (f'<polyline fill="none" stroke="#38bdf8" stroke-width="1.5" points="{" ".join(points)}"/>'
+            if len(points) > 1 else "")
+    return (f'<svg class="spark" width="{width}" height="{height}" viewBox="0 0 {width} {height}">'
+            f'{"".join(marks)}{line}</svg>')
+
+def render_registration_card(accs):
+    regs = daemon_registrations()
+    if regs is None:
+        rows = '<p class="subtle">Daemon nicht erreichbar, kein Live-Status.</p>'
+    else:
+        items = []
+        for acc in accs:
+            aor = sip_accounts.account_aor(acc)
+            st = regs.get(aor) or {"status": "unknown", "history": []}
+            cls, label = REG_BADGES.get(st["status"], REG_BADGES["unknown"])
+            facts = []
+            if st.get("rtt_ms") is not None:
+                facts.append(f"RTT {st['rtt_ms']:.0f} ms (Median {st['rtt_med']:.0f} ms)")
+            if st.get("refresh"):
+                facts.append(f"Erneuerung alle {st['refresh']:.0f}s")
+            if st.get("fails"):
+                facts.append(f"{st['fails']} Fehler")
+            if st.get("status") == "fail" and st.get("param"):
+                facts.append(st["param"])
+            if st.get("last_ok"):
+                facts.append("zuletzt ok " + fmt_ts(st["last_ok"]))
+            items.append(f"""
+<li><code>{html.escape(aor)}</code> <span class="badge {cls}">{label}</span><br>
+  {sparkline(st.get("history") or [])}
+  <span class="subtle">{html.escape(", ".join(facts) or "noch keine Registrierung gesehen")}</span></li>""")
+        rows = f'<ul class="subtle">{"".join(items)}</ul>' if items else '<p class="subtle">Kein Account.</p>'
+    return f"""
+<div class="card">
+  <h2>SIP Registrierung</h2>
+  <p class="subtle">Live vom Daemon: Antwortzeit des Registrars je Erneuerung (rot = fehlgeschlagen).
+  Instabil = Registrierung wechselt oft zwischen ok und Fehler, meist WLAN oder NAT.</p>
+  {rows}
+</div>
+"""
+
+# --- Netzwerk (Messrunden des Daemons, siehe net_monitor.py) ---
+NET_WINDOW = 30          # letzte Messrunden fuer die Bewertung
+NET_LOSS_WARN = 2.0      # Prozent Verlust, ab dem Audio hoerbar leidet
+
+def baresip_config_value(key, default=""):
+    """Wert aus der baresip config neben der accounts-Datei."""
+    p = os.path.join(os.path.dirname(accounts_path()), "config")
+    try:
+        with open(p, "r", encoding="utf-8") as f:
+            for line in f:
+                parts = line.split("#", 1)[0].split()
+                if len(parts) >= 2 and parts[0] == key:
+                    return parts[1]
+    except OSError:
+        pass
+    return default
+
+def jitter_buffer_ms():
+    """(min_ms, max_ms) aus jitter_buffer_delay (Frames) x ptime."""
+    try:
+        lo, _, hi = baresip_config_value("jitter_buffer_delay", "5-10").partition("-")
+        ptime = int(baresip_config_value("ptime", "20"))
+        return int(lo) * ptime, int(hi or lo) * ptime
+    except ValueError:
+        return 100, 200
+
+def network_verdict(rounds, jb):
+    """
+    Bewertung der letzten Runden gegen den Jitter-Puffer. Die Laufzeit-
+    schwankung einer Richtung schaetzen wir als (p95 RTT - min RTT) / 2.
+    Liefert (badge, text).
+    """
+    rtts = sorted(r["rtt_max"] for r in rounds if r["rtt_max"] is not None)
+    mins = [r["rtt_min"] for r in rounds if r["rtt_min"] is not None]
+    if not rtts:
+        return "err", "Registrar antwortet nicht auf OPTIONS"
+    spread = (rtts[min(len(rtts) - 1, int(len(rtts) * 0.95))] - min(mins)) / 2
+    loss = sum(r["loss"] for r in rounds) / len(rounds)
+    if loss >= NET_LOSS_WARN:
+        return "err", f"{loss:.1f}% Paketverlust, Aussetzer im Gespraech wahrscheinlich"
+    if spread > jb[1]:
+        return "err", (f"Laufzeitschwankung ~{spread:.0f} ms groesser als der Jitter-Puffer "
+                       f"({jb[1]} ms): Aussetzer zu erwarten, jitter_buffer_delay erhoehen")
+    if spread > jb[0]:
+        return "warn", (f"Laufzeitschwankung ~{spread:.0f} ms ueber dem Puffer-Minimum "
+                        f"({jb[0]} ms): Puffer waechst, mehr Verzoegerung")
+    return "ok", f"Laufzeitschwankung ~{spread:.0f} ms, passt in den Jitter-Puffer ({jb[0]}-{jb[1]} ms)"
+
+def render_network_card():
+    try:
+        resp = daemon_ipc.request({"cmd": "network"}, timeout=1.0)
+        info = resp.get("network") if resp.get("ok") else None
+    except OSError:
+        info = None
+    if not info:
+        return ""
+    rounds = info["rounds"][-NET_WINDOW:]
+    jb = jitter_buffer_ms()
+    ps = {True: ("err", "an"), False: ("ok", "aus"), None: ("", "unbekannt")}[info["power_save"]]
+    if rounds:
+        cls, verdict = network_verdict(rounds, jb)
+        last = rounds[-1]
+        via = f" ({html.escape(last['target'])})" if last.get("target") else ""
+        facts = (f"Registrar {html.escape(last['host'])}{via}: RTT {last['rtt_med'] or '-'} ms, "
+                 f"Jitter {last['jitter'] if last['jitter'] is not None else '-'} ms, Verlust {last['loss']:.0f}%")
+        hist = [[r["loss"] < 100, r["rtt_med"]] for r in rounds]
+        status = f"""
+  <p><span class="badge {cls}">{html.escape(verdict)}</span></p>
+  <p>{sparkline(hist)} <span class="subtle">{facts}</span></p>"""
+    else:
+        status = '<p class="subtle">Noch keine Messung (erste Runde kurz nach dem Start).</p>'
+    return f"""
+<div class="card">
+  <h2>Netzwerk</h2>
+  <p class="subtle">SIP OPTIONS an den Registrar, je Runde mehrere Pakete. Bewertet gegen
+  <code>jitter_buffer_delay</code> der baresip config ({jb[0]}-{jb[1]} ms).</p>
+  {status}
+  <p class="subtle">WLAN-Stromsparen: <span class="badge {ps[0]}">{ps[1]}</span>
+  {f"(vom Daemon {info['ps_fixes']}x wieder ausgeschaltet)" if info["ps_fixes"] else ""}</p>
+</div>
+"""
+
+# --- Live-Zustand (ein Abo beim Daemon, per SSE an alle Tabs) ---
+SSE_PING_SEC = 15.0     # Kommentarzeile, damit Proxies die Verbindung offen lassen
+
+live_feed = daemon_ipc.StateFeed()
+
+PHASES = {
+    "idle":      ("",     "Hoerer aufgelegt"),
+    "offhook":   ("ok",   "Hoerer abgehoben, Waehlton"),
+    "dialing":   ("ok",   "waehlt"),
+    "ringing":   ("warn", "klingelt"),
+    "calling":   ("warn", "verbindet"),
+    "call":      ("ok",   "Gespraech"),
+    "voicemail": ("warn", "Anrufbeantworter nimmt auf"),
+    "playback":  ("ok",   "Nachrichten abhoeren"),
+}
+
+@app.get("/events")
+@login_required
+def live_events():
+    def stream():
+        live_feed.join()
+        try:
+            version = 0
+            yield "retry: 3000\n\n"
+            while True:
+                new, state = live_feed.wait(version, SSE_PING_SEC)
+                if new == version:
+                    yield ": ping\n\n"
+                    continue
+                version = new
+                # Zeit des Pi mitschicken: Gespraechsdauer unabhaengig von der Browser-Uhr
+                yield f"data: {json.dumps({'now': time.time(), 'state': state})}\n\n"
+        finally:
+            live_feed.leave()
+    return Response(stream_with_context(stream()), mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+LIVE_JS = """
+(function(){
+  var el = document.getElementById('live');
+  var phases = %(phases)s, regs = %(regs)s, st = null, skew = 0;
+  function esc(s){ var d = document.createElement('div'); d.textContent = s == null ? '' : String(s); return d.innerHTML; }
+  function badge(cls, text){ return '<span class="badge ' + cls + '">' + esc(text) + '</span>'; }
+  function dur(sec){ sec = Math.max(0, Math.floor(sec)); var m = Math.floor(sec / 60), s = sec %% 60;
+    return (m < 10 ? '0' : '') + m + ':' + (s < 10 ? '0' : '') + s; }
+  function render(){
+    if (!st) { el.innerHTML = '<p class="subtle">Daemon nicht erreichbar.</p>'; return; }
+    var p = phases[st.phase] || ['', st.phase], h = [];
+    h.push('<p>' + badge(p[0], p[1]) + ' ' + badge('', 'Hoerer ' + (st.hook == 'off' ? 'abgehoben' : 'aufgelegt')) +
+           (st.ringing ? ' ' + badge('warn', 'Klingel an') : '') +
+           (st.baresip ? '' : ' ' + badge('err', 'baresip nicht verbunden')) + '</p>');
+    if (st.digits || st.pulses)
+      h.push('<p>Gewaehlt: <code>' + esc(st.digits) + (st.pulses ? ' (' + st.pulses + ' Impulse)' : '') + '</code></p>');
+    if (st.call) {
+      var c = st.call, who = c.name ? c.name + ' (' + c.number + ')' : (c.number || 'unbekannt');
+      h.push('<p>' + (c.direction == 'incoming' ? 'Von' : 'An') + ' <code>' + esc(who) + '</code>, ' +
+             (c.answered ? 'Dauer <b id="live-dur"></b>' : esc(c.state)) +
+             (st.calls > 1 ? ' <span class="subtle">(' + st.calls + ' Calls)</span>' : '') + '</p>');
+    }
+    var r = [];
+    for (var aor in st.registrations) {
+      var b = regs[st.registrations[aor]] || ['warn', st.registrations[aor]];
+      r.push('<li><code>' + esc(aor) + '</code> ' + badge(b[0], b[1]) + '</li>');
+    }
+    h.push(r.length ? '<ul class="subtle">' + r.join('') + '</ul>' : '<p class="subtle">Keine Registrierung gemeldet.</p>');
+    if (st.messages) h.push('<p>' + badge('warn', st.messages + ' neue Nachrichten') + '</p>');
+    el.innerHTML = h.join('');
+    tick();
+  }
+  function tick(){
+    var d = document.getElementById('live-dur');
+    if (d && st && st.call) d.textContent = dur(Date.now() / 1000 - skew - st.call.since);
+  }
+  var es = new EventSource('%(url)s');
+  es.onmessage = function(e){ var m = JSON.parse(e.data); skew = Date.now() / 1000 - m.now; st = m.state; render(); };
+  es.onerror = function(){ el.innerHTML = '<p class="subtle">Verbindung unterbrochen, verbinde neu ...</p>'; };
+  setInterval(tick, 1000);
+})();
+"""
+
+def render_live_card():
+    js = LIVE_JS % {"phases": json.dumps(PHASES), "regs": json.dumps(REG_BADGES),
+                    "url": url_for("live_events")}
+    return f"""
+<div class="card">
+  <h2>Telefon live</h2>
+  <div id="live"><p class="subtle">Verbinde ...</p></div>
+</div>
+<script>{js}</script>
+"""
+
 # --- Dashboard ---
 @app.get("/")
 @login_required
 def index():
-    acc_line = read_account_line()
-    acc = parse_account(acc_line)
+    all_accs = accounts.accounts()
+    acc = accounts.first()
+    n_acc = len(all_accs)
     acc_status = "konfiguriert" if acc.get("user") and acc.get("domain") else "nicht konfiguriert"
+    if n_acc > 1:
+        acc_status += f" ({n_acc} Accounts)"
     badge_class = "ok" if acc_status == "konfiguriert" else "err"
     body = f"""
 <div class="grid-2">
@@ -416,6 +678,9 @@ def index():
     </div>
   </div>
 </div>
+{render_live_card()}
+{render_registration_card(all_accs)}
+{render_network_card()}
 """
     return render_page("Dashboard", "home", body)
 
@@ -425,6 +690,10 @@ def index():
 def auth_info():
     user = WEB_USER or "(nicht gesetzt)"
     service_file = "/etc/systemd/system/retrophone-web.service"
+    m = auth.metrics()
+    pass_badge = ('<span class="badge warn">Klartext-Passwort</span> Hash erzeugen mit '
+                  '<code>python3 /usr/local/retrophone/web_auth.py hash</code> und in RETRO_WEB_PASS eintragen.'
+                  if auth.plaintext else '<span class="badge ok">scrypt-Hash</span>')
     body = f"""
 <div class="card">
   <h1>Login / Authentifizierung</h1>
@@ -435,6 +704,9 @@ def auth_info():
     <label>Passwort (RETRO_WEB_PASS)</label>
     <input type="password" value="{ '********' if WEB_PASS else '' }" readonly>
   </form>
+  <p>{pass_badge}</p>
+  <p class="subtle">Login-Versuche seit dem Start: {m['attempts']}, davon {m['fail']} falsch und
+  {m['limited']} gebremst (je IP, je Benutzer und insgesamt). Hash-Zeit max. {m['hash_ms_max']:.0f} ms.</p>
   <p class="subtle" style="margin-top:10px;">
     Quelle: <code>{html.escape(service_file)}</code><br>
     Beispiel:
@@ -443,7 +715,8 @@ def auth_info():
 User=pi
 Group=pi
 Environment=RETRO_WEB_USER={html.escape(user)}
-Environment=RETRO_WEB_PASS=&lt;dein_passwort&gt;
+Environment=RETRO_WEB_PASS=scrypt:14:8:1:&lt;salt&gt;:&lt;hash&gt;
+Nice=10
 ExecStart=/usr/bin/python3 /usr/local/retrophone/webapp.py
 ...</pre>
   <p class="subtle">
@@ -464,30 +737,38 @@ auth_info = app.view_functions["auth_info"]
 @app.get("/logs/phone")
 @login_required
 def logs_phone():
-    auto = (request.args.get("auto", "1") == "1")
+    seek = log_seek("phone", "logs_phone")
+    auto = (request.args.get("auto", "1") == "1") and not seek
     auto_refresh = 2 if auto else None
     toggle_auto = "0" if auto else "1"
     toggle_label = "Auto-Refresh pausieren" if auto else "Auto-Refresh aktivieren"
     toggle_url = url_for('logs_phone', auto=toggle_auto)
 
-    try:
-        data = html.escape(tail_file(PHONE_LOG))
-    except Exception as e:
-        data = f"Fehler beim Lesen des Logs: {html.escape(str(e))}"
+    if seek:
+        data, seek_nav = html.escape(seek[0]), seek[1]
+    else:
+        seek_nav = ""
+        try:
+            data = html.escape(tail_file(PHONE_LOG))
+        except Exception as e:
+            data = f"Fehler beim Lesen des Logs: {html.escape(str(e))}"
 
     body = f"""
 <div class="card">
   <h2>Phone Log</h2>
   <p class="subtle">
-    Letzte Eintraege.{" Seite aktualisiert automatisch." if auto else " Auto-Refresh ist pausiert."}
+    {"Eintraege ab Zeitpunkt." if seek else "Letzte Eintraege."}{" Seite aktualisiert automatisch." if auto else " Auto-Refresh ist pausiert."}
   </p>
+  {render_log_seek_form("phone", "logs_phone")}
   <div class="tabs">
     <a class="tab active" href="{url_for('logs_phone', auto=('1' if auto else '0'))}">Phone</a>
     <a class="tab" href="{url_for('logs_ring', auto=('1' if auto else '0'))}">Ring</a>
     <a class="tab" href="{url_for('logs_baresip', auto=('1' if auto else '0'))}">baresip</a>
+    <a class="tab" href="{url_for('logs_search')}">Suche</a>
   </div>
   <pre>{data}</pre>
   <div class="btn-row">
+    {seek_nav}
     <a class="btn" href="{toggle_url}">{toggle_label}</a>
     <a class="btn" href="{url_for('index')}">Zurueck zum Dashboard</a>
   </div>
@@ -498,30 +779,38 @@ def logs_phone():
 @app.get("/logs/ring")
 @login_required
 def logs_ring():
-    auto = (request.args.get("auto", "1") == "1")
+    seek = log_seek("ring", "logs_ring")
+    auto = (request.args.get("auto", "1") == "1") and not seek
     auto_refresh = 2 if auto else None
     toggle_auto = "0" if auto else "1"
     toggle_label = "Auto-Refresh pausieren" if auto else "Auto-Refresh aktivieren"
     toggle_url = url_for('logs_ring', auto=toggle_auto)
 
-    try:
-        data = html.escape(tail_file(RING_LOG))
-    except Exception as e:
-        data = f"Fehler beim Lesen des Logs: {html.escape(str(e))}"
+    if seek:
+        data, seek_nav = html.escape(seek[0]), seek[1]
+    else:
+        seek_nav = ""
+        try:
+            data = html.escape(tail_file(RING_LOG))
+        except Exception as e:
+            data = f"Fehler beim Lesen des Logs: {html.escape(str(e))}"
 
     body = f"""
 <div class="card">
   <h2>Ring Log</h2>
   <p class="subtle">
-    Letzte Eintraege.{" Seite aktualisiert automatisch." if auto else " Auto-Refresh ist pausiert."}
+    {"Eintraege ab Zeitpunkt." if seek else "Letzte Eintraege."}{" Seite aktualisiert automatisch." if auto else " Auto-Refresh ist pausiert."}
   </p>
+  {render_log_seek_form("ring", "logs_ring")}
   <div class="tabs">
     <a class="tab" href="{url_for('logs_phone', auto=('1' if auto else '0'))}">Phone</a>
     <a class="tab active" href="{url_for('logs_ring', auto=('1' if auto else '0'))}">Ring</a>
     <a class="tab" href="{url_for('logs_baresip', auto=('1' if auto else '0'))}">baresip</a>
+    <a class="tab" href="{url_for('logs_search')}">Suche</a>
   </div>
   <pre>{data}</pre>
   <div class="btn-row">
+    {seek_nav}
     <a class="btn" href="{toggle_url}">{toggle_label}</a>
     <a class="btn" href="{url_for('index')}">Zurueck zum Dashboard</a>
   </div>
@@ -553,6 +842,7 @@ def logs_baresip():
     <a class="tab" href="{url_for('logs_phone', auto=('1' if auto else '0'))}">Phone</a>
     <a class="tab" href="{url_for('logs_ring', auto=('1' if auto else '0'))}">Ring</a>
     <a class="tab active" href="{url_for('logs_baresip', auto=('1' if auto else '0'))}">baresip</a>
+    <a class="tab" href="{url_for('logs_search')}">Suche</a>
   </div>
   <pre>{data}</pre>
   <div class="btn-row">
@@ -563,22 +853,150 @@ def logs_baresip():
 """
     return render_page("baresip Log", "logs", body, auto_refresh=auto_refresh)
 
+# --- Log-Suche (siehe log_search.py) ---
+def parse_log_time(raw):
+    return log_archive.parse_when(raw) if raw else None
+
+@app.get("/logs/search")
+@login_required
+def logs_search():
+    q = (request.args.get("q") or "").strip()
+    regex = request.args.get("re") == "1"
+    srcs = [x for x in request.args.getlist("src") if x in log_search.SOURCES] or list(log_search.SOURCES)
+    raw_from = request.args.get("from", "")
+    raw_to = request.args.get("to", "")
+    searched = bool(q or raw_from or raw_to)
+    msg, result, more = "", "", ""
+    if searched:
+        try:
+            t0, t1 = parse_log_time(raw_from), parse_log_time(raw_to)
+            cursor = None
+            if request.args.get("at"):
+                cursor = (float(request.args["at"]), max(0, int(request.args.get("skip", "0"))))
+            con = log_search.connect()
+            try:
+                cfg = retro_config.ConfigStore().load()
+                log_search.update(con, keep_days=cfg.log_keep_days,
+                                  budget=log_search.UPDATE_BUDGET_SEC, sources=srcs)
+                if regex:
+                    # eigener Prozess mit hartem Timeout: eine Regex kann sich festrennen
+                    res = log_search.search_isolated(q, srcs, t0, t1, True, cursor)
+                else:
+                    res = log_search.search(con, q, srcs, t0, t1, False, cursor)
+            finally:
+                con.close()
+        except ValueError as e:
+            msg = f'<p><span class="badge err">Fehler</span> {html.escape(str(e))}</p>'
+        except (OSError, EOFError, log_search.sqlite3.Error) as e:
+            msg = f'<p><span class="badge err">Fehler</span> Suche fehlgeschlagen: {html.escape(str(e))}</p>'
+        else:
+            rows = "\n".join(f"{html.escape(src):<8} {html.escape(text)}" for _, src, text in res["lines"])
+            result = f"<pre>{rows}</pre>" if rows else '<p class="subtle">Keine Treffer.</p>'
+            note = (" Zeitbudget erschoepft, weiter sucht ab der letzten Stelle."
+                    if res["partial"] else "")
+            msg = (f'<p class="subtle">{len(res["lines"])} Treffer, {res["blocks"]} Bloecke gelesen, '
+                   f'{res["elapsed"] * 1000:.0f} ms.{note}</p>')
+            if res["next"]:
+                keep = {k: v for k, v in request.args.items(multi=True) if k not in ("at", "skip")}
+                keep["src"] = srcs
+                more = (f'<a class="btn" href="{url_for("logs_search", **keep, at=repr(res["next"][0]), skip=res["next"][1])}">'
+                        f'Weiter</a>')
+    src_boxes = " ".join(
+        f'<label style="display:inline"><input type="checkbox" name="src" value="{x}" style="width:auto" '
+        f'{"checked" if x in srcs else ""}> {x}</label>' for x in log_search.SOURCES)
+    body = f"""
+<div class="card">
+  <h2>Log-Suche</h2>
+  <p class="subtle">Phone, Ring und baresip, auch in den gepackten Archiven. Woerter muessen in
+  derselben Zeile stehen und werden als Wortanfang gesucht (<code>0301</code> findet
+  <code>sip:0301234@...</code>), ohne Gross/Klein.</p>
+  <div class="tabs">
+    <a class="tab" href="{url_for('logs_phone')}">Phone</a>
+    <a class="tab" href="{url_for('logs_ring')}">Ring</a>
+    <a class="tab" href="{url_for('logs_baresip')}">baresip</a>
+    <a class="tab active" href="{url_for('logs_search')}">Suche</a>
+  </div>
+  <form method="get" action="{url_for('logs_search')}">
+    <label>Suchbegriffe</label>
+    <input name="q" value="{html.escape(q)}" placeholder="z. B. REGISTER_FAIL oder 0301234">
+    <label><input type="checkbox" name="re" value="1" style="width:auto" {"checked" if regex else ""}> als Regex</label>
+    <div class="grid-2">
+      <div>
+        <label>Von</label>
+        <input type="datetime-local" step="1" name="from" value="{html.escape(raw_from)}">
+      </div>
+      <div>
+        <label>Bis</label>
+        <input type="datetime-local" step="1" name="to" value="{html.escape(raw_to)}">
+      </div>
+    </div>
+    <p>{src_boxes}</p>
+    <div class="btn-row">
+      <button class="btn primary" type="submit">Suchen</button>
+    </div>
+  </form>
+  {msg}
+  {result}
+  <div class="btn-row">
+    {more}
+    <a class="btn" href="{url_for('index')}">Zurueck zum Dashboard</a>
+  </div>
+</div>
+"""
+    return render_page("Log-Suche", "logs", body)
+
 # --- Account ---
+def account_index():
+    """Index aus ?i= bzw. Formularfeld; None = neuer Account."""
+    raw = (request.values.get("i") or "0").strip()
+    if raw == "new":
+        return None
+    return int(raw) if raw.isdigit() else 0
+
 @app.get("/account")
 @login_required
 def account_form():
-    acc = parse_account(read_account_line())
+    idx = account_index()
+    all_accs = accounts.accounts()
+    acc = accounts.get(idx) if idx is not None else None
+    if acc is None:
+        acc = sip_accounts.empty_account()
+        idx = None if all_accs else 0
     def esc(x): return html.escape(x or "")
     transports = ["udp", "tcp", "tls"]
     opts = "".join(
         f'<option value="{t}" {"selected" if (acc.get("transport") or "udp")==t else ""}>{t}</option>'
         for t in transports
     )
+    rows = "".join(f"""
+<tr>
+  <td><code>{esc(sip_accounts.account_aor(a))}</code></td>
+  <td>{esc(a.get('display'))}</td>
+  <td>
+    <a class="btn" href="{url_for('account_form', i=n)}">Bearbeiten</a>
+    <form method="post" action="{url_for('account_delete')}" style="display:inline">
+      <input type="hidden" name="i" value="{n}">
+      <button class="btn" type="submit">Loeschen</button>
+    </form>
+  </td>
+</tr>""" for n, a in enumerate(all_accs))
+    title = "Neuer Account" if idx is None else f"Account {idx + 1}"
     body = f"""
 <div class="card">
-  <h1>SIP Account</h1>
-  <p class="subtle">Konfiguration des baresip Accounts. Nach Aenderung baresip neu starten.</p>
+  <h1>SIP Accounts</h1>
+  <p class="subtle">Eine Zeile der baresip accounts-Datei pro Account. Aenderungen gehen ueber den Daemon
+  direkt an das laufende baresip: nur das Registrierintervall = neu registrieren, sonst wird nur dieser
+  Account neu angelegt. Ein Neustart von baresip (trennt laufende Gespraeche) nur, wenn das nicht klappt.</p>
+  <table class="table">
+    <thead><tr><th>AOR</th><th>Name</th><th></th></tr></thead>
+    <tbody>{rows or '<tr><td colspan="3" class="subtle">Noch kein Account.</td></tr>'}</tbody>
+  </table>
+  <div class="btn-row"><a class="btn" href="{url_for('account_form', i='new')}">Neuer Account</a></div>
+</div>
+<div class="card">
+  <h2>{html.escape(title)}</h2>
   <form method="post" action="{url_for('account_save')}">
+    <input type="hidden" name="i" value="{'new' if idx is None else idx}">
     <label>Display Name (optional)</label>
     <input name="display" value="{esc(acc.get('display'))}">
     <label>Benutzername (User)</label>
@@ -597,7 +1015,8 @@ def account_form():
     <input name="regint" value="{esc(acc.get('regint') or "300")}">
     <div class="btn-row">
       <button class="btn primary" type="submit">Speichern</button>
-      <a class="btn" href="{url_for('action_restart_baresip')}">baresip neu starten</a>
+      <a class="btn" href="{url_for('action_restart_baresip')}">Neu registrieren</a>
+      <a class="btn" href="{url_for('action_restart_baresip', force=1)}">baresip neu starten</a>
       <a class="btn" href="{url_for('index')}">Abbrechen</a>
     </div>
     <p class="subtle" style="margin-top:8px;">Accounts Datei: <code>{html.escape(accounts_path())}</code></p>
@@ -606,6 +1025,29 @@ def account_form():
 """
     return render_page("SIP Account", "account", body)
 
+def render_account_result(title, text, ok, msg, regs, restarted):
+    if restarted:
+        badge = ('ok', 'baresip neu gestartet') if ok else ('err', 'Neustart fehlgeschlagen')
+    else:
+        badge = ('ok', 'baresip live aktualisiert') if ok else ('err', 'Fehler')
+    body = f"""
+<div class="card">
+  <h2>{html.escape(title)}</h2>
+  <pre>{html.escape(text)}</pre>
+  <p><span class="badge {badge[0]}">{badge[1]}</span> <span class="subtle">{html.escape(msg)}</span></p>
+  {render_registrations(regs)}
+  <div class="btn-row">
+    <a class="btn" href="{url_for('account_form')}">Zurueck zum Account</a>
+    <a class="btn" href="{url_for('index')}">Zurueck zum Dashboard</a>
+  </div>
+</div>
+"""
+    return render_page(title, "account", body)
+
+def render_account_saved(p, line, old, new):
+    ok, msg, regs, restarted = apply_accounts(old, new)
+    return render_account_result("Gespeichert", f"{p}\n{line}", ok, msg, regs, restarted)
+
 @app.post("/account")
 @login_required
 def account_save():
@@ -626,42 +1068,570 @@ def account_save():
     if not fields["auth_user"]:
         fields["auth_user"] = fields["user"]
 
-    line = build_account_line(fields)
-    p = write_accounts_file(line)
+    idx = account_index()
+    accs = [account_fields(a) for a in accounts.accounts()]
+    if idx is None or idx >= len(accs):
+        idx = len(accs)
+        accs.append(fields)
+    else:
+        accs[idx] = fields
+    aor = sip_accounts.account_aor(fields)
+    if any(sip_accounts.account_aor(a) == aor for n, a in enumerate(accs) if n != idx):
+        return Response(f"{aor} ist schon als Account eingetragen.", 400)
+
+    p, old, new = accounts.save(accs)
+    return render_account_saved(p, new[idx]["line"], old, new)
 
+@app.post("/account/delete")
+@login_required
+def account_delete():
+    idx = account_index()
+    accs = [account_fields(a) for a in accounts.accounts()]
+    if idx is None or idx >= len(accs):
+        return redirect(url_for("account_form"))
+    removed = sip_accounts.account_aor(accs.pop(idx))
+    p, old, new = accounts.save(accs)
+    return render_account_saved(p, f"{removed} entfernt", old, new)
+
+@app.get("/action/restart")
+@login_required
+def action_restart_baresip():
+    """
+    Alle Accounts neu registrieren (uafind + uareg), baresip laeuft weiter.
+    Neustart nur mit ?force=1 oder wenn der Daemon baresip nicht erreicht.
+    """
+    accs = accounts.accounts()
+    force = request.args.get("force") == "1"
+    commands, aors = [], []
+    for acc in accs:
+        aor = sip_accounts.account_aor(acc)
+        commands += [["uafind", aor], ["uareg", acc.get("regint") or "0"]]
+        if (acc.get("regint") or "0") != "0":
+            aors.append(aor)
+    if force or not commands:
+        ok, msg, regs, restarted = apply_accounts([], [], force_restart=True)
+    else:
+        ok, msg, regs = run_live(commands, aors)
+        restarted = False
+        if not ok:
+            ok, out = restart_service(SERVICES["baresip"])
+            msg = f"{msg}; baresip neu gestartet" if ok else f"{msg}; {out}"
+            restarted = True
+    return render_account_result("baresip aktualisieren", f"{len(accs)} Account(s)",
+                                 ok, msg, regs, restarted)
+
+# --- Anrufliste (CDR) ---
+CALLS_PAGE_SIZE = 50
+
+def calls_filters():
+    """Filter aus den Query-Parametern, Datumsfelder im Format YYYY-MM-DD."""
+    f = {
+        "direction": request.args.get("direction", ""),
+        "missed":    request.args.get("missed") == "1",
+        "number":    (request.args.get("number") or "").strip(),
+        "since":     None,
+        "until":     None,
+    }
+    try:
+        if request.args.get("from"):
+            f["since"] = datetime.strptime(request.args["from"], "%Y-%m-%d").timestamp()
+        if request.args.get("to"):
+            day = datetime.strptime(request.args["to"], "%Y-%m-%d")
+            f["until"] = (day + timedelta(days=1)).timestamp()
+    except ValueError:
+        pass
+    return f
+
+def fmt_ts(ts):
+    return datetime.fromtimestamp(ts).strftime("%Y-%m-%d %H:%M:%S") if ts else ""
+
+def fmt_dur(sec):
+    sec = int(sec or 0)
+    return f"{sec // 60}:{sec % 60:02d}"
+
+@app.get("/calls")
+@login_required
+def calls_history():
+    filters = calls_filters()
+    before = None
+    if request.args.get("before_ts") and request.args.get("before_id"):
+        try:
+            before = (float(request.args["before_ts"]), int(request.args["before_id"]))
+        except ValueError:
+            before = None
+
+    rows, last = [], None
+    err = ""
+    try:
+        con = cdr_store.connect(cdr_store.CDR_DB, readonly=True)
+        try:
+            for c in cdr_store.iter_calls(con, filters, limit=CALLS_PAGE_SIZE + 1, before=before):
+                if len(rows) == CALLS_PAGE_SIZE:
+                    last = prev
+                    break
+                prev = c
+                if c["direction"] == "incoming":
+                    if (c["reason"] or "").startswith(caller_filter.BLOCK):
+                        badge = '<span class="badge warn">abgewiesen</span>'
+                    elif (c["reason"] or "").startswith("voicemail"):
+                        badge = '<span class="badge warn">Anrufbeantworter</span>'
+                    elif c["t_answer"]:
+                        badge = '<span class="badge ok">eingehend</span>'
+                    else:
+                        badge = '<span class="badge err">verpasst</span>'
+                else:
+                    badge = '<span class="badge">ausgehend</span>'
+                rows.append(f"""
+<tr>
+  <td>{html.escape(fmt_ts(c['t_start']))}</td>
+  <td>{badge}</td>
+  <td><code>{html.escape(c['number'] or '-')}</code> <span class="subtle">{html.escape(c['peer_name'])}</span></td>
+  <td>{html.escape(fmt_dur(c['duration']))}</td>
+  <td><span class="subtle">{html.escape(c['reason'] or '')}</span></td>
+  <td><span class="subtle">{html.escape(media_stats.summary(media_stats.decode(c['media'])))}</span></td>
+</tr>
+""")
+        finally:
+            con.close()
+    except Exception as e:
+        err = f'<p class="errtext">Anrufliste nicht lesbar: {html.escape(str(e))}</p>'
+
+    keep = {k: v for k, v in request.args.items() if k not in ("before_ts", "before_id") and v}
+    more = ""
+    if last:
+        more = f'<a class="btn" href="{url_for("calls_history", before_ts=last["t_start"], before_id=last["id"], **keep)}">Aeltere Anrufe</a>'
+    dir_opts = "".join(
+        f'<option value="{v}" {"selected" if filters["direction"]==v else ""}>{label}</option>'
+        for v, label in (("", "alle"), ("incoming", "eingehend"), ("outgoing", "ausgehend"))
+    )
+    table_rows = "\n".join(rows) or '<tr><td colspan="6" class="subtle">Keine Anrufe gefunden.</td></tr>'
     body = f"""
 <div class="card">
-  <h2>Gespeichert</h2>
-  <p class="subtle">Accounts Datei aktualisiert.</p>
-  <p><code>{html.escape(p)}</code></p>
-  <pre>{html.escape(line)}</pre>
+  <h1>Anrufe</h1>
+  <p class="subtle">Anrufliste aus <code>{html.escape(cdr_store.CDR_DB)}</code>, neueste zuerst.</p>
+  {err}
+  <form method="get" action="{url_for('calls_history')}">
+    <div class="grid-2">
+      <div>
+        <label>Nummer (Anfang)</label>
+        <input name="number" value="{html.escape(filters['number'])}">
+        <label>Richtung</label>
+        <select name="direction">{dir_opts}</select>
+      </div>
+      <div>
+        <label>Von (YYYY-MM-DD)</label>
+        <input name="from" value="{html.escape(request.args.get('from', ''))}">
+        <label>Bis (YYYY-MM-DD)</label>
+        <input name="to" value="{html.escape(request.args.get('to', ''))}">
+      </div>
+    </div>
+    <label><input type="checkbox" name="missed" value="1" style="width:auto" {"checked" if filters["missed"] else ""}> nur verpasste</label>
+    <div class="btn-row">
+      <button class="btn primary" type="submit">Filtern</button>
+      <a class="btn" href="{url_for('calls_export', **keep)}">CSV Export</a>
+    </div>
+  </form>
+  <table class="table">
+    <thead>
+      <tr><th>Zeit</th><th>Richtung</th><th>Nummer</th><th>Dauer</th><th>Grund</th><th>Audio</th></tr>
+    </thead>
+    <tbody>
+      {table_rows}
+    </tbody>
+  </table>
   <div class="btn-row">
-    <a class="btn primary" href="{url_for('action_restart_baresip')}">baresip jetzt neu starten</a>
-    <a class="btn" href="{url_for('account_form')}">Zurueck zum Account</a>
+    {more}
     <a class="btn" href="{url_for('index')}">Zurueck zum Dashboard</a>
   </div>
 </div>
+{render_media_card()}
 """
-    return render_page("Gespeichert", "account", body)
+    return render_page("Anrufe", "calls", body)
 
-@app.get("/action/restart")
+MEDIA_CALLS = 200     # so viele Calls mit Audio-Statistik fliessen in die Empfehlung
+
+def render_media_card():
+    """Verteilung aus den letzten Calls und Vorschlaege fuer die baresip config."""
+    try:
+        con = cdr_store.connect(cdr_store.CDR_DB, readonly=True)
+        try:
+            merged = media_stats.merge(media_stats.decode(m)
+                                       for m in cdr_store.iter_media(con, MEDIA_CALLS))
+        finally:
+            con.close()
+    except Exception:
+        return ""
+    if not merged["calls"]:
+        return ""
+    try:
+        ptime = int(baresip_config_value("ptime", str(media_stats.PTIME_MS)))
+    except ValueError:
+        ptime = media_stats.PTIME_MS
+    recs = media_stats.recommend(merged, ptime)
+    def hist_row(label, key, edges, unit):
+        total = sum(merged[key]) or 1
+        cells = "".join(
+            f'<td>{"&le;" + str(e) if i < len(edges) else "&gt;" + str(edges[-1])} {unit}<br>'
+            f'<span class="subtle">{100.0 * n / total:.0f}%</span></td>'
+            for i, (e, n) in enumerate(zip(list(edges) + [edges[-1]], merged[key])))
+        return f"<tr><th>{label}</th>{cells}</tr>"
+    current = {key: baresip_config_value(key, "-") for key, _, _ in recs}
+    rec_rows = "".join(
+        f"<tr><td><code>{html.escape(k)}</code></td><td><code>{html.escape(current[k])}</code></td>"
+        f"<td><code>{html.escape(v)}</code></td><td class=\"subtle\">{html.escape(why)}</td></tr>"
+        for k, v, why in recs)
+    recs_html = (f"""
+  <table class="table">
+    <thead><tr><th>Einstellung</th><th>aktuell</th><th>Vorschlag</th><th>Grund</th></tr></thead>
+    <tbody>{rec_rows}</tbody>
+  </table>""" if recs else '<p class="subtle">Noch zu wenige RTCP-Reports fuer eine Empfehlung.</p>')
+    return f"""
+<div class="card">
+  <h2>Audioqualitaet</h2>
+  <p class="subtle">RTCP-Statistik der letzten {merged['calls']} Gespraeche ({merged['n']} Reports):
+  Anteil der Reports je Bereich. Audio-Start = Annahme bis zum ersten Audio-Paket, Anteil der Calls.</p>
+  <table class="table">
+    {hist_row("Jitter", "jit", media_stats.JITTER_BUCKETS_MS, "ms")}
+    {hist_row("Verlust", "loss", media_stats.LOSS_BUCKETS_PCT, "%")}
+    {hist_row("Audio-Start", "start", media_stats.START_BUCKETS_MS, "ms") if sum(merged["start"]) else ""}
+  </table>
+  {recs_html}
+  <p class="subtle">Aenderungen in der baresip config wirken nach einem Neustart von baresip.</p>
+</div>
+"""
+
+# Tabellenprogramme werten Zellen mit diesen Anfangszeichen als Formel
+CSV_FORMULA_CHARS = ("=", "+", "-", "@", "\t", "\r")
+
+def csv_cell(value):
+    """Text vom Anrufer (Nummer, URI, Grund) entschaerfen: ' davor."""
+    value = value or ""
+    return "'" + value if value.startswith(CSV_FORMULA_CHARS) else value
+
+@app.get("/calls.csv")
 @login_required
-def action_restart_baresip():
-    ok, msg = restart_service(SERVICES["baresip"])
-    badge = "ok" if ok else "err"
+def calls_export():
+    filters = calls_filters()
+
+    def generate():
+        buf = io.StringIO()
+        w = csv.writer(buf)
+        w.writerow(["start", "answer", "end", "direction", "number", "peer_uri",
+                    "duration_s", "reason", "audio_loss_pct", "audio_jitter_max_ms"])
+        try:
+            con = cdr_store.connect(cdr_store.CDR_DB, readonly=True)
+        except Exception:
+            yield buf.getvalue()
+            return
+        try:
+            for c in cdr_store.iter_calls(con, filters):
+                m = media_stats.decode(c["media"])
+                loss = (100.0 * m["rx_lost"] / (m["rx"] + m["rx_lost"])
+                        if m and m["rx"] + m["rx_lost"] else None)
+                w.writerow([fmt_ts(c["t_start"]), fmt_ts(c["t_answer"]), fmt_ts(c["t_end"]),
+                            c["direction"], csv_cell(c["number"]), csv_cell(c["peer_uri"]),
+                            int(c["duration"]), csv_cell(c["reason"]),
+                            f"{loss:.2f}" if loss is not None else "",
+                            m["jit_max"] if m else ""])
+                # zeilenweise ausliefern, nie die ganze Liste im Speicher
+                yield buf.getvalue()
+                buf.seek(0)
+                buf.truncate()
+        finally:
+            con.close()
+        if buf.tell():
+            yield buf.getvalue()
+
+    return Response(generate(), mimetype="text/csv", headers={
+        "Content-Disposition": "attachment; filename=retrophone-calls.csv",
+    })
+
+# --- Anrufbeantworter ---
+GREETING_MAX_BYTES = 5 * 1024 * 1024
+
+def voicemail_path_ok(path):
+    """Nur Dateien aus dem Nachrichten-Verzeichnis ausliefern oder loeschen."""
+    base = os.path.realpath(voicemail.VM_DIR)
+    return os.path.realpath(path).startswith(base + os.sep)
+
+def daemon_messages():
+    """Nachrichtenanzeige (MWI) vom Daemon oder None."""
+    try:
+        resp = daemon_ipc.request({"cmd": "messages"}, timeout=1.0)
+    except OSError:
+        return None
+    return resp.get("messages") if resp.get("ok") else None
+
+def render_mwi(mw, cfg):
+    if mw is None:
+        return '<p class="subtle">Nachrichtenanzeige: Daemon nicht erreichbar.</p>'
+    remote = ", ".join(f"{html.escape(aor)}: {r['new']} neu / {r['old']} alt"
+                       for aor, r in mw["remote"].items()) or "keine Meldung vom Provider"
+    last = fmt_ts(mw["last_signal"]) if mw["last_signal"] else "noch nie"
+    return f"""
+  <p class="subtle">Provider-Mailbox (MWI): {remote}. Verpasste Anrufe seit dem letzten Abheben: {mw['missed']}.
+  Glockenzeichen {"an" if cfg.mwi_signal else "aus"}, zuletzt {html.escape(last)}.
+  Abhoeren am Telefon: <code>{html.escape(cfg.playback_code)}</code> waehlen.</p>"""
+
+def render_voicemail(msg_html=""):
+    rows = []
+    err = ""
+    total = new = 0
+    try:
+        con = cdr_store.connect(cdr_store.CDR_DB, readonly=True)
+        try:
+            total, new = voicemail.counts(con)
+            for m in voicemail.iter_messages(con):
+                badge = '<span class="badge">gehoert</span>' if m["heard"] else '<span class="badge warn">neu</span>'
+                rows.append(f"""
+<tr>
+  <td>{html.escape(fmt_ts(m['t_start']))}</td>
+  <td>{badge}</td>
+  <td><code>{html.escape(m['number'] or '-')}</code></td>
+  <td>{html.escape(fmt_dur(m['duration']))}</td>
+  <td><audio controls preload="none" src="{url_for('voicemail_audio', msg_id=m['id'])}"></audio></td>
+  <td>
+    <form method="post" action="{url_for('voicemail_delete', msg_id=m['id'])}" style="margin:0">
+      <button class="btn" type="submit">Loeschen</button>
+    </form>
+  </td>
+</tr>
+""")
+        finally:
+            con.close()
+    except Exception as e:
+        err = f'<p class="errtext">Nachrichten nicht lesbar: {html.escape(str(e))}</p>'
+    cfg = retro_config.ConfigStore().load()
+    state = (f'<span class="badge ok">an</span> nimmt nach {cfg.voicemail_rings} Klingelzyklen ab, '
+             f'hoechstens {cfg.voicemail_max_sec:.0f}s, {html.escape(cfg.voicemail_format.upper())}'
+             if cfg.voicemail else
+             '<span class="badge">aus</span> einschalten mit <code>voicemail = yes</code> unter '
+             f'<a href="{url_for("config_form")}">Konfiguration</a>')
+    greeting = ("vorhanden" if os.path.exists(voicemail.GREETING) else "fehlt (Anrufer hoeren Stille)")
+    table_rows = "\n".join(rows) or '<tr><td colspan="6" class="subtle">Keine Nachrichten.</td></tr>'
     body = f"""
 <div class="card">
-  <h2>baresip Restart</h2>
-  <p><span class="badge {badge}">{html.escape("Erfolg" if ok else "Fehler")}</span></p>
-  <pre>{html.escape(msg)}</pre>
-  <div class="btn-row">
-    <a class="btn" href="{url_for('services_overview')}">Zu Services</a>
-    <a class="btn" href="{url_for('account_form')}">Zurueck zum Account</a>
-    <a class="btn" href="{url_for('index')}">Zurueck zum Dashboard</a>
-  </div>
+  <h1>Anrufbeantworter</h1>
+  <p>{state}</p>
+  <p class="subtle">{total} Nachrichten, {new} neu. Dateien in <code>{html.escape(voicemail.VM_DIR)}</code>.</p>
+  {render_mwi(daemon_messages(), cfg)}
+  {err}
+  {msg_html}
+  <table class="table">
+    <thead>
+      <tr><th>Zeit</th><th>Status</th><th>Nummer</th><th>Dauer</th><th>Anhoeren</th><th></th></tr>
+    </thead>
+    <tbody>
+      {table_rows}
+    </tbody>
+  </table>
+</div>
+<div class="card">
+  <h2>Ansage</h2>
+  <p class="subtle">Ansage: {greeting}. WAV-Datei (z. B. 16 Bit mono), hoechstens {GREETING_MAX_BYTES // (1024 * 1024)} MB.</p>
+  <form method="post" action="{url_for('voicemail_greeting')}" enctype="multipart/form-data">
+    <input type="file" name="greeting" accept=".wav,audio/wav">
+    <div class="btn-row"><button class="btn primary" type="submit">Hochladen</button></div>
+  </form>
+</div>
+"""
+    return render_page("Anrufbeantworter", "voicemail", body)
+
+@app.get("/voicemail")
+@login_required
+def voicemail_list():
+    return render_voicemail()
+
+@app.get("/voicemail/<int:msg_id>/audio")
+@login_required
+def voicemail_audio(msg_id):
+    try:
+        con = cdr_store.connect(cdr_store.CDR_DB)
+        try:
+            m = voicemail.get_message(con, msg_id)
+            if m and not m["heard"]:
+                voicemail.mark_heard(con, msg_id)
+        finally:
+            con.close()
+    except Exception as e:
+        return Response(f"Nachricht nicht lesbar: {e}", 500)
+    if not m or not voicemail_path_ok(m["path"]) or not os.path.exists(m["path"]):
+        return Response("Nachricht nicht gefunden", 404)
+    # send_file streamt von der Platte und beantwortet Range-Anfragen (Spulen im Player)
+    return send_file(m["path"], mimetype=voicemail.MIME.get(m["format"], "application/octet-stream"),
+                     conditional=True)
+
+@app.post("/voicemail/<int:msg_id>/delete")
+@login_required
+def voicemail_delete(msg_id):
+    try:
+        con = cdr_store.connect(cdr_store.CDR_DB)
+        try:
+            m = voicemail.get_message(con, msg_id)
+            if m and voicemail_path_ok(m["path"]):
+                voicemail.delete_message(con, msg_id)
+        finally:
+            con.close()
+    except Exception as e:
+        return render_voicemail(f'<p class="errtext">Loeschen fehlgeschlagen: {html.escape(str(e))}</p>')
+    return redirect(url_for("voicemail_list"))
+
+@app.post("/voicemail/greeting")
+@login_required
+def voicemail_greeting():
+    f = request.files.get("greeting")
+    data = f.read(GREETING_MAX_BYTES + 1) if f else b""
+    if not data:
+        return render_voicemail('<p class="errtext">Keine Datei gewaehlt.</p>')
+    if len(data) > GREETING_MAX_BYTES:
+        return render_voicemail('<p class="errtext">Datei zu gross.</p>')
+    try:
+        voicemail.wav_header(io.BytesIO(data))
+    except ValueError as e:
+        return render_voicemail(f'<p class="errtext">Keine gueltige WAV-Datei: {html.escape(str(e))}</p>')
+    try:
+        os.makedirs(voicemail.VM_DIR, exist_ok=True)
+        tmp = voicemail.GREETING + ".tmp"
+        with open(tmp, "wb") as out:
+            out.write(data)
+        os.replace(tmp, voicemail.GREETING)
+    except OSError as e:
+        return render_voicemail(f'<p class="errtext">Speichern fehlgeschlagen: {html.escape(str(e))}</p>')
+    return render_voicemail('<p><span class="badge ok">Ansage gespeichert</span></p>')
+
+# --- Anruffilter (allow/block, Nicht stoeren) ---
+def read_caller_filter():
+    try:
+        with open(caller_filter.FILTER_PATH, "r", encoding="utf-8") as f:
+            return f.read()
+    except OSError:
+        return caller_filter.DEFAULT_TEXT
+
+def write_caller_filter(text: str):
+    p = caller_filter.FILTER_PATH
+    os.makedirs(os.path.dirname(p), exist_ok=True)
+    tmp = p + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(text.replace("\r\n", "\n").rstrip() + "\n")
+    # atomar ersetzen: der Daemon sieht nie eine halbe Datei und erkennt die neue mtime
+    os.replace(tmp, p)
+    return p
+
+def render_callers(text, msg_html=""):
+    test = (request.args.get("test") or "").strip()
+    result = ""
+    if test:
+        rules, _ = caller_filter.Rules.parse(text)
+        verdict, why = caller_filter.decide(rules, test, datetime.now().timestamp())
+        label, badge = {
+            caller_filter.BLOCK: ("wird abgewiesen", "err"),
+            caller_filter.DND:   ("klingelt nicht (Nicht stoeren)", "warn"),
+        }.get(verdict, ("klingelt", "ok"))
+        result = (f'<p><code>{html.escape(test)}</code> <span class="badge {badge}">{label}</span> '
+                  f'<span class="subtle">{html.escape(why)}</span></p>')
+    body = f"""
+<div class="card">
+  <h1>Anruffilter</h1>
+  <p class="subtle">Nummern in <code>[allow]</code> klingeln immer, <code>[block]</code> wird vor der ersten Glocke abgewiesen,
+  in den <code>[dnd]</code>-Zeitfenstern bleibt die Glocke still (Abheben nimmt trotzdem an).
+  Praefixe mit <code>*</code>, Anrufe ohne Nummer mit <code>anonymous</code>.
+  Der Daemon uebernimmt Aenderungen beim naechsten Anruf, ohne Neustart.</p>
+  {msg_html}
+  <form method="post" action="{url_for('callers_save')}">
+    <textarea name="rules" rows="18">{html.escape(text)}</textarea>
+    <div class="btn-row">
+      <button class="btn primary" type="submit">Speichern</button>
+      <a class="btn" href="{url_for('index')}">Abbrechen</a>
+    </div>
+    <p class="subtle" style="margin-top:8px;">Datei: <code>{html.escape(caller_filter.FILTER_PATH)}</code></p>
+  </form>
+</div>
+<div class="card">
+  <h2>Nummer testen</h2>
+  <form method="get" action="{url_for('callers_form')}">
+    <input name="test" value="{html.escape(test)}" placeholder="z. B. 0791234567">
+    <div class="btn-row"><button class="btn" type="submit">Pruefen</button></div>
+  </form>
+  {result}
 </div>
 """
-    return render_page("Restart", "home", body)
+    return render_page("Anruffilter", "callers", body)
+
+@app.get("/callers")
+@login_required
+def callers_form():
+    return render_callers(read_caller_filter())
+
+@app.post("/callers")
+@login_required
+def callers_save():
+    text = request.form.get("rules") or ""
+    _, errors = caller_filter.Rules.parse(text)
+    if errors:
+        msg = "".join(f'<p class="errtext">{html.escape(e)}</p>' for e in errors)
+        return render_callers(text, msg + '<p class="errtext">Nicht gespeichert.</p>')
+    try:
+        write_caller_filter(text)
+    except OSError as e:
+        return render_callers(text, f'<p class="errtext">Speichern fehlgeschlagen: {html.escape(str(e))}</p>')
+    return render_callers(read_caller_filter(), '<p><span class="badge ok">Gespeichert</span></p>')
+
+# --- Konfiguration (Daemon + Klingel) ---
+def read_config_text():
+    try:
+        with open(retro_config.CONFIG_PATH, "r", encoding="utf-8") as f:
+            return f.read()
+    except OSError:
+        return retro_config.default_text()
+
+def write_config_text(text: str):
+    p = retro_config.CONFIG_PATH
+    os.makedirs(os.path.dirname(p), exist_ok=True)
+    tmp = p + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(text.replace("\r\n", "\n").rstrip() + "\n")
+    # atomar ersetzen: Daemon und Klingel laden bei neuer mtime den ganzen Snapshot
+    os.replace(tmp, p)
+    return p
+
+def render_config(text, msg_html=""):
+    body = f"""
+<div class="card">
+  <h1>Konfiguration</h1>
+  <p class="subtle">Zeiten, Entprellung und Klingel-Kadenz. Der Daemon uebernimmt Aenderungen nach wenigen Sekunden,
+  die Klingel ab dem naechsten Klingelzyklus. Mit <code>(Neustart)</code> markierte Werte wirken erst nach
+  einem Neustart des Daemons. Eine fehlerhafte Datei wird nicht gespeichert.</p>
+  {msg_html}
+  <form method="post" action="{url_for('config_save')}">
+    <textarea name="config" rows="34">{html.escape(text)}</textarea>
+    <div class="btn-row">
+      <button class="btn primary" type="submit">Speichern</button>
+      <a class="btn" href="{url_for('index')}">Abbrechen</a>
+    </div>
+    <p class="subtle" style="margin-top:8px;">Datei: <code>{html.escape(retro_config.CONFIG_PATH)}</code></p>
+  </form>
+</div>
+"""
+    return render_page("Konfiguration", "config", body)
+
+@app.get("/config")
+@login_required
+def config_form():
+    return render_config(read_config_text())
+
+@app.post("/config")
+@login_required
+def config_save():
+    text = request.form.get("config") or ""
+    _, errors = retro_config.parse(text)
+    if errors:
+        msg = "".join(f'<p class="errtext">{html.escape(e)}</p>' for e in errors)
+        return render_config(text, msg + '<p class="errtext">Nicht gespeichert.</p>')
+    try:
+        write_config_text(text)
+    except OSError as e:
+        return render_config(text, f'<p class="errtext">Speichern fehlgeschlagen: {html.escape(str(e))}</p>')
+    return render_config(read_config_text(), '<p><span class="badge ok">Gespeichert</span></p>')
 
 # --- Service Uebersicht ---
 @app.get("/services")
@@ -9,6 +9,14 @@ echo "=== RetroPhone Installer ==="
 RETRO_USER="${SUDO_USER:-pi}"
 RETRO_HOME="$(getent passwd "$RETRO_USER" | cut -d: -f6)"
 
+# ALSA-Karte des Hoerers (aplay -l), Standard: Karte 0
+AUDIO_CARD="${AUDIO_CARD:-0}"
+
+# Ressourcen-Profil: "realtime" = GPIO-Schleife und Klingel mit SCHED_FIFO auf
+# dem letzten Kern, baresip bevorzugt, Webapp gedrosselt; "standard" = wie frueher
+RESOURCE_PROFILE="${RESOURCE_PROFILE:-realtime}"
+RT_PRIORITY=50
+
 # HIER ANPASSEN: Basis-URL zu deinem GitHub-Repo (raw)
 # Beispiel: https://raw.githubusercontent.com/deinuser/retrophone/main
 RAW_BASE="https://github.com/chkronenberg/retrophone/tree/main/files"
@@ -16,15 +24,41 @@ RAW_BASE="https://github.com/chkronenberg/retrophone/tree/main/files"
 # Datei-Liste, die aus dem Repo geholt wird
 PY_FILES=(
   "phone_daemon.py"
+  "sd_notify.py"
+  "liveness.py"
+  "baresip_ctrl.py"
+  "call_table.py"
+  "cdr_store.py"
+  "caller_filter.py"
+  "sip_accounts.py"
+  "daemon_ipc.py"
+  "registrations.py"
+  "net_monitor.py"
+  "media_stats.py"
+  "audio_lease.py"
+  "voicemail.py"
+  "log_archive.py"
+  "log_search.py"
+  "mwi.py"
+  "retro_config.py"
+  "hook_gesture.py"
+  "input_filter.py"
+  "dial_decoder.py"
   "ring_control.py"
+  "rt_sched.py"
   "webapp.py"
+  "web_auth.py"
   "gpio_monitor.py"
   "gpio_hook_monitor.py"
+  "wakeup_stats.py"
+  "edge_trace.py"
+  "dial_bench.py"
 )
 
 RETRO_DIR="/usr/local/retrophone"
 RETRO_LOG_DIR="/var/log/retrophone"
 RETRO_RUN_DIR="/run/retrophone"
+RETRO_LIB_DIR="/var/lib/retrophone"
 
 # --- Helpers -------------------------------------------------------------------
 
@@ -52,7 +86,7 @@ sudo apt-get update
 sudo apt-get upgrade -y
 sudo apt-get install -y \  
   python3 python3-pip python3-flask python3-gpiozero python3-rpi.gpio \  
-  alsa-utils sox git \  
+  alsa-utils sox opus-tools git python3-zstandard \  
   build-essential libasound2-dev libssl-dev libz-dev libopus-dev libavformat-dev \  
   libavcodec-dev libavutil-dev libre-dev libspandsp-dev libreadline-dev \  
   uuid-dev libedit-dev libmicrohttpd-dev systemd python3-venv \ 
@@ -103,13 +137,136 @@ modify_or_add() {
 # alte ring_aufile Zeilen entfernen
 sed -i '/^ring_aufile /d' "$BARESIP_CONFIG"
 
-modify_or_add "audio_player" "alsa,plughw:0,0"
-modify_or_add "audio_source" "alsa,plughw:0,0"
+# Gemeinsames ALSA-Geraet fuer Waehlton (aplay) und baresip: dmix/dsnoop,
+# damit sich beide nicht mit "device busy" gegenseitig blockieren.
+# Eine eigene /etc/asound.conf ohne unsere Markierung bleibt unangetastet.
+ASOUND_CONF="/etc/asound.conf"
+if [ ! -f "$ASOUND_CONF" ] || grep -q "^# RetroPhone" "$ASOUND_CONF"; then
+  echo "==> ALSA dmix/dsnoop fuer Karte $AUDIO_CARD einrichten..."
+  cat >"$ASOUND_CONF" <<EOF
+# RetroPhone: gemeinsames Geraet fuer Waehlton und baresip (install_retrophone.sh)
+pcm.retrophone {
+    type asym
+    playback.pcm "retrophone_play"
+    capture.pcm  "retrophone_rec"
+}
+pcm.retrophone_play {
+    type plug
+    slave.pcm "retrophone_dmix"
+}
+pcm.retrophone_rec {
+    type plug
+    slave.pcm "retrophone_dsnoop"
+}
+pcm.retrophone_dmix {
+    type dmix
+    ipc_key 4741
+    ipc_key_add_uid false
+    ipc_perm 0660
+    slave {
+        pcm "hw:$AUDIO_CARD,0"
+        rate 48000
+        period_size 480
+        buffer_size 1920
+    }
+}
+pcm.retrophone_dsnoop {
+    type dsnoop
+    ipc_key 4742
+    ipc_key_add_uid false
+    ipc_perm 0660
+    slave {
+        pcm "hw:$AUDIO_CARD,0"
+        rate 48000
+        period_size 480
+        buffer_size 1920
+    }
+}
+ctl.retrophone {
+    type hw
+    card $AUDIO_CARD
+}
+EOF
+  AUDIO_DEV="retrophone"
+else
+  echo "==> Eigene $ASOUND_CONF gefunden, baresip bleibt auf plughw:$AUDIO_CARD,0"
+  AUDIO_DEV="plughw:$AUDIO_CARD,0"
+  # Waehlton auf dasselbe Geraet (exklusiv: kein Vorwaermen, Daemon raeumt vor baresip)
+  if [ ! -f /etc/retrophone/retrophone.conf ]; then
+    mkdir -p /etc/retrophone
+    printf '[daemon]\naudio_device = %s\n' "$AUDIO_DEV" >/etc/retrophone/retrophone.conf
+  elif ! grep -q "^audio_device" /etc/retrophone/retrophone.conf; then
+    echo "   Hinweis: audio_device = $AUDIO_DEV in /etc/retrophone/retrophone.conf setzen"
+  fi
+fi
+
+modify_or_add "audio_player" "alsa,$AUDIO_DEV"
+modify_or_add "audio_source" "alsa,$AUDIO_DEV"
 modify_or_add "audio_alert"  "alsa,null"
 modify_or_add "audio_srate"  "48000"
 echo "ring_aufile none" >>"$BARESIP_CONFIG"
 modify_or_add "ctrl_tcp_listen" "0.0.0.0:4444"
 
+# Anrufbeantworter: Ansage per aufile, Aufnahme per sndfile. sndfile laedt der
+# Daemon nur fuer den Anrufbeantworter (module_load), sonst wuerde jeder Call
+# aufgezeichnet. Spool auf tmpfs, der Daemon legt das Verzeichnis an.
+sed -i 's/^#\?module[[:space:]]\+sndfile\.so/#module                 sndfile.so/' "$BARESIP_CONFIG"
+if grep -q "^#module[[:space:]]\+aufile\.so" "$BARESIP_CONFIG"; then
+  sed -i 's/^#module[[:space:]]\+aufile\.so/module                  aufile.so/' "$BARESIP_CONFIG"
+elif ! grep -q "^module[[:space:]]\+aufile\.so" "$BARESIP_CONFIG"; then
+  echo "module                  aufile.so" >>"$BARESIP_CONFIG"
+fi
+modify_or_add "snd_path" "/run/retrophone/vm-spool"
+
+# Nachrichtenanzeige: message-summary (MWI) beim Provider abonnieren
+if grep -q "^#module_app[[:space:]]\+mwi\.so" "$BARESIP_CONFIG"; then
+  sed -i 's/^#module_app[[:space:]]\+mwi\.so/module_app              mwi.so/' "$BARESIP_CONFIG"
+elif ! grep -q "^module_app[[:space:]]\+mwi\.so" "$BARESIP_CONFIG"; then
+  echo "module_app              mwi.so" >>"$BARESIP_CONFIG"
+fi
+
+# Ressourcen-Profil: Schluessel fuer Daemon und Klingel, Zusaetze fuer die Units (Abschnitt 12)
+RETRO_CONF=/etc/retrophone/retrophone.conf
+conf_default() {
+  mkdir -p /etc/retrophone
+  [ -f "$RETRO_CONF" ] || printf '[daemon]\n' >"$RETRO_CONF"
+  grep -q "^\[daemon\]" "$RETRO_CONF" || printf '\n[daemon]\n' >>"$RETRO_CONF"
+  # vorhandene Werte nicht ueberschreiben
+  grep -q "^$1[[:space:]]*=" "$RETRO_CONF" || sed -i "/^\[daemon\]/a $1 = $2" "$RETRO_CONF"
+}
+
+NCPU=$(nproc)
+DAEMON_RES=""
+BARESIP_RES=""
+WEB_RES="Nice=10"
+LOGS_RES=""
+if [ "$RESOURCE_PROFILE" = "realtime" ]; then
+  echo "==> Ressourcen-Profil realtime ($NCPU Kerne)"
+  RT_CORE=-1
+  if [ "$NCPU" -gt 1 ]; then
+    RT_CORE=$((NCPU - 1))
+    OTHER_CORES="0-$((NCPU - 2))"
+  fi
+  conf_default rt_priority "$RT_PRIORITY"
+  conf_default cpu_core "$RT_CORE"
+  # ohne Root darf der Daemon SCHED_FIFO nur bis LimitRTPRIO setzen
+  DAEMON_RES="LimitRTPRIO=$RT_PRIORITY"
+  # baresip hat keine Thread-Prioritaeten: ganzer Prozess vor Webapp und Jobs, aber kein Echtzeit
+  BARESIP_RES="Nice=-10"
+  # Webapp samt journalctl/systemctl-Kindern: Quota, niedrige I/O-Prioritaet
+  WEB_RES="Nice=10
+CPUQuota=50%
+IOSchedulingClass=best-effort
+IOSchedulingPriority=7"
+  if [ "$RT_CORE" -ge 0 ]; then
+    BARESIP_RES="$BARESIP_RES
+CPUAffinity=$OTHER_CORES"
+    WEB_RES="$WEB_RES
+CPUAffinity=$OTHER_CORES"
+    LOGS_RES="CPUAffinity=$OTHER_CORES"
+  fi
+fi
+
 # --- 6. zentrale Accounts-Datei unter /etc ------------------------------------
 
 echo "==> SIP-Accounts nach /etc/retrophone/baresip verschieben..."
@@ -141,8 +298,8 @@ ln -sf "$ETC_ACCOUNTS" "$BARESIP_ACCOUNTS"
 
 echo "==> Projektverzeichnisse anlegen..."
 
-mkdir -p "$RETRO_DIR" "$RETRO_LOG_DIR" "$RETRO_RUN_DIR"
-chown -R "$RETRO_USER:$RETRO_USER" "$RETRO_DIR" "$RETRO_LOG_DIR" "$RETRO_RUN_DIR"
+mkdir -p "$RETRO_DIR" "$RETRO_LOG_DIR" "$RETRO_RUN_DIR" "$RETRO_LIB_DIR"
+chown -R "$RETRO_USER:$RETRO_USER" "$RETRO_DIR" "$RETRO_LOG_DIR" "$RETRO_RUN_DIR" "$RETRO_LIB_DIR"
 
 # --- 8. Python-Files von GitHub laden ----------------------------------------
 
@@ -156,6 +313,10 @@ done
 chmod +x "$RETRO_DIR"/*.py
 chown "$RETRO_USER:$RETRO_USER" "$RETRO_DIR"/*.py
 
+# Bytecode vorab erzeugen, damit der Daemon nach einem Neustart nicht erst kompiliert
+python3 -m compileall -q "$RETRO_DIR"
+chown -R "$RETRO_USER:$RETRO_USER" "$RETRO_DIR/__pycache__"
+
 # --- 9. Dialtone erzeugen -----------------------------------------------------
 
 DIALTONE="$RETRO_DIR/dialtone.wav"
@@ -165,6 +326,14 @@ if [ ! -f "$DIALTONE" ]; then
   chown "$RETRO_USER:$RETRO_USER" "$DIALTONE"
 fi
 
+# Platzhalter-Ansage fuer den Anrufbeantworter (ein Piepton); eigene per Weboberflaeche
+VM_DIR="$RETRO_LIB_DIR/voicemail"
+mkdir -p "$VM_DIR"
+if [ ! -f "$VM_DIR/greeting.wav" ]; then
+  sox -n -r 8000 -c 1 -b 16 "$VM_DIR/greeting.wav" synth 0.4 sin 1000 pad 0.5 0
+fi
+chown -R "$RETRO_USER:$RETRO_USER" "$VM_DIR"
+
 # --- 10. sudoers für Service-Restarts ----------------------------------------
 
 echo "==> sudoers-Regeln für Service-Restarts anlegen..."
@@ -174,27 +343,19 @@ cat >"$SUDOERS_FILE" <<EOF
 $RETRO_USER ALL=(ALL) NOPASSWD: /usr/bin/systemctl restart baresip.service
 $RETRO_USER ALL=(ALL) NOPASSWD: /usr/bin/systemctl restart phone-daemon.service
 $RETRO_USER ALL=(ALL) NOPASSWD: /usr/bin/systemctl restart retrophone-web.service
+$RETRO_USER ALL=(ALL) NOPASSWD: /usr/sbin/iw dev wlan0 set power_save off
 EOF
 
 chmod 440 "$SUDOERS_FILE"
 
-# --- 11. logrotate für Retrophone-Logs ---------------------------------------
-
-echo "==> logrotate Konfiguration für Retrophone-Logs..."
-
-LOGROTATE_FILE="/etc/logrotate.d/retrophone"
-cat >"$LOGROTATE_FILE" <<EOF
-/var/log/retrophone/phone.log /var/log/retrophone/ring.log {
-    daily
-    rotate 7
-    missingok
-    notifempty
-    compress
-    delaycompress
-    copytruncate
-    create 640 $RETRO_USER $RETRO_USER
-}
-EOF
+# --- 11. Log-Archiv für Retrophone-Logs --------------------------------------
+
+# Die Logs rotieren selbst um Mitternacht; log_archive.py packt sie (Timer
+# unten). Ein logrotate daneben wuerde dieselben Dateien ein zweites Mal drehen.
+echo "==> Log-Archiv statt logrotate..."
+rm -f /etc/logrotate.d/retrophone
+mkdir -p "$RETRO_LOG_DIR/archive"
+chown "$RETRO_USER:$RETRO_USER" "$RETRO_LOG_DIR/archive"
 
 # Rechte sofort einmal korrigieren
 touch "$RETRO_LOG_DIR/phone.log" "$RETRO_LOG_DIR/ring.log"
@@ -214,6 +375,7 @@ After=network.target sound.target
 [Service]
 User=$RETRO_USER
 ExecStart=/usr/local/bin/baresip -f $RETRO_HOME/.baresip
+$BARESIP_RES
 Restart=on-failure
 NoNewPrivileges=false
 
@@ -228,18 +390,46 @@ Description=RetroPhone Dial/Hook Daemon
 After=network.target sound.target baresip.service
 
 [Service]
+Type=notify
+NotifyAccess=main
+WatchdogSec=30
 ExecStart=/usr/bin/python3 $RETRO_DIR/phone_daemon.py
+ExecReload=/bin/kill -HUP \$MAINPID
+RuntimeDirectory=retrophone
+RuntimeDirectoryPreserve=yes
 Restart=on-failure
 User=$RETRO_USER
 Group=$RETRO_USER
+$DAEMON_RES
 NoNewPrivileges=false
 
 [Install]
 WantedBy=multi-user.target
 EOF
 
+# Web-Login: vorhandenes Passwort behalten, sonst zufaelliges erzeugen (nur als scrypt-Hash gespeichert)
+WEB_SERVICE=/etc/systemd/system/retrophone-web.service
+WEB_PASS_LINE=$(grep -s "^Environment=RETRO_WEB_PASS=" "$WEB_SERVICE" || true)
+WEB_PASS_NEW=""
+if [ -n "$WEB_PASS_LINE" ]; then
+  WEB_PASS_VALUE="${WEB_PASS_LINE#Environment=RETRO_WEB_PASS=}"
+  case "$WEB_PASS_VALUE" in
+    scrypt:*) ;;
+    *)
+      # Klartext aus einer aelteren Installation: gleiches Passwort, jetzt als Hash
+      WEB_PASS_VALUE="${WEB_PASS_VALUE#\"}"
+      WEB_PASS_VALUE="${WEB_PASS_VALUE%\"}"
+      WEB_PASS_VALUE=$(printf '%s\n' "$WEB_PASS_VALUE" | python3 "$RETRO_DIR/web_auth.py" hash)
+      echo "Web-Login: vorhandenes Klartext-Passwort als scrypt-Hash gespeichert"
+      ;;
+  esac
+else
+  WEB_PASS_NEW=$(python3 -c 'import secrets; print(secrets.token_urlsafe(9))')
+  WEB_PASS_VALUE=$(printf '%s\n' "$WEB_PASS_NEW" | python3 "$RETRO_DIR/web_auth.py" hash)
+fi
+
 # retrophone-web.service
-cat >/etc/systemd/system/retrophone-web.service <<EOF
+cat >"$WEB_SERVICE" <<EOF
 [Unit]
 Description=RetroPhone Web UI
 After=network.target
@@ -250,7 +440,9 @@ WorkingDirectory=$RETRO_DIR
 User=$RETRO_USER
 Group=$RETRO_USER
 Environment=RETRO_WEB_USER=admin
-Environment=RETRO_WEB_PASS=secret
+Environment=RETRO_WEB_PASS=$WEB_PASS_VALUE
+# Login-Hashes und Seitenaufbau nach dem Phone-Daemon
+$WEB_RES
 Restart=on-failure
 NoNewPrivileges=false
 
@@ -258,6 +450,34 @@ NoNewPrivileges=false
 WantedBy=multi-user.target
 EOF
 
+# retrophone-logs: rotierte Logs packen und aufraeumen, danach den Suchindex nachziehen
+cat >/etc/systemd/system/retrophone-logs.service <<EOF
+[Unit]
+Description=RetroPhone Log-Archiv
+
+[Service]
+Type=oneshot
+ExecStart=/usr/bin/python3 $RETRO_DIR/log_archive.py compact
+ExecStart=/usr/bin/python3 $RETRO_DIR/log_search.py update
+User=$RETRO_USER
+Group=$RETRO_USER
+Nice=19
+IOSchedulingClass=idle
+$LOGS_RES
+EOF
+
+cat >/etc/systemd/system/retrophone-logs.timer <<EOF
+[Unit]
+Description=RetroPhone Log-Archiv taeglich
+
+[Timer]
+OnCalendar=*-*-* 00:05:00
+Persistent=true
+
+[Install]
+WantedBy=timers.target
+EOF
+
 # --- 13. systemd reload & enable ---------------------------------------------
 
 echo "==> systemd neu laden und Services aktivieren..."
@@ -267,7 +487,12 @@ systemctl enable baresip.service phone-daemon.service retrophone-web.service
 systemctl restart baresip.service
 systemctl restart phone-daemon.service
 systemctl restart retrophone-web.service
+systemctl enable --now retrophone-logs.timer
 
 echo "=== Installation abgeschlossen ==="
-echo "Weboberfläche: http://<IP-des-Pi>:8080  (Login: admin / secret)"
+if [ -n "$WEB_PASS_NEW" ]; then
+  echo "Weboberfläche: http://<IP-des-Pi>:8080  (Login: admin / $WEB_PASS_NEW, bitte notieren)"
+else
+  echo "Weboberfläche: http://<IP-des-Pi>:8080  (Login unveraendert)"
+fi
 echo "SIP-Account-Datei: /etc/retrophone/baresip/accounts"